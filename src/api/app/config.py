@@ -55,6 +55,8 @@ class ApiConfig(YamlBaseSettings):
     API_RATE_LIMIT_RULES: Optional[Union[str, object]] = None
     API_RATE_LIMIT_KEY: str = "ip"
     API_RATE_LIMIT_EXEMPT_IPS: Optional[str] = None
+    API_RATE_LIMIT_HYBRID: bool | str = "no"
+    API_RATE_LIMIT_SYNC_INTERVAL: Optional[str] = "1"
 
     model_config = YamlSettingsConfigDict(  # type: ignore
         yaml_file=getenv("SETTINGS_YAML_FILE", "/etc/bunkerweb/api.yml"),
@@ -117,6 +119,19 @@ class ApiConfig(YamlBaseSettings):
         v = str(self.API_RATE_LIMIT_HEADERS_ENABLED).strip().lower()
         return v in ("1", "true", "yes", "on")
 
+    @property
+    def rate_limit_hybrid(self) -> bool:
+        v = str(self.API_RATE_LIMIT_HYBRID).strip().lower()
+        return v in ("1", "true", "yes", "on")
+
+    @property
+    def rate_limit_sync_interval(self) -> float:
+        """Return the seconds between two reconciliations of the hybrid rate limiter buckets."""
+        try:
+            return max(0.05, float(str(self.API_RATE_LIMIT_SYNC_INTERVAL).strip()))
+        except Exception:
+            return 1.0
+
     # Internal API resolution, keeping DB-sourced fallbacks
     @property
     def internal_api_port(self) -> str:
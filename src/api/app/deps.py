@@ -3,8 +3,12 @@ from ApiCaller import ApiCaller  # type: ignore
 from fastapi import HTTPException
 
 from .config import api_config
+from .instance_registry import InstanceRegistry
 from .utils import get_db
 
+# Instances and API clients of the worker, shared by its requests
+instances_registry = InstanceRegistry(lambda: get_db(log=False))
+
 
 def get_internal_api() -> API:
     """Dependency that returns the internal NGINX API client."""
@@ -12,24 +16,17 @@ def get_internal_api() -> API:
 
 
 def get_instances_api_caller() -> ApiCaller:
-    """Build an ApiCaller targeting all known instances from the database."""
-    db = get_db(log=False)
-    apis = []
-    try:
-        for inst in db.get_instances():
-            try:
-                apis.append(API.from_instance(inst))
-            except Exception:
-                continue
-    except Exception:
+    """Build an ApiCaller targeting all known instances from the registry of the worker."""
+    apis = instances_registry.get_apis()
+    if apis is None:
         # Fallback to internal API only if DB access fails
-        apis.append(API(api_config.internal_endpoint, api_config.internal_api_host_header))
+        apis = [API(api_config.internal_endpoint, api_config.internal_api_host_header)]
     return ApiCaller(apis)
 
 
 def get_api_for_hostname(hostname: str) -> API:
     """Dependency returning a single API client targeting the given hostname."""
-    inst = get_db(log=False).get_instance(hostname)
-    if not inst:
+    api = instances_registry.get_api(hostname)
+    if not api:
         raise HTTPException(status_code=404, detail=f"Instance {hostname} not found")
-    return API.from_instance(inst)
+    return api
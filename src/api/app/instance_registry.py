@@ -0,0 +1,157 @@
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from API import API  # type: ignore
+from requests import Session
+
+# The database is asked whether the instances changed at most once per REGISTRY_CHECK_INTERVAL seconds by each worker
+REGISTRY_CHECK_INTERVAL = 1.0
+# An instance is considered down after HEALTH_MAX_FAILURES failed requests in a row, its requests (except pings) are then answered right away
+# with an error until HEALTH_RETRY_INTERVAL seconds passed since the last failure
+HEALTH_MAX_FAILURES = 3
+HEALTH_RETRY_INTERVAL = 30.0
+
+_CONNECTION_FIELDS = ("hostname", "port", "listen_https", "https_port", "server_name")
+
+
+class InstanceHealth:
+    """Health of an instance as seen by the requests of the worker."""
+
+    __slots__ = ("_lock", "_clock", "last_ping", "latency", "failures", "last_failure")
+
+    def __init__(self, clock: Callable[[], float] = monotonic):
+        self._lock = Lock()
+        self._clock = clock
+        self.last_ping: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.last_failure: Optional[float] = None
+
+    def is_down(self) -> bool:
+        return self.failures >= HEALTH_MAX_FAILURES and self.last_failure is not None and self._clock() - self.last_failure < HEALTH_RETRY_INTERVAL
+
+    def record(self, url: str, success: bool, latency: float) -> None:
+        with self._lock:
+            if not success:
+                self.failures += 1
+                self.last_failure = self._clock()
+                return
+
+            self.failures = 0
+            self.latency = latency
+            if url == "ping":
+                self.last_ping = self._clock()
+
+
+class RegisteredAPI(API):
+    """API client of a registered instance : it keeps its connections to the instance and records the health of the instance.
+
+    Requests to an instance known to be down fail right away, pings always go through so that they can tell when it is back.
+    """
+
+    def __init__(self, endpoint: str, host: Optional[str] = None, token: Optional[str] = None, *, health: Optional[InstanceHealth] = None):
+        super().__init__(endpoint, host=host, token=token, session=Session())
+        self.health = health or InstanceHealth()
+
+    def request(self, method, url: str, data=None, files=None, timeout=(5, 10)) -> Tuple[bool, str, Optional[int], Optional[dict]]:
+        path = url.lstrip("/")
+        if path != "ping" and self.health.is_down():
+            return False, f"Instance {self.endpoint} is down ({self.health.failures} failed requests in a row), skipped", None, None
+
+        start = monotonic()
+        sent, err, status, resp = super().request(method, url, data=data, files=files, timeout=timeout)
+        self.health.record(path, sent, monotonic() - start)
+        return sent, err, status, resp
+
+
+class InstanceRegistry:
+    """Per-worker cache of the instances and of their API clients.
+
+    The instances are loaded again when the version of the instances collection (the change marker of the metadata, the number of instances
+    and their last creation date) moves, the version being checked at most once per check interval. The health of the instances is kept
+    across the reloads as long as their hostname stays the same.
+    """
+
+    def __init__(self, db_getter: Callable[[], Any], *, check_interval: float = REGISTRY_CHECK_INTERVAL, clock: Callable[[], float] = monotonic):
+        self.check_interval = check_interval
+        self._db_getter = db_getter
+        self._clock = clock
+        self._lock = Lock()
+        self._version: Optional[str] = None
+        self._checked: Optional[float] = None
+        self._instances: Dict[str, Dict[str, Any]] = {}
+        self._apis: Dict[str, RegisteredAPI] = {}
+        self._health: Dict[str, InstanceHealth] = {}
+        self._loaded = False
+
+    def invalidate(self) -> None:
+        """Check the version of the instances on the next access, to call after updating the instances."""
+        with self._lock:
+            self._checked = None
+
+    def _make_api(self, instance: Dict[str, Any]) -> RegisteredAPI:
+        health = self._health.get(instance["hostname"])
+        if health is None:
+            health = self._health[instance["hostname"]] = InstanceHealth(self._clock)
+        api = RegisteredAPI.from_instance(instance)
+        api.health = health
+        return api
+
+    def _refresh(self) -> bool:
+        """Reload the instances if they changed, returns False if they were never loaded because the database can't be reached."""
+        with self._lock:
+            now = self._clock()
+            if self._loaded and self._checked is not None and now - self._checked < self.check_interval:
+                return True
+
+            db = self._db_getter()
+            version = db.get_collection_version("instances")
+            if self._loaded and version is not None and version == self._version:
+                self._checked = now
+                return True
+
+            try:
+                instances = {instance["hostname"]: instance for instance in db.get_instances()}
+            except BaseException:
+                # ? Keep the previous instances while the database can't be reached
+                return self._loaded
+
+            apis = {}
+            for hostname, instance in instances.items():
+                previous = self._instances.get(hostname)
+                if previous and hostname in self._apis and all(previous.get(field) == instance.get(field) for field in _CONNECTION_FIELDS):
+                    apis[hostname] = self._apis[hostname]
+                    continue
+                try:
+                    apis[hostname] = self._make_api(instance)
+                except Exception:
+                    continue
+
+            self._instances, self._apis = instances, apis
+            self._health = {hostname: health for hostname, health in self._health.items() if hostname in instances}
+            # ? Without version, the instances are loaded again on the next check
+            self._version = version
+            self._checked = now if version is not None else None
+            self._loaded = True
+            return True
+
+    def get_apis(self) -> Optional[List[API]]:
+        """API clients of every instance, None if the instances can't be loaded."""
+        try:
+            if not self._refresh():
+                return None
+        except BaseException:
+            if not self._loaded:
+                return None
+        return list(self._apis.values())
+
+    def get_api(self, hostname: str) -> Optional[API]:
+        """API client of an instance, the database is checked again when the instance isn't known yet."""
+        self.get_apis()
+        api = self._apis.get(hostname)
+        if api is None:
+            self.invalidate()
+            self.get_apis()
+            api = self._apis.get(hostname)
+        return api
@@ -101,7 +101,7 @@ def create_app() -> FastAPI:
             with suppress(Exception):
                 LOGGER.debug(f"HTTPException 500: {exc}\n{format_exc()}")
         detail = exc.detail if isinstance(exc.detail, str) else "error"
-        return JSONResponse(status_code=exc.status_code, content={"status": "error", "message": detail})
+        return JSONResponse(status_code=exc.status_code, content={"status": "error", "message": detail}, headers=getattr(exc, "headers", None))
 
     # Log tracebacks for unexpected errors (500)
     @app.exception_handler(Exception)
@@ -0,0 +1,156 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_right
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps, loads
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+PAGE_MAX_LIMIT = 1000
+COLLECTIONS_CACHE_SIZE = 8
+
+
+class CursorError(ValueError):
+    pass
+
+
+class _Collection:
+    __slots__ = ("items", "keys")
+
+    def __init__(self, items: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Tuple]):
+        self.items = sorted(items, key=key)
+        self.keys = [key(item) for item in self.items]
+
+
+# (collection name, version, build params) -> computed collection, shared by the requests of the worker
+_collections: "OrderedDict[Tuple[str, str, Hashable], _Collection]" = OrderedDict()
+_collections_lock = Lock()
+
+
+def encode_cursor(collection: str, key: Sequence[Any]) -> str:
+    """Opaque cursor pointing after the item with the given sort key."""
+    return urlsafe_b64encode(dumps({"c": collection, "k": list(key)}, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(collection: str, cursor: str) -> Tuple:
+    try:
+        data = loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise CursorError("Invalid cursor") from e
+    if not isinstance(data, dict) or data.get("c") != collection or not isinstance(data.get("k"), list):
+        raise CursorError("Invalid cursor")
+    return tuple(data["k"])
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated list of fields, None means every field."""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()] or None
+
+
+def select_fields(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+def make_etag(request: Request, collection: str, version: str) -> str:
+    """Weak ETag of a representation : the version of the collection and the query parameters that shape it."""
+    params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    return 'W/"' + sha256(f"{collection}|{version}|{params}".encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # ? Weak comparison, as recommended for If-None-Match
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def paginate(
+    collection: str, items: List[Dict[str, Any]], keys: List[Tuple], *, cursor: Optional[str], limit: Optional[int]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Keyset pagination over sorted items : returns the page following the cursor and the cursor of the next page (None on the last page)."""
+    start = 0
+    if cursor:
+        key = decode_cursor(collection, cursor)
+        # ? The sort keys of a collection share the same shape, a cursor key that doesn't can't be compared with them
+        if keys and (len(key) != len(keys[0]) or any(type(value) is not type(expected) for value, expected in zip(key, keys[0]))):
+            raise CursorError("Invalid cursor")
+        start = bisect_right(keys, key)
+    if limit is None:
+        return items[start:], None
+
+    end = start + limit
+    page = items[start:end]
+    next_cursor = encode_cursor(collection, keys[end - 1]) if end < len(items) else None
+    return page, next_cursor
+
+
+def _get_collection(
+    collection: str, version: Optional[str], params: Hashable, build: Callable[[], List[Dict[str, Any]]], key: Callable[[Dict[str, Any]], Tuple]
+) -> _Collection:
+    if version is None:
+        return _Collection(build(), key)
+
+    cache_key = (collection, version, params)
+    with _collections_lock:
+        cached = _collections.get(cache_key)
+        if cached is not None:
+            _collections.move_to_end(cache_key)
+            return cached
+
+    computed = _Collection(build(), key)
+    with _collections_lock:
+        _collections[cache_key] = computed
+        while len(_collections) > COLLECTIONS_CACHE_SIZE:
+            _collections.popitem(last=False)
+    return computed
+
+
+def clear_collections() -> None:
+    with _collections_lock:
+        _collections.clear()
+
+
+def list_response(
+    request: Request,
+    collection: str,
+    *,
+    version: Optional[str],
+    params: Hashable,
+    build: Callable[[], List[Dict[str, Any]]],
+    key: Callable[[Dict[str, Any]], Tuple],
+    render: Callable[[List[Dict[str, Any]]], Dict[str, Any]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+) -> Response:
+    """Build a paginated and conditional listing of a collection.
+
+    The collection is computed by build() (with params being everything it depends on) and kept per worker as long as its version, read from the
+    database change timestamps, stays the same. A request whose If-None-Match matches the ETag gets a 304 without the collection being computed.
+    Without limit, every item following the cursor is returned like before.
+    """
+    etag = make_etag(request, collection, version) if version is not None else None
+    if etag and etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    computed = _get_collection(collection, version, params, build, key)
+    try:
+        page, next_cursor = paginate(collection, computed.items, computed.keys, cursor=cursor, limit=limit)
+    except CursorError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+
+    selected = parse_fields(fields)
+    content = render([select_fields(item, selected) for item in page])
+    if limit is not None:
+        content["next_cursor"] = next_cursor
+    return JSONResponse(status_code=200, content=content, headers={"ETag": etag} if etag else None)
@@ -1,12 +1,14 @@
 from contextlib import suppress
 from csv import Sniffer, reader as csv_reader
+from functools import lru_cache
 from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
 from json import dumps, loads
+from math import ceil
 from typing import Iterable, List, Optional, Set, Tuple, Dict, Any, Union
 from io import StringIO
 from pathlib import Path
 
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request
 from fastapi.responses import Response
 
 from regex import compile as regex_compile, Pattern, escape, fullmatch, search, split
@@ -15,6 +17,7 @@ from slowapi.errors import RateLimitExceeded
 from yaml import safe_load
 
 from .config import api_config
+from .rate_limit_engine import HybridLimiter, RuleMatcher
 from os import getenv
 from .utils import LOGGER, get_db
 
@@ -29,7 +32,7 @@ DEFAULT_AUTH_RATE = (10, 60)
 
 
 class _Rule:
-    __slots__ = ("methods", "pattern", "times", "seconds", "raw")
+    __slots__ = ("methods", "pattern", "times", "seconds", "raw", "limit_string")
 
     def __init__(self, methods: Set[str], pattern: Pattern[str], times: int, seconds: int, raw: str):
         self.methods = methods
@@ -37,13 +40,13 @@ class _Rule:
         self.times = times
         self.seconds = seconds
         self.raw = raw
-
-    @property
-    def limit_string(self) -> str:
-        return _limit_string(self.times, self.seconds)
+        self.limit_string = _limit_string(times, seconds)
 
 
 _rules: List[_Rule] = []
+_matcher: Optional[RuleMatcher] = None
+_hybrid: Optional[HybridLimiter] = None
+_key_func = None
 
 
 def _normalize_method(m: str) -> str:
@@ -468,17 +471,15 @@ def _path_variants(path: str) -> List[str]:
 
 
 def _match_rule(method: str, path: str) -> Optional[str]:
-    if not _rules:
+    if _matcher is None:
         return None
-    m = _normalize_method(method)
-    paths = _path_variants(path)
-    for rule in _rules:
-        if rule.methods and m not in rule.methods and "*" not in rule.methods:
-            continue
-        for p in paths:
-            if rule.pattern.match(p):
-                return rule.limit_string
-    return None
+    rule = _matcher.match(_normalize_method(method), _path_variants(path))
+    return rule.limit_string if rule else None
+
+
+@lru_cache(maxsize=256)
+def _limit_rate(limit: str) -> Tuple[int, int]:
+    return _parse_rate(limit)
 
 
 def _auth_default_limit(method: str, path: str) -> Optional[str]:
@@ -503,6 +504,14 @@ def limiter_dep_dynamic():
         if match is None:
             match = _auth_default_limit(request.method, request.scope.get("path", "/"))
 
+        if _hybrid is not None:
+            key = _key_func(request) if _key_func else _client_identifier(request)
+            for lstr in _base_limits if match is None else [match]:
+                allowed, retry_after = _hybrid.hit(*_limit_rate(lstr), key)
+                if not allowed:
+                    raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {lstr}", headers={"Retry-After": str(ceil(retry_after))})
+            return None
+
         async def _noop(request: Request, response: Response | None = None):
             return None
 
@@ -518,9 +527,10 @@ def setup_rate_limiter(app) -> None:
         LOGGER.info("API rate limiting disabled by configuration")
         return
 
-    global _limiter, _enabled, _rules, _base_limits, _exempt_networks, _auth_limit
+    global _limiter, _enabled, _rules, _matcher, _hybrid, _key_func, _base_limits, _exempt_networks, _auth_limit
 
     _rules = _load_rules(getattr(api_config, "API_RATE_LIMIT_RULES", None))
+    _matcher = RuleMatcher(_rules) if _rules else None
 
     # Base/default limits (new simple string form wins over legacy split knobs)
     _base_limits = []
@@ -580,8 +590,9 @@ def setup_rate_limiter(app) -> None:
         strategy = "fixed-window"
         LOGGER.warning(f"Unknown API rate limit strategy '{orig_strategy}'; falling back to '{strategy}'")
 
+    _key_func = _build_key_func()
     _limiter = Limiter(
-        key_func=_build_key_func(),
+        key_func=_key_func,
         default_limits=_base_limits,  # type: ignore[arg-type]
         storage_uri=storage,
         storage_options=storage_options,
@@ -591,9 +602,13 @@ def setup_rate_limiter(app) -> None:
     )
     app.state.limiter = _limiter
 
+    # Token buckets per worker, reconciled with the limiter storage instead of a storage round trip per request and limit
+    if api_config.rate_limit_hybrid:
+        _hybrid = HybridLimiter(_limiter._storage, sync_interval=api_config.rate_limit_sync_interval, logger=LOGGER)
+
     # Use slowapi's default handler to include useful headers
     app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
     _enabled = True
     LOGGER.info(
-        f"Rate limiting enabled with storage={storage}; strategy={api_config.API_RATE_LIMIT_STRATEGY}; headers={api_config.rate_limit_headers_enabled}; defaults={len(_base_limits)}; rules={len(_rules)}; auth_limit={'on' if _auth_limit else 'off'}"
+        f"Rate limiting enabled with storage={storage}; strategy={'hybrid token buckets' if _hybrid else api_config.API_RATE_LIMIT_STRATEGY}; headers={api_config.rate_limit_headers_enabled}; defaults={len(_base_limits)}; rules={len(_rules)}; auth_limit={'on' if _auth_limit else 'off'}"
     )
@@ -0,0 +1,248 @@
+from collections import OrderedDict
+from logging import Logger
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from regex import Pattern, compile as regex_compile, search
+
+# Reconciliation of the hybrid limiter : every bucket is synchronized with the storage at least once per HYBRID_SYNC_INTERVAL seconds
+HYBRID_SYNC_INTERVAL = 1.0
+HYBRID_MAX_BUCKETS = 10000
+# Share of its remaining tokens a worker may spend before reconciling again with the other workers
+HYBRID_BURST_SHARE = 0.5
+
+_DEFAULT_FLAGS = regex_compile("").flags
+_REGEX_SPECIALS = set(".^$*+?{}[]()|\\")
+
+
+def _has_alternation(source: str) -> bool:
+    escaped = False
+    for char in source:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "|":
+            return True
+    return False
+
+
+def _literal_prefix(pattern: Pattern[str]) -> Tuple[str, str]:
+    """Literal text every path matched by the pattern starts with, and the rest of the pattern source."""
+    source = pattern.pattern
+    if pattern.flags != _DEFAULT_FLAGS or _has_alternation(source):
+        return "", source
+
+    i = 1 if source.startswith("^") else 0
+    prefix = []
+    while i < len(source):
+        char = source[i]
+        if char == "\\" and i + 1 < len(source) and not source[i + 1].isalnum():
+            prefix.append(source[i + 1])
+            i += 2
+        elif char not in _REGEX_SPECIALS:
+            prefix.append(char)
+            i += 1
+        else:
+            break
+
+    rest = source[i:]
+    if prefix and rest[:1] in ("*", "+", "?", "{"):
+        # ? The last literal character is repeated or optional
+        prefix.pop()
+    return "".join(prefix), rest
+
+
+def _path_segment(path: str) -> str:
+    end = path.find("/", 1)
+    return path if end == -1 else path[:end]
+
+
+def _rule_segment(rule: Any) -> Optional[str]:
+    """First path segment every path matched by the rule has, None when the rule may match paths of any segment."""
+    prefix, rest = _literal_prefix(rule.pattern)
+    if prefix.startswith("/") and (prefix.find("/", 1) != -1 or rest == "$"):
+        return _path_segment(prefix)
+    return None
+
+
+def _combinable(pattern: Pattern[str]) -> bool:
+    # ? Capture groups would shift the groups of the combined pattern and inline flags would apply to every rule
+    return pattern.groups == 0 and pattern.flags == _DEFAULT_FLAGS and not search(r"\(\?[a-zA-Z^-]", pattern.pattern)
+
+
+def _compile_group(indexes: List[int], rules: Sequence[Any]) -> List[Tuple[Pattern[str], Optional[int]]]:
+    """Ordered patterns of a group of rules : a combined pattern (None) for each run of combinable rules, else the pattern of the rule alone."""
+    parts: List[Tuple[Pattern[str], Optional[int]]] = []
+    run: List[int] = []
+
+    def close_run():
+        if not run:
+            return
+        try:
+            parts.append((regex_compile("|".join(f"(?P<r{index}>{rules[index].pattern.pattern})" for index in run)), None))
+        except Exception:
+            parts.extend((rules[index].pattern, index) for index in run)
+        run.clear()
+
+    for index in indexes:
+        if _combinable(rules[index].pattern):
+            run.append(index)
+            continue
+        close_run()
+        parts.append((rules[index].pattern, index))
+    close_run()
+    return parts
+
+
+def _first_match(parts: List[Tuple[Pattern[str], Optional[int]]], path: str) -> Optional[int]:
+    for pattern, index in parts:
+        match = pattern.match(path)
+        if match:
+            # ? The alternatives are tried in the rules order, the first one that matches is the one of the first matching rule
+            return index if index is not None else int(match.lastgroup[1:])
+    return None
+
+
+class RuleMatcher:
+    """Compiled form of the rate limit rules, returning the first rule (in configuration order) matching a request.
+
+    The rules are grouped by method and by the first segment of their literal path prefix (/instances for /instances/*), and the rules of each
+    group are compiled into a single combined pattern, so matching a request costs one or two regex matches whatever the number of rules.
+    Rules that can't be combined (capture groups, inline flags) keep their own pattern at their position in the group.
+    The rules only need the methods (upper-cased, empty or containing * for every method) and pattern attributes.
+    """
+
+    def __init__(self, rules: Sequence[Any]):
+        self.rules = list(rules)
+        segments = [_rule_segment(rule) for rule in self.rules]
+        methods = set().union(*(rule.methods for rule in self.rules)) - {"*"}
+
+        # method (None for the methods no rule names) -> segment (None for the paths of no known segment) -> patterns
+        self._groups: Dict[Optional[str], Dict[Optional[str], List[Tuple[Pattern[str], Optional[int]]]]] = {}
+        for method in (*methods, None):
+            indexes = [i for i, rule in enumerate(self.rules) if not rule.methods or "*" in rule.methods or method in rule.methods]
+            groups = {None: _compile_group([i for i in indexes if segments[i] is None], self.rules)}
+            for segment in {segments[i] for i in indexes} - {None}:
+                groups[segment] = _compile_group([i for i in indexes if segments[i] in (None, segment)], self.rules)
+            self._groups[method] = groups
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, method: str, paths: Iterable[str]) -> Optional[Any]:
+        """First rule matching the method and any of the paths (the rules order wins over the paths order)."""
+        groups = self._groups.get(method) or self._groups[None]
+        first = None
+        for path in paths:
+            parts = groups.get(_path_segment(path))
+            index = _first_match(groups[None] if parts is None else parts, path)
+            if index is not None and (first is None or index < first):
+                first = index
+        return None if first is None else self.rules[first]
+
+
+class _Bucket:
+    __slots__ = ("lock", "tokens", "updated", "budget", "pending", "synced", "window", "own", "seen")
+
+    def __init__(self, times: int, now: float):
+        self.lock = Lock()
+        self.tokens = float(times)
+        self.updated = now
+        self.budget = 0
+        # Hits accepted since the last reconciliation
+        self.pending = 0
+        self.synced: Optional[float] = None
+        # Window of the shared counter, with the hits of this worker and of the other workers already counted in it
+        self.window: Optional[int] = None
+        self.own = 0
+        self.seen = 0
+
+
+class HybridLimiter:
+    """Rate limits enforced by in-process token buckets, reconciled with the other workers through a shared storage.
+
+    Every bucket holds times tokens refilled at times / seconds tokens per second. A worker accepts requests from its buckets without any
+    network round trip and reconciles a bucket once per sync interval, or when it spent its share of the remaining tokens : the accepted hits
+    are added to the shared counter of the current window and the hits accepted by the other workers meanwhile are taken from the tokens.
+    The storage is anything with the incr(key, expiry, amount) method of the limits storages, Redis in production.
+    """
+
+    def __init__(
+        self,
+        storage: Any,
+        *,
+        sync_interval: float = HYBRID_SYNC_INTERVAL,
+        max_buckets: int = HYBRID_MAX_BUCKETS,
+        burst_share: float = HYBRID_BURST_SHARE,
+        prefix: str = "bwapi-rl-hybrid-",
+        logger: Optional[Logger] = None,
+        clock: Callable[[], float] = time,
+    ) -> None:
+        self.sync_interval = sync_interval
+        self.max_buckets = max_buckets
+        self.burst_share = burst_share
+        self.prefix = prefix
+        self._storage = storage
+        self._logger = logger
+        # ? The windows of the shared counters must be the same for every worker, hence the wall clock
+        self._clock = clock
+        self._lock = Lock()
+        self._buckets: "OrderedDict[Tuple[int, int, str], _Bucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _get_bucket(self, times: int, seconds: int, key: str, now: float) -> _Bucket:
+        bucket_key = (times, seconds, key)
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                self._buckets.move_to_end(bucket_key)
+                return bucket
+
+            bucket = self._buckets[bucket_key] = _Bucket(times, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return bucket
+
+    def _sync(self, bucket: _Bucket, times: int, seconds: int, key: str, now: float) -> None:
+        window = int(now // seconds)
+        if window != bucket.window:
+            bucket.window, bucket.own, bucket.seen = window, 0, 0
+        bucket.synced = now
+
+        try:
+            total = int(self._storage.incr(f"{self.prefix}{times}/{seconds}/{key}/{window}", seconds * 2, amount=bucket.pending))
+        except Exception as e:
+            if self._logger:
+                self._logger.warning(f"Can't reconcile the rate limit of {key} with the storage, enforcing it locally : {e}")
+            bucket.budget = int(bucket.tokens)
+            return
+
+        bucket.own += bucket.pending
+        bucket.pending = 0
+        others = total - bucket.own
+        if others > bucket.seen:
+            bucket.tokens -= others - bucket.seen
+            bucket.seen = others
+        bucket.budget = max(1, int(bucket.tokens * self.burst_share)) if bucket.tokens >= 1 else 0
+
+    def hit(self, times: int, seconds: int, key: str) -> Tuple[bool, float]:
+        """Consume a token of the limit for the key, returns whether the request is accepted and else the seconds before a token is available."""
+        now = self._clock()
+        rate = times / seconds
+        bucket = self._get_bucket(times, seconds, key, now)
+        with bucket.lock:
+            bucket.tokens = min(float(times), bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+            if bucket.synced is None or now - bucket.synced >= self.sync_interval or (bucket.budget < 1 and bucket.tokens >= 1):
+                self._sync(bucket, times, seconds, key, now)
+
+            if bucket.tokens < 1 or bucket.budget < 1:
+                return False, max(0.0, (1 - bucket.tokens) / rate)
+            bucket.tokens -= 1
+            bucket.budget -= 1
+            bucket.pending += 1
+            return True, 0.0
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
-from typing import List, Union
+from typing import Any, Dict, List, Union
 import json
 
 from ..auth.guard import guard
@@ -11,6 +11,19 @@ from ..schemas import BanRequest, UnbanRequest
 router = APIRouter(prefix="/bans", tags=["bans"])
 
 
+def _bulk_response(action: str, payloads: List[Dict[str, Any]], ok: bool, responses: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> JSONResponse:
+    """Per-item results of a bulk ban or unban, with the error of each instance on which the item failed."""
+    results = []
+    for i, payload in enumerate(payloads):
+        result = {"ip": payload["ip"], "service": payload.get("service"), "status": "success"}
+        errors = {host: host_results[action][i].get("msg") for host, host_results in responses.items() if host_results[action][i].get("status") != "success"}
+        if errors:
+            result["status"] = "error"
+            result["errors"] = errors
+        results.append(result)
+    return JSONResponse(status_code=200 if ok else 502, content={"status": "success" if ok else "error", "results": results})
+
+
 @router.get("", dependencies=[Depends(guard)])
 def list_bans(api_caller=Depends(get_instances_api_caller)) -> JSONResponse:
     """List all active bans across all BunkerWeb instances."""
@@ -41,7 +54,7 @@ def ban(req: Union[List[BanRequest], BanRequest, str], api_caller=Depends(get_in
     else:
         items = req if isinstance(req, list) else [req]
 
-    all_ok = True
+    payloads = []
     for it in items:
         payload = it.model_dump()
         # Derive ban_scope from service presence: if no service, scope is global
@@ -52,9 +65,10 @@ def ban(req: Union[List[BanRequest], BanRequest, str], api_caller=Depends(get_in
             payload["ban_scope"] = "global"
             # Remove empty service to avoid ambiguity downstream
             payload.pop("service", None)
-        ok, _ = api_caller.send_to_apis("POST", "/ban", data=payload)
-        all_ok = all_ok and ok
-    return JSONResponse(status_code=200 if all_ok else 502, content={"status": "success" if all_ok else "error"})
+        payloads.append(payload)
+
+    ok, responses = api_caller.send_bans(bans=payloads)
+    return _bulk_response("bans", payloads, ok, responses)
 
 
 @router.post("/unban", dependencies=[Depends(guard)])
@@ -79,8 +93,6 @@ def unban(req: Union[List[UnbanRequest], UnbanRequest, str], api_caller=Depends(
     else:
         items = req if isinstance(req, list) else [req]
 
-    all_ok = True
-    for it in items:
-        ok, _ = api_caller.send_to_apis("POST", "/unban", data=it.model_dump())
-        all_ok = all_ok and ok
-    return JSONResponse(status_code=200 if all_ok else 502, content={"status": "success" if all_ok else "error"})
+    payloads = [it.model_dump() for it in items]
+    ok, responses = api_caller.send_bans(unbans=payloads)
+    return _bulk_response("unbans", payloads, ok, responses)
@@ -1,12 +1,13 @@
 from contextlib import suppress
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import JSONResponse, Response
 from ..schemas import CacheFilesDeleteRequest, CacheFileKey
 
 from ..auth.guard import guard
+from ..pagination import PAGE_MAX_LIMIT, list_response
 from ..utils import get_db
 
 
@@ -34,11 +35,15 @@ def _decode_printable(b: Optional[bytes]) -> tuple[str, bool]:
 
 @router.get("", dependencies=[Depends(guard)])
 def list_cache(
+    request: Request,
     service: Optional[str] = None,
     plugin: Optional[str] = None,
     job_name: Optional[str] = None,
     with_data: bool = Query(False, description="Include file data inline (text only)"),
-) -> JSONResponse:
+    limit: Annotated[Optional[int], Query(ge=1, le=PAGE_MAX_LIMIT, description="Page size, every file is returned when omitted")] = None,
+    cursor: Annotated[Optional[str], Query(description="Cursor of the page, as returned in next_cursor")] = None,
+    fields: Annotated[Optional[str], Query(description="Comma-separated fields to return")] = None,
+) -> Response:
     """List cache files from job executions.
 
     Args:
@@ -46,26 +51,46 @@ def list_cache(
         plugin: Filter by plugin ID
         job_name: Filter by job name
         with_data: Include file content (text files only)
+        limit: Page size (files sorted by plugin, job, service and file name)
+        cursor: Cursor of the page, as returned in next_cursor
+        fields: Comma-separated fields to return
+
+    The response has an ETag, a request with a matching If-None-Match gets a 304 while the cache is unchanged.
     """
-    items = get_db().get_jobs_cache_files(with_data=with_data, job_name=job_name or "", plugin_id=plugin or "")
-    out: List[Dict[str, Any]] = []
-    for it in items:
-        if service not in (None, "", "global") and it.get("service_id") != service:
-            continue
-        data = {
-            "plugin": it.get("plugin_id"),
-            "job_name": it.get("job_name"),
-            "service": it.get("service_id") or "global",
-            "file_name": it.get("file_name"),
-            "last_update": it.get("last_update").astimezone().isoformat() if it.get("last_update") else None,
-            "checksum": it.get("checksum"),
-        }
-        if with_data:
-            text, printable = _decode_printable(it.get("data"))
-            data["data"] = text
-            data["printable"] = printable
-        out.append(data)
-    return JSONResponse(status_code=200, content={"status": "success", "cache": out})
+    db = get_db()
+
+    def build() -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for it in db.get_jobs_cache_files(with_data=with_data, job_name=job_name or "", plugin_id=plugin or ""):
+            if service not in (None, "", "global") and it.get("service_id") != service:
+                continue
+            data = {
+                "plugin": it.get("plugin_id"),
+                "job_name": it.get("job_name"),
+                "service": it.get("service_id") or "global",
+                "file_name": it.get("file_name"),
+                "last_update": it.get("last_update").astimezone().isoformat() if isinstance(it.get("last_update"), datetime) else None,
+                "checksum": it.get("checksum"),
+            }
+            if with_data:
+                text, printable = _decode_printable(it.get("data"))
+                data["data"] = text
+                data["printable"] = printable
+            out.append(data)
+        return out
+
+    return list_response(
+        request,
+        "cache",
+        version=db.get_collection_version("jobs_cache"),
+        params=(service or None, plugin or None, job_name or None, with_data),
+        build=build,
+        key=lambda file: (file["plugin"], file["job_name"], file["service"], file["file_name"]),
+        render=lambda files: {"status": "success", "cache": files},
+        cursor=cursor,
+        limit=limit,
+        fields=fields,
+    )
 
 
 def _transform_filename(path_token: str) -> str:
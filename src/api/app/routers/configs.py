@@ -3,10 +3,11 @@ from typing import Annotated, Any, Dict, List, Optional
 from re import sub as re_sub
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Path as PathParam, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Path as PathParam, Query, Request
+from fastapi.responses import JSONResponse, Response
 
 from ..auth.guard import guard
+from ..pagination import PAGE_MAX_LIMIT, list_response
 from ..utils import get_db
 from ..schemas import (
     ConfigCreateRequest,
@@ -34,10 +35,8 @@ def _sanitize_name_from_filename(filename: str) -> str:
 def _service_exists(service: Optional[str]) -> bool:
     if not service:
         return True
-    db = get_db()
     try:
-        conf = db.get_config(global_only=True, methods=False, with_drafts=True)
-        return service in (conf.get("SERVER_NAME", "www.example.com") or "").split()
+        return get_db().service_exists(service)
     except Exception:
         return False
 
@@ -54,11 +53,15 @@ def _decode_data(val: bytes | str | None) -> str:
 
 @router.get("", dependencies=[Depends(guard)])
 def list_configs(
+    request: Request,
     service: Optional[str] = None,
     type: Annotated[OptionalConfigType, Query(description="Config type filter")] = None,  # noqa: A002
     with_drafts: bool = True,
     with_data: bool = False,
-) -> JSONResponse:
+    limit: Annotated[Optional[int], Query(ge=1, le=PAGE_MAX_LIMIT, description="Page size, every config is returned when omitted")] = None,
+    cursor: Annotated[Optional[str], Query(description="Cursor of the page, as returned in next_cursor")] = None,
+    fields: Annotated[Optional[str], Query(description="Comma-separated fields to return")] = None,
+) -> Response:
     """List custom configs.
 
     Query params:
@@ -66,27 +69,43 @@ def list_configs(
     - type: optional filter (e.g., http, server_http, modsec, ...)
     - with_drafts: include draft services when computing templates
     - with_data: include the content of configs
+    - limit/cursor: page through the configs (sorted by service, type and name)
+    - fields: only return these fields
+
+    The response has an ETag, a request with a matching If-None-Match gets a 304 while the configs are unchanged.
     """
     db = get_db()
     s_filter = None if (service in (None, "", "global")) else service
     t_filter = type  # Already normalized by Pydantic
-    items = db.get_custom_configs(with_drafts=with_drafts, with_data=with_data)
-
-    out: List[Dict[str, Any]] = []
-    for it in items:
-        if s_filter is not None and it.get("service_id") != s_filter:
-            continue
-        if t_filter is not None and it.get("type") != t_filter:
-            continue
-        data = {k: v for k, v in it.items() if k != "data"}
-        if with_data:
-            data["data"] = _decode_data(it.get("data"))
-        # Normalize global service presentation
-        data["service"] = data.pop("service_id", None) or "global"
-        data["is_draft"] = bool(it.get("is_draft", False))
-        out.append(data)
 
-    return JSONResponse(status_code=200, content={"status": "success", "configs": out})
+    def build() -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for it in db.get_custom_configs(with_drafts=with_drafts, with_data=with_data):
+            if s_filter is not None and it.get("service_id") != s_filter:
+                continue
+            if t_filter is not None and it.get("type") != t_filter:
+                continue
+            data = {k: v for k, v in it.items() if k != "data"}
+            if with_data:
+                data["data"] = _decode_data(it.get("data"))
+            # Normalize global service presentation
+            data["service"] = data.pop("service_id", None) or "global"
+            data["is_draft"] = bool(it.get("is_draft", False))
+            out.append(data)
+        return out
+
+    return list_response(
+        request,
+        "configs",
+        version=db.get_collection_version("custom_configs"),
+        params=(s_filter, t_filter, with_drafts, with_data),
+        build=build,
+        key=lambda config: (config["service"], config["type"], config["name"]),
+        render=lambda configs: {"status": "success", "configs": configs},
+        cursor=cursor,
+        limit=limit,
+        fields=fields,
+    )
 
 
 @router.post("/upload", dependencies=[Depends(guard)])
@@ -374,34 +393,25 @@ def delete_configs(req: ConfigsDeleteRequest) -> JSONResponse:
         return JSONResponse(status_code=422, content={"status": "error", "message": "No valid configs to delete"})
 
     db = get_db()
-    # Keep only API-managed configs not in to_del
-    current = db.get_custom_configs(with_drafts=True, with_data=True)
-    keep: List[Dict[str, Any]] = []
+    # Only look up the methods of the selected configs, their data is never read
+    methods = db.get_custom_configs_methods(to_del)
+    removed: List[List[Optional[str]]] = []
     skipped: List[str] = []
-    for it in current:
-        key = (it.get("service_id"), it.get("type"), it.get("name"))
-        if it.get("method") != "api":
-            # Not API-managed: ignore deletions for these
-            if key in to_del:
-                skipped.append(f"{(it.get('service_id') or 'global')}/{it.get('type')}/{it.get('name')}")
+    for key in sorted(to_del, key=lambda key: (key[0] or "", key[1], key[2])):
+        method = methods.get(key)
+        if method is None:
+            # Missing configs are ignored
             continue
-        if key in to_del:
-            # delete -> skip adding to keep
+        if method != "api":
+            # Not API-managed (or template-managed): ignore deletions for these
+            skipped.append(f"{(key[0] or 'global')}/{key[1]}/{key[2]}")
             continue
-        # Convert to expected format for save_custom_configs
-        keep.append(
-            {
-                "service_id": it.get("service_id") or None,
-                "type": it.get("type"),
-                "name": it.get("name"),
-                "data": it.get("data") or b"",
-                "method": "api",
-            }
-        )
-
-    err = db.save_custom_configs(keep, "api")
-    if err:
-        return JSONResponse(status_code=500, content={"status": "error", "message": err})
+        removed.append(list(key))
+
+    if removed:
+        err = db.save_custom_configs_changes([], removed, "api")
+        if err:
+            return JSONResponse(status_code=500, content={"status": "error", "message": err})
 
     content: Dict[str, Any] = {"status": "success"}
     if skipped:
@@ -415,7 +425,7 @@ def delete_config(
     config_type: Annotated[ConfigType, PathParam(description="Config type")],
     name: str,
 ) -> JSONResponse:
-    """Delete a single API-managed custom config by replacing the API set without the selected item."""
+    """Delete a single API-managed custom config."""
     s_id = None if service in (None, "", "global") else service
     # config_type is already normalized by Pydantic
     return delete_configs(ConfigsDeleteRequest(configs=[ConfigKey(service=s_id or "global", type=config_type, name=name)]))
@@ -5,7 +5,7 @@ import re
 from urllib.parse import urlsplit
 
 from ..auth.guard import guard
-from ..deps import get_instances_api_caller, get_api_for_hostname
+from ..deps import get_instances_api_caller, get_api_for_hostname, instances_registry
 from ..schemas import InstanceCreateRequest, InstancesDeleteRequest, InstanceUpdateRequest
 from ..config import api_config
 from ..utils import get_db, LOGGER
@@ -192,6 +192,7 @@ def create_instance(req: InstanceCreateRequest) -> JSONResponse:
     if err:
         code = 400 if "already exists" in err or "read-only" in err else 500
         return JSONResponse(status_code=code, content={"status": "error", "message": err})
+    instances_registry.invalidate()
 
     return JSONResponse(
         status_code=201,
@@ -255,6 +256,7 @@ def update_instance(hostname: str, req: InstanceUpdateRequest) -> JSONResponse:
     if err:
         code = 400 if ("does not exist" in err or "read-only" in err) else 500
         return JSONResponse(status_code=code, content={"status": "error", "message": err})
+    instances_registry.invalidate()
 
     instance = db.get_instance(hostname)
     return JSONResponse(status_code=200, content={"status": "success", "instance": instance})
@@ -279,6 +281,7 @@ def delete_instance(hostname: str) -> JSONResponse:
     if err:
         LOGGER.exception(f"DELETE /instances/{hostname} failed: {err}")
         return JSONResponse(status_code=500, content={"status": "error", "message": err})
+    instances_registry.invalidate()
 
     return JSONResponse(status_code=200, content={"status": "success", "deleted": hostname})
 
@@ -292,17 +295,13 @@ def delete_instances(req: InstancesDeleteRequest) -> JSONResponse:
     """
     db = get_db()
 
-    # Only delete instances created via API
-    existing = {inst["hostname"]: inst for inst in db.get_instances()}
+    # Only delete instances created via API, only the selected instances are looked up
+    methods = db.get_instances_methods(req.instances)
 
     to_delete: List[str] = []
     skipped: List[str] = []
     for h in req.instances:
-        inst = existing.get(h)
-        if not inst:
-            skipped.append(h)
-            continue
-        if inst.get("method") != "api":
+        if methods.get(h) != "api":
             skipped.append(h)
             continue
         to_delete.append(h)
@@ -320,5 +319,6 @@ def delete_instances(req: InstancesDeleteRequest) -> JSONResponse:
     err = db.delete_instances(to_delete)
     if err:
         return JSONResponse(status_code=500, content={"status": "error", "message": err, "skipped": skipped})
+    instances_registry.invalidate()
 
     return JSONResponse(status_code=200, content={"status": "success", "deleted": to_delete, "skipped": skipped})
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, Response
 from ..schemas import RunJobsRequest
 
 from ..auth.guard import guard
+from ..pagination import PAGE_MAX_LIMIT, list_response
 from ..utils import get_db
 
 
@@ -10,10 +13,30 @@ router = APIRouter(prefix="/jobs", tags=["jobs"])
 
 
 @router.get("", dependencies=[Depends(guard)])
-def list_jobs() -> JSONResponse:
-    """List all jobs with their history and cache metadata."""
-    jobs = get_db().get_jobs()
-    return JSONResponse(status_code=200, content={"status": "success", "jobs": jobs})
+def list_jobs(
+    request: Request,
+    limit: Annotated[Optional[int], Query(ge=1, le=PAGE_MAX_LIMIT, description="Page size, every job is returned when omitted")] = None,
+    cursor: Annotated[Optional[str], Query(description="Cursor of the page, as returned in next_cursor")] = None,
+    fields: Annotated[Optional[str], Query(description="Comma-separated fields to return for each job")] = None,
+) -> Response:
+    """List all jobs with their history and cache metadata.
+
+    The jobs can be paged (sorted by name) with limit/cursor and the response has an ETag for conditional requests (If-None-Match).
+    """
+    db = get_db()
+    return list_response(
+        request,
+        "jobs",
+        version=db.get_collection_version("jobs"),
+        params=None,
+        build=lambda: [{"name": name} | job for name, job in db.get_jobs().items()],
+        key=lambda job: (job["name"],),
+        # ? The jobs are keyed by name in the response
+        render=lambda jobs: {"status": "success", "jobs": {job["name"]: {k: v for k, v in job.items() if k != "name"} for job in jobs}},
+        cursor=cursor,
+        limit=limit,
+        fields=f"name,{fields}" if fields else None,
+    )
 
 
 @router.post("/run", dependencies=[Depends(guard)])
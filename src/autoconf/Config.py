@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 
+from collections import defaultdict
 from contextlib import suppress
-from datetime import datetime
-from time import sleep
-from typing import Any, Dict, List, Literal, Optional, Union
+from json import dumps
+from typing import Any, Dict, FrozenSet, List, Literal, Optional, Set, Tuple, Union
 
+from common_utils import bytes_hash  # type: ignore
 from Database import Database  # type: ignore
 from logger import getLogger  # type: ignore
 
@@ -31,6 +32,18 @@ class Config:
         self.__config = {}
         self.__extra_config = {}
 
+        # ? Hashed per-object state used to compute exact change sets between two events
+        self.__instances_state: Set[str] = set()
+        self.__services_state: Dict[str, str] = {}
+        self.__configs_state: Dict[Tuple[str, str], str] = {}
+        self.__extra_config_state = ""
+        # ? Validated env fragments per service, reused as long as the service, the known services and the plugins settings don't change
+        self.__env_fragments: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self.__env_fragments_key: Tuple[FrozenSet[str], str] = (frozenset(), "")
+        self.__settings_state = ""
+        # ? Apply generation the scheduler has to reach for the last configuration saved by autoconf to be applied
+        self.__expected_generation = 0
+
         self._db = Database(self.__logger)
 
     def _update_settings(self):
@@ -41,26 +54,72 @@ class Config:
         self._settings = {}
         for plugin in plugins:
             self._settings.update(plugin["settings"])
-
-    def __get_full_env(self) -> dict:
-        config = {"SERVER_NAME": "", "MULTISITE": "yes"}
-        for service in self.__services:
-            server_name = service["SERVER_NAME"].split(" ")[0]
+        self.__settings_state = self._object_hash(self._settings)
+
+    @staticmethod
+    def _object_hash(obj: Any) -> str:
+        """Return a stable hash of an autoconf object (labels, annotations, custom config data, ...)"""
+        if isinstance(obj, bytes):
+            return bytes_hash(obj, algorithm="sha256")
+        return bytes_hash(dumps(obj, sort_keys=True, default=str), algorithm="sha256")
+
+    @staticmethod
+    def _group_services(services: List[Dict[str, str]]) -> Dict[str, List[Dict[str, str]]]:
+        grouped = defaultdict(list)
+        for service in services:
+            server_name = service.get("SERVER_NAME", "").split(" ")[0]
             if not server_name:
                 continue
-            config["SERVER_NAME"] += f" {server_name}"
+            grouped[server_name].append(service)
+        return grouped
 
-        db_services = []
-        for db_service in self._db.get_services():
-            server_name = db_service.get("id", "")
-            if not server_name:
-                continue
-            db_services.append(server_name)
-
-        for service in self.__services:
-            server_name = service["SERVER_NAME"].split(" ")[0]
-            if not server_name:
-                continue
+    def _get_state(
+        self,
+        instances: List[Dict[str, Any]],
+        services: List[Dict[str, str]],
+        configs: Dict[str, Dict[str, bytes]],
+        extra_config: Dict[str, str],
+    ) -> Tuple[Set[str], Dict[str, str], Dict[Tuple[str, str], str], str]:
+        instances_state = {self._object_hash(instance) for instance in instances}
+        services_state = {
+            server_name: self._object_hash(sorted(map(self._object_hash, grouped))) for server_name, grouped in self._group_services(services).items()
+        }
+        configs_state = {
+            (config_type, file): self._object_hash(data)
+            for config_type, files in configs.items()
+            for file, data in files.items()
+            if config_type in self._supported_config_types
+        }
+        return instances_state, services_state, configs_state, self._object_hash(extra_config)
+
+    def _get_changes(
+        self,
+        instances: List[Dict[str, Any]],
+        services: List[Dict[str, str]],
+        configs: Dict[str, Dict[str, bytes]],
+        extra_config: Dict[str, str],
+    ) -> Dict[str, Any]:
+        """Compute the exact change set between the last applied state and the given one"""
+        instances_state, services_state, configs_state, extra_config_state = self._get_state(instances, services, configs, extra_config)
+
+        def diff(old: Dict[Any, str], new: Dict[Any, str]) -> Dict[str, Set[Any]]:
+            return {
+                "added": new.keys() - old.keys(),
+                "removed": old.keys() - new.keys(),
+                "updated": {key for key in new.keys() & old.keys() if new[key] != old[key]},
+            }
+
+        return {
+            "instances": instances_state != self.__instances_state,
+            "services": diff(self.__services_state, services_state),
+            "configs": diff(self.__configs_state, configs_state),
+            "extra_config": extra_config_state != self.__extra_config_state,
+            "state": (instances_state, services_state, configs_state, extra_config_state),
+        }
+
+    def __get_service_env(self, server_name: str, services: List[Dict[str, str]], extra_services: List[str]) -> Dict[str, str]:
+        config = {}
+        for service in services:
             for variable, value in service.items():
                 if variable == "NAMESPACE" or variable.startswith("CUSTOM_CONF"):
                     continue
@@ -70,7 +129,7 @@ class Config:
                     variable,
                     value=value,
                     multisite=True,
-                    extra_services=config["SERVER_NAME"].split() + db_services,
+                    extra_services=extra_services,
                 )
                 if not success:
                     if self._type == "kubernetes":
@@ -89,6 +148,44 @@ class Config:
                     config[variable] = value
                     continue
                 config[f"{server_name}_{variable}"] = value
+        return config
+
+    def __get_full_env(self) -> dict:
+        config = {"SERVER_NAME": "", "MULTISITE": "yes"}
+        for service in self.__services:
+            server_name = service["SERVER_NAME"].split(" ")[0]
+            if not server_name:
+                continue
+            config["SERVER_NAME"] += f" {server_name}"
+
+        db_services = []
+        for db_service in self._db.get_services():
+            server_name = db_service.get("id", "")
+            if not server_name:
+                continue
+            db_services.append(server_name)
+
+        extra_services = config["SERVER_NAME"].split() + db_services
+
+        # ? Settings are validated against the plugins settings and the known services (for prefixed ones), so a change to either invalidates every fragment
+        fragments_key = (frozenset(extra_services), self.__settings_state)
+        if fragments_key != self.__env_fragments_key:
+            self.__env_fragments = {}
+            self.__env_fragments_key = fragments_key
+
+        grouped_services = self._group_services(self.__services)
+        for server_name in self.__env_fragments.keys() - grouped_services.keys():
+            del self.__env_fragments[server_name]
+
+        for server_name, services in grouped_services.items():
+            state = self.__services_state.get(server_name, "")
+            fragment = self.__env_fragments.get(server_name)
+            if not fragment or fragment[0] != state:
+                self.__logger.debug(f"Computing settings of service {server_name}")
+                fragment = (state, self.__get_service_env(server_name, services, extra_services))
+                self.__env_fragments[server_name] = fragment
+            config.update(fragment[1])
+
         config["SERVER_NAME"] = config["SERVER_NAME"].strip()
         return config
 
@@ -99,65 +196,53 @@ class Config:
         configs: Optional[Dict[str, Dict[str, bytes]]] = None,
         extra_config: Optional[Dict[str, str]] = None,
     ) -> bool:
-        configs = configs or {}
-        extra_config = extra_config or {}
+        changes = self._get_changes(instances, services, configs or {}, extra_config or {})
 
-        # Use sets for comparing lists of dictionaries
-        if set(map(str, self.__instances)) != set(map(str, instances)):
+        if changes["instances"]:
             self.__logger.debug(f"Instances changed: {self.__instances} -> {instances}")
             return True
 
-        if set(map(str, self.__services)) != set(map(str, services)):
-            self.__logger.debug(f"Services changed: {self.__services} -> {services}")
+        if any(changes["services"].values()):
+            self.__logger.debug("Services changed: " + ", ".join(f"{kind}={sorted(names)}" for kind, names in changes["services"].items() if names))
             return True
 
-        if set(map(str, self.__configs.items())) != set(map(str, configs.items())):
-            self.__logger.debug(f"Configs changed: {self.__configs} -> {configs}")
+        if any(changes["configs"].values()):
+            self.__logger.debug(
+                "Configs changed: " + ", ".join(f"{kind}={sorted('/'.join(key) for key in keys)}" for kind, keys in changes["configs"].items() if keys)
+            )
             return True
 
-        if set(map(str, self.__extra_config.items())) != set(map(str, extra_config.items())):
+        if changes["extra_config"]:
             self.__logger.debug(f"Extra config changed: {self.__extra_config} -> {extra_config}")
             return True
 
         return False
 
     def have_to_wait(self) -> bool:
-        db_metadata = self._db.get_metadata()
-        return (
-            isinstance(db_metadata, str)
-            or not db_metadata["is_initialized"]
-            or any(
-                v
-                for k, v in db_metadata.items()
-                if k in ("custom_configs_changed", "external_plugins_changed", "pro_plugins_changed", "plugins_config_changed", "instances_changed")
-            )
-        )
+        try:
+            status = self._db.get_apply_status()
+        except BaseException as e:
+            self.__logger.debug(f"Can't retrieve the scheduler apply status: {e}")
+            return True
+        return not status["ready"] or status["generation"] < self.__expected_generation
 
-    def wait_applying(self, startup: bool = False):
-        current_time = datetime.now().astimezone()
-        ready = False
-        while not ready and (datetime.now().astimezone() - current_time).seconds < 240:
-            db_metadata = self._db.get_metadata()
-            if isinstance(db_metadata, str):
-                if not startup:
-                    self.__logger.error(f"An error occurred when checking for changes in the database : {db_metadata}")
-            elif (
-                db_metadata["is_initialized"]
-                and db_metadata["first_config_saved"]
-                and not any(
-                    v
-                    for k, v in db_metadata.items()
-                    if k in ("custom_configs_changed", "external_plugins_changed", "pro_plugins_changed", "plugins_config_changed", "instances_changed")
-                )
-            ):
-                ready = True
-                continue
-            self.__logger.warning("Scheduler is already applying a configuration, retrying in 5 seconds ...")
-            sleep(5)
+    def wait_applying(self, startup: bool = False, timeout: int = 240) -> int:
+        """Wait for the scheduler to apply the pending changes, including the last configuration saved by autoconf, and return the reached generation"""
+        with suppress(BaseException):
+            status = self._db.get_apply_status()
+            if status["ready"] and status["generation"] >= self.__expected_generation:
+                return status["generation"]
 
+        if not startup:
+            self.__logger.info("Scheduler is already applying a configuration, waiting for it to finish ...")
+
+        ready, generation = self._db.wait_for_apply(timeout=timeout, min_generation=self.__expected_generation)
         if not ready:
             raise Exception("Too many retries while waiting for scheduler to apply configuration...")
 
+        self.__logger.debug(f"Scheduler finished applying configuration (generation {generation})")
+        return generation
+
     def apply(
         self,
         instances: List[Dict[str, Any]],
@@ -172,22 +257,28 @@ class Config:
         if err:
             return False
 
-        self.wait_applying()
+        generation = self.wait_applying()
 
         configs = configs or {}
         extra_config = extra_config or {}
 
+        diff = self._get_changes(instances, services, configs, extra_config)
+        instances_state, services_state, configs_state, extra_config_state = diff.pop("state")
+
         changes = []
-        if instances != self.__instances or first:
+        if diff["instances"] or first:
             self.__instances = instances
+            self.__instances_state = instances_state
             changes.append("instances")
-        if services != self.__services or first:
+        if any(diff["services"].values()) or first:
             self.__services = services
+            self.__services_state = services_state
             changes.append("services")
-        if configs != self.__configs or first:
+        if any(diff["configs"].values()) or first:
             self.__configs = configs
+            self.__configs_state = configs_state
             changes.append("custom_configs")
-        if extra_config != self.__extra_config or first:
+        if diff["extra_config"] or first:
             changes.append("extra_config")
         if "instances" in changes or "services" in changes or "extra_config" in changes:
             old_env = self.__config.copy()
@@ -197,22 +288,21 @@ class Config:
                 changes.append("config")
             if "extra_config" in changes:
                 self.__extra_config = extra_config.copy()
+                self.__extra_config_state = extra_config_state
 
         custom_configs = []
+        removed_custom_configs = []
         if "custom_configs" in changes:
             for config_type in self.__configs:
                 if config_type not in self._supported_config_types:
                     self.__logger.warning(f"Unsupported custom config type: {config_type}")
-                    continue
 
-                for file, data in self.__configs[config_type].items():
-                    site = None
-                    name = file
-                    if "/" in file:
-                        exploded = file.split("/")
-                        site = exploded[0]
-                        name = exploded[1]
-                    custom_configs.append({"value": data, "exploded": [site, config_type, name.replace(".conf", "")]})
+            # ? Only the added and updated configs are pushed, the removed ones are deleted one by one
+            to_save = configs_state.keys() if first else diff["configs"]["added"] | diff["configs"]["updated"]
+            for config_type, file in sorted(to_save):
+                custom_configs.append({"value": self.__configs[config_type][file], "exploded": self._explode_custom_config(config_type, file)})
+            if not first:
+                removed_custom_configs = [self._explode_custom_config(config_type, file) for config_type, file in sorted(diff["configs"]["removed"])]
 
         # update instances in database
         if "instances" in changes:
@@ -233,8 +323,12 @@ class Config:
 
         # save custom configs to database
         if "custom_configs" in changes:
-            self.__logger.debug(f"Saving custom configs in database: {custom_configs}")
-            err = self._db.save_custom_configs(custom_configs, "autoconf", changed=False)
+            if first:
+                self.__logger.debug(f"Saving custom configs in database: {custom_configs}")
+                err = self._db.save_custom_configs(custom_configs, "autoconf", changed=False)
+            else:
+                self.__logger.debug(f"Saving custom configs changes in database: {custom_configs}, removing {removed_custom_configs}")
+                err = self._db.save_custom_configs_changes(custom_configs, removed_custom_configs, "autoconf", changed=False)
             if err:
                 success = False
                 self.__logger.error(f"Can't save autoconf custom configs in database: {err}, custom configs may not work as expected")
@@ -243,11 +337,24 @@ class Config:
         ret = self._db.checked_changes(changes, plugins_changes=changed_plugins, value=True)
         if ret:
             self.__logger.error(f"An error occurred when setting the changes to checked in the database : {ret}")
+        else:
+            # ? The scheduler was idle when the changes were saved, so the apply that picks them up bumps the generation we started from
+            self.__expected_generation = generation + 1
 
         self.__logger.info("Successfully saved new configuration 🚀")
 
         return success
 
+    @staticmethod
+    def _explode_custom_config(config_type: str, file: str) -> List[Optional[str]]:
+        site = None
+        name = file
+        if "/" in file:
+            exploded = file.split("/")
+            site = exploded[0]
+            name = exploded[1]
+        return [site, config_type, name.replace(".conf", "")]
+
     def _try_database_readonly(self) -> bool:
         if not self._db.readonly:
             try:
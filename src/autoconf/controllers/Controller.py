@@ -20,6 +20,7 @@ class Controller(Config):
         self._logger = getLogger(f"{self._type.upper()}-CONTROLLER")
         self._namespaces = None
         self._first_start = True
+        self._last_state_time = 0.0
         namespaces = getenv("NAMESPACES")
         if namespaces:
             self._namespaces = namespaces.strip().split()
@@ -106,6 +107,11 @@ class Controller(Config):
     def process_events(self):
         raise NotImplementedError
 
+    def _already_applied(self, received_time: float) -> bool:
+        """An event received by a watcher while another one held the lock is already part of the state the other one read afterwards,
+        only meaningful when the events are processed by concurrent watchers (Kubernetes)"""
+        return received_time < self._last_state_time
+
     def _is_service_present(self, server_name):
         if not isinstance(server_name, str):
             return False
@@ -347,6 +347,7 @@ class KubernetesController(Controller):
             applied = False
             try:
                 for event in self._get_stream_with_retries(watch_type, what):
+                    received_time = time()
                     applied = False
                     self._internal_lock.acquire()
                     locked = True
@@ -354,6 +355,11 @@ class KubernetesController(Controller):
                         self._internal_lock.release()
                         locked = False
                         continue
+                    if self._already_applied(received_time):
+                        # ? Coalesced into the follow-up apply of the configuration that was being deployed when the event was received
+                        self._internal_lock.release()
+                        locked = False
+                        continue
                     self._first_start = False
 
                     self._pending_apply = True
@@ -383,6 +389,7 @@ class KubernetesController(Controller):
 
                     to_apply = False
                     while not applied:
+                        self._last_state_time = time()
                         waiting = self.have_to_wait()
                         self._update_settings()
                         self._instances = self.get_instances()
@@ -398,8 +405,7 @@ class KubernetesController(Controller):
 
                         to_apply = True
                         if waiting:
-                            self._logger.info("Scheduler is already applying a configuration, retrying in 1 second ...")
-                            sleep(1)
+                            self.wait_applying()
                             continue
 
                         self._logger.info("Batched kubernetes event(s), deploying configuration...")
@@ -407,14 +413,17 @@ class KubernetesController(Controller):
                             ret = self.apply_config()
                             if not ret:
                                 self._logger.error("Error while deploying new configuration ...")
+                                applied = True
                             else:
                                 self._logger.info("Successfully deployed new configuration")
 
                                 self._set_autoconf_load_db()
+                                # ? Check once more so that the events received while applying end up in a single follow-up apply
+                                to_apply = False
                         except BaseException as e:
                             self._logger.debug(format_exc())
                             self._logger.error(f"Exception while deploying new configuration :\n{e}")
-                        applied = True
+                            applied = True
 
                     if locked:
                         self._internal_lock.release()
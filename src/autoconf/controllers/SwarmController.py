@@ -283,18 +283,20 @@ class SwarmController(Controller):
 
                             to_apply = True
                             if waiting:
-                                sleep(1)
+                                self.wait_applying()
                                 continue
 
                             self._logger.info("Batched Swarm event(s), deploying configuration...")
                             if not self.apply_config():
                                 self._logger.error("Error while deploying new configuration")
+                                applied = True
                             else:
                                 self._logger.info(
                                     "Successfully deployed new configuration 🚀",
                                 )
                                 self._set_autoconf_load_db()
-                            applied = True
+                                # ? Check once more so that the events received while applying end up in a single follow-up apply
+                                to_apply = False
                     except BaseException:
                         self._logger.error(f"Exception while processing Swarm event ({event_type}) :\n{format_exc()}")
 
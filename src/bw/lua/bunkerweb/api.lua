@@ -12,6 +12,9 @@ local rsignal = require "resty.signal"
 local upload = require "resty.upload"
 local utils = require "bunkerweb.utils"
 
+-- ngx.pipe needs the socket_cloexec patch when the Nginx core is not the OpenResty one
+local has_pipe, pipe = pcall(require, "ngx.pipe")
+
 local api = class("api")
 
 local datastore = cdatastore:new()
@@ -21,7 +24,6 @@ local logger = clogger:new("API")
 local get_country = utils.get_country
 local get_variable = utils.get_variable
 local is_ip_in_networks = utils.is_ip_in_networks
--- local run = shell.run
 local NOTICE = ngx.NOTICE
 local ERR = ngx.ERR
 local HTTP_OK = ngx.HTTP_OK
@@ -32,6 +34,8 @@ local kill = rsignal.kill
 local get_master_pid = process.get_master_pid
 local execute = os.execute
 local open = io.open
+local remove = os.remove
+local concat = table.concat
 local read_body = ngx_req.read_body
 local get_body_data = ngx_req.get_body_data
 local get_body_file = ngx_req.get_body_file
@@ -42,6 +46,9 @@ local require_plugin = helpers.require_plugin
 local new_plugin = helpers.new_plugin
 local call_plugin = helpers.call_plugin
 
+local SWAP_ARCHIVE = "/usr/share/bunkerweb/helpers/swap-archive.sh"
+local SWAP_ARCHIVE_TIMEOUT = 120000
+
 api.global = { GET = {}, POST = {}, PUT = {}, DELETE = {} }
 
 -- Constant-time string comparison to mitigate timing attacks
@@ -109,18 +116,42 @@ function api:log_cmd(cmd, status, stdout, stderr)
 	logger:log(level, "stdout = " .. stderr)
 end
 
--- TODO : use this if we switch to OpenResty
-function api:cmd(cmd)
-	-- Non-blocking command
-	-- luacheck: ignore 113
-	local ok, stdout, stderr, reason, status = run(cmd, nil, 10000)
-	self:log_cmd(cmd, status, stdout, stderr)
+local function shell_quote(arg)
+	return "'" .. arg:gsub("'", "'\\''") .. "'"
+end
+
+function api:cmd(args, timeout)
+	if not has_pipe then
+		-- Blocking fallback, the worker waits for the command
+		local quoted = {}
+		for i, arg in ipairs(args) do
+			quoted[i] = shell_quote(arg)
+		end
+		local status = execute(concat(quoted, " "))
+		if status ~= 0 then
+			return false, "exit status = " .. tostring(status)
+		end
+		return true, "exit status = 0"
+	end
+	-- Non-blocking command, the worker keeps serving other requests while it runs
+	local proc, err = pipe.spawn(args, { merge_stderr = true })
+	if not proc then
+		return false, err
+	end
+	proc:set_timeouts(nil, timeout, nil, timeout)
+	local stdout, _, partial = proc:stdout_read_all()
+	local ok, reason, status = proc:wait()
+	self:log_cmd(concat(args, " "), ok and 0 or (status or -1), stdout or partial or "", "")
 	-- Timeout
 	if ok == nil then
-		return nil, reason
+		proc:kill(9)
+		return false, reason
 	end
 	-- Other cases : exit 0, exit !0 and killed by signal
-	return status == 0, reason, status
+	if not ok then
+		return false, reason .. " status = " .. tostring(status)
+	end
+	return true, reason .. " status = " .. tostring(status)
 end
 
 -- luacheck: ignore 212
@@ -204,7 +235,8 @@ api.global.POST["^/stop$"] = function(self)
 end
 
 api.global.POST["^/confs$"] = function(self)
-	local tmp = "/var/tmp/bunkerweb/api_" .. self.ctx.bw.uri:sub(2) .. ".tar.gz"
+	-- One archive per request, the same kind of data can be uploaded by concurrent requests
+	local tmp = "/var/tmp/bunkerweb/api_" .. self.ctx.bw.uri:sub(2) .. "_" .. ngx.var.request_id .. ".tar.gz"
 	local destination = "/usr/share/bunkerweb/" .. self.ctx.bw.uri:sub(2)
 	if self.ctx.bw.uri == "/confs" then
 		destination = "/etc/nginx"
@@ -233,6 +265,7 @@ api.global.POST["^/confs$"] = function(self)
 		local typ, res, err = form:read()
 		if not typ then
 			file:close()
+			remove(tmp)
 			return self:response(HTTP_BAD_REQUEST, "error", err)
 		end
 		if typ == "eof" then
@@ -244,17 +277,11 @@ api.global.POST["^/confs$"] = function(self)
 	end
 	file:flush()
 	file:close()
-	local cmds = {
-		"rm -rf " .. destination .. "/*",
-		"tar xzf " .. tmp .. " -C " .. destination,
-		-- Remove the temporary archive once extracted
-		"rm -f " .. tmp,
-	}
-	for _, cmd in ipairs(cmds) do
-		local status = execute(cmd)
-		if status ~= 0 then
-			return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "exit status = " .. tostring(status))
-		end
+	-- Extract into a staging directory and swap it in, the destination is never empty nor half extracted
+	local ok, err = self:cmd({ "bash", SWAP_ARCHIVE, tmp, destination }, SWAP_ARCHIVE_TIMEOUT)
+	if not ok then
+		remove(tmp)
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
 	end
 	return self:response(HTTP_OK, "success", "saved data at " .. destination)
 end
@@ -269,7 +296,8 @@ api.global.POST["^/plugins$"] = api.global.POST["^/confs$"]
 
 api.global.POST["^/pro_plugins$"] = api.global.POST["^/confs$"]
 
-api.global.POST["^/unban$"] = function(self)
+-- Decoded JSON body of the request, the body is read from its temporary file when it didn't fit in the buffer
+local function read_json_body()
 	read_body()
 	local data = get_body_data()
 	if not data then
@@ -277,65 +305,51 @@ api.global.POST["^/unban$"] = function(self)
 		if data_file then
 			local file, err = open(data_file)
 			if not file then
-				return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
+				return nil, err
 			end
 			data = file:read("*a")
 			file:close()
 		end
 	end
-	local ok, ip = pcall(decode, data)
+	local ok, decoded = pcall(decode, data)
 	if not ok then
-		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "can't decode JSON : " .. ip)
+		return nil, "can't decode JSON : " .. decoded
 	end
+	return decoded
+end
 
-	local ban_scope = ip["ban_scope"] or "global"
-	local service = ip["service"]
-	local response_msg = "ip " .. ip["ip"] .. " unbanned"
+-- Unban of a request, service-specific unbans with an invalid service are turned into global ones
+local function make_unban(data)
+	local unban = {
+		ip = data["ip"],
+		service = data["service"],
+		ban_scope = data["ban_scope"] or "global",
+	}
+	local response_msg = "ip " .. unban.ip .. " unbanned"
 
 	-- Validate ban scope
-	if ban_scope ~= "global" and ban_scope ~= "service" then
-		logger:log(ERR, "Invalid ban scope: " .. ban_scope .. ", defaulting to global")
-		ban_scope = "global"
+	if unban.ban_scope ~= "global" and unban.ban_scope ~= "service" then
+		logger:log(ERR, "Invalid ban scope: " .. unban.ban_scope .. ", defaulting to global")
+		unban.ban_scope = "global"
 	end
 
 	-- For service-specific unbans, validate the service
-	if ban_scope == "service" then
+	if unban.ban_scope == "service" then
+		local service = unban.service
 		if not service or service == "unknown" or service == "Web UI" or service == "bwcli" or service == "" then
 			logger:log(ERR, "Invalid service name for service-specific unban, defaulting to global unban")
-			ban_scope = "global"
-			service = nil
+			unban.ban_scope = "global"
+			unban.service = nil
 		else
 			response_msg = response_msg .. " for service " .. service
 		end
 	end
 
-	-- Use utils.remove_ban to remove the ban(s)
-	local ok, err = utils.remove_ban(ip["ip"], service, ban_scope)
-	if not ok then
-		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "failed to remove ban: " .. err)
-	end
-
-	return self:response(HTTP_OK, "success", response_msg)
+	return unban, response_msg
 end
 
-api.global.POST["^/ban$"] = function(self)
-	read_body()
-	local data = get_body_data()
-	if not data then
-		local data_file = get_body_file()
-		if data_file then
-			local file, err = open(data_file)
-			if not file then
-				return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
-			end
-			data = file:read("*a")
-			file:close()
-		end
-	end
-	local ok, ip = pcall(decode, data)
-	if not ok then
-		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "can't decode JSON : " .. ip)
-	end
+-- Ban of a request with its defaults and the country of the IP
+local function make_ban(data)
 	local ban = {
 		ip = "",
 		exp = 86400,
@@ -346,18 +360,18 @@ api.global.POST["^/ban$"] = function(self)
 	}
 
 	-- Copy values from request
-	ban.ip = ip["ip"]
-	if ip["exp"] then
-		ban.exp = ip["exp"]
+	ban.ip = data["ip"]
+	if data["exp"] then
+		ban.exp = data["exp"]
 	end
-	if ip["reason"] then
-		ban.reason = ip["reason"]
+	if data["reason"] then
+		ban.reason = data["reason"]
 	end
-	if ip["service"] then
-		ban.service = ip["service"]
+	if data["service"] then
+		ban.service = data["service"]
 	end
-	if ip["ban_scope"] then
-		ban.ban_scope = ip["ban_scope"]
+	if data["ban_scope"] then
+		ban.ban_scope = data["ban_scope"]
 	end
 
 	-- Validate ban scope
@@ -382,16 +396,102 @@ api.global.POST["^/ban$"] = function(self)
 	end
 	ban.country = country
 
+	-- Create a more informative response message
+	local scope_text = ban.ban_scope == "global" and "globally" or ("for service " .. ban.service)
+	local duration_text = not ban["exp"] and "permanently" or ("for " .. ban["exp"] .. " seconds")
+	return ban, "ip " .. ban.ip .. " banned " .. scope_text .. " " .. duration_text
+end
+
+api.global.POST["^/unban$"] = function(self)
+	local ip, err = read_json_body()
+	if not ip then
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
+	end
+	local unban, response_msg = make_unban(ip)
+
+	-- Use utils.remove_ban to remove the ban(s)
+	local ok, remove_err = utils.remove_ban(unban.ip, unban.service, unban.ban_scope)
+	if not ok then
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "failed to remove ban: " .. remove_err)
+	end
+
+	return self:response(HTTP_OK, "success", response_msg)
+end
+
+api.global.POST["^/ban$"] = function(self)
+	local ip, err = read_json_body()
+	if not ip then
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
+	end
+	local ban, response_msg = make_ban(ip)
+
 	-- Use utils.add_ban to ensure ban is applied to datastore and Redis
-	local ok, err = utils.add_ban(ban.ip, ban.reason, ban.exp, ban.service, ban.country, ban.ban_scope)
+	local ok, add_err = utils.add_ban(ban.ip, ban.reason, ban.exp, ban.service, ban.country, ban.ban_scope)
 	if not ok then
-		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "failed to add ban: " .. err)
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "failed to add ban: " .. add_err)
 	end
 
-	-- Create a more informative response message
-	local scope_text = ban.ban_scope == "global" and "globally" or ("for service " .. ban.service)
-	local duration_text = not ban["exp"] and "permanently" or ("for " .. ban["exp"] .. " seconds")
-	return self:response(HTTP_OK, "success", "ip " .. ip["ip"] .. " banned " .. scope_text .. " " .. duration_text)
+	return self:response(HTTP_OK, "success", response_msg)
+end
+
+-- Bans and unbans in one request : {"bans": [{"ip": ..., "exp": ..., ...}, ...], "unbans": [{"ip": ..., "service": ...}, ...]}
+-- The bans are applied before the unbans and the msg of the response holds the status and message of each item, in the same order.
+api.global.POST["^/bans/bulk$"] = function(self)
+	local data, err = read_json_body()
+	if not data then
+		return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", err)
+	end
+	if type(data) ~= "table" then
+		return self:response(HTTP_BAD_REQUEST, "error", "body must be an object with bans and/or unbans arrays")
+	end
+
+	local all_ok = true
+	local results = { bans = {}, unbans = {} }
+	for _, action in ipairs({ "bans", "unbans" }) do
+		local items = {}
+		local msgs = {}
+		local positions = {}
+		for i, item in ipairs(type(data[action]) == "table" and data[action] or {}) do
+			if type(item) ~= "table" or type(item["ip"]) ~= "string" or item["ip"] == "" then
+				all_ok = false
+				results[action][i] = { status = "error", msg = "missing ip" }
+			else
+				local normalized, msg
+				if action == "bans" then
+					normalized, msg = make_ban(item)
+				else
+					normalized, msg = make_unban(item)
+				end
+				table.insert(items, normalized)
+				table.insert(msgs, msg)
+				table.insert(positions, i)
+			end
+		end
+
+		if #items > 0 then
+			local applied, apply_err
+			if action == "bans" then
+				applied, apply_err = utils.add_bans(items)
+			else
+				applied, apply_err = utils.remove_bans(items)
+			end
+			if not applied then
+				return self:response(HTTP_INTERNAL_SERVER_ERROR, "error", "failed to apply " .. action .. ": " .. apply_err)
+			end
+
+			local failure = action == "bans" and "failed to add ban: " or "failed to remove ban: "
+			for j, result in ipairs(applied) do
+				if result[1] then
+					results[action][positions[j]] = { status = "success", msg = msgs[j] }
+				else
+					all_ok = false
+					results[action][positions[j]] = { status = "error", msg = failure .. result[2] }
+				end
+			end
+		end
+	end
+
+	return self:response(HTTP_OK, all_ok and "success" or "error", results)
 end
 
 api.global.GET["^/bans$"] = function(self)
@@ -950,69 +950,174 @@ utils.is_banned = function(ip, server_name)
 
 	return banned, reason, ttl, reason_data
 end
+-- Number of bans written to or removed from Redis by each pipeline of add_bans() and remove_bans()
+local BANS_PIPELINE_SIZE = 500
 
-utils.add_ban = function(ip, reason, ttl, service, country, ban_scope, reason_data)
-	-- Determine ban key based on scope
-	local ban_key = "bans_ip_" .. ip
+local function run_pipeline(clusterstore, commands)
+	clusterstore:call("init_pipeline")
+	for _, command in ipairs(commands) do
+		clusterstore:call(unpack(command))
+	end
+	return clusterstore:call("commit_pipeline")
+end
+
+-- Error of the first failed command of a pipeline between first and last (included)
+local function pipeline_error(results, first, last)
+	for i = first, last do
+		local result = results[i]
+		if type(result) == "table" and result[1] == false then
+			return result[2]
+		end
+	end
+	return nil
+end
+
+local function get_ban_key(ip, service, ban_scope)
 	if ban_scope == "service" and service then
-		ban_key = "bans_service_" .. service .. "_ip_" .. ip
-	end
-
-	-- Set on local datastore
-	local ban_data = encode({
-		reason = reason,
-		service = service or "unknown",
-		date = os.time(),
-		country = country or "local",
-		ban_scope = ban_scope or "global",
-		reason_data = reason_data or {},
-		permanent = not ttl or ttl == 0,
-	})
+		return "bans_service_" .. service .. "_ip_" .. ip
+	end
+	return "bans_ip_" .. ip
+end
 
-	-- Convert 0 TTL to nil for permanent bans in local datastore
-	local effective_ttl = (not ttl or ttl == 0) and nil or ttl
+-- Member of the IP index : the IP then the ban key, all scored 0 so that the IPs can be searched by prefix with lexicographical ranges
+local function ban_ip_member(ban_key)
+	local ip = ban_key:match("^bans_ip_(.+)$") or ban_key:match("^bans_service_.-_ip_(.+)$")
+	return ip and ip .. "|" .. ban_key
+end
 
-	local ok, err = datastore:set_with_retries(ban_key, ban_data, effective_ttl)
-	if not ok then
-		return false, "datastore:set_with_retries() error : " .. err
+-- Sorted sets of the bans index, the web UI lists the bans with range queries on them (see ui/app/models/ban_index.py)
+local function index_ban_commands(commands, ban_key, date, ttl, service, country)
+	local service_set = "bans_index_service_" .. (ban_key:find("^bans_service_") and service or "_")
+	local country_set = "bans_index_country_" .. country
+	table.insert(commands, { "zadd", "bans_index_date", date, ban_key })
+	table.insert(commands, { "zadd", "bans_index_exp", (not ttl or ttl == 0) and "+inf" or date + ttl, ban_key })
+	table.insert(commands, { "zadd", "bans_index_ip", 0, ban_ip_member(ban_key) })
+	table.insert(commands, { "zadd", service_set, date, ban_key })
+	table.insert(commands, { "zadd", country_set, date, ban_key })
+	table.insert(commands, { "sadd", "bans_index_sets", service_set, country_set })
+end
+
+-- data is the value of the ban in Redis, the country of the ban is read from it
+local function unindex_ban_commands(commands, ban_key, data)
+	local service = ban_key:match("^bans_service_(.-)_ip_") or "_"
+	table.insert(commands, { "zrem", "bans_index_date", ban_key })
+	table.insert(commands, { "zrem", "bans_index_exp", ban_key })
+	table.insert(commands, { "zrem", "bans_index_ip", ban_ip_member(ban_key) })
+	table.insert(commands, { "zrem", "bans_index_service_" .. service, ban_key })
+	if data and data ~= null then
+		local ok, ban_data = pcall(decode, data)
+		if ok and type(ban_data) == "table" and ban_data.country then
+			table.insert(commands, { "zrem", "bans_index_country_" .. ban_data.country, ban_key })
+		end
+	end
+end
+
+-- Add multiple bans, each ban being a table with the ip, reason, exp, service, country, ban_scope and reason_data keys.
+-- The bans are written to the datastore one by one and to Redis in pipelines of BANS_PIPELINE_SIZE bans.
+-- Returns a table with the { ok, msg } result of each ban, or nil and an error if the bans couldn't be processed at all.
+utils.add_bans = function(bans)
+	local results = {}
+	local written = {}
+	local date = os.time()
+	for i, ban in ipairs(bans) do
+		local ttl = ban.exp
+		local ban_key = get_ban_key(ban.ip, ban.service, ban.ban_scope)
+		local ban_data = encode({
+			reason = ban.reason,
+			service = ban.service or "unknown",
+			date = date,
+			country = ban.country or "local",
+			ban_scope = ban.ban_scope or "global",
+			reason_data = ban.reason_data or {},
+			permanent = not ttl or ttl == 0,
+		})
+
+		-- Convert 0 TTL to nil for permanent bans in local datastore
+		local effective_ttl = (not ttl or ttl == 0) and nil or ttl
+
+		local ok, err = datastore:set_with_retries(ban_key, ban_data, effective_ttl)
+		if not ok then
+			results[i] = { false, "datastore:set_with_retries() error : " .. err }
+		else
+			results[i] = { true, "success" }
+			table.insert(written, { index = i, key = ban_key, data = ban_data, ban = ban })
+		end
 	end
 
 	-- Set on redis
 	local use_redis, err = utils.get_variable("USE_REDIS", false)
 	if not use_redis then
 		return nil, "can't get USE_REDIS variable : " .. err
-	elseif use_redis ~= "yes" then
-		return true, "success"
+	elseif use_redis ~= "yes" or #written == 0 then
+		return results
 	end
 
 	-- Connect
 	local clusterstore = require "bunkerweb.clusterstore":new()
-	ok, err = clusterstore:connect()
+	local ok, connect_err = clusterstore:connect()
 	if not ok then
-		return false, "can't connect to redis server : " .. err
-	end
+		for _, entry in ipairs(written) do
+			results[entry.index] = { false, "can't connect to redis server : " .. connect_err }
+		end
+		return results
+	end
+
+	for first = 1, #written, BANS_PIPELINE_SIZE do
+		local last = math.min(first + BANS_PIPELINE_SIZE - 1, #written)
+		local commands = {}
+		local ranges = {}
+		for j = first, last do
+			local entry = written[j]
+			local ttl = entry.ban.exp
+			local start = #commands + 1
+			-- For Redis, set without expiration if permanent, otherwise with EX and ttl
+			if not ttl or ttl == 0 then
+				table.insert(commands, { "set", entry.key, entry.data })
+			else
+				table.insert(commands, { "set", entry.key, entry.data, "EX", ttl })
+			end
+			index_ban_commands(commands, entry.key, date, ttl, entry.ban.service, entry.ban.country or "local")
+			ranges[j] = { start, #commands }
+		end
 
-	-- For Redis, set without expiration if permanent, otherwise with EX and ttl
-	if not ttl or ttl == 0 then
-		ok, err = clusterstore:call("set", ban_key, ban_data)
-	else
-		ok, err = clusterstore:call("set", ban_key, ban_data, "EX", ttl)
+		local replies, pipeline_err = run_pipeline(clusterstore, commands)
+		for j = first, last do
+			local entry = written[j]
+			local reply_err = pipeline_err
+			if replies then
+				reply_err = pipeline_error(replies, ranges[j][1], ranges[j][2])
+			end
+			if reply_err then
+				results[entry.index] = { false, "redis pipeline failed : " .. reply_err }
+			end
+		end
 	end
 
-	if not ok then
-		clusterstore:close()
-		return false, "redis SET failed : " .. err
-	end
 	clusterstore:close()
-	return true, "success"
+	return results
 end
 
-utils.remove_ban = function(ip, service, ban_scope)
-	-- Set default scope to global
-	if not ban_scope then
-		ban_scope = "global"
+utils.add_ban = function(ip, reason, ttl, service, country, ban_scope, reason_data)
+	local results, err = utils.add_bans({
+		{
+			ip = ip,
+			reason = reason,
+			exp = ttl,
+			service = service,
+			country = country,
+			ban_scope = ban_scope,
+			reason_data = reason_data,
+		},
+	})
+	if not results then
+		return nil, err
 	end
+	return results[1][1], results[1][2]
+end
 
+-- Remove multiple bans, each unban being a table with the ip, service and ban_scope keys.
+-- A global unban also removes the service-specific bans of the IP. Returns the { ok, msg } result of each unban like add_bans().
+utils.remove_bans = function(unbans)
 	-- Connect to redis if needed
 	local use_redis, err = utils.get_variable("USE_REDIS", false)
 	if not use_redis then
@@ -1025,43 +1130,95 @@ utils.remove_ban = function(ip, service, ban_scope)
 		clusterstore = require "bunkerweb.clusterstore":new()
 		local ok, connect_err = clusterstore:connect()
 		if not ok then
-			return false, "can't connect to redis: " .. connect_err
+			return nil, "can't connect to redis: " .. connect_err
 		end
 	end
 
-	-- Handle service-specific unban
-	if ban_scope == "service" and service then
-		local ban_key = "bans_service_" .. service .. "_ip_" .. ip
-		datastore:delete(ban_key)
-		if use_redis then
-			clusterstore:call("del", ban_key)
-		end
-	-- Handle global unban
-	else
-		-- Delete global ban from datastore and redis
-		local global_ban_key = "bans_ip_" .. ip
-		datastore:delete(global_ban_key)
-		if use_redis then
-			clusterstore:call("del", global_ban_key)
+	-- Service-specific bans of each IP, the keys of the datastore are listed only once
+	local service_bans
+	local results = {}
+	local ban_keys = {}
+	for i, unban in ipairs(unbans) do
+		results[i] = { true, "success" }
+		-- Handle service-specific unban
+		if unban.ban_scope == "service" and unban.service then
+			ban_keys[i] = { get_ban_key(unban.ip, unban.service, "service") }
+		-- Handle global unban
+		else
+			if not service_bans then
+				service_bans = {}
+				for _, k in ipairs(datastore:keys()) do
+					local ip = k:match("^bans_service_.+_ip_(.+)$")
+					if ip then
+						service_bans[ip] = service_bans[ip] or {}
+						table.insert(service_bans[ip], k)
+					end
+				end
+			end
+			ban_keys[i] = { "bans_ip_" .. unban.ip }
+			for _, k in ipairs(service_bans[unban.ip] or {}) do
+				table.insert(ban_keys[i], k)
+			end
 		end
+	end
 
-		-- Delete all service-specific bans for this IP from datastore and redis
-		-- This is inefficient but it's how it's done in api.lua
-		for _, k in ipairs(datastore:keys()) do
-			if k:find("^bans_service_.-_ip_" .. ip .. "$") then
-				datastore:delete(k)
-				if use_redis then
-					clusterstore:call("del", k)
+	for first = 1, #unbans, BANS_PIPELINE_SIZE do
+		local last = math.min(first + BANS_PIPELINE_SIZE - 1, #unbans)
+		if use_redis then
+			-- The bans are read first to get their country, then unindexed and deleted
+			local gets = {}
+			for i = first, last do
+				for _, ban_key in ipairs(ban_keys[i]) do
+					table.insert(gets, { "get", ban_key })
+				end
+			end
+			local values, pipeline_err = run_pipeline(clusterstore, gets)
+			local commands = {}
+			local ranges = {}
+			local n = 0
+			for i = first, last do
+				local start = #commands + 1
+				for _, ban_key in ipairs(ban_keys[i]) do
+					n = n + 1
+					unindex_ban_commands(commands, ban_key, values and values[n])
+					table.insert(commands, { "del", ban_key })
+				end
+				ranges[i] = { start, #commands }
+			end
+			local replies
+			if values then
+				replies, pipeline_err = run_pipeline(clusterstore, commands)
+			end
+			for i = first, last do
+				local reply_err = pipeline_err
+				if replies then
+					reply_err = pipeline_error(replies, ranges[i][1], ranges[i][2])
+				end
+				if reply_err then
+					results[i] = { false, "can't update the bans index : " .. reply_err }
 				end
 			end
 		end
+		for i = first, last do
+			for _, ban_key in ipairs(ban_keys[i]) do
+				datastore:delete(ban_key)
+			end
+		end
 	end
 
 	if clusterstore then
 		clusterstore:close()
 	end
 
-	return true, "success"
+	return results
+end
+
+utils.remove_ban = function(ip, service, ban_scope)
+	local results, err = utils.remove_bans({ { ip = ip, service = service, ban_scope = ban_scope or "global" } })
+	if not results then
+		return nil, err
+	end
+	return results[1][1], results[1][2]
 end
 
 utils.new_cachestore = function(ctx, pool)
@@ -1157,6 +1314,22 @@ utils.read_files = function(files)
 	return true, data
 end
 
+utils.open_list = function(file_path)
+	local f, err = open(file_path, "r")
+	if not f then
+		return nil, err
+	end
+	-- The list may only reference a list shared with other services
+	local first_line = f:read("*l")
+	local shared_list = first_line and first_line:match("^# ref: (merged%-%x+%.list)$")
+	if not shared_list then
+		f:seek("set")
+		return f
+	end
+	f:close()
+	return open(file_path:match("^(.*/)[^/]+/[^/]+$") .. shared_list, "r")
+end
+
 utils.deduplicate_list = function(list)
 	local seen = {}
 	local deduped = {}
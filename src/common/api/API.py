@@ -5,7 +5,7 @@ from copy import deepcopy
 from typing import Literal, Optional, Union
 from os import getenv
 from urllib.parse import urlsplit
-from requests import request
+from requests import Session, request
 from requests.exceptions import ConnectionError
 from urllib3 import disable_warnings  # new
 from urllib3.exceptions import InsecureRequestWarning  # new
@@ -28,9 +28,11 @@ class API:
     - SSL verification and CA bundle controlled via env or constructor
     """
 
-    def __init__(self, endpoint: str, host: Optional[str] = None, token: Optional[str] = None):
+    def __init__(self, endpoint: str, host: Optional[str] = None, token: Optional[str] = None, *, session: Optional[Session] = None):
         # Normalize endpoint trailing slash
         self.__endpoint = endpoint if endpoint.endswith("/") else endpoint + "/"
+        # Optional requests session, to keep the connections to the instance between requests
+        self.__session = session
         # Host header (defaults to API_SERVER_NAME)
         self.__host = host or getenv("API_SERVER_NAME", "bwapi")
         # Optional API token: if not provided, fallback to env var
@@ -69,8 +71,9 @@ class API:
         if self.__token:
             headers["Authorization"] = f"Bearer {self.__token}"
 
+        send = self.__session.request if self.__session is not None else request
         try:
-            resp = request(
+            resp = send(
                 method,
                 f"{self.__endpoint}{url if not url.startswith('/') else url[1:]}",
                 timeout=timeout,
@@ -82,7 +85,7 @@ class API:
             scheme = urlsplit(self.__endpoint).scheme
             if scheme == "https":
                 self.__logger.warning(f"SSL connection error when contacting {self.__endpoint}{url}, trying HTTP: {e}")
-                resp = request(
+                resp = send(
                     method,
                     f"http://{self.__endpoint.lstrip('https://')}{url if not url.startswith('/') else url[1:]}",
                     timeout=timeout,
@@ -1,43 +1,55 @@
 #!/usr/bin/env python3
 
-from datetime import datetime
+from base64 import b64decode, b64encode
+from contextlib import closing
+from datetime import date, datetime
+from hashlib import sha256
+from itertools import islice
 import re
 from json import dumps, loads
 from os import getenv
 from os.path import join, sep
 from pathlib import Path
-from subprocess import PIPE, run
-from shutil import which
+from sqlite3 import Error as SQLiteError, connect as sqlite_connect
+from subprocess import DEVNULL, PIPE, Popen, run
+from shutil import copyfileobj, which
 from sys import exit as sys_exit, path as sys_path
-from time import sleep
-from typing import Literal
+from tempfile import NamedTemporaryFile, TemporaryDirectory, TemporaryFile
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Set, Tuple
 from zipfile import ZIP_DEFLATED, ZipFile
 
 for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
     if deps_path not in sys_path:
         sys_path.append(deps_path)
 
+from sqlalchemy import Date, DateTime, LargeBinary, Table, and_, bindparam, func, select, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.engine.url import make_url
 
 from common_utils import bytes_hash  # type: ignore
-from Database import Database  # type: ignore
+from Database import Database, DatabaseLock  # type: ignore
 from logger import getLogger  # type: ignore
-from model import Base  # type: ignore
+from model import Base, Custom_configs, Jobs_cache, Jobs_runs, Metadata  # type: ignore
 
 LOGGER = getLogger("BACKUP")
 
 BACKUP_DIR = Path(getenv("BACKUP_DIRECTORY", "/var/lib/bunkerweb/backups"))
-DB_LOCK_FILE = Path(sep, "var", "lib", "bunkerweb", "db.lock")
+DB_LOCK_TIMEOUT = 30
+DUMP_CHUNK_SIZE = 1024 * 1024  # ? Size of the chunks streamed between the dump tools and the archive
+SQLITE_BACKUP_PAGES = 4096  # ? Number of pages copied at each step of the SQLite online backup
+BACKUP_MANIFEST = "manifest.json"
+BACKUP_MANIFEST_VERSION = 1
+BACKUP_ROWS_BATCH = 1000  # ? Number of rows read or written at once when dealing with incremental backups
+BACKUP_EXCLUDED_TABLES = ("bw_locks",)  # ? Tables whose content only makes sense while their owners are running
+PG_SET_BLACKLIST = re.compile(rb"^\s*SET\s+(transaction_timeout|idle_session_timeout)\s*=.*;\s*$", re.IGNORECASE)
 
 
-def acquire_db_lock():
-    """Acquire the database lock to prevent concurrent access to the database."""
-    current_time = datetime.now().astimezone()
-    while DB_LOCK_FILE.is_file() and DB_LOCK_FILE.stat().st_ctime + 30 > current_time.timestamp():
-        LOGGER.warning("Database is locked, waiting for it to be unlocked (timeout: 30s) ...")
-        sleep(1)
-    DB_LOCK_FILE.unlink(missing_ok=True)
-    DB_LOCK_FILE.touch()
+def acquire_db_lock(db: Database) -> DatabaseLock:
+    """Acquire the database lock to prevent concurrent access to the database, release it once done."""
+    lock = db.lock(timeout=DB_LOCK_TIMEOUT)
+    if not lock.acquire():
+        LOGGER.warning(f"Database is still locked after {DB_LOCK_TIMEOUT}s, continuing anyway ...")
+    return lock
 
 
 def update_cache_file(db: Database, backup_dir: Path) -> str:
@@ -56,7 +68,177 @@ def update_cache_file(db: Database, backup_dir: Path) -> str:
     return ""
 
 
-def backup_database(current_time: datetime, db: Database = None, backup_dir: Path = BACKUP_DIR):
+def stream_command_to_zip(cmd: List[str], env: Dict[str, str], zipf: ZipFile, arcname: str) -> Tuple[int, str]:
+    """Run a dump command and stream its output into an archive member in fixed-size chunks."""
+    with TemporaryFile() as stderr_file:
+        proc = Popen(cmd, stdin=DEVNULL, stdout=PIPE, stderr=stderr_file, env=env)
+        try:
+            with zipf.open(arcname, "w", force_zip64=True) as member:
+                while chunk := proc.stdout.read(DUMP_CHUNK_SIZE):
+                    member.write(chunk)
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+        stderr_file.seek(0)
+        return proc.returncode, stderr_file.read().decode(errors="replace")
+
+
+def stream_zip_to_command(
+    cmd: List[str], env: Dict[str, str], zipf: ZipFile, arcname: str, *, preamble: bytes = b"", line_filter: Optional[Callable[[bytes], bool]] = None
+) -> Tuple[int, str]:
+    """Feed an archive member to a restore command in fixed-size chunks, or line by line when the lines have to be filtered."""
+    with TemporaryFile() as stderr_file:
+        proc = Popen(cmd, stdin=PIPE, stdout=DEVNULL, stderr=stderr_file, env=env)
+        try:
+            with zipf.open(arcname, "r") as member:
+                if preamble:
+                    proc.stdin.write(preamble)
+                if line_filter is None:
+                    copyfileobj(member, proc.stdin, DUMP_CHUNK_SIZE)
+                else:
+                    for line in member:
+                        if line_filter(line):
+                            proc.stdin.write(line)
+            proc.stdin.close()
+        except BrokenPipeError:
+            # ? The command exited early, its stderr explains why
+            pass
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.wait()
+
+        stderr_file.seek(0)
+        return proc.returncode, stderr_file.read().decode(errors="replace")
+
+
+def copy_sqlite_database(source: Path, target: Path):
+    """Copy a SQLite database page by page with the online backup API, writers are only blocked during each step."""
+    with closing(sqlite_connect(source.as_posix())) as source_conn, closing(sqlite_connect(target.as_posix())) as target_conn:
+        source_conn.backup(target_conn, pages=SQLITE_BACKUP_PAGES)
+
+
+def encode_row(table: Table, row: Dict[str, Any]) -> bytes:
+    """Serialize a table row as a JSON line, binary values are base64 encoded and dates ISO formatted."""
+    values = {}
+    for column in table.columns:
+        value = row[column.name]
+        if isinstance(value, bytes):
+            value = b64encode(value).decode("ascii")
+        elif isinstance(value, date):
+            value = value.isoformat()
+        values[column.name] = value
+    return dumps(values, sort_keys=True, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def decode_row(table: Table, line: bytes) -> Dict[str, Any]:
+    """Deserialize a table row encoded with encode_row."""
+    row = loads(line)
+    for column in table.columns:
+        value = row.get(column.name)
+        if value is None:
+            continue
+        if isinstance(column.type, LargeBinary):
+            row[column.name] = b64decode(value)
+        elif isinstance(column.type, DateTime):
+            row[column.name] = datetime.fromisoformat(value)
+        elif isinstance(column.type, Date):
+            row[column.name] = date.fromisoformat(value)
+    return row
+
+
+def iter_table_rows(conn: Connection, table: Table) -> Iterator[bytes]:
+    """Iterate over the encoded rows of a table, ordered by primary key so that their checksum is stable."""
+    order_by = list(table.primary_key.columns) or list(table.columns)
+    result = conn.execution_options(yield_per=BACKUP_ROWS_BATCH).execute(select(table).order_by(*order_by))
+    for row in result.mappings():
+        yield encode_row(table, row)
+
+
+def get_backup_tables() -> List[Table]:
+    """Get the tables saved by the incremental backups, parents first."""
+    return [table for table in Base.metadata.sorted_tables if table.name not in BACKUP_EXCLUDED_TABLES]
+
+
+def get_tables_versions(conn: Connection) -> Dict[str, str]:
+    """Fingerprint the tables whose every write moves a change timestamp of the metadata or an aggregate of their identity columns, without reading their rows.
+
+    The jobs runs are only inserted or deleted and every write of a jobs cache file sets its last update. The other tables hold flags or counters updated
+    without any timestamp (e.g. the plugins config_changed or the instances last_seen), they have no version and are always hashed.
+    """
+    queries = {
+        Custom_configs.__tablename__: select(
+            select(Metadata.last_custom_configs_change).where(Metadata.id == 1).scalar_subquery(), func.count(Custom_configs.id), func.max(Custom_configs.id)
+        ),
+        Jobs_cache.__tablename__: select(func.count(Jobs_cache.id), func.max(Jobs_cache.id), func.max(Jobs_cache.last_update)),
+        Jobs_runs.__tablename__: select(func.count(Jobs_runs.id), func.min(Jobs_runs.id), func.max(Jobs_runs.id), func.max(Jobs_runs.end_date)),
+    }
+    return {name: dumps(list(conn.execute(query).one()), default=str) for name, query in queries.items()}
+
+
+def get_tables_checksums(conn: Connection, versions: Dict[str, str], previous_manifest: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Compute a checksum of the content of each table defined in the model, the tables whose version didn't move since the previous backup keep their
+    previous checksum instead of being read again."""
+    previous_tables = previous_manifest.get("tables", {}) if previous_manifest else {}
+    previous_versions = previous_manifest.get("versions", {}) if previous_manifest else {}
+
+    checksums = {}
+    for table in get_backup_tables():
+        if table.name in versions and table.name in previous_tables and previous_versions.get(table.name) == versions[table.name]:
+            checksums[table.name] = previous_tables[table.name]
+            continue
+
+        checksum = sha256()
+        for line in iter_table_rows(conn, table):
+            checksum.update(line)
+        checksums[table.name] = checksum.hexdigest()
+    return checksums
+
+
+def get_backup_manifest(backup_file: Path) -> Optional[Dict[str, Any]]:
+    """Get the manifest of a backup, backups made before incremental backups existed have none."""
+    try:
+        with ZipFile(backup_file, "r") as zipf:
+            if BACKUP_MANIFEST not in zipf.namelist():
+                return None
+            manifest = loads(zipf.read(BACKUP_MANIFEST))
+    except (OSError, ValueError) as e:
+        LOGGER.warning(f"Can't read the manifest of backup {backup_file.name}: {e}")
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get("version") != BACKUP_MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def get_backup_chain(backup_file: Path) -> List[Path]:
+    """Get the backups needed to restore a backup, from its full base backup to itself. An empty list means the chain is broken."""
+    chain = [backup_file]
+    seen = {backup_file.name}
+    manifest = get_backup_manifest(backup_file)
+    while manifest and manifest.get("type") == "incremental":
+        parent = backup_file.parent.joinpath(manifest.get("parent", ""))
+        if parent.name in seen or not parent.is_file():
+            LOGGER.error(f"Backup {chain[0].name} depends on {parent.name} which is missing")
+            return []
+        seen.add(parent.name)
+        chain.insert(0, parent)
+        manifest = get_backup_manifest(parent)
+    return chain
+
+
+def write_full_backup_manifest(backup_file: Path, checksums: Dict[str, str], versions: Dict[str, str]):
+    """Record the checksums and the versions of the tables in a full backup so that the next backups can be incremental."""
+    with ZipFile(backup_file, "a", compression=ZIP_DEFLATED) as zipf:
+        zipf.writestr(BACKUP_MANIFEST, dumps({"version": BACKUP_MANIFEST_VERSION, "type": "full", "tables": checksums, "versions": versions}, indent=2))
+
+
+def backup_database(current_time: datetime, db: Database = None, backup_dir: Path = BACKUP_DIR) -> Tuple[Database, Optional[Path]]:
     """Backup the database."""
     db = db or Database(LOGGER)
 
@@ -71,20 +253,319 @@ def backup_database(current_time: datetime, db: Database = None, backup_dir: Pat
     model_tables = list(Base.metadata.tables.keys())
     LOGGER.info(f"Backing up {len(model_tables)} tables defined in the model")
 
+    if database == "oracle":
+        LOGGER.warning("Creating a database backup for Oracle is not supported")
+        return db, None
+
     while "Table 'db.test_" in stderr and (datetime.now().astimezone() - current_time).total_seconds() < 10:
-        if database == "sqlite":
+        with ZipFile(backup_file, "w", compression=ZIP_DEFLATED) as zipf:
+            if database == "sqlite":
+                db_path = Path(database_url.database)
+
+                LOGGER.info("Creating a backup for the SQLite database ...")
+
+                # Page level copy of the SQLite database, it is never serialized to SQL
+                with NamedTemporaryFile(dir=backup_dir, prefix=f".{backup_file.stem}.", suffix=".sqlite3") as tmp_file:
+                    try:
+                        copy_sqlite_database(db_path, Path(tmp_file.name))
+                        with closing(sqlite_connect(tmp_file.name)) as tmp_conn, tmp_conn:
+                            for table_name in BACKUP_EXCLUDED_TABLES:
+                                if tmp_conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone():
+                                    tmp_conn.execute(f"DELETE FROM {table_name}")
+                        returncode, stderr = 0, ""
+                    except SQLiteError as e:
+                        returncode, stderr = 1, str(e)
+                    else:
+                        zipf.write(tmp_file.name, backup_file.with_suffix(".sqlite3").name)
+            else:
+                url = make_url(db.database_uri)
+                db_user = url.username or ""
+                db_password = url.password or ""
+                db_host = url.host or ""
+                db_port = str(url.port) if url.port else ""
+                db_database_name = url.database or ""
+                db_query_args = url.query if hasattr(url, "query") else {}
+
+                if database in ("mariadb", "mysql"):
+                    LOGGER.info("Creating a backup for the MariaDB/MySQL database ...")
+
+                    dump_bin = "mariadb-dump" if which("mariadb-dump") else "mysqldump"
+                    cmd = [
+                        dump_bin,
+                        "-h",
+                        db_host,
+                        "-u",
+                        db_user,
+                        db_database_name,
+                    ]
+                    if db_port:
+                        cmd.extend(["-P", db_port])
+
+                    # Add options to handle large data and improve compatibility
+                    cmd.extend(
+                        [
+                            "--single-transaction",  # Consistent backup for InnoDB
+                            "--routines",  # Include stored procedures and functions
+                            "--triggers",  # Include triggers
+                            "--events",  # Include events
+                            "--max_allowed_packet=2147483648",  # 2GB max packet size
+                            "--quick",  # Retrieve rows one at a time
+                            "--lock-tables=false",  # Don't lock tables
+                            "--skip-add-locks",  # Don't add LOCK TABLES statements
+                            "--default-character-set=utf8mb4",  # Use utf8mb4 charset
+                            "--add-drop-table",  # Ensure DROP TABLE before CREATE
+                        ]
+                    )
+
+                    # Avoid --set-gtid-purged for broad compatibility (MariaDB variant doesn't support it)
+
+                    # Apply additional arguments from query parameters
+                    for key, value in db_query_args.items():
+                        if key == "ssl" and value == "true":
+                            cmd.append("--ssl")
+                        elif key == "charset":
+                            cmd.extend(["--default-character-set", value])
+
+                    returncode, stderr = stream_command_to_zip(
+                        cmd,
+                        {"MYSQL_PWD": db_password, "PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
+                        zipf,
+                        backup_file.with_suffix(".sql").name,
+                    )
+                elif database == "postgresql":
+                    LOGGER.info("Creating a backup for the PostgreSQL database ...")
+
+                    cmd = [
+                        "pg_dump",
+                        "-h",
+                        db_host,
+                        "-U",
+                        db_user,
+                        db_database_name,
+                        "-w",
+                        "--no-password",
+                    ]
+                    if db_port:
+                        cmd.extend(["-p", db_port])
+
+                    # Add options to handle large data and improve compatibility
+                    cmd.extend(
+                        [
+                            "--clean",  # Include DROP statements for existing objects
+                            "--if-exists",  # Avoid errors if objects do not exist
+                            "--no-owner",  # Skip ownership commands
+                            "--no-privileges",  # Skip privilege commands
+                            "--format=plain",  # Plain text format
+                            "--verbose",  # Verbose output for debugging
+                        ]
+                    )
+
+                    # Apply additional arguments from query parameters
+                    pg_env = {"PGPASSWORD": db_password}
+                    for key, value in db_query_args.items():
+                        if key == "sslmode":
+                            pg_env["PGSSLMODE"] = value
+                        elif key == "sslrootcert":
+                            pg_env["PGSSLROOTCERT"] = value
+
+                    returncode, stderr = stream_command_to_zip(
+                        cmd,
+                        {"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")} | pg_env,
+                        zipf,
+                        backup_file.with_suffix(".sql").name,
+                    )
+
+        if "Table 'db.test_" not in stderr and returncode != 0:
+            backup_file.unlink(missing_ok=True)
+            LOGGER.error(f"Failed to dump the database: {stderr}")
+            sys_exit(1)
+
+    if "Table 'db.test_" in stderr:
+        backup_file.unlink(missing_ok=True)
+        LOGGER.error("Failed to dump the database: Timeout reached")
+        sys_exit(1)
+
+    backup_file.chmod(0o600)
+
+    LOGGER.info(f"💾 Backup {backup_file.name} created successfully in {backup_dir}")
+    return db, backup_file
+
+
+def backup_database_incremental(
+    current_time: datetime, db: Database = None, backup_dir: Path = BACKUP_DIR, *, full_interval: int = 1
+) -> Tuple[Database, Optional[Path]]:
+    """Backup only the tables which changed since the previous backup, a full backup is made every full_interval backups."""
+    db = db or Database(LOGGER)
+
+    database = make_url(db.database_uri).drivername.split("+")[0]
+    backup_file = backup_dir.joinpath(f"backup-{database}-{current_time.strftime('%Y-%m-%d_%H-%M-%S')}.zip")
+
+    previous_backups = sorted(backup_dir.glob(f"backup-{database}-*.zip"))
+    chain = get_backup_chain(previous_backups[-1]) if previous_backups else []
+    previous_manifest = get_backup_manifest(chain[-1]) if chain else None
+
+    if not previous_manifest or len(chain) >= full_interval:
+        LOGGER.info("Creating a full backup as the base of the next incremental backups ...")
+        # ? The versions then the checksums are computed before the dump, a write in between makes the next backup save the table again instead of
+        # ? missing it. The tables which didn't change since the previous backup keep their checksum instead of being read before the dump as well.
+        with db.sql_engine.connect() as conn:
+            versions = get_tables_versions(conn)
+            checksums = get_tables_checksums(conn, versions, previous_manifest)
+        db, backup_file = backup_database(current_time, db, backup_dir)
+        if backup_file:
+            write_full_backup_manifest(backup_file, checksums, versions)
+        return db, backup_file
+
+    LOGGER.info(f"Creating an incremental backup on top of {chain[-1].name} ({len(chain)}/{full_interval}) ...")
+
+    # ? The checksums are computed before the rows are read, a write in between makes the next backup save the table again instead of missing it
+    with db.sql_engine.connect() as conn, ZipFile(backup_file, "w", compression=ZIP_DEFLATED) as zipf:
+        versions = get_tables_versions(conn)
+        checksums = get_tables_checksums(conn, versions, previous_manifest)
+        changed = [table for table in get_backup_tables() if previous_manifest["tables"].get(table.name) != checksums[table.name]]
+
+        for table in changed:
+            with zipf.open(f"tables/{table.name}.jsonl", "w", force_zip64=True) as member:
+                for line in iter_table_rows(conn, table):
+                    member.write(line)
+
+        zipf.writestr(
+            BACKUP_MANIFEST,
+            dumps(
+                {
+                    "version": BACKUP_MANIFEST_VERSION,
+                    "type": "incremental",
+                    "base": chain[0].name,
+                    "parent": chain[-1].name,
+                    "tables": checksums,
+                    "versions": versions,
+                    "changed": [table.name for table in changed],
+                },
+                indent=2,
+            ),
+        )
+
+    backup_file.chmod(0o600)
+
+    LOGGER.info(f"💾 Incremental backup {backup_file.name} created successfully in {backup_dir} ({len(changed)} changed table(s))")
+    return db, backup_file
+
+
+def iter_backup_rows(zipf: ZipFile, table: Table) -> Iterator[List[Dict[str, Any]]]:
+    """Iterate over batches of the rows of a table stored in an incremental backup."""
+    with zipf.open(f"tables/{table.name}.jsonl", "r") as member:
+        while batch := [decode_row(table, line) for line in islice(member, BACKUP_ROWS_BATCH)]:
+            yield batch
+
+
+def apply_incremental_backup(backup_file: Path, db: Database):
+    """Replay an incremental backup: the rows of each changed table are upserted by primary key and the missing ones are deleted.
+
+    Rows are never deleted and inserted back so that the foreign keys cascades don't touch the tables which didn't change.
+    """
+    manifest = get_backup_manifest(backup_file) or {}
+    changed = set(manifest.get("changed", []))
+    tables = [table for table in get_backup_tables() if table.name in changed]
+
+    LOGGER.info(f"Applying incremental backup {backup_file.name} ({len(tables)} changed table(s)) ...")
+
+    with ZipFile(backup_file, "r") as zipf, db.sql_engine.begin() as conn:
+        existing_keys: Dict[str, Set[tuple]] = {}
+
+        # Delete the rows which don't exist anymore, children first
+        for table in reversed(tables):
+            pk_columns = list(table.primary_key.columns)
+            existing_keys[table.name] = {tuple(row) for row in conn.execute(select(*pk_columns))}
+            backup_keys = {tuple(row[column.name] for column in pk_columns) for batch in iter_backup_rows(zipf, table) for row in batch}
+            to_delete = existing_keys[table.name] - backup_keys
+            if to_delete:
+                conn.execute(
+                    table.delete().where(and_(*(column == bindparam(f"_pk_{column.name}") for column in pk_columns))),
+                    [{f"_pk_{column.name}": value for column, value in zip(pk_columns, key)} for key in to_delete],
+                )
+            existing_keys[table.name] -= to_delete
+
+        # Upsert the rows, parents first
+        for table in tables:
+            pk_columns = list(table.primary_key.columns)
+            update_stmt = table.update().where(and_(*(column == bindparam(f"_pk_{column.name}") for column in pk_columns)))
+            for batch in iter_backup_rows(zipf, table):
+                to_insert, to_update = [], []
+                for row in batch:
+                    key = tuple(row[column.name] for column in pk_columns)
+                    if key in existing_keys[table.name]:
+                        to_update.append(row | {f"_pk_{column.name}": value for column, value in zip(pk_columns, key)})
+                    else:
+                        to_insert.append(row)
+                if to_update:
+                    conn.execute(update_stmt, to_update)
+                if to_insert:
+                    conn.execute(table.insert(), to_insert)
+
+            # ? Explicitly inserted identities don't move the PostgreSQL sequences forward
+            if conn.dialect.name == "postgresql" and table.autoincrement_column is not None:
+                column = table.autoincrement_column
+                max_id = conn.execute(select(func.max(column))).scalar()
+                if max_id is not None:
+                    conn.execute(
+                        text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"), {"table": table.name, "column": column.name, "value": max_id}
+                    )
+
+
+def restore_database(backup_file: Path, db: Database = None) -> Database:
+    """Restore the database from a backup, incremental backups are restored by replaying them on top of their full base backup."""
+    db = db or Database(LOGGER)
+    database_url = make_url(db.database_uri)
+    database: Literal["sqlite", "mariadb", "mysql", "postgresql", "oracle"] = database_url.drivername.split("+")[0]
+
+    chain = get_backup_chain(backup_file)
+    if not chain:
+        LOGGER.error(f"Failed to restore the database: the backups {backup_file.name} depends on are missing")
+        sys_exit(1)
+    base_file = chain[0]
+
+    with ZipFile(base_file, "r") as zipf:
+        sql_name = base_file.with_suffix(".sql").name
+        sqlite_name = base_file.with_suffix(".sqlite3").name
+
+        if database == "sqlite" and sqlite_name in zipf.namelist():
             db_path = Path(database_url.database)
 
-            LOGGER.info("Creating a backup for the SQLite database ...")
+            LOGGER.info("Restoring the SQLite database ...")
+
+            # Page level copy of the backed up database over the current one, which replaces all its content
+            db.sql_engine.dispose()
+            with TemporaryDirectory(dir=base_file.parent, prefix=f".{base_file.stem}.") as tmp_dir:
+                try:
+                    copy_sqlite_database(Path(zipf.extract(sqlite_name, tmp_dir)), db_path)
+                    returncode, stderr = 0, ""
+                except SQLiteError as e:
+                    returncode, stderr = 1, str(e)
+        elif database == "sqlite":
+            Base.metadata.drop_all(db.sql_engine)
+            db_path = Path(database_url.database)
+
+            # Clear the database
+            run(
+                ["sqlite3", db_path.as_posix(), ".read", "/dev/null"],
+                stdout=PIPE,
+                stderr=PIPE,
+                env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
+            )
+
+            LOGGER.info("Restoring the SQLite database ...")
+
+            tmp_file = Path(sep, "var", "tmp", "bunkerweb", sql_name)
+            zipf.extract(sql_name, path=tmp_file.parent)
 
-            # Full SQLite database dump
             proc = run(
-                ["sqlite3", db_path.as_posix()],
-                input=".dump\n".encode(),
+                ["sqlite3", db_path.as_posix(), f".read {tmp_file.as_posix()}"],
                 stdout=PIPE,
                 stderr=PIPE,
                 env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
             )
+            tmp_file.unlink(missing_ok=True)
+            returncode, stderr = proc.returncode, proc.stderr.decode()
         else:
             url = make_url(db.database_uri)
             db_user = url.username or ""
@@ -95,38 +576,13 @@ def backup_database(current_time: datetime, db: Database = None, backup_dir: Pat
             db_query_args = url.query if hasattr(url, "query") else {}
 
             if database in ("mariadb", "mysql"):
-                LOGGER.info("Creating a backup for the MariaDB/MySQL database ...")
+                Base.metadata.drop_all(db.sql_engine)
+                LOGGER.info("Restoring the MariaDB/MySQL database ...")
 
-                dump_bin = "mariadb-dump" if which("mariadb-dump") else "mysqldump"
-                cmd = [
-                    dump_bin,
-                    "-h",
-                    db_host,
-                    "-u",
-                    db_user,
-                    db_database_name,
-                ]
+                cmd = ["mysql", "-h", db_host, "-u", db_user, db_database_name]
                 if db_port:
                     cmd.extend(["-P", db_port])
 
-                # Add options to handle large data and improve compatibility
-                cmd.extend(
-                    [
-                        "--single-transaction",  # Consistent backup for InnoDB
-                        "--routines",  # Include stored procedures and functions
-                        "--triggers",  # Include triggers
-                        "--events",  # Include events
-                        "--max_allowed_packet=2147483648",  # 2GB max packet size
-                        "--quick",  # Retrieve rows one at a time
-                        "--lock-tables=false",  # Don't lock tables
-                        "--skip-add-locks",  # Don't add LOCK TABLES statements
-                        "--default-character-set=utf8mb4",  # Use utf8mb4 charset
-                        "--add-drop-table",  # Ensure DROP TABLE before CREATE
-                    ]
-                )
-
-                # Avoid --set-gtid-purged for broad compatibility (MariaDB variant doesn't support it)
-
                 # Apply additional arguments from query parameters
                 for key, value in db_query_args.items():
                     if key == "ssl" and value == "true":
@@ -134,40 +590,29 @@ def backup_database(current_time: datetime, db: Database = None, backup_dir: Pat
                     elif key == "charset":
                         cmd.extend(["--default-character-set", value])
 
-                proc = run(
-                    cmd,
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    env={"MYSQL_PWD": db_password, "PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
+                returncode, stderr = stream_zip_to_command(
+                    cmd, {"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", ""), "MYSQL_PWD": db_password}, zipf, sql_name
                 )
             elif database == "postgresql":
-                LOGGER.info("Creating a backup for the PostgreSQL database ...")
+                Base.metadata.drop_all(db.sql_engine)
+                LOGGER.info("Restoring the PostgreSQL database ...")
 
                 cmd = [
-                    "pg_dump",
+                    "psql",
                     "-h",
                     db_host,
                     "-U",
                     db_user,
                     db_database_name,
-                    "-w",
-                    "--no-password",
+                    "-v",
+                    "ON_ERROR_STOP=1",  # Stop immediately on error
+                    "--single-transaction",  # All-or-nothing restore
+                    "--no-psqlrc",  # Do not read user startup files
+                    "-X",  # Do not read ~/.psqlrc or ~/.pgpass implicitly
                 ]
                 if db_port:
                     cmd.extend(["-p", db_port])
 
-                # Add options to handle large data and improve compatibility
-                cmd.extend(
-                    [
-                        "--clean",  # Include DROP statements for existing objects
-                        "--if-exists",  # Avoid errors if objects do not exist
-                        "--no-owner",  # Skip ownership commands
-                        "--no-privileges",  # Skip privilege commands
-                        "--format=plain",  # Plain text format
-                        "--verbose",  # Verbose output for debugging
-                    ]
-                )
-
                 # Apply additional arguments from query parameters
                 pg_env = {"PGPASSWORD": db_password}
                 for key, value in db_query_args.items():
@@ -175,133 +620,6 @@ def backup_database(current_time: datetime, db: Database = None, backup_dir: Pat
                         pg_env["PGSSLMODE"] = value
                     elif key == "sslrootcert":
                         pg_env["PGSSLROOTCERT"] = value
-                proc = run(
-                    cmd,
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")} | pg_env,
-                )
-            elif database == "oracle":
-                LOGGER.warning("Creating a database backup for Oracle is not supported")
-                return db
-
-        stderr = proc.stderr.decode() if hasattr(proc, "stderr") and proc.stderr else ""
-        if "Table 'db.test_" not in stderr and proc.returncode != 0:
-            LOGGER.error(f"Failed to dump the database: {stderr}")
-            sys_exit(1)
-
-    if (datetime.now().astimezone() - current_time).total_seconds() >= 10:
-        LOGGER.error("Failed to dump the database: Timeout reached")
-        sys_exit(1)
-
-    with ZipFile(backup_file, "w", compression=ZIP_DEFLATED) as zipf:
-        zipf.writestr(backup_file.with_suffix(".sql").name, proc.stdout)
-
-    backup_file.chmod(0o600)
-
-    LOGGER.info(f"💾 Backup {backup_file.name} created successfully in {backup_dir}")
-    return db, backup_file
-
-
-def restore_database(backup_file: Path, db: Database = None) -> Database:
-    """Restore the database from a backup."""
-    db = db or Database(LOGGER)
-    Base.metadata.drop_all(db.sql_engine)
-    database_url = make_url(db.database_uri)
-    database: Literal["sqlite", "mariadb", "mysql", "postgresql", "oracle"] = database_url.drivername.split("+")[0]
-
-    if database == "sqlite":
-        db_path = Path(database_url.database)
-
-        # Clear the database
-        proc = run(
-            ["sqlite3", db_path.as_posix(), ".read", "/dev/null"],
-            stdout=PIPE,
-            stderr=PIPE,
-            env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
-        )
-
-        LOGGER.info("Restoring the SQLite database ...")
-
-        tmp_file = Path(sep, "var", "tmp", "bunkerweb", backup_file.with_suffix(".sql").name)
-        with ZipFile(backup_file, "r") as zipf:
-            zipf.extractall(path=tmp_file.parent)
-
-        proc = run(
-            ["sqlite3", db_path.as_posix(), f".read {tmp_file.as_posix()}"],
-            stdout=PIPE,
-            stderr=PIPE,
-            env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")},
-        )
-        tmp_file.unlink(missing_ok=True)
-    else:
-        url = make_url(db.database_uri)
-        db_user = url.username or ""
-        db_password = url.password or ""
-        db_host = url.host or ""
-        db_port = str(url.port) if url.port else ""
-        db_database_name = url.database or ""
-        db_query_args = url.query if hasattr(url, "query") else {}
-
-        if database in ("mariadb", "mysql"):
-            LOGGER.info("Restoring the MariaDB/MySQL database ...")
-
-            cmd = ["mysql", "-h", db_host, "-u", db_user, db_database_name]
-            if db_port:
-                cmd.extend(["-P", db_port])
-
-            # Apply additional arguments from query parameters
-            for key, value in db_query_args.items():
-                if key == "ssl" and value == "true":
-                    cmd.append("--ssl")
-                elif key == "charset":
-                    cmd.extend(["--default-character-set", value])
-
-            with ZipFile(backup_file, "r") as zipf:
-                proc = run(
-                    cmd,
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", ""), "MYSQL_PWD": db_password},
-                    input=zipf.read(backup_file.with_suffix(".sql").name),
-                )
-        elif database == "postgresql":
-            LOGGER.info("Restoring the PostgreSQL database ...")
-
-            cmd = [
-                "psql",
-                "-h",
-                db_host,
-                "-U",
-                db_user,
-                db_database_name,
-                "-v",
-                "ON_ERROR_STOP=1",  # Stop immediately on error
-                "--single-transaction",  # All-or-nothing restore
-                "--no-psqlrc",  # Do not read user startup files
-                "-X",  # Do not read ~/.psqlrc or ~/.pgpass implicitly
-            ]
-            if db_port:
-                cmd.extend(["-p", db_port])
-
-            # Apply additional arguments from query parameters
-            pg_env = {"PGPASSWORD": db_password}
-            for key, value in db_query_args.items():
-                if key == "sslmode":
-                    pg_env["PGSSLMODE"] = value
-                elif key == "sslrootcert":
-                    pg_env["PGSSLROOTCERT"] = value
-
-            with ZipFile(backup_file, "r") as zipf:
-                sql_name = backup_file.with_suffix(".sql").name
-                sql_data = zipf.read(sql_name)
-
-                # Sanitize dump for cross-version compatibility:
-                # - Remove SET directives unknown to older servers (e.g., transaction_timeout)
-                sql_text = sql_data.decode("utf-8", errors="ignore")
-                set_blacklist = re.compile(r"^\s*SET\s+(transaction_timeout|idle_session_timeout)\s*=.*;\s*$", re.IGNORECASE)
-                sanitized_lines = [line for line in sql_text.splitlines(True) if not set_blacklist.match(line)]
-                sanitized_sql = "".join(sanitized_lines).encode()
 
                 # Stabilize restore by setting safe defaults before feeding dump
                 # Avoid superuser-only settings to preserve compatibility
@@ -314,23 +632,28 @@ def restore_database(backup_file: Path, db: Database = None) -> Database:
                     "SET standard_conforming_strings = on;\n"
                     "SET search_path = public, pg_catalog;\n"
                 ).encode()
-                input_bytes = preamble + sanitized_sql
 
-                proc = run(
+                # Sanitize dump for cross-version compatibility:
+                # - Remove SET directives unknown to older servers (e.g., transaction_timeout)
+                returncode, stderr = stream_zip_to_command(
                     cmd,
-                    stdout=PIPE,
-                    stderr=PIPE,
-                    input=input_bytes,
-                    env={"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")} | pg_env,
+                    {"PATH": getenv("PATH", ""), "PYTHONPATH": getenv("PYTHONPATH", "")} | pg_env,
+                    zipf,
+                    sql_name,
+                    preamble=preamble,
+                    line_filter=lambda line: not PG_SET_BLACKLIST.match(line),
                 )
-        elif database == "oracle":
-            LOGGER.warning("Restoring a database backup for Oracle is not supported")
-            return db
+            elif database == "oracle":
+                LOGGER.warning("Restoring a database backup for Oracle is not supported")
+                return db
 
-    if proc.returncode != 0:
-        LOGGER.error(f"Failed to restore the database: {proc.stderr.decode()}")
+    if returncode != 0:
+        LOGGER.error(f"Failed to restore the database: {stderr}")
         sys_exit(1)
 
+    for incremental_file in chain[1:]:
+        apply_incremental_backup(incremental_file, db)
+
     err = db.checked_changes(plugins_changes="all", value=True)
     if err:
         LOGGER.error(f"Error while applying changes to the database: {err}, you may need to reload the application")
@@ -10,13 +10,12 @@ deps_path = join(sep, "usr", "share", "bunkerweb", "core", "backup")
 if deps_path not in sys_path:
     sys_path.append(deps_path)
 
-from backup import acquire_db_lock, backup_database, BACKUP_DIR, DB_LOCK_FILE, LOGGER, restore_database
+from backup import acquire_db_lock, backup_database, BACKUP_DIR, Database, LOGGER, restore_database
 
 status = 0
+db_lock = None
 
 try:
-    acquire_db_lock()
-
     # Global parser
     parser = ArgumentParser(description="BunkerWeb's backup plugin restore command line interface")
 
@@ -51,7 +50,9 @@ try:
     current_time = datetime.now().astimezone()
     tmp_backup_dir = Path(sep, "tmp", "bunkerweb", "backups")
     tmp_backup_dir.mkdir(parents=True, exist_ok=True)
-    db, _ = backup_database(current_time, backup_dir=tmp_backup_dir)
+    db = Database(LOGGER)
+    db_lock = acquire_db_lock(db)
+    db, _ = backup_database(current_time, db, tmp_backup_dir)
 
     LOGGER.info(f"Restoring backup {backup_file} ...")
     restore_database(backup_file, db)
@@ -61,6 +62,7 @@ except BaseException as e:
     LOGGER.error(f"Error while executing backup restore command: {e}")
     status = 1
 finally:
-    DB_LOCK_FILE.unlink(missing_ok=True)
+    if db_lock:
+        db_lock.release()
 
 sys_exit(status)
@@ -10,13 +10,12 @@ deps_path = join(sep, "usr", "share", "bunkerweb", "core", "backup")
 if deps_path not in sys_path:
     sys_path.append(deps_path)
 
-from backup import acquire_db_lock, backup_database, BACKUP_DIR, DB_LOCK_FILE, LOGGER, update_cache_file
+from backup import acquire_db_lock, backup_database, BACKUP_DIR, Database, LOGGER, update_cache_file
 
 status = 0
+db_lock = None
 
 try:
-    acquire_db_lock()
-
     # Global parser
     parser = ArgumentParser(description="BunkerWeb's backup plugin save command line interface")
 
@@ -44,7 +43,9 @@ try:
         LOGGER.info(f"Creating directory {directory} as it does not exist")
         directory.mkdir(parents=True, exist_ok=True)
 
-    db, _ = backup_database(datetime.now().astimezone(), backup_dir=directory)
+    db = Database(LOGGER)
+    db_lock = acquire_db_lock(db)
+    db, _ = backup_database(datetime.now().astimezone(), db, directory)
 
     if directory == BACKUP_DIR:
         update_cache_file(db, directory)
@@ -54,6 +55,7 @@ except BaseException as e:
     LOGGER.error(f"Error while executing backup save command: {e}")
     status = 1
 finally:
-    DB_LOCK_FILE.unlink(missing_ok=True)
+    if db_lock:
+        db_lock.release()
 
 sys_exit(status)
@@ -15,14 +15,13 @@ for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in ((
 from Database import Database  # type: ignore
 from logger import getLogger  # type: ignore
 from jobs import Job  # type: ignore
-from backup import backup_database, update_cache_file, acquire_db_lock, DB_LOCK_FILE
+from backup import backup_database, backup_database_incremental, get_backup_chain, update_cache_file, acquire_db_lock
 
 LOGGER = getLogger("BACKUP")
 status = 0
+db_lock = None
 
 try:
-    # Prevent concurrent DB access with other backup plugins
-    acquire_db_lock()
     backup_dir = Path(getenv("BACKUP_DIRECTORY", "/var/lib/bunkerweb/backups"))
     backup_dir.mkdir(parents=True, exist_ok=True)
 
@@ -78,7 +77,13 @@ try:
                 LOGGER.info("First start of the scheduler, skipping backup ...")
                 sys_exit(0)
 
-        db, _ = backup_database(current_time, db, backup_dir)
+        # Prevent concurrent DB access with other backup plugins and the scheduler
+        db_lock = acquire_db_lock(db)
+        full_interval = int(getenv("BACKUP_FULL_INTERVAL", "1"))
+        if force_backup or full_interval <= 1:
+            db, _ = backup_database(current_time, db, backup_dir)
+        else:
+            db, _ = backup_database_incremental(current_time, db, backup_dir, full_interval=full_interval)
         backed_up = True
 
         if not force_backup:
@@ -91,11 +96,13 @@ try:
     if not force_backup:
         # Check if the number of backup files exceeds the rotation limit
         if len(sorted_files) > backup_rotation:
-            # Calculate the number of files to remove
-            num_files_to_remove = len(sorted_files) - backup_rotation
+            # Keep the backups the most recent ones are based on
+            kept_files = {file for kept_file in sorted_files[-backup_rotation:] for file in get_backup_chain(kept_file) or [kept_file]}
 
             # Remove the oldest backup files
-            for file in sorted_files[:num_files_to_remove]:
+            for file in sorted_files:
+                if file in kept_files:
+                    continue
                 LOGGER.warning(f"Removing old backup file: {file}, as the rotation limit has been reached ...")
                 file.unlink()
 
@@ -110,6 +117,7 @@ except BaseException as e:
 
 finally:
     # Always release DB lock
-    DB_LOCK_FILE.unlink(missing_ok=True)
+    if db_lock:
+        db_lock.release()
 
 sys_exit(status)
@@ -17,7 +17,7 @@ status = 0
 
 try:
     DB = Database(LOGGER, sqlalchemy_string=getenv("DATABASE_URI"))
-    ret = DB.cleanup_jobs_runs_excess(int(getenv("DATABASE_MAX_JOBS_RUNS", "10000")))
+    ret = DB.cleanup_jobs_runs_excess(int(getenv("DATABASE_MAX_JOBS_RUNS", "10000")), summarize=getenv("DATABASE_JOBS_RUNS_SUMMARY", "yes").lower() == "yes")
     if not ret.startswith("Removed"):
         LOGGER.error(ret)
         sys_exit(1)
@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 
 from contextlib import suppress
-from datetime import datetime, timedelta
 from ipaddress import ip_address, ip_network
 from os import getenv, sep
 from os.path import join
 from sys import exit as sys_exit, path as sys_path
-from time import sleep
 from traceback import format_exc
 
 # Add shared deps
@@ -14,9 +12,6 @@ for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in ((
     if deps_path not in sys_path:
         sys_path.append(deps_path)
 
-from requests import get
-from requests.exceptions import ConnectionError
-
 from common_utils import bytes_hash  # type: ignore
 from logger import getLogger  # type: ignore
 from jobs import Job  # type: ignore
@@ -89,8 +84,10 @@ try:
                 LOGGER.warning(f"Couldn't delete file {file} from cache : {err}")
         sys_exit(0)
 
+    # Download all the URLs concurrently, each URL is only fetched once even if it is used by multiple services
+    downloads = JOB.download_urls(url for urls in services_urls.values() for url in urls)
+
     processed_urls: set[str] = set()
-    failed_urls: set[str] = set()
     url_cache_files: set[str] = set()
 
     for service, urls in services_urls.items():
@@ -107,85 +104,41 @@ try:
         total_new_lines = 0
 
         for url in urls:
-            url_file = f"{bytes_hash(url, algorithm='sha1')}.list"
-            url_cache_files.add(url_file)
-            cached_url = JOB.get_cache(url_file, with_info=True, with_data=True)
+            url_cache_files.add(JOB.url_cache_name(url))
+            download = downloads[url]
             try:
-                # If URL previously failed this run, just count failure once
-                if url in failed_urls:
-                    pass
-                # If cached recently (< 1h), reuse cached data
-                elif (
-                    isinstance(cached_url, dict)
-                    and cached_url.get("last_update")
-                    and cached_url["last_update"] > (datetime.now().astimezone() - timedelta(hours=1)).timestamp()
-                ):
-                    LOGGER.debug(f"URL {url} cached < 1h ago, skipping download...")
-                    cached_data = cached_url.get("data", b"")
-                    if cached_data:
-                        for line in cached_data.split(b"\n")[1:]:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            unique_entries.add(line)
+                # If URL failed this run, it is already reported by the downloads recap
+                if download["status"] == "failed":
+                    status = 2
+                # If cached recently (< 1h), not modified or already processed, reuse cached data
+                elif download["data"] is not None:
+                    for line in download["data"].split(b"\n"):
+                        line = line.strip()
+                        if not line or line.startswith(b"#"):
+                            continue
+                        unique_entries.add(line)
                 else:
-                    # Download
-                    iterable = None
-                    failed = False
-                    LOGGER.info(f"Downloading DNSBL ignore IP data from {url} ...")
-                    if url.startswith("file://"):
-                        try:
-                            with open(url[7:], "rb") as f:
-                                iterable = f.readlines()
-                        except OSError as e:
-                            status = 2
-                            LOGGER.debug(format_exc())
-                            LOGGER.error(f"Error while opening file {url[7:]} : {e}")
-                            failed_urls.add(url)
-                            failed = True
-                    else:
-                        max_retries = 3
-                        retry_count = 0
-                        while retry_count < max_retries:
-                            try:
-                                resp = get(url, stream=True, timeout=10)
-                                break
-                            except ConnectionError:
-                                retry_count += 1
-                                if retry_count == max_retries:
-                                    raise
-                                LOGGER.warning(f"Connection refused, retrying in 3 seconds... ({retry_count}/{max_retries})")
-                                sleep(3)
-
-                        if resp.status_code != 200:
-                            status = 2
-                            LOGGER.warning(f"Got status code {resp.status_code}, skipping...")
-                            failed_urls.add(url)
-                            failed = True
-                        else:
-                            iterable = resp.iter_lines()
-
-                    if not failed and iterable is not None:
-                        url_content = b""
-                        added_lines = 0
-                        for line in iterable:
-                            valid = check_ip_line(line)
-                            if valid is None:
-                                continue
-                            if valid not in unique_entries:
-                                added_lines += 1
-                            unique_entries.add(valid)
-                            url_content += valid + b"\n"
-                        total_new_lines += added_lines
-
-                        cached, err = JOB.cache_file(url_file, b"# Downloaded from " + url.encode() + b"\n" + url_content)
-                        if not cached:
-                            LOGGER.error(f"Error while caching url content for {url}: {err}")
+                    url_content = b""
+                    added_lines = 0
+                    for line in JOB.read_download(download):
+                        valid = check_ip_line(line)
+                        if valid is None:
+                            continue
+                        if valid not in unique_entries:
+                            added_lines += 1
+                        unique_entries.add(valid)
+                        url_content += valid + b"\n"
+                    total_new_lines += added_lines
+
+                    download["data"] = url_content
+                    cached, err = JOB.cache_download(download, url_content)
+                    if not cached:
+                        LOGGER.error(f"Error while caching url content for {url}: {err}")
             except BaseException as e:
                 status = 2
                 LOGGER.debug(format_exc())
                 LOGGER.error(f"Exception while getting {service} DNSBL ignore IPs from {url} :\n{e}")
-                failed_urls.add(url)
+                download["status"] = "failed"
             finally:
                 processed_urls.add(url)
 
@@ -214,6 +167,8 @@ try:
 
         status = 1 if status != 2 else 2
 
+    JOB.log_downloads_recap(LOGGER, downloads)
+
     # Clean old url cache files no longer referenced
     for url_file in JOB.job_path.glob("*.list"):
         if url_file.name not in url_cache_files:
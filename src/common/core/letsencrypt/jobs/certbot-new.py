@@ -65,6 +65,7 @@ from letsencrypt_providers import (
     ScalewayProvider,
     TransIPProvider,
 )
+from letsencrypt_certificates import update_certificates_index
 
 LOG_LEVEL = getenv("CUSTOM_LOG_LEVEL", getenv("LOG_LEVEL", "INFO")).upper()
 LOGGER = getLogger("LETS-ENCRYPT.NEW")
@@ -980,6 +981,10 @@ try:
                 LOGGER.error(f"Error while saving data to db cache : {err}")
             else:
                 LOGGER.info("Successfully saved data to db cache")
+
+            indexed, err = update_certificates_index(JOB, DATA_PATH, LOGGER)
+            if not indexed:
+                LOGGER.error(f"Error while saving certificates index to db cache : {err}")
 except SystemExit as e:
     status = e.code
 except BaseException as e:
@@ -13,6 +13,7 @@ for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in ((
 
 from logger import getLogger  # type: ignore
 from jobs import Job  # type: ignore
+from letsencrypt_certificates import update_certificates_index
 
 LOGGER = getLogger("LETS-ENCRYPT.RENEW")
 LIB_PATH = Path(sep, "var", "lib", "bunkerweb", "letsencrypt")
@@ -133,6 +134,10 @@ try:
             LOGGER.error(f"Error while saving Let's Encrypt data to db cache : {err}")
         else:
             LOGGER.info("Successfully saved Let's Encrypt data to db cache")
+
+        indexed, err = update_certificates_index(JOB, DATA_PATH, LOGGER)
+        if not indexed:
+            LOGGER.error(f"Error while saving Let's Encrypt certificates index to db cache : {err}")
 except SystemExit as e:
     status = e.code
 except BaseException as e:
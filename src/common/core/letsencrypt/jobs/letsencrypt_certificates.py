@@ -0,0 +1,142 @@
+from json import JSONDecodeError, dumps, loads
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+
+CERTIFICATES_INDEX_FILE = "certificates.json"
+CERTIFICATES_INDEX_JOB = "certbot-renew"
+CERTIFICATES_INDEX_VERSION = 1
+
+RENEWAL_KEYS = {
+    "preferred_profile": "preferred_profile",
+    "pref_challs": "challenge",
+    "authenticator": "authenticator",
+    "server": "issuer_server",
+    "key_type": "key_type",
+}
+
+
+def _file_signature(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _certificate_signature(data_path: Path, domain: str) -> list:
+    return [
+        _file_signature(data_path.joinpath("live", domain, "fullchain.pem")),
+        _file_signature(data_path.joinpath("renewal", f"{domain}.conf")),
+    ]
+
+
+def parse_certificate(data_path: Path, domain: str, logger=None) -> Dict[str, Any]:
+    """Extract the metadata of a certificate from its fullchain and its renewal configuration."""
+    cert_info = {
+        "common_name": domain,
+        "issuer": "Unknown",
+        "issuer_server": "Unknown",
+        "valid_from": None,
+        "valid_to": None,
+        "serial_number": "Unknown",
+        "fingerprint": "Unknown",
+        "version": "Unknown",
+        "preferred_profile": "classic",
+        "challenge": "Unknown",
+        "authenticator": "Unknown",
+        "key_type": "Unknown",
+    }
+
+    cert_file = data_path.joinpath("live", domain, "fullchain.pem")
+    try:
+        cert = x509.load_pem_x509_certificate(cert_file.read_bytes(), default_backend())
+        subject = cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        if subject:
+            cert_info["common_name"] = subject[0].value
+        issuer = cert.issuer.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        if issuer:
+            cert_info["issuer"] = issuer[0].value
+        cert_info["valid_from"] = cert.not_valid_before.astimezone().isoformat()
+        cert_info["valid_to"] = cert.not_valid_after.astimezone().isoformat()
+        cert_info["serial_number"] = str(cert.serial_number)
+        cert_info["fingerprint"] = cert.fingerprint(hashes.SHA256()).hex()
+        cert_info["version"] = cert.version.name
+    except BaseException as e:
+        if logger:
+            logger.error(f"Error while parsing certificate {cert_file}: {e}")
+
+    renewal_file = data_path.joinpath("renewal", f"{domain}.conf")
+    try:
+        if renewal_file.is_file():
+            with renewal_file.open("r") as f:
+                for line in f:
+                    key, sep, value = line.partition(" = ")
+                    if not sep or key not in RENEWAL_KEYS:
+                        continue
+                    value = value.strip()
+                    if key == "pref_challs":
+                        value = value.split(",")[0]
+                    cert_info[RENEWAL_KEYS[key]] = value
+    except BaseException as e:
+        if logger:
+            logger.error(f"Error while parsing renewal configuration {renewal_file}: {e}")
+
+    return cert_info
+
+
+def build_certificates_index(data_path: Path, previous: Optional[Dict[str, Any]] = None, logger=None) -> Dict[str, Any]:
+    """Build the certificates index of a certbot config dir, only re-parsing the certificates whose files changed since the previous index."""
+    previous_certificates = {}
+    if previous and previous.get("version") == CERTIFICATES_INDEX_VERSION:
+        previous_certificates = previous.get("certificates", {})
+
+    certificates = {}
+    for cert_file in sorted(data_path.joinpath("live").glob("*/fullchain.pem")):
+        domain = cert_file.parent.name
+        signature = _certificate_signature(data_path, domain)
+
+        entry = previous_certificates.get(domain)
+        if entry and entry.get("signature") == signature:
+            certificates[domain] = entry
+            continue
+
+        if logger:
+            logger.debug(f"Indexing certificate {domain}")
+        certificates[domain] = {"signature": signature, "info": parse_certificate(data_path, domain, logger)}
+
+    return {"version": CERTIFICATES_INDEX_VERSION, "certificates": certificates}
+
+
+def load_certificates_index(data: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    if not data:
+        return None
+    try:
+        index = loads(data)
+    except (JSONDecodeError, UnicodeDecodeError, TypeError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != CERTIFICATES_INDEX_VERSION or not isinstance(index.get("certificates"), dict):
+        return None
+    return index
+
+
+def dump_certificates_index(index: Dict[str, Any]) -> bytes:
+    return dumps(index, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def update_certificates_index(job, data_path: Path, logger=None) -> Tuple[bool, str]:
+    """Refresh the certificates index cache entry, the database is only written when the index actually changed."""
+    previous_data = job.get_cache(CERTIFICATES_INDEX_FILE, job_name=CERTIFICATES_INDEX_JOB)
+    if isinstance(previous_data, dict):
+        previous_data = previous_data.get("data")
+    previous = load_certificates_index(previous_data)
+
+    index = build_certificates_index(data_path, previous, logger)
+    content = dump_certificates_index(index)
+    if previous_data == content:
+        return True, "unchanged"
+
+    return job.cache_file(CERTIFICATES_INDEX_FILE, content, job_name=CERTIFICATES_INDEX_JOB)
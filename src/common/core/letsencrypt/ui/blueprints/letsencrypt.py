@@ -5,15 +5,13 @@ from os import getenv
 from re import fullmatch
 from subprocess import DEVNULL, PIPE, STDOUT, run
 from os.path import dirname, join, sep
+from sys import path as sys_path
 from pathlib import Path
 from shutil import rmtree
 from io import BytesIO
 from tarfile import open as tar_open
 from traceback import format_exc
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required
 
@@ -23,6 +21,19 @@ from app.routes.utils import cors_required  # type: ignore
 
 blueprint_path = dirname(__file__)
 
+# ? The certificates index helpers are shared with the certbot jobs of the plugin
+jobs_path = join(dirname(dirname(blueprint_path)), "jobs")
+if jobs_path not in sys_path:
+    sys_path.append(jobs_path)
+
+from letsencrypt_certificates import (  # type: ignore # noqa: E402
+    CERTIFICATES_INDEX_FILE,
+    CERTIFICATES_INDEX_JOB,
+    dump_certificates_index,
+    load_certificates_index,
+    parse_certificate,
+)
+
 letsencrypt = Blueprint(
     "letsencrypt",
     __name__,
@@ -86,7 +97,28 @@ def download_certificates():
                     tar.extractall(DATA_PATH)
 
 
+def get_certificates_index():
+    # ? Maintained by the certbot-new and certbot-renew jobs
+    index = load_certificates_index(DB.get_job_cache_file(CERTIFICATES_INDEX_JOB, CERTIFICATES_INDEX_FILE))
+    if index is None:
+        LOGGER.debug("No valid certificates index found, falling back to parsing the certificates")
+    return index
+
+
 def retrieve_certificates():
+    index = get_certificates_index()
+    if index is None:
+        return parse_certificates()
+
+    certificates = defaultdict(list)
+    for domain, entry in sorted(index["certificates"].items()):
+        certificates["domain"].append(domain)
+        for key, value in entry.get("info", {}).items():
+            certificates[key].append(value)
+    return certificates
+
+
+def parse_certificates():
     download_certificates()
 
     certificates = {
@@ -108,56 +140,7 @@ def retrieve_certificates():
     for cert_file in Path(DATA_PATH).joinpath("live").glob("*/fullchain.pem"):
         domain = cert_file.parent.name
         certificates["domain"].append(domain)
-        cert_info = {
-            "common_name": domain,
-            "issuer": "Unknown",
-            "issuer_server": "Unknown",
-            "valid_from": None,
-            "valid_to": None,
-            "serial_number": "Unknown",
-            "fingerprint": "Unknown",
-            "version": "Unknown",
-            "preferred_profile": "classic",
-            "challenge": "Unknown",
-            "authenticator": "Unknown",
-            "key_type": "Unknown",
-        }
-        try:
-            cert = x509.load_pem_x509_certificate(cert_file.read_bytes(), default_backend())
-            subject = cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
-            if subject:
-                cert_info["common_name"] = subject[0].value
-            issuer = cert.issuer.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
-            if issuer:
-                cert_info["issuer"] = issuer[0].value
-            cert_info["valid_from"] = cert.not_valid_before.astimezone().isoformat()
-            cert_info["valid_to"] = cert.not_valid_after.astimezone().isoformat()
-            cert_info["serial_number"] = str(cert.serial_number)
-            cert_info["fingerprint"] = cert.fingerprint(hashes.SHA256()).hex()
-            cert_info["version"] = cert.version.name
-        except BaseException as e:
-            LOGGER.debug(format_exc())
-            LOGGER.error(f"Error while parsing certificate {cert_file}: {e}")
-
-        try:
-            renewal_file = Path(DATA_PATH).joinpath("renewal", f"{domain}.conf")
-            if renewal_file.exists():
-                with renewal_file.open("r") as f:
-                    for line in f:
-                        if line.startswith("preferred_profile = "):
-                            cert_info["preferred_profile"] = line.split(" = ")[1].strip()
-                        elif line.startswith("pref_challs = "):
-                            cert_info["challenge"] = line.split(" = ")[1].strip().split(",")[0]
-                        elif line.startswith("authenticator = "):
-                            cert_info["authenticator"] = line.split(" = ")[1].strip()
-                        elif line.startswith("server = "):
-                            cert_info["issuer_server"] = line.split(" = ")[1].strip()
-                        elif line.startswith("key_type = "):
-                            cert_info["key_type"] = line.split(" = ")[1].strip()
-        except BaseException as e:
-            LOGGER.debug(format_exc())
-            LOGGER.error(f"Error while parsing renewal configuration {renewal_file}: {e}")
-
+        cert_info = parse_certificate(Path(DATA_PATH), domain, LOGGER)
         for key in cert_info:
             certificates[key].append(cert_info[key])
 
@@ -415,10 +398,16 @@ def letsencrypt_delete():
             err = DB.upsert_job_cache("", file_name, content.getvalue(), job_name="certbot-renew")
             if err:
                 return jsonify({"status": "ko", "message": f"Failed to cache letsencrypt dir: {err}"})
-            else:
-                err = DB.checked_changes(["plugins"], ["letsencrypt"], True)
-                if err:
-                    return jsonify({"status": "ko", "message": f"Failed to cache letsencrypt dir: {err}"})
+
+            index = get_certificates_index()
+            if index is not None and index["certificates"].pop(cert_name, None) is not None:
+                index_err = DB.upsert_job_cache("", CERTIFICATES_INDEX_FILE, dump_certificates_index(index), job_name=CERTIFICATES_INDEX_JOB)
+                if index_err:
+                    LOGGER.warning(f"Failed to update the certificates index: {index_err}")
+
+            err = DB.checked_changes(["plugins"], ["letsencrypt"], True)
+            if err:
+                return jsonify({"status": "ko", "message": f"Failed to cache letsencrypt dir: {err}"})
         except Exception as e:
             return jsonify({"status": "ok", "message": f"Successfully deleted certificate {cert_name}, but failed to cache letsencrypt dir: {e}"})
         return jsonify({"status": "ok", "message": f"Successfully deleted certificate {cert_name}"})
@@ -1,21 +1,16 @@
 #!/usr/bin/env python3
 
 from contextlib import suppress
-from datetime import datetime, timedelta
 from ipaddress import ip_address, ip_network
 from os import getenv, sep
-from os.path import join, normpath
+from os.path import join
 from sys import exit as sys_exit, path as sys_path
-from time import sleep
 from traceback import format_exc
 
 for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
     if deps_path not in sys_path:
         sys_path.append(deps_path)
 
-from requests import get
-from requests.exceptions import ConnectionError
-
 from logger import getLogger  # type: ignore
 from common_utils import bytes_hash  # type: ignore
 from jobs import Job  # type: ignore
@@ -91,8 +86,10 @@ try:
                 LOGGER.warning(f"Couldn't delete file {file} from cache : {err}")
         sys_exit(0)
 
+    # Download all the URLs concurrently, each URL is only fetched once even if it is used by multiple services
+    downloads = JOB.download_urls(url for urls_list in services_realip_urls.values() for url in urls_list)
+
     urls = set()
-    failed_urls = set()
     processed_urls = set()  # Track which URLs have been processed globally
     # Initialize aggregation per kind with service tracking
     aggregated_recap = {
@@ -113,104 +110,58 @@ try:
         unique_entries = set()
         content = b""
         for url in urls_list:
-            url_file = f"{bytes_hash(url, algorithm='sha1')}.list"
-            cached_url = JOB.get_cache(url_file, with_info=True, with_data=True)
+            download = downloads[url]
             try:
                 # Only count URLs that haven't been processed globally
                 if url not in processed_urls:
                     aggregated_recap["total_urls"] += 1
 
-                # If the URL has recently been downloaded, use cache
-                if url in failed_urls:
+                if download["status"] == "failed":
+                    status = 2
                     if url not in processed_urls:
                         aggregated_recap["failed_count"] += 1
-                elif (
-                    isinstance(cached_url, dict)
-                    and cached_url.get("last_update")
-                    and cached_url["last_update"] > (datetime.now().astimezone() - timedelta(hours=1)).timestamp()
-                ):
-                    LOGGER.debug(f"URL {url} has already been downloaded less than 1 hour ago, skipping download...")
+                elif download["data"] is not None:
+                    # The URL content is fresh in cache, not modified since the last download or already processed
                     if url not in processed_urls:
                         aggregated_recap["skipped_urls"] += 1
-                    # Process cached data and add to unique_entries
-                    cached_data = cached_url.get("data", b"")
-                    if cached_data:
-                        # Skip first line (URL comment) and process entries
-                        for line in cached_data.split(b"\n")[1:]:
-                            line = line.strip()
-                            if line:
-                                unique_entries.add(line)
+                    # Skip the header lines (URL and validators comments) and process entries
+                    for line in download["data"].split(b"\n"):
+                        line = line.strip()
+                        if line and not line.startswith(b"#"):
+                            unique_entries.add(line)
                 else:
-                    LOGGER.info(f"Downloading Real IP data from {url} ...")
-                    failed = False
-                    if url.startswith("file://"):
-                        try:
-                            with open(normpath(url[7:]), "rb") as f:
-                                iterable = f.readlines()
-                        except OSError as e:
-                            status = 2
-                            LOGGER.debug(format_exc())
-                            LOGGER.error(f"Error while opening file {url[7:]} : {e}")
-                            failed_urls.add(url)
-                            if url_file not in urls:
-                                aggregated_recap["failed_count"] += 1
-                            failed = True
-                    else:
-                        max_retries = 3
-                        retry_count = 0
-                        while retry_count < max_retries:
-                            try:
-                                resp = get(url, stream=True, timeout=10)
-                                break
-                            except ConnectionError as e:
-                                retry_count += 1
-                                if retry_count == max_retries:
-                                    raise e
-                                LOGGER.warning(f"Connection refused, retrying in 3 seconds... ({retry_count}/{max_retries})")
-                                sleep(3)
-
-                        if resp.status_code != 200:
-                            status = 2
-                            LOGGER.warning(f"Got status code {resp.status_code}, skipping...")
-                            failed_urls.add(url)
-                            if url_file not in urls:
-                                aggregated_recap["failed_count"] += 1
-                            failed = True
-                        else:
-                            iterable = resp.iter_lines()
-
-                    if not failed:
-                        if url not in processed_urls:
-                            aggregated_recap["downloaded_urls"] += 1
-
-                        url_content = b""
-                        count_lines = 0
-                        for line in iterable:
-                            line = line.strip()
-                            if not line or line.startswith((b"#", b";")):
-                                continue
-                            ok, data = check_line(line)
-                            if ok:
-                                unique_entries.add(data)
-                                url_content += data + b"\n"
-                                count_lines += 1
-                        if url not in processed_urls:
-                            aggregated_recap["total_lines"] += count_lines
-
-                        cached, err = JOB.cache_file(url_file, b"# Downloaded from " + url.encode("utf-8") + b"\n" + url_content)
-                        if not cached:
-                            LOGGER.error(f"Error while caching url content for {url}: {err}")
+                    if url not in processed_urls:
+                        aggregated_recap["downloaded_urls"] += 1
+
+                    url_content = b""
+                    count_lines = 0
+                    for line in JOB.read_download(download):
+                        line = line.strip()
+                        if not line or line.startswith((b"#", b";")):
+                            continue
+                        ok, data = check_line(line)
+                        if ok:
+                            unique_entries.add(data)
+                            url_content += data + b"\n"
+                            count_lines += 1
+                    if url not in processed_urls:
+                        aggregated_recap["total_lines"] += count_lines
+
+                    download["data"] = url_content
+                    cached, err = JOB.cache_download(download, url_content)
+                    if not cached:
+                        LOGGER.error(f"Error while caching url content for {url}: {err}")
             except BaseException as e:
                 status = 2
                 LOGGER.debug(format_exc())
-                LOGGER.error(f"Exception while getting {service} greylist from {url} :\n{e}")
-                failed_urls.add(url)
+                LOGGER.error(f"Exception while getting {service} realip list from {url} :\n{e}")
+                download["status"] = "failed"
                 if url not in processed_urls:
                     aggregated_recap["failed_count"] += 1
             finally:
                 # Mark URL as processed to avoid double counting
                 processed_urls.add(url)
-                urls.add(url_file)
+                urls.add(JOB.url_cache_name(url))
 
         # Build final content from unique entries, sorted for consistency
         content = b"\n".join(sorted(unique_entries)) + b"\n" if unique_entries else b""
@@ -250,6 +201,8 @@ try:
             f"Skipped (cached): {skipped}, Failed: {failed}, Total Lines: {total_lines}"
         )
 
+    JOB.log_downloads_recap(LOGGER, downloads)
+
     # Remove old files
     for url_file in JOB.job_path.glob("*.list"):
         if url_file.name == "combined.list":
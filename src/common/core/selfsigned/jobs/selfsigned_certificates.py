@@ -0,0 +1,211 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from cryptography import x509
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.x509.oid import NameOID
+
+CURVES = {"prime256v1": ec.SECP256R1, "secp256r1": ec.SECP256R1, "secp384r1": ec.SECP384R1}
+
+SUBJECT_ATTRIBUTES = {
+    "CN": NameOID.COMMON_NAME,
+    "C": NameOID.COUNTRY_NAME,
+    "ST": NameOID.STATE_OR_PROVINCE_NAME,
+    "L": NameOID.LOCALITY_NAME,
+    "O": NameOID.ORGANIZATION_NAME,
+    "OU": NameOID.ORGANIZATIONAL_UNIT_NAME,
+    "DC": NameOID.DOMAIN_COMPONENT,
+    "emailAddress": NameOID.EMAIL_ADDRESS,
+    "serialNumber": NameOID.SERIAL_NUMBER,
+    "street": NameOID.STREET_ADDRESS,
+    "title": NameOID.TITLE,
+    "GN": NameOID.GIVEN_NAME,
+    "SN": NameOID.SURNAME,
+    "UID": NameOID.USER_ID,
+}
+
+PrivateKey = Union[ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey]
+
+
+@dataclass(frozen=True)
+class CertificateRequest:
+    server: str
+    algorithm: str
+    subject: str
+    days: int
+
+
+def normalize_algorithm_name(algorithm: str) -> Tuple[str, Optional[str]]:
+    """Normalize algorithm names to handle equivalent curve names."""
+    # Mapping of equivalent curve names
+    curve_name_mapping = {
+        "prime256v1": "secp256r1",
+        "secp256r1": "prime256v1",
+        "secp384r1": "secp384r1",  # No alternative name but added for completeness
+    }
+
+    if algorithm.startswith("ec-"):
+        curve = algorithm.split("-", 1)[1]
+        if curve in curve_name_mapping:
+            alternative_curve = curve_name_mapping[curve]
+            return f"ec-{curve}", f"ec-{alternative_curve}" if alternative_curve != curve else None
+    return algorithm, None
+
+
+def parse_subject(subject: str) -> x509.Name:
+    """Convert an openssl -subj string (e.g. /CN=www.example.com/) to a x509 name."""
+    attributes = []
+    for part in (part for part in subject.split("/") if part):
+        name, sep, value = part.partition("=")
+        if not sep or name not in SUBJECT_ATTRIBUTES:
+            raise ValueError(f"unsupported subject attribute {part!r}")
+        attributes.append(x509.NameAttribute(SUBJECT_ATTRIBUTES[name], value))
+    if not attributes:
+        raise ValueError(f"empty subject {subject!r}")
+    return x509.Name(attributes)
+
+
+def check_certificate(cert_path: Path, key_path: Path, request: CertificateRequest, *, now: Optional[datetime] = None) -> Optional[str]:
+    """Return why the certificate has to be generated again, None if it is still valid."""
+    if not cert_path.is_file() or not key_path.is_file():
+        return "missing"
+
+    try:
+        certificate = x509.load_pem_x509_certificate(cert_path.read_bytes(), default_backend())
+    except ValueError:
+        return "invalid"
+
+    try:
+        not_valid_after = certificate.not_valid_after_utc
+        not_valid_before = certificate.not_valid_before_utc
+    except AttributeError:
+        not_valid_after = certificate.not_valid_after.replace(tzinfo=timezone.utc)
+        not_valid_before = certificate.not_valid_before.replace(tzinfo=timezone.utc)
+
+    now = now or datetime.now(timezone.utc)
+    # ? Same as openssl x509 -checkend 86400
+    if not_valid_after <= now + timedelta(days=1):
+        return "expiring"
+
+    # Check if the current certificate uses the same algorithm as specified in the config
+    current_algorithm = None
+    public_key = certificate.public_key()
+    if hasattr(public_key, "curve"):
+        current_algorithm = f"ec-{public_key.curve.name}"
+    elif hasattr(public_key, "key_size"):
+        current_algorithm = f"rsa-{public_key.key_size}"
+
+    normalized_algorithm, alternative_algorithm = normalize_algorithm_name(request.algorithm)
+    if current_algorithm and current_algorithm not in (normalized_algorithm, alternative_algorithm):
+        return f"algorithm ({current_algorithm}) is different from the one in the configuration ({request.algorithm})"
+    elif sorted(attribute.rfc4514_string() for attribute in certificate.subject) != sorted(v for v in request.subject.split("/") if v):
+        return "subject is different from the one in the configuration"
+    elif not_valid_after - not_valid_before != timedelta(days=request.days):
+        return "expiration date is different from the one in the configuration"
+    return None
+
+
+def generate_key(algorithm: str) -> PrivateKey:
+    if algorithm.startswith("ec-"):
+        curve = algorithm.split("-", 1)[1]
+        if curve not in CURVES:
+            raise ValueError(f"unsupported curve {curve}")
+        return ec.generate_private_key(CURVES[curve]())
+    elif algorithm.startswith("rsa-"):
+        return rsa.generate_private_key(public_exponent=65537, key_size=int(algorithm.split("-", 1)[1]))
+    raise ValueError(f"unsupported algorithm {algorithm}")
+
+
+def dump_key(key: PrivateKey) -> bytes:
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+
+
+def build_certificate(request: CertificateRequest, key_pem: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+    """Generate the self-signed certificate of the request like openssl req -x509 does, with a new key unless one is given. Returns (cert, key) in PEM."""
+    # ? The shared keys are generated by the pool itself, checking them again on each load would cost as much as an RSA key generation
+    key = serialization.load_pem_private_key(key_pem, password=None, unsafe_skip_rsa_key_validation=True) if key_pem else generate_key(request.algorithm)
+    name = parse_subject(request.subject)
+    not_valid_before = datetime.now(timezone.utc).replace(microsecond=0)
+    public_key = key.public_key()
+
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_valid_before)
+        .not_valid_after(not_valid_before + timedelta(days=request.days))
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(public_key), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    return certificate.public_bytes(serialization.Encoding.PEM), key_pem or dump_key(key)
+
+
+def _build_key(algorithm: str) -> bytes:
+    return dump_key(generate_key(algorithm))
+
+
+def generate_certificates(
+    requests: List[CertificateRequest], *, max_workers: int = 1, reuse_keys: bool = False, logger=None
+) -> Dict[str, Union[Tuple[bytes, bytes], Exception]]:
+    """Generate the certificates of the requests in a pool of threads, keyed by server. A failed generation is returned as its exception.
+
+    When reuse_keys is set, a single key is generated for all the requests with the same algorithm and subject."""
+    results: Dict[str, Union[Tuple[bytes, bytes], Exception]] = {}
+    if not requests:
+        return results
+
+    pool = None
+    workers = max(1, min(max_workers, len(requests)))
+    if workers > 1:
+        # ? cryptography releases the GIL while generating keys and signing, threads run in parallel without forking the multithreaded scheduler
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="selfsigned")
+
+    def submit(function, *args) -> Future:
+        if pool:
+            return pool.submit(function, *args)
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    try:
+        shared_keys: Dict[Tuple[str, str], Optional[bytes]] = {}
+        if reuse_keys:
+            groups = {(request.algorithm, request.subject) for request in requests}
+            key_futures = {submit(_build_key, algorithm): (algorithm, subject) for algorithm, subject in groups}
+            for future in as_completed(key_futures):
+                try:
+                    shared_keys[key_futures[future]] = future.result()
+                except Exception as e:
+                    if logger:
+                        logger.error(f"Error while generating the shared key for {key_futures[future][0]} certificates : {e}")
+                    shared_keys[key_futures[future]] = None
+
+        futures = {}
+        for request in requests:
+            key_pem = shared_keys.get((request.algorithm, request.subject))
+            if reuse_keys and key_pem is None:
+                results[request.server] = ValueError("the shared key couldn't be generated")
+                continue
+            futures[submit(build_certificate, request, key_pem)] = request.server
+
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+    finally:
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return results
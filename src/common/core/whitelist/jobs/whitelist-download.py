@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 
 from contextlib import suppress
-from datetime import datetime, timedelta
 from ipaddress import ip_address, ip_network
 from os import getenv, sep
-from os.path import join, normpath
+from os.path import join
 from re import compile as re_compile
 from sys import exit as sys_exit, path as sys_path
-from time import sleep
 from traceback import format_exc
 from typing import Tuple
 
@@ -15,9 +13,6 @@ for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in ((
     if deps_path not in sys_path:
         sys_path.append(deps_path)
 
-from requests import get
-from requests.exceptions import ConnectionError
-
 from common_utils import bytes_hash  # type: ignore
 from logger import getLogger  # type: ignore
 from jobs import Job  # type: ignore
@@ -114,9 +109,13 @@ try:
                 LOGGER.warning(f"Couldn't delete file {file} from cache : {err}")
         sys_exit(0)
 
+    # Download all the URLs concurrently, each URL is only fetched once even if it is used by multiple services or kinds
+    downloads = JOB.download_urls(url for kinds in services_whitelist_urls.values() for urls_list in kinds.values() for url in urls_list)
+
     urls = set()
-    failed_urls = set()
     processed_urls = set()  # Track which URLs have been processed globally
+    url_entries = {}  # Entries of each URL, parsed only once
+    shared_lists = {}  # Content and checksum of each distinct list, built only once
     # Initialize aggregation per kind with service tracking
     aggregated_recap = {
         kind: {
@@ -130,150 +129,117 @@ try:
         for kind in KINDS
     }
 
-    # Loop on services and kinds
-    for service, kinds in services_whitelist_urls.items():
-        for kind, urls_list in kinds.items():
-            if not urls_list:
-                if JOB.job_path.joinpath(service, f"{kind}.list").is_file():
-                    LOGGER.warning(f"{service} whitelist for {kind} is cached but no URL is configured, removing from cache...")
-                    deleted, err = JOB.del_cache(f"{kind}.list", service_id=service)
-                    if not deleted:
-                        LOGGER.warning(f"Couldn't delete {service} {kind}.list from cache : {err}")
-                continue
-
-            # Track that this service provided URLs for the current kind
-            aggregated_recap[kind]["total_services"].add(service)
-
-            # Use set to avoid duplicate entries
-            unique_entries = set()
-            content = b""
-            for url in urls_list:
-                url_file = f"{bytes_hash(url, algorithm='sha1')}.list"
-                cached_url = JOB.get_cache(url_file, with_info=True, with_data=True)
-                try:
-                    # Only count URLs that haven't been processed globally
-                    if url not in processed_urls:
-                        aggregated_recap[kind]["total_urls"] += 1
-
-                    # If the URL has recently been downloaded, use cache
-                    if url in failed_urls:
-                        if url not in processed_urls:
-                            aggregated_recap[kind]["failed_count"] += 1
-                    elif (
-                        isinstance(cached_url, dict)
-                        and cached_url.get("last_update")
-                        and cached_url["last_update"] > (datetime.now().astimezone() - timedelta(hours=1)).timestamp()
-                    ):
-                        LOGGER.debug(f"URL {url} has already been downloaded less than 1 hour ago, skipping download...")
-                        if url not in processed_urls:
-                            aggregated_recap[kind]["skipped_urls"] += 1
-                        # Process cached data and add to unique_entries
-                        cached_data = cached_url.get("data", b"")
-                        if cached_data:
-                            # Skip first line (URL comment) and process entries
-                            for line in cached_data.split(b"\n")[1:]:
-                                line = line.strip()
-                                if line:
-                                    unique_entries.add(line)
-                    else:
-                        failed = False
-                        LOGGER.info(f"Downloading whitelist data from {url} ...")
-                        if url.startswith("file://"):
-                            try:
-                                with open(normpath(url[7:]), "rb") as f:
-                                    iterable = f.readlines()
-                            except OSError as e:
-                                status = 2
-                                LOGGER.debug(format_exc())
-                                LOGGER.error(f"Error while opening file {url[7:]} : {e}")
-                                failed_urls.add(url)
-                                if url_file not in urls:
-                                    aggregated_recap[kind]["failed_count"] += 1
-                                failed = True
-                        else:
-                            max_retries = 3
-                            retry_count = 0
-                            while retry_count < max_retries:
-                                try:
-                                    resp = get(url, stream=True, timeout=10)
-                                    break
-                                except ConnectionError as e:
-                                    retry_count += 1
-                                    if retry_count == max_retries:
-                                        raise e
-                                    LOGGER.warning(f"Connection refused, retrying in 3 seconds... ({retry_count}/{max_retries})")
-                                    sleep(3)
-
-                            if resp.status_code != 200:
+    # Loop on services and kinds, the cache files are saved in the database in a single transaction at the end
+    with JOB.batch_cache() as cache_errors:
+        for service, kinds in services_whitelist_urls.items():
+            for kind, urls_list in kinds.items():
+                if not urls_list:
+                    if JOB.job_path.joinpath(service, f"{kind}.list").is_file():
+                        LOGGER.warning(f"{service} whitelist for {kind} is cached but no URL is configured, removing from cache...")
+                        deleted, err = JOB.del_cache(f"{kind}.list", service_id=service)
+                        if not deleted:
+                            LOGGER.warning(f"Couldn't delete {service} {kind}.list from cache : {err}")
+                    continue
+
+                # Track that this service provided URLs for the current kind
+                aggregated_recap[kind]["total_services"].add(service)
+
+                # Services using the same URLs for a kind share the same list
+                list_key = (kind, frozenset(urls_list))
+                if list_key not in shared_lists:
+                    # Use set to avoid duplicate entries
+                    unique_entries = set()
+                    for url in urls_list:
+                        download = downloads[url]
+                        try:
+                            # Only count URLs that haven't been processed globally
+                            if url not in processed_urls:
+                                aggregated_recap[kind]["total_urls"] += 1
+
+                            if download["status"] == "failed":
                                 status = 2
-                                LOGGER.warning(f"Got status code {resp.status_code}, skipping...")
-                                failed_urls.add(url)
-                                if url_file not in urls:
+                                if url not in processed_urls:
                                     aggregated_recap[kind]["failed_count"] += 1
-                                failed = True
+                            elif url in url_entries:
+                                pass
+                            elif download["data"] is not None:
+                                # The URL content is fresh in cache or not modified since the last download
+                                if url not in processed_urls:
+                                    aggregated_recap[kind]["skipped_urls"] += 1
+                                # Skip the header lines (URL and validators comments) and process entries
+                                url_entries[url] = [line for line in map(bytes.strip, download["data"].split(b"\n")) if line and not line.startswith(b"#")]
                             else:
-                                iterable = resp.iter_lines()
-
-                        if not failed:
-                            if url not in processed_urls:
-                                aggregated_recap[kind]["downloaded_urls"] += 1
-
-                            url_content = b""
-                            count_lines = 0
-                            for line in iterable:
-                                line = line.strip()
-                                if not line or line.startswith((b"#", b";")):
-                                    continue
-                                elif kind != "USER_AGENT":
-                                    line = line.split(b" ")[0]
-                                ok, data = check_line(kind, line)
-                                if ok:
-                                    unique_entries.add(data)
-                                    url_content += data + b"\n"
-                                    count_lines += 1
+                                if url not in processed_urls:
+                                    aggregated_recap[kind]["downloaded_urls"] += 1
+
+                                entries = []
+                                for line in JOB.read_download(download):
+                                    line = line.strip()
+                                    if not line or line.startswith((b"#", b";")):
+                                        continue
+                                    elif kind != "USER_AGENT":
+                                        line = line.split(b" ")[0]
+                                    ok, data = check_line(kind, line)
+                                    if ok:
+                                        entries.append(data)
+                                url_entries[url] = entries
+                                if url not in processed_urls:
+                                    aggregated_recap[kind]["total_lines"] += len(entries)
+
+                                cached, err = JOB.cache_download(download, b"".join(entry + b"\n" for entry in entries))
+                                if not cached:
+                                    LOGGER.error(f"Error while caching url content for {url}: {err}")
+                        except BaseException as e:
+                            status = 2
+                            LOGGER.debug(format_exc())
+                            LOGGER.error(f"Exception while getting {service} whitelist from {url} :\n{e}")
+                            download["status"] = "failed"
+                            url_entries.pop(url, None)
                             if url not in processed_urls:
-                                aggregated_recap[kind]["total_lines"] += count_lines
-
-                            cached, err = JOB.cache_file(url_file, b"# Downloaded from " + url.encode("utf-8") + b"\n" + url_content)
-                            if not cached:
-                                LOGGER.error(f"Error while caching url content for {url}: {err}")
-                except BaseException as e:
+                                aggregated_recap[kind]["failed_count"] += 1
+                        finally:
+                            # Mark URL as processed to avoid double counting
+                            processed_urls.add(url)
+                            urls.add(JOB.url_cache_name(url))
+
+                        unique_entries.update(url_entries.get(url, ()))
+
+                    # Build final content from unique entries, sorted for consistency
+                    content = b"".join(entry + b"\n" for entry in sorted(unique_entries))
+                    shared_lists[list_key] = (content, bytes_hash(content) if content else "")
+
+                content, content_hash = shared_lists[list_key]
+                if not content:
+                    # ? The service keeps its previous list, the shared list it references must be kept as well
+                    shared_name = JOB.shared_list_referenced(f"{kind}.list", service_id=service)
+                    if shared_name:
+                        urls.add(shared_name)
+                    continue
+                urls.add(JOB.shared_list_name(content_hash))
+
+                # Check if file has changed
+                new_hash = bytes_hash(JOB.shared_list_reference(content_hash))
+                old_hash = JOB.cache_hash(f"{kind}.list", service_id=service)
+                if new_hash == old_hash:
+                    LOGGER.debug(f"{service} file {kind}.list is identical to cache file, reload is not needed")
+                    continue
+                elif old_hash:
+                    LOGGER.debug(f"{service} file {kind}.list is different than cache file, reload is needed")
+                else:
+                    LOGGER.debug(f"New {service} file {kind}.list is not in cache, reload is needed")
+
+                # Put the list in cache once and reference it from the service
+                cached, err = JOB.cache_shared_list(f"{kind}.list", content, service_id=service, checksum=content_hash)
+                if not cached:
+                    LOGGER.error(f"Error while caching whitelist : {err}")
                     status = 2
-                    LOGGER.debug(format_exc())
-                    LOGGER.error(f"Exception while getting {service} whitelist from {url} :\n{e}")
-                    failed_urls.add(url)
-                    if url not in processed_urls:
-                        aggregated_recap[kind]["failed_count"] += 1
-                finally:
-                    # Mark URL as processed to avoid double counting
-                    processed_urls.add(url)
-                    urls.add(url_file)
-
-            # Build final content from unique entries, sorted for consistency
-            content = b"\n".join(sorted(unique_entries)) + b"\n" if unique_entries else b""
-
-            if not content:
-                continue
-
-            # Check if file has changed
-            new_hash = bytes_hash(content)
-            old_hash = JOB.cache_hash(f"{kind}.list", service_id=service)
-            if new_hash == old_hash:
-                LOGGER.debug(f"{service} file {kind}.list is identical to cache file, reload is not needed")
-                continue
-            elif old_hash:
-                LOGGER.debug(f"{service} file {kind}.list is different than cache file, reload is needed")
-            else:
-                LOGGER.debug(f"New {service} file {kind}.list is not in cache, reload is needed")
+                    continue
 
-            # Put file in cache
-            cached, err = JOB.cache_file(f"{kind}.list", content, service_id=service, checksum=new_hash)
-            if not cached:
-                LOGGER.error(f"Error while caching whitelist : {err}")
-                status = 2
-                continue
+                status = 1 if status != 2 else 2
 
-            status = 1 if status != 2 else 2
+    # The lists which could not be saved in the database are not used by the other instances
+    if cache_errors:
+        status = 2
 
     # Log a detailed recap per kind across services, only if there is at least one service using the kind
     for kind, recap in aggregated_recap.items():
@@ -289,6 +255,8 @@ try:
             f"Skipped (cached): {skipped}, Failed: {failed}, Total Lines: {total_lines}"
         )
 
+    JOB.log_downloads_recap(LOGGER, downloads)
+
     # Remove old files
     for url_file in JOB.job_path.glob("*.list"):
         LOGGER.debug(f"Checking if {url_file} is still in use ...")
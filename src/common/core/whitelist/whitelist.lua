@@ -19,9 +19,9 @@ local get_asn = utils.get_asn
 local regex_match = utils.regex_match
 local get_variable = utils.get_variable
 local deduplicate_list = utils.deduplicate_list
+local open_list = utils.open_list
 local ipmatcher_new = ipmatcher.new
 local tostring = tostring
-local open = io.open
 local env_set = env.set
 
 function whitelist:initialize(ctx)
@@ -107,7 +107,7 @@ function whitelist:init()
 	for key in server_name:gmatch("%S+") do
 		for kind, _ in pairs(whitelists) do
 			local file_path = "/var/cache/bunkerweb/whitelist/" .. key .. "/" .. kind .. ".list"
-			local f = open(file_path, "r")
+			local f = open_list(file_path)
 			if f then
 				for line in f:lines() do
 					if line ~= "" then
@@ -5,21 +5,25 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager, suppress
 from copy import deepcopy
 from datetime import datetime, timedelta
+from hashlib import sha256
 from io import BytesIO
-from json import JSONDecodeError, loads
+from json import JSONDecodeError, dumps, loads
 from logging import Logger
-from os import _exit, getenv, sep
+from math import ceil, log2
+from os import _exit, getenv, getpid, sep
 from os.path import join as os_join
 from pathlib import Path
 from re import Match, compile as re_compile, escape, error as RegexError, search
+from socket import gethostname
 from sys import argv, path as sys_path
 from tarfile import open as tar_open
-from threading import Lock
+from threading import Event, Lock, Thread
 from traceback import format_exc
-from typing import Any, Dict, List, Literal, Optional, Set, Tuple, Union
-from time import sleep
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Tuple, Union
+from time import monotonic, sleep
 from uuid import uuid4
 from warnings import filterwarnings
+from zlib import compress, decompress
 
 from model import (
     Base,
@@ -33,6 +37,7 @@ from model import (
     Plugin_pages,
     Jobs_cache,
     Jobs_runs,
+    Jobs_runs_daily,
     Custom_configs,
     Selects,
     Multiselects,
@@ -42,6 +47,9 @@ from model import (
     Template_settings,
     Template_custom_configs,
     Metadata,
+    Failover_snapshot,
+    Failover_objects,
+    Locks,
     Users,
     UserSessions,
 )
@@ -53,11 +61,29 @@ for deps_path in [os_join(sep, "usr", "share", "bunkerweb", *paths) for paths in
 from common_utils import bytes_hash  # type: ignore
 
 from pymysql import install_as_MySQLdb
-from sqlalchemy import case, create_engine, event, MetaData as sql_metadata, func, join, select as db_select, text
+from sqlalchemy import (
+    and_,
+    case,
+    create_engine,
+    delete as db_delete,
+    event,
+    insert as db_insert,
+    MetaData as sql_metadata,
+    func,
+    join,
+    or_,
+    select as db_select,
+    text,
+    update as db_update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import (
     ArgumentError,
     DatabaseError,
+    DBAPIError,
     OperationalError,
     ProgrammingError,
     SAWarning,
@@ -82,6 +108,182 @@ def set_sqlite_pragma(dbapi_connection, _):
 
 filterwarnings("ignore", category=SAWarning, message="DELETE statement on table .* expected to delete")
 
+DATABASE_LOCK = "database"
+LOCK_LEASE = 60
+JOBS_RUNS_CLEANUP_BATCH = 5000  # ? Number of jobs runs deleted per transaction when cleaning up the excess ones
+JOBS_RUNS_HISTOGRAM_MIN = 0.001  # ? Upper bound in seconds of the first bucket of the jobs runs durations histograms
+JOBS_RUNS_HISTOGRAM_STEPS = 8  # ? Buckets per doubling of the duration, the percentiles are precise to about 9%
+JOB_CACHE_QUERY_BATCH = 500  # ? Number of file names looked up per query when updating many cache files at once
+
+
+class DatabaseLock:
+    """Lock shared by every process connected to the same database, even from different hosts.
+
+    PostgreSQL and MySQL/MariaDB advisory locks are held by a dedicated connection, the server releases them if their owner dies.
+    SQLite (and Oracle) locks are rows of the bw_locks table created within a BEGIN IMMEDIATE transaction, they expire after their lease
+    unless their owner renews it. The bw_locks row is written on every database to know who owns a lock.
+    """
+
+    def __init__(self, db: "Database", name: str = DATABASE_LOCK, *, timeout: float = 30, lease: int = LOCK_LEASE, owner: Optional[str] = None) -> None:
+        self.db = db
+        self.name = name
+        self.timeout = timeout
+        self.lease = lease
+        self.owner = owner or f"{gethostname()}:{getpid()}:{uuid4().hex[:8]}"
+        self.acquired = False
+        self._conn = None
+        self._stop_renewing = Event()
+        self._renew_thread = None
+
+    @property
+    def dialect(self) -> str:
+        return self.db.sql_engine.dialect.name
+
+    @property
+    def advisory_key(self) -> int:
+        return int.from_bytes(sha256(self.name.encode("utf-8")).digest()[:8], "big", signed=True)
+
+    @property
+    def advisory_name(self) -> str:
+        return f"bunkerweb_{self.name}"[:64]
+
+    def __enter__(self) -> "DatabaseLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.release()
+
+    def _write_owner(self, conn) -> None:
+        current_time = datetime.now().astimezone()
+        conn.execute(db_delete(Locks).where(Locks.name == self.name))
+        conn.execute(
+            db_insert(Locks).values(name=self.name, owner=self.owner, acquired_at=current_time, expires_at=current_time + timedelta(seconds=self.lease))
+        )
+
+    def _try_acquire_row(self) -> bool:
+        with self.db.sql_engine.connect() as conn:
+            dbapi_connection = conn.connection.driver_connection
+            isolation_level = getattr(dbapi_connection, "isolation_level", None)
+            try:
+                if self.dialect == "sqlite":
+                    # ? Take the write lock right away so that only one process at a time can check and claim the row
+                    dbapi_connection.isolation_level = None
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+                row = conn.execute(db_select(Locks.owner, Locks.expires_at).where(Locks.name == self.name)).first()
+                if row and row.owner != self.owner and row.expires_at.astimezone() > datetime.now().astimezone():
+                    conn.rollback()
+                    return False
+
+                self._write_owner(conn)
+                conn.commit()
+                return True
+            except DBAPIError as e:
+                # ? Another process holds the write lock for too long or claimed the row at the same time
+                self.db.logger.debug(f"Can't claim the {self.name} lock row yet: {e}")
+                conn.rollback()
+                return False
+            finally:
+                if self.dialect == "sqlite":
+                    dbapi_connection.isolation_level = isolation_level
+
+    def _acquire_advisory(self, timeout: float) -> bool:
+        self._conn = self.db.sql_engine.connect()
+        try:
+            if self.dialect == "postgresql":
+                self._conn.execute(text("SELECT set_config('lock_timeout', :timeout, false)"), {"timeout": f"{max(int(timeout * 1000), 1)}ms"})
+                self._conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": self.advisory_key})
+                self._conn.execute(text("SELECT set_config('lock_timeout', '0', false)"))
+            elif self._conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": self.advisory_name, "timeout": max(int(timeout), 0)}).scalar() != 1:
+                raise TimeoutError
+            self._write_owner(self._conn)
+            self._conn.commit()
+            return True
+        except (DBAPIError, TimeoutError):
+            self._conn.rollback()
+            self._conn.close()
+            self._conn = None
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Acquire the lock, waiting at most timeout seconds for its current owner to release it."""
+        timeout = self.timeout if timeout is None else timeout
+        if self.acquired:
+            return True
+
+        if self.db.readonly:
+            self.db.logger.debug(f"The database is read-only, not taking the {self.name} lock")
+            self.acquired = True
+            return True
+
+        if self.dialect in ("postgresql", "mysql", "mariadb"):
+            self.acquired = self._acquire_advisory(timeout)
+        else:
+            deadline = monotonic() + timeout
+            delay = 0.005
+            while not (acquired := self._try_acquire_row()) and monotonic() < deadline:
+                sleep(min(delay, max(deadline - monotonic(), 0)))
+                delay = min(delay * 2, 0.1)
+            self.acquired = acquired
+
+        if not self.acquired:
+            owner = self.db.get_lock_owner(self.name)
+            self.db.logger.warning(f"Couldn't acquire the {self.name} lock within {timeout}s" + (f", it is owned by {owner['owner']}" if owner else ""))
+            return False
+
+        self._stop_renewing.clear()
+        self._renew_thread = Thread(target=self._renew_loop, name=f"lock-{self.name}", daemon=True)
+        self._renew_thread.start()
+        return True
+
+    def renew(self) -> None:
+        """Push the expiry of the lock row back by one lease."""
+        with self.db.sql_engine.begin() as conn:
+            renewed = conn.execute(
+                db_update(Locks)
+                .where(Locks.name == self.name, Locks.owner == self.owner)
+                .values(expires_at=datetime.now().astimezone() + timedelta(seconds=self.lease))
+            ).rowcount
+            if not renewed:
+                # ? The row disappeared (e.g. the database was restored), write it back
+                self._write_owner(conn)
+
+    def _renew_loop(self) -> None:
+        while not self._stop_renewing.wait(self.lease / 3):
+            try:
+                self.renew()
+            except BaseException as e:
+                self.db.logger.warning(f"Couldn't renew the {self.name} lock: {e}")
+
+    def release(self) -> None:
+        """Release the lock if it is held."""
+        if not self.acquired:
+            return
+        self.acquired = False
+
+        self._stop_renewing.set()
+        if self._renew_thread:
+            self._renew_thread.join()
+            self._renew_thread = None
+
+        if self.db.readonly:
+            return
+
+        try:
+            conn = self._conn or self.db.sql_engine.connect()
+            with conn:
+                conn.execute(db_delete(Locks).where(Locks.name == self.name, Locks.owner == self.owner))
+                if self.dialect == "postgresql":
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.advisory_key})
+                elif self.dialect in ("mysql", "mariadb"):
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.advisory_name})
+                conn.commit()
+        except BaseException as e:
+            self.db.logger.warning(f"Couldn't release the {self.name} lock: {e}")
+        finally:
+            self._conn = None
+
 
 class Database:
     DB_STRING_RX = re_compile(r"^(?P<database>(mariadb|mysql)(\+pymysql)?|sqlite(\+pysqlite)?|postgresql(\+psycopg)?|oracle(\+oracledb)?):/+(?P<path>/[^\s]+)")
@@ -96,6 +298,7 @@ class Database:
         """Initialize the database"""
         self.logger = logger
         self.readonly = False
+        self._locks_table_ready = False
         self.last_connection_retry = None
         self.__ignore_regex_check = getenv("IGNORE_REGEX_CHECK", "no").lower() == "yes"
 
@@ -534,6 +737,7 @@ class Database:
             "last_pro_plugins_change": None,
             "last_instances_change": None,
             "reload_ui_plugins": False,
+            "apply_generation": 0,
             "integration": "unknown",
             "version": "1.6.8",
             "database_version": "Unknown",  # ? Extracted from the database
@@ -568,6 +772,143 @@ class Database:
 
         return data
 
+    def get_apply_status(self) -> Dict[str, Any]:
+        """Get the scheduler apply status (pending changes and apply generation) with a single lightweight query"""
+        status = {"ready": False, "generation": 0}
+        with self._db_session() as session:
+            metadata = (
+                session.query(Metadata)
+                .with_entities(
+                    Metadata.is_initialized,
+                    Metadata.first_config_saved,
+                    Metadata.custom_configs_changed,
+                    Metadata.external_plugins_changed,
+                    Metadata.pro_plugins_changed,
+                    Metadata.instances_changed,
+                    Metadata.apply_generation,
+                    session.query(Plugins.id).filter_by(config_changed=True).exists().label("plugins_config_changed"),
+                )
+                .filter_by(id=1)
+                .first()
+            )
+
+        if not metadata:
+            return status
+
+        status["generation"] = metadata.apply_generation or 0
+        status["ready"] = bool(
+            metadata.is_initialized
+            and metadata.first_config_saved
+            and not any(
+                (
+                    metadata.custom_configs_changed,
+                    metadata.external_plugins_changed,
+                    metadata.pro_plugins_changed,
+                    metadata.instances_changed,
+                    metadata.plugins_config_changed,
+                )
+            )
+        )
+        return status
+
+    def get_collection_version(self, collection: Literal["custom_configs", "jobs", "jobs_cache", "instances"]) -> Optional[str]:
+        """Get a fingerprint of a collection that changes whenever its content may have changed, built from the change timestamps of the metadata
+        and from aggregates of the identity columns (the large columns are never read), returns None if it can't be computed"""
+        with self._db_session() as session:
+            try:
+                if collection == "custom_configs":
+                    # ? The settings (templates and drafts services) are part of the custom configs listing
+                    values = session.query(
+                        session.query(Metadata.last_custom_configs_change).filter_by(id=1).scalar_subquery(),
+                        session.query(func.max(Plugins.last_config_change)).scalar_subquery(),
+                    ).first()
+                elif collection == "jobs":
+                    values = session.query(
+                        session.query(Metadata.last_external_plugins_change).filter_by(id=1).scalar_subquery(),
+                        session.query(Metadata.last_pro_plugins_change).filter_by(id=1).scalar_subquery(),
+                        session.query(func.count(Jobs.name)).scalar_subquery(),
+                        session.query(func.max(Jobs_runs.id)).scalar_subquery(),
+                        session.query(func.count(Jobs_cache.id)).scalar_subquery(),
+                        session.query(func.max(Jobs_cache.last_update)).scalar_subquery(),
+                    ).first()
+                elif collection == "jobs_cache":
+                    values = session.query(
+                        session.query(func.count(Jobs_cache.id)).scalar_subquery(),
+                        session.query(func.max(Jobs_cache.id)).scalar_subquery(),
+                        session.query(func.max(Jobs_cache.last_update)).scalar_subquery(),
+                    ).first()
+                elif collection == "instances":
+                    # ? The instances replaced without marking the change still move the count or the last creation date
+                    values = session.query(
+                        session.query(Metadata.last_instances_change).filter_by(id=1).scalar_subquery(),
+                        session.query(func.count(Instances.hostname)).scalar_subquery(),
+                        session.query(func.max(Instances.creation_date)).scalar_subquery(),
+                    ).first()
+                else:
+                    return None
+            except BaseException as e:
+                self.logger.debug(f"Can't compute the version of the {collection} collection: {e}")
+                return None
+
+        return "|".join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values or ())
+
+    def wait_for_apply(self, *, timeout: float = 240, min_generation: int = 0, interval: float = 0.1, max_interval: float = 1.0) -> Tuple[bool, int]:
+        """Block until the scheduler has no pending changes and reached the given apply generation, returns whether it did before the timeout"""
+        deadline = datetime.now().astimezone() + timedelta(seconds=timeout)
+        generation = 0
+        while True:
+            try:
+                status = self.get_apply_status()
+                generation = status["generation"]
+                if status["ready"] and generation >= min_generation:
+                    return True, generation
+            except BaseException as e:
+                self.logger.debug(f"Can't retrieve the scheduler apply status: {e}")
+
+            remaining = (deadline - datetime.now().astimezone()).total_seconds()
+            if remaining <= 0:
+                return False, generation
+            sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+
+    def lock(self, name: str = DATABASE_LOCK, *, timeout: float = 30, lease: int = LOCK_LEASE) -> DatabaseLock:
+        """Return a lock shared with every process using this database, use it as a context manager and check its acquired attribute"""
+        if not self.readonly and not self._locks_table_ready:
+            try:
+                # ? The table may not exist yet on databases created before it was added
+                Locks.__table__.create(self.sql_engine, checkfirst=True)
+                self._locks_table_ready = True
+            except BaseException as e:
+                self.logger.debug(f"Can't create the {Locks.__tablename__} table: {e}")
+        return DatabaseLock(self, name, timeout=timeout, lease=lease)
+
+    def get_lock_owner(self, name: str = DATABASE_LOCK) -> Optional[Dict[str, Any]]:
+        """Get the owner of a lock if it is currently held"""
+        try:
+            with self.sql_engine.connect() as conn:
+                row = conn.execute(db_select(Locks.owner, Locks.acquired_at, Locks.expires_at).where(Locks.name == name)).first()
+        except BaseException as e:
+            self.logger.debug(f"Can't retrieve the owner of the {name} lock: {e}")
+            return None
+
+        if not row or row.expires_at.astimezone() <= datetime.now().astimezone():
+            return None
+        return {"owner": row.owner, "acquired_at": row.acquired_at.astimezone(), "expires_at": row.expires_at.astimezone()}
+
+    def is_locked(self, name: str = DATABASE_LOCK) -> bool:
+        """Check if a lock is currently held"""
+        return self.get_lock_owner(name) is not None
+
+    def wait_for_lock(self, name: str = DATABASE_LOCK, *, timeout: float = 30) -> bool:
+        """Block until a lock is released, returns whether it was before the timeout"""
+        owner = self.get_lock_owner(name)
+        if not owner:
+            return True
+
+        self.logger.info(f"The {name} lock is held by {owner['owner']}, waiting for it to be released ...")
+        with self.lock(name, timeout=timeout) as lock:
+            return lock.acquired
+
     def set_metadata(self, data: Dict[str, Any]) -> str:
         """Set the metadata values"""
         with self._db_session() as session:
@@ -597,8 +938,10 @@ class Database:
         changes: Optional[List[str]] = None,
         plugins_changes: Optional[Union[Literal["all"], Set[str], List[str], Tuple[str]]] = None,
         value: Optional[bool] = False,
+        *,
+        applied: bool = False,
     ) -> str:
-        """Set changed bit for config, custom configs, instances and plugins"""
+        """Set changed bit for config, custom configs, instances and plugins, and bump the apply generation when the scheduler finished applying them"""
         changes = changes or ["config", "custom_configs", "external_plugins", "pro_plugins", "instances", "ui_plugins"]
         plugins_changes = plugins_changes or set()
         with self._db_session() as session:
@@ -630,6 +973,8 @@ class Database:
                     metadata.last_instances_change = current_time
                 if "ui_plugins" in changes:
                     metadata.reload_ui_plugins = value
+                if applied:
+                    metadata.apply_generation = (metadata.apply_generation or 0) + 1
 
                 if plugins_changes:
                     if plugins_changes == "all":
@@ -1973,6 +2318,71 @@ class Database:
 
         return changed_plugins
 
+    def _upsert_custom_configs(self, session: scoped_session, custom_configs: List[Dict[str, Any]], method: str) -> Tuple[List[Custom_configs], str]:
+        """Update the existing custom configs in the session and return the ones to add alongside the warnings"""
+        message = ""
+        to_put = []
+        endl = "\n"
+        for custom_config in custom_configs:
+            if "exploded" in custom_config:
+                config = {"data": custom_config["value"], "method": method, "is_draft": bool(custom_config.get("is_draft", False))}
+
+                if custom_config["exploded"][0]:
+                    if not session.query(Services).with_entities(Services.id).filter_by(id=custom_config["exploded"][0]).first():
+                        message += f"{endl if message else ''}Service {custom_config['exploded'][0]} not found, please check your config"
+
+                    config.update(
+                        {
+                            "service_id": custom_config["exploded"][0],
+                            "type": custom_config["exploded"][1],
+                            "name": custom_config["exploded"][2],
+                        }
+                    )
+                else:
+                    config.update(
+                        {
+                            "type": custom_config["exploded"][1],
+                            "name": custom_config["exploded"][2],
+                        }
+                    )
+
+                custom_config = config
+
+            custom_config["type"] = custom_config["type"].strip().replace("-", "_").lower()  # type: ignore
+            custom_config["is_draft"] = bool(custom_config.get("is_draft", False))
+            custom_config["data"] = custom_config["data"].encode("utf-8") if isinstance(custom_config["data"], str) else custom_config["data"]
+            custom_config["checksum"] = custom_config.get("checksum", bytes_hash(custom_config["data"], algorithm="sha256"))  # type: ignore
+
+            service_id = custom_config.get("service_id") or None
+            filters = {
+                "type": custom_config["type"],
+                "name": custom_config["name"],
+                "service_id": service_id,
+            }
+
+            custom_conf = session.query(Custom_configs).filter_by(**filters).first()
+
+            if not custom_conf:
+                to_put.append(Custom_configs(**custom_config))
+            elif method == "manual" and custom_conf.method in {"manual", "ui", "api"}:
+                should_update_data = custom_config["checksum"] != custom_conf.checksum
+                if should_update_data:
+                    custom_conf.data = custom_config["data"]
+                    custom_conf.checksum = custom_config["checksum"]
+                if custom_conf.is_draft != custom_config["is_draft"] or should_update_data:
+                    custom_conf.is_draft = custom_config["is_draft"]
+            elif self._methods_are_compatible(method, custom_conf.method):
+                should_update_data = custom_config["checksum"] != custom_conf.checksum
+                if should_update_data:
+                    custom_conf.data = custom_config["data"]
+                    custom_conf.checksum = custom_config["checksum"]
+                if custom_conf.is_draft != custom_config["is_draft"] or should_update_data:
+                    custom_conf.is_draft = custom_config["is_draft"]
+                    custom_conf.method = method
+                custom_conf.is_draft = custom_config["is_draft"]
+
+        return to_put, message
+
     def save_custom_configs(
         self,
         custom_configs: List[
@@ -1994,7 +2404,7 @@ class Database:
         changed: Optional[bool] = True,
     ) -> str:
         """Save the custom configs in the database"""
-        message = ""
+        endl = "\n"
         with self._db_session() as session:
             if self.readonly:
                 return "The database is read-only, the changes will not be saved"
@@ -2002,65 +2412,43 @@ class Database:
             # Delete all the old config
             session.query(Custom_configs).filter(Custom_configs.method == method).delete()
 
-            to_put = []
-            endl = "\n"
-            for custom_config in custom_configs:
-                if "exploded" in custom_config:
-                    config = {"data": custom_config["value"], "method": method, "is_draft": bool(custom_config.get("is_draft", False))}
+            to_put, message = self._upsert_custom_configs(session, custom_configs, method)
 
-                    if custom_config["exploded"][0]:
-                        if not session.query(Services).with_entities(Services.id).filter_by(id=custom_config["exploded"][0]).first():
-                            message += f"{endl if message else ''}Service {custom_config['exploded'][0]} not found, please check your config"
+            if changed:
+                with suppress(ProgrammingError, OperationalError):
+                    metadata = session.query(Metadata).get(1)
+                    if metadata is not None:
+                        metadata.custom_configs_changed = True
+                        metadata.last_custom_configs_change = datetime.now().astimezone()
 
-                        config.update(
-                            {
-                                "service_id": custom_config["exploded"][0],
-                                "type": custom_config["exploded"][1],
-                                "name": custom_config["exploded"][2],
-                            }
-                        )
-                    else:
-                        config.update(
-                            {
-                                "type": custom_config["exploded"][1],
-                                "name": custom_config["exploded"][2],
-                            }
-                        )
+            try:
+                session.add_all(to_put)
+                session.commit()
+            except BaseException as e:
+                return f"{f'{message}{endl}' if message else ''}{e}"
+
+        return message
 
-                    custom_config = config
+    def save_custom_configs_changes(
+        self,
+        custom_configs: List[Dict[str, Any]],
+        removed_custom_configs: List[List[Optional[str]]],
+        method: str,
+        changed: Optional[bool] = True,
+    ) -> str:
+        """Save only the given custom configs and delete the removed ones ([service_id, type, name]) in the database, leaving the others untouched"""
+        endl = "\n"
+        with self._db_session() as session:
+            if self.readonly:
+                return "The database is read-only, the changes will not be saved"
 
-                custom_config["type"] = custom_config["type"].strip().replace("-", "_").lower()  # type: ignore
-                custom_config["is_draft"] = bool(custom_config.get("is_draft", False))
-                custom_config["data"] = custom_config["data"].encode("utf-8") if isinstance(custom_config["data"], str) else custom_config["data"]
-                custom_config["checksum"] = custom_config.get("checksum", bytes_hash(custom_config["data"], algorithm="sha256"))  # type: ignore
+            for service_id, config_type, name in removed_custom_configs:
+                session.query(Custom_configs).filter_by(
+                    service_id=service_id or None, type=(config_type or "").strip().replace("-", "_").lower(), name=name, method=method
+                ).delete()
 
-                service_id = custom_config.get("service_id") or None
-                filters = {
-                    "type": custom_config["type"],
-                    "name": custom_config["name"],
-                    "service_id": service_id,
-                }
+            to_put, message = self._upsert_custom_configs(session, custom_configs, method)
 
-                custom_conf = session.query(Custom_configs).filter_by(**filters).first()
-
-                if not custom_conf:
-                    to_put.append(Custom_configs(**custom_config))
-                elif method == "manual" and custom_conf.method in {"manual", "ui", "api"}:
-                    should_update_data = custom_config["checksum"] != custom_conf.checksum
-                    if should_update_data:
-                        custom_conf.data = custom_config["data"]
-                        custom_conf.checksum = custom_config["checksum"]
-                    if custom_conf.is_draft != custom_config["is_draft"] or should_update_data:
-                        custom_conf.is_draft = custom_config["is_draft"]
-                elif self._methods_are_compatible(method, custom_conf.method):
-                    should_update_data = custom_config["checksum"] != custom_conf.checksum
-                    if should_update_data:
-                        custom_conf.data = custom_config["data"]
-                        custom_conf.checksum = custom_config["checksum"]
-                    if custom_conf.is_draft != custom_config["is_draft"] or should_update_data:
-                        custom_conf.is_draft = custom_config["is_draft"]
-                        custom_conf.method = method
-                    custom_conf.is_draft = custom_config["is_draft"]
             if changed:
                 with suppress(ProgrammingError, OperationalError):
                     metadata = session.query(Metadata).get(1)
@@ -2415,14 +2803,31 @@ class Database:
         if multiple:
             with self._db_session() as session:
                 query = session.query(Settings).with_entities(Settings.id, Settings.default).filter(Settings.multiple.in_(multiple.keys()))
+                group_settings = [setting for setting in query if multiple_groups.get(setting.id) in multiple]
 
-                for setting in query:
-                    group_key = multiple_groups.get(setting.id)
-                    if group_key is None or group_key not in multiple:
-                        continue
+                # Resolve the templates defaults of the suffixed settings with a single query instead of one per suffix
+                windows_templates = {window: templates.get(window, "") or templates.get("global", "") for windows in multiple.values() for window in windows}
+                template_defaults = {}
+                if group_settings and any(windows_templates.values()):
+                    query = (
+                        session.query(Template_settings)
+                        .with_entities(Template_settings.template_id, Template_settings.setting_id, Template_settings.suffix, Template_settings.default)
+                        .filter(
+                            Template_settings.template_id.in_({template for template in windows_templates.values() if template}),
+                            Template_settings.setting_id.in_([setting.id for setting in group_settings]),
+                            Template_settings.suffix > 0,
+                        )
+                        .order_by(Template_settings.order)
+                    )
 
-                    for window, suffixes in multiple[group_key].items():
-                        template = templates.get(window, "") or templates.get("global", "")
+                    for template_setting in query:
+                        template_defaults.setdefault(
+                            (template_setting.template_id, template_setting.setting_id, template_setting.suffix), template_setting.default
+                        )
+
+                for setting in group_settings:
+                    for window, suffixes in multiple[multiple_groups[setting.id]].items():
+                        template = windows_templates[window]
                         for suffix in map(int, suffixes):
                             if window == "global" or service:
                                 key = f"{setting.id}_{suffix}"
@@ -2431,12 +2836,8 @@ class Database:
 
                             default = self._empty_if_none(setting.default)
                             value = deepcopy(default)
-                            if template:
-                                template_setting = (
-                                    session.query(Template_settings).filter_by(template_id=template, setting_id=setting.id, suffix=suffix).first()
-                                )
-                                if template_setting is not None:
-                                    value = self._empty_if_none(template_setting.default)
+                            if template and (template, setting.id, suffix) in template_defaults:
+                                value = self._empty_if_none(template_defaults[(template, setting.id, suffix)])
 
                             if key not in config:
                                 config[key] = (
@@ -2502,38 +2903,51 @@ class Database:
                     return dict_custom_configs
                 return custom_configs
 
-            template_entities = [Template_custom_configs.type, Template_custom_configs.name, Template_custom_configs.checksum]
-            if with_data:
-                template_entities.append(Template_custom_configs.data)
+            services_templates = {
+                service_id: db_config[f"{service_id}_USE_TEMPLATE"] for service_id in allowed_services if db_config.get(f"{service_id}_USE_TEMPLATE")
+            }
+            if not services_templates:
+                template_configs = {}
+            else:
+                # Fetch the custom configs of every used template at once and resolve them in memory
+                template_entities = [
+                    Template_custom_configs.template_id,
+                    Template_custom_configs.type,
+                    Template_custom_configs.name,
+                    Template_custom_configs.checksum,
+                ]
+                if with_data:
+                    template_entities.append(Template_custom_configs.data)
 
-            for service_id in allowed_services:
-                for key, value in db_config.items():
-                    if key.startswith(f"{service_id}_"):
-                        for template_config in (
-                            session.query(Template_custom_configs)
-                            .with_entities(*template_entities)
-                            .filter_by(template_id=value)
-                            .order_by(Template_custom_configs.order)
-                        ):
-                            config_type = template_config.type.replace("_", "-").replace(".conf", "").strip()
-                            if not any(
-                                custom_config["service_id"] == service_id
-                                and custom_config["type"] == config_type
-                                and custom_config["name"] == template_config.name
-                                for custom_config in custom_configs
-                            ):
-                                custom_config = {
-                                    "service_id": service_id,
-                                    "type": config_type,
-                                    "name": template_config.name,
-                                    "checksum": template_config.checksum,
-                                    "method": "default",
-                                    "template": value,
-                                    "is_draft": False,
-                                }
-                                if with_data:
-                                    custom_config["data"] = template_config.data
-                                custom_configs.append(custom_config)
+                template_configs = {}
+                for template_config in (
+                    session.query(Template_custom_configs)
+                    .with_entities(*template_entities)
+                    .filter(Template_custom_configs.template_id.in_(set(services_templates.values())))
+                    .order_by(Template_custom_configs.order)
+                ):
+                    template_configs.setdefault(template_config.template_id, []).append(template_config)
+
+            existing_configs = {(custom_config["service_id"], custom_config["type"], custom_config["name"]) for custom_config in custom_configs}
+            for service_id, template in services_templates.items():
+                for template_config in template_configs.get(template, []):
+                    config_type = template_config.type.replace("_", "-").replace(".conf", "").strip()
+                    if (service_id, config_type, template_config.name) in existing_configs:
+                        continue
+
+                    custom_config = {
+                        "service_id": service_id,
+                        "type": config_type,
+                        "name": template_config.name,
+                        "checksum": template_config.checksum,
+                        "method": "default",
+                        "template": template,
+                        "is_draft": False,
+                    }
+                    if with_data:
+                        custom_config["data"] = template_config.data
+                    custom_configs.append(custom_config)
+                    existing_configs.add((service_id, config_type, template_config.name))
 
             if as_dict:
                 dict_custom_configs = {}
@@ -2600,6 +3014,33 @@ class Database:
 
         return custom_config
 
+    def get_custom_configs_methods(self, keys: Iterable[Tuple[Optional[str], str, str]]) -> Dict[Tuple[Optional[str], str, str], str]:
+        """Get the methods of the given custom configs ((service_id, type, name) keys) that exist in the database, without reading their data"""
+        keys = {(service_id or None, config_type.strip().replace("-", "_").lower(), name) for service_id, config_type, name in keys}
+        methods = {}
+        if not keys:
+            return methods
+
+        keys = list(keys)
+        with self._db_session() as session:
+            # ? Every key is matched with the unique (service_id, type, name) index, by chunks to keep the statements small
+            for i in range(0, len(keys), 100):
+                query = (
+                    session.query(Custom_configs)
+                    .with_entities(Custom_configs.service_id, Custom_configs.type, Custom_configs.name, Custom_configs.method)
+                    .filter(
+                        or_(
+                            *(
+                                and_(Custom_configs.service_id == service_id, Custom_configs.type == config_type, Custom_configs.name == name)
+                                for service_id, config_type, name in keys[i : i + 100]  # noqa: E203
+                            )
+                        )
+                    )
+                )
+                for custom_config in query:
+                    methods[(custom_config.service_id, custom_config.type, custom_config.name)] = custom_config.method
+        return methods
+
     def upsert_custom_config(self, config_type: str, name: str, config: Dict[str, Any], *, service_id: Optional[str] = None, new: bool = False) -> str:
         """Update or insert a custom config in the database"""
         with self._db_session() as session:
@@ -2731,6 +3172,14 @@ class Database:
 
         return services
 
+    def service_exists(self, service_id: str, *, with_drafts: bool = True) -> bool:
+        """Check if a service exists with a single lookup of its id"""
+        with self._db_session() as session:
+            query = session.query(Services).with_entities(Services.id).filter_by(id=service_id)
+            if not with_drafts:
+                query = query.filter_by(is_draft=False)
+            return query.first() is not None
+
     def add_job_run(self, job_name: str, success: bool, start_date: datetime, end_date: Optional[datetime] = None) -> str:
         """Add a job run."""
         with self._db_session() as session:
@@ -2745,22 +3194,140 @@ class Database:
                 return str(e)
         return ""
 
-    def cleanup_jobs_runs_excess(self, max_runs: int) -> str:
-        """Remove excess jobs runs."""
-        result = 0
+    @staticmethod
+    def _duration_bucket(duration: float) -> int:
+        """Get the histogram bucket of a job run duration, the buckets grow exponentially so that their relative width is constant."""
+        if duration <= JOBS_RUNS_HISTOGRAM_MIN:
+            return 0
+        return ceil(log2(duration / JOBS_RUNS_HISTOGRAM_MIN) * JOBS_RUNS_HISTOGRAM_STEPS)
+
+    @staticmethod
+    def _histogram_percentile(histogram: Dict[int, int], runs: int, percent: int, max_duration: float) -> Optional[float]:
+        """Get the upper bound of the bucket holding the given percentile of a durations histogram, capped by the maximum duration."""
+        if not runs:
+            return None
+        rank = max(1, ceil(percent / 100 * runs))
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= rank:
+                return min(JOBS_RUNS_HISTOGRAM_MIN * 2 ** (bucket / JOBS_RUNS_HISTOGRAM_STEPS), max_duration)
+        return max_duration
+
+    def _summarize_jobs_runs(self, session, runs: List[Any]) -> None:
+        """Roll jobs runs up into the per job and per day summaries."""
+        days = {}
+        for job_name, success, start_date, end_date in runs:
+            # ? SQLite gives back naive dates which are already in local time
+            key = (job_name, (end_date.astimezone() if end_date.tzinfo else end_date).date())
+            day = days.get(key)
+            if day is None:
+                day = days[key] = {"runs": 0, "failures": 0, "total_duration": 0.0, "max_duration": 0.0, "histogram": defaultdict(int)}
+            duration = max((end_date - start_date).total_seconds(), 0.0)
+            day["runs"] += 1
+            day["total_duration"] += duration
+            if duration > day["max_duration"]:
+                day["max_duration"] = duration
+            day["histogram"][self._duration_bucket(duration)] += 1
+            if not success:
+                day["failures"] += 1
+
+        existing = {
+            (summary.job_name, summary.day): summary
+            for summary in session.query(Jobs_runs_daily).filter(
+                Jobs_runs_daily.job_name.in_({job_name for job_name, _ in days}), Jobs_runs_daily.day.in_({day for _, day in days})
+            )
+        }
+
+        for (job_name, day), values in days.items():
+            histogram = values["histogram"]
+            summary = existing.get((job_name, day))
+            if summary is None:
+                summary = Jobs_runs_daily(job_name=job_name, day=day, runs=0, failures=0, total_duration=0.0, max_duration=0.0)
+                session.add(summary)
+            elif summary.durations_histogram:
+                # ? Histograms add up, so a day summarized over several cleanups gets the same percentiles as if it was summarized at once
+                with suppress(JSONDecodeError, TypeError, ValueError):
+                    for bucket, count in loads(summary.durations_histogram).items():
+                        histogram[int(bucket)] += count
+
+            summary.runs += values["runs"]
+            summary.failures += values["failures"]
+            summary.total_duration += values["total_duration"]
+            summary.max_duration = max(summary.max_duration or 0.0, values["max_duration"])
+            summary.durations_histogram = dumps({str(bucket): count for bucket, count in sorted(histogram.items())}, separators=(",", ":"))
+            summary.p50_duration = self._histogram_percentile(histogram, summary.runs, 50, summary.max_duration)
+            summary.p95_duration = self._histogram_percentile(histogram, summary.runs, 95, summary.max_duration)
+
+    def cleanup_jobs_runs_excess(self, max_runs: int, *, batch_size: int = JOBS_RUNS_CLEANUP_BATCH, summarize: bool = False) -> str:
+        """Remove excess jobs runs, the oldest ones are deleted in batches and can be rolled up into daily summaries beforehand."""
+        if self.readonly:
+            return "The database is read-only, the changes will not be saved"
+
+        # Find the most recent run to remove by walking the end_date index instead of counting the whole table
         with self._db_session() as session:
-            rows_count = session.query(Jobs_runs).count()
-            if rows_count > max_runs:
-                records_to_delete = session.query(Jobs_runs.id).order_by(Jobs_runs.end_date.asc()).limit(rows_count - max_runs).all()
-                ids_to_delete = [record.id for record in records_to_delete]
-                if ids_to_delete:
-                    result = session.query(Jobs_runs).filter(Jobs_runs.id.in_(ids_to_delete)).delete(synchronize_session=False)
+            cutoff = session.query(Jobs_runs.id, Jobs_runs.end_date).order_by(Jobs_runs.end_date.desc(), Jobs_runs.id.desc()).offset(max_runs).limit(1).first()
+
+        if not cutoff:
+            return "Removed 0 excess jobs runs"
+
+        def up_to(run: Any) -> Any:
+            """Runs which end before the given one in the (end_date, id) order of the end_date index."""
+            return or_(Jobs_runs.end_date < run.end_date, and_(Jobs_runs.end_date == run.end_date, Jobs_runs.id <= run.id))
+
+        removed = 0
+        while True:
+            # ? Each batch is its own short transaction so that the scheduler can keep adding runs while the cleanup goes on
+            with self._db_session() as session:
+                # ? The batches follow the end_date index and are bounded by their last run, so that each one only reads its own runs
+                last = (
+                    session.query(Jobs_runs.id, Jobs_runs.end_date)
+                    .filter(up_to(cutoff))
+                    .order_by(Jobs_runs.end_date, Jobs_runs.id)
+                    .offset(batch_size - 1)
+                    .limit(1)
+                    .first()
+                )
+                batch = up_to(last or cutoff)
+
+                if summarize:
+                    runs = session.execute(db_select(Jobs_runs.job_name, Jobs_runs.success, Jobs_runs.start_date, Jobs_runs.end_date).where(batch)).all()
+                    if runs:
+                        self._summarize_jobs_runs(session, runs)
+
+                removed += session.query(Jobs_runs).filter(batch).delete(synchronize_session=False)
 
                 try:
                     session.commit()
                 except BaseException as e:
                     return str(e)
-        return f"Removed {result} excess jobs runs"
+
+            if last is None or (last.end_date, last.id) == (cutoff.end_date, cutoff.id):
+                break
+
+        return f"Removed {removed} excess jobs runs"
+
+    def get_jobs_runs_summary(self, job_name: Optional[str] = None, *, days: int = 30) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the daily summaries of the jobs runs which were cleaned up, most recent days first."""
+        with self._db_session() as session:
+            query = session.query(Jobs_runs_daily).filter(Jobs_runs_daily.day >= (datetime.now().astimezone() - timedelta(days=days)).date())
+            if job_name:
+                query = query.filter(Jobs_runs_daily.job_name == job_name)
+
+            summaries = {}
+            for summary in query.order_by(Jobs_runs_daily.job_name, Jobs_runs_daily.day.desc()):
+                summaries.setdefault(summary.job_name, []).append(
+                    {
+                        "day": summary.day.isoformat(),
+                        "runs": summary.runs,
+                        "failures": summary.failures,
+                        "average_duration": summary.total_duration / summary.runs if summary.runs else None,
+                        "p50_duration": summary.p50_duration,
+                        "p95_duration": summary.p95_duration,
+                        "max_duration": summary.max_duration,
+                    }
+                )
+            return summaries
 
     def cleanup_expired_ui_sessions(self, max_age_days: int) -> str:
         """Remove UI sessions older than the provided age threshold."""
@@ -2839,6 +3406,144 @@ class Database:
 
         return ""
 
+    def bulk_upsert_job_cache(self, entries: Iterable[Tuple[Optional[str], str, bytes, Optional[str]]], *, job_name: Optional[str] = None) -> str:
+        """Update many plugin cache files (service_id, file_name, data, checksum) in the database in a single transaction"""
+        job_name = job_name or argv[0].replace(".py", "")
+        files = {}
+        for service_id, file_name, data, checksum in entries:
+            files[(service_id or None, file_name)] = (data, checksum)
+
+        if not files:
+            return ""
+
+        file_names = list({file_name for _, file_name in files})
+        with self._db_session() as session:
+            if self.readonly:
+                return "The database is read-only, the changes will not be saved"
+
+            existing = {}
+            for offset in range(0, len(file_names), JOB_CACHE_QUERY_BATCH):
+                for cache in session.execute(
+                    db_select(Jobs_cache.id, Jobs_cache.service_id, Jobs_cache.file_name, Jobs_cache.checksum).where(
+                        Jobs_cache.job_name == job_name, Jobs_cache.file_name.in_(file_names[offset : offset + JOB_CACHE_QUERY_BATCH])  # noqa: E203
+                    )
+                ):
+                    existing[(cache.service_id, cache.file_name)] = (cache.id, cache.checksum)
+
+            current_time = datetime.now().astimezone()
+            to_insert, to_update, unchanged = [], [], []
+            for (service_id, file_name), (data, checksum) in files.items():
+                row = {"job_name": job_name, "service_id": service_id, "file_name": file_name, "data": data, "last_update": current_time, "checksum": checksum}
+                if (service_id, file_name) not in existing:
+                    to_insert.append(row)
+                    continue
+
+                cache_id, cache_checksum = existing[(service_id, file_name)]
+                # ? Files with the same checksum as the cached one are not written again, only their last update is refreshed so that they stay fresh
+                if checksum and checksum == cache_checksum:
+                    unchanged.append(cache_id)
+                    continue
+                to_update.append(row | {"id": cache_id})
+
+            try:
+                for offset in range(0, len(unchanged), JOB_CACHE_QUERY_BATCH):
+                    session.execute(
+                        db_update(Jobs_cache)
+                        .where(Jobs_cache.id.in_(unchanged[offset : offset + JOB_CACHE_QUERY_BATCH]))  # noqa: E203
+                        .values(last_update=current_time)
+                        .execution_options(synchronize_session=False)
+                    )
+
+                if to_update:
+                    # ? The existing rows are upserted on their id so that a row deleted in the meantime is written back instead of being lost
+                    dialect = self.sql_engine.dialect.name
+                    columns = ("data", "last_update", "checksum")
+                    if dialect in ("sqlite", "postgresql"):
+                        stmt = (sqlite_insert if dialect == "sqlite" else postgresql_insert)(Jobs_cache.__table__)
+                        stmt = stmt.on_conflict_do_update(index_elements=[Jobs_cache.id], set_={column: stmt.excluded[column] for column in columns})
+                    elif dialect in ("mysql", "mariadb"):
+                        stmt = mysql_insert(Jobs_cache.__table__)
+                        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in columns})
+                    else:
+                        stmt = db_update(Jobs_cache)
+                    session.execute(stmt, to_update)
+
+                if to_insert:
+                    session.execute(db_insert(Jobs_cache), to_insert)
+
+                session.commit()
+            except BaseException as e:
+                return str(e)
+
+        return ""
+
+    def get_failover_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Get the manifest of the last failover snapshot"""
+        with self._db_session() as session:
+            snapshot = (
+                session.query(Failover_snapshot).with_entities(Failover_snapshot.checksum, Failover_snapshot.manifest, Failover_snapshot.last_update).first()
+            )
+            if not snapshot:
+                return None
+
+            try:
+                manifest = loads(snapshot.manifest)
+            except (JSONDecodeError, TypeError):
+                return None
+            return {"checksum": snapshot.checksum, "manifest": manifest, "last_update": snapshot.last_update}
+
+    def get_failover_checksums(self) -> Set[str]:
+        """Get the checksums of the files stored for the failover snapshot"""
+        with self._db_session() as session:
+            return {checksum for (checksum,) in session.query(Failover_objects).with_entities(Failover_objects.checksum)}
+
+    def get_failover_objects(self, checksums: Iterable[str]) -> Dict[str, bytes]:
+        """Get the content of the failover snapshot files with the given checksums"""
+        checksums = list(checksums)
+        objects = {}
+        with self._db_session() as session:
+            for offset in range(0, len(checksums), JOB_CACHE_QUERY_BATCH):
+                for failover_object in session.query(Failover_objects).filter(
+                    Failover_objects.checksum.in_(checksums[offset : offset + JOB_CACHE_QUERY_BATCH])  # noqa: E203
+                ):
+                    objects[failover_object.checksum] = decompress(failover_object.data)
+        return objects
+
+    def save_failover_snapshot(self, checksum: str, manifest: Dict[str, Any], objects: Dict[str, bytes]) -> str:
+        """Save the failover snapshot manifest with the content of the files the database doesn't have yet, the files no longer referenced are removed"""
+        referenced = {entry[0] for entry in manifest.get("files", {}).values()}
+        with self._db_session() as session:
+            if self.readonly:
+                return "The database is read-only, the changes will not be saved"
+
+            stored = {stored_checksum for (stored_checksum,) in session.query(Failover_objects).with_entities(Failover_objects.checksum)}
+            # ? The files are compressed one by one, the checksums stay the ones of their content
+            to_insert = [{"checksum": object_checksum, "data": compress(data, 9)} for object_checksum, data in objects.items() if object_checksum not in stored]
+            unreferenced = list(stored - referenced)
+
+            try:
+                if to_insert:
+                    session.execute(db_insert(Failover_objects), to_insert)
+                for offset in range(0, len(unreferenced), JOB_CACHE_QUERY_BATCH):
+                    session.execute(
+                        db_delete(Failover_objects).where(Failover_objects.checksum.in_(unreferenced[offset : offset + JOB_CACHE_QUERY_BATCH]))  # noqa: E203
+                    )
+
+                snapshot = session.query(Failover_snapshot).filter_by(id=1).first()
+                current_time = datetime.now().astimezone()
+                if snapshot:
+                    snapshot.checksum = checksum
+                    snapshot.manifest = dumps(manifest)
+                    snapshot.last_update = current_time
+                else:
+                    session.add(Failover_snapshot(id=1, checksum=checksum, manifest=dumps(manifest), last_update=current_time))
+
+                session.commit()
+            except BaseException as e:
+                return str(e)
+
+        return ""
+
     def update_external_plugins(
         self,
         plugins: List[Dict[str, Any]],
@@ -3902,6 +4607,42 @@ class Database:
                 return str(e)
         return ""
 
+    def get_plugins_manifests(self, *, _type: Literal["all", "external", "ui", "pro"] = "all") -> Dict[str, Dict[str, Any]]:
+        """Get the file manifests of the plugins, a manifest is only valid while its checksum matches the one of the plugin."""
+        with self._db_session() as session:
+            query = session.query(Plugins).with_entities(Plugins.id, Plugins.checksum, Plugins.manifest).filter(Plugins.manifest.is_not(None))
+            if _type == "external":
+                query = query.filter(Plugins.type.in_(["external", "ui"]))
+            elif _type != "all":
+                query = query.filter_by(type=_type)
+
+            manifests = {}
+            for plugin in query:
+                with suppress(AttributeError, JSONDecodeError, TypeError):
+                    manifest = loads(plugin.manifest)
+                    if plugin.checksum and manifest.get("checksum") == plugin.checksum:
+                        manifests[plugin.id] = manifest
+            return manifests
+
+    def update_plugins_manifests(self, manifests: Dict[str, Dict[str, Any]]) -> str:
+        """Save the file manifests of the plugins, each one along with the checksum of the plugin data it describes."""
+        if not manifests:
+            return ""
+
+        with self._db_session() as session:
+            if self.readonly:
+                return "The database is read-only, the changes will not be saved"
+
+            for plugin_id, manifest in manifests.items():
+                session.query(Plugins).filter_by(id=plugin_id, checksum=manifest["checksum"]).update({Plugins.manifest: dumps(manifest)})
+
+            try:
+                session.commit()
+            except BaseException as e:
+                return str(e)
+
+        return ""
+
     def get_plugins(self, *, _type: Literal["all", "external", "ui", "pro"] = "all", with_data: bool = False) -> List[Dict[str, Any]]:
         """Get all plugins from the database using batched queries to avoid N+1 issues."""
         with self._db_session() as session:
@@ -4031,6 +4772,7 @@ class Database:
 
     def get_jobs(self) -> Dict[str, Dict[str, Any]]:
         """Get jobs."""
+        summaries = self.get_jobs_runs_summary()
         with self._db_session() as session:
             return {
                 job.name: {
@@ -4050,6 +4792,7 @@ class Database:
                         .order_by(Jobs_runs.end_date.desc())
                         .limit(10)
                     ],
+                    "summary": summaries.get(job.name, []),
                     "cache": [
                         {
                             "service_id": cache.service_id,
@@ -4436,6 +5179,18 @@ class Database:
                 "last_seen": instance.last_seen,
             }
 
+    def get_instances_methods(self, hostnames: Iterable[str]) -> Dict[str, str]:
+        """Get the methods of the given instances that exist in the database, looked up by hostname"""
+        hostnames = list(set(hostnames))
+        if not hostnames:
+            return {}
+
+        with self._db_session() as session:
+            return {
+                instance.hostname: instance.method
+                for instance in session.query(Instances).with_entities(Instances.hostname, Instances.method).filter(Instances.hostname.in_(hostnames))
+            }
+
     def get_plugin_page(self, plugin_id: str) -> Optional[bytes]:
         """Get plugin page."""
         with self._db_session() as session:
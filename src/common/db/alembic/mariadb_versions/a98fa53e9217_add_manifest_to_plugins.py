@@ -0,0 +1,44 @@
+"""Add the file manifests to the plugins
+
+Revision ID: a98fa53e9217
+Revises: 08d046be32d8
+Create Date: 2026-10-18 23:12:05.631942
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = "a98fa53e9217"
+down_revision: Union[str, None] = "08d046be32d8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    # Check if the column exists before adding it, the external plugins changes are detected by comparing their files with it
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" not in columns:
+        op.add_column("bw_plugins", sa.Column("manifest", mysql.MEDIUMTEXT(), nullable=True))
+
+
+def downgrade() -> None:
+    # Remove the file manifests from bw_plugins
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" in columns:
+        op.drop_column("bw_plugins", "manifest")
@@ -0,0 +1,43 @@
+"""Add the apply generation to the metadata
+
+Revision ID: 499b60f3e622
+Revises: 1b8164b8905e
+Create Date: 2026-10-18 21:04:12.417305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "499b60f3e622"
+down_revision: Union[str, None] = "1b8164b8905e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_metadata"):
+        return
+
+    # Check if the column exists before adding it
+    columns = [col["name"] for col in inspector.get_columns("bw_metadata")]
+    if "apply_generation" not in columns:
+        op.add_column("bw_metadata", sa.Column("apply_generation", sa.Integer(), nullable=True, server_default="0"))
+
+
+def downgrade() -> None:
+    # Remove the apply generation from bw_metadata
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("bw_metadata"):
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("bw_metadata")]
+    if "apply_generation" in columns:
+        op.drop_column("bw_metadata", "apply_generation")
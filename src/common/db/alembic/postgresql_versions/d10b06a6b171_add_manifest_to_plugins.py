@@ -0,0 +1,43 @@
+"""Add the file manifests to the plugins
+
+Revision ID: d10b06a6b171
+Revises: 0d8082bf50f2
+Create Date: 2026-10-18 23:12:05.631942
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d10b06a6b171"
+down_revision: Union[str, None] = "0d8082bf50f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    # Check if the column exists before adding it, the external plugins changes are detected by comparing their files with it
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" not in columns:
+        op.add_column("bw_plugins", sa.Column("manifest", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    # Remove the file manifests from bw_plugins
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" in columns:
+        op.drop_column("bw_plugins", "manifest")
@@ -0,0 +1,72 @@
+"""Add the jobs runs indexes and daily summaries
+
+Revision ID: 3acd13b52f0a
+Revises: c880ccf1e420
+Create Date: 2026-10-18 22:41:37.208814
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3acd13b52f0a"
+down_revision: Union[str, None] = "c880ccf1e420"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JOBS_RUNS_INDEXES = {
+    "idx_bw_jobs_runs_job_name_end_date": ["job_name", "end_date"],
+    "idx_bw_jobs_runs_end_date": ["end_date"],
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_jobs_runs"):
+        return
+
+    # Check if the indexes exist before creating them, the cleanup of the excess jobs runs walks them
+    indexes = {index["name"] for index in inspector.get_indexes("bw_jobs_runs")}
+    for name, columns in JOBS_RUNS_INDEXES.items():
+        if name not in indexes:
+            op.create_index(name, "bw_jobs_runs", columns)
+
+    # Check if the table exists before creating it
+    if not inspector.has_table("bw_jobs_runs_daily"):
+        op.create_table(
+            "bw_jobs_runs_daily",
+            sa.Column("job_name", sa.String(128), sa.ForeignKey("bw_jobs.name", onupdate="cascade", ondelete="cascade"), primary_key=True),
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("runs", sa.Integer(), nullable=False),
+            sa.Column("failures", sa.Integer(), nullable=False),
+            sa.Column("total_duration", sa.Float(), nullable=False),
+            sa.Column("p50_duration", sa.Float(), nullable=True),
+            sa.Column("p95_duration", sa.Float(), nullable=True),
+            sa.Column("max_duration", sa.Float(), nullable=True),
+            sa.Column("durations_histogram", sa.Text(), nullable=True),
+        )
+    elif "durations_histogram" not in [col["name"] for col in inspector.get_columns("bw_jobs_runs_daily")]:
+        with op.batch_alter_table("bw_jobs_runs_daily") as batch_op:
+            batch_op.add_column(sa.Column("durations_histogram", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # Remove the daily summaries and the jobs runs indexes
+    if inspector.has_table("bw_jobs_runs_daily"):
+        op.drop_table("bw_jobs_runs_daily")
+
+    if not inspector.has_table("bw_jobs_runs"):
+        return
+
+    indexes = {index["name"] for index in inspector.get_indexes("bw_jobs_runs")}
+    for name in JOBS_RUNS_INDEXES:
+        if name in indexes:
+            op.drop_index(name, table_name="bw_jobs_runs")
@@ -0,0 +1,45 @@
+"""Add the apply generation to the metadata
+
+Revision ID: c880ccf1e420
+Revises: bf32ccd17258
+Create Date: 2026-10-18 21:04:12.417305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c880ccf1e420"
+down_revision: Union[str, None] = "bf32ccd17258"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_metadata"):
+        return
+
+    # Check if the column exists before adding it - use batch_alter_table for SQLite
+    columns = [col["name"] for col in inspector.get_columns("bw_metadata")]
+    if "apply_generation" not in columns:
+        with op.batch_alter_table("bw_metadata") as batch_op:
+            batch_op.add_column(sa.Column("apply_generation", sa.Integer(), nullable=True, server_default="0"))
+
+
+def downgrade() -> None:
+    # Remove the apply generation from bw_metadata
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("bw_metadata"):
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("bw_metadata")]
+    if "apply_generation" in columns:
+        with op.batch_alter_table("bw_metadata") as batch_op:
+            batch_op.drop_column("apply_generation")
@@ -0,0 +1,45 @@
+"""Add the file manifests to the plugins
+
+Revision ID: cd78b2290f47
+Revises: 3acd13b52f0a
+Create Date: 2026-10-18 23:12:05.631942
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "cd78b2290f47"
+down_revision: Union[str, None] = "3acd13b52f0a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ? A database without the table gets the current schema when its tables are created
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    # Check if the column exists before adding it, the external plugins changes are detected by comparing their files with it
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" not in columns:
+        with op.batch_alter_table("bw_plugins") as batch_op:
+            batch_op.add_column(sa.Column("manifest", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    # Remove the file manifests from bw_plugins
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("bw_plugins"):
+        return
+
+    columns = [col["name"] for col in inspector.get_columns("bw_plugins")]
+    if "manifest" in columns:
+        with op.batch_alter_table("bw_plugins") as batch_op:
+            batch_op.drop_column("manifest")
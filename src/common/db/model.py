@@ -2,7 +2,7 @@
 
 from json import dumps, loads
 from typing import Any, Optional
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Identity, Integer, LargeBinary, String, Text, TypeDecorator, UnicodeText
+from sqlalchemy import Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Identity, Index, Integer, LargeBinary, String, Text, TypeDecorator, UnicodeText
 from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.schema import UniqueConstraint
@@ -57,6 +57,7 @@ class Plugins(Base):
     method = Column(METHODS_ENUM, default="manual", nullable=False)
     data = Column(LargeBinary(length=(2**32) - 1), default=None, nullable=True)
     checksum = Column(String(128), default=None, nullable=True)
+    manifest = Column(LargeText, default=None, nullable=True)
     config_changed = Column(Boolean, default=False, nullable=True)
     last_config_change = Column(DateTime(timezone=True), nullable=True)
 
@@ -178,6 +179,7 @@ class Jobs(Base):
     plugin = relationship("Plugins", back_populates="jobs")
     cache = relationship("Jobs_cache", back_populates="job", cascade="all")
     runs = relationship("Jobs_runs", back_populates="job", cascade="all")
+    runs_daily = relationship("Jobs_runs_daily", back_populates="job", cascade="all")
 
 
 class Plugin_pages(Base):
@@ -208,6 +210,10 @@ class Jobs_cache(Base):
 
 class Jobs_runs(Base):
     __tablename__ = "bw_jobs_runs"
+    __table_args__ = (
+        Index("idx_bw_jobs_runs_job_name_end_date", "job_name", "end_date"),
+        Index("idx_bw_jobs_runs_end_date", "end_date"),
+    )
 
     id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
     job_name = Column(String(128), ForeignKey("bw_jobs.name", onupdate="cascade", ondelete="cascade"), nullable=False)
@@ -218,6 +224,22 @@ class Jobs_runs(Base):
     job = relationship("Jobs", back_populates="runs")
 
 
+class Jobs_runs_daily(Base):
+    __tablename__ = "bw_jobs_runs_daily"
+
+    job_name = Column(String(128), ForeignKey("bw_jobs.name", onupdate="cascade", ondelete="cascade"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    runs = Column(Integer, default=0, nullable=False)
+    failures = Column(Integer, default=0, nullable=False)
+    total_duration = Column(Float, default=0.0, nullable=False)
+    p50_duration = Column(Float, nullable=True)
+    p95_duration = Column(Float, nullable=True)
+    max_duration = Column(Float, nullable=True)
+    durations_histogram = Column(Text, nullable=True)
+
+    job = relationship("Jobs", back_populates="runs_daily")
+
+
 class Custom_configs(Base):
     __tablename__ = "bw_custom_configs"
     __table_args__ = (UniqueConstraint("service_id", "type", "name"),)
@@ -352,6 +374,7 @@ class Metadata(Base):
     instances_changed = Column(Boolean, default=False, nullable=True)
     last_instances_change = Column(DateTime(timezone=True), nullable=True)
     reload_ui_plugins = Column(Boolean, default=False, nullable=True)
+    apply_generation = Column(Integer, default=0, nullable=True)
     force_pro_update = Column(Boolean, default=False, nullable=True)
     failover = Column(Boolean, default=None, nullable=True)
     failover_message = Column(Text, nullable=True, default="")
@@ -359,6 +382,31 @@ class Metadata(Base):
     version = Column(String(32), default="1.6.8", nullable=False)
 
 
+class Failover_snapshot(Base):
+    __tablename__ = "bw_failover_snapshot"
+
+    id = Column(Integer, primary_key=True, default=1)
+    checksum = Column(String(128), nullable=False)
+    manifest = Column(LargeText, nullable=False)
+    last_update = Column(DateTime(timezone=True), nullable=False)
+
+
+class Failover_objects(Base):
+    __tablename__ = "bw_failover_objects"
+
+    checksum = Column(String(128), primary_key=True)
+    data = Column(LargeBinary(length=(2**32) - 1), nullable=False)
+
+
+class Locks(Base):
+    __tablename__ = "bw_locks"
+
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(256), nullable=False)
+    acquired_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
 ## UI Models
 
 THEMES_ENUM = Enum("light", "dark", name="themes_enum")
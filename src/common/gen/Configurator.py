@@ -37,6 +37,7 @@ class Configurator:
         self.__setting_id_rx = re_compile(r"^[A-Z0-9_]{1,256}$")
         self.__name_rx = re_compile(r"^[\w.-]{1,128}$")
         self.__job_file_rx = re_compile(r"^[\w./-]{1,256}$")
+        self.__multiple_suffix_rx = re_compile(r"^(.+)_[0-9]+$")
 
         # Pre-compile sets for O(1) membership testing
         self.__mandatory_plugin_keys = frozenset(("id", "name", "description", "version", "stream", "settings"))
@@ -115,6 +116,7 @@ class Configurator:
 
         self.__multisite = self.__variables.get("MULTISITE", "no") == "yes"
         self.__servers = self.__map_servers()
+        self.__build_resolution_index()
 
     def get_settings(self) -> Dict[str, str]:
         return self.__settings.copy()
@@ -316,10 +318,10 @@ class Configurator:
                 return False, f"variable name {variable} doesn't exist"
 
             try:
-                if not self.__ignore_regex_check and re_search(where[real_var]["regex"], value) is None:
-                    return (False, f"value {value} doesn't match regex {where[real_var]['regex']}")
+                if not self.__ignore_regex_check and re_search(where["regex"], value) is None:
+                    return (False, f"value {value} doesn't match regex {where['regex']}")
             except RegexError:
-                self.__logger.warning(f"Invalid regex for {variable} : {where[real_var]['regex']}, ignoring regex check")
+                self.__logger.warning(f"Invalid regex for {variable} : {where['regex']}, ignoring regex check")
 
             return True, "ok"
         # MULTISITE=yes
@@ -327,37 +329,62 @@ class Configurator:
         where, real_var = self.__find_var(real_var)
         if not where:
             return False, f"variable name {variable} doesn't exist"
-        elif prefixed and where[real_var]["context"] != "multisite":
+        elif prefixed and where["context"] != "multisite":
             return False, f"context of {variable} isn't multisite"
 
         try:
-            if not self.__ignore_regex_check and re_search(where[real_var]["regex"], value) is None:
-                return (False, f"value {value} doesn't match regex {where[real_var]['regex']}")
+            if not self.__ignore_regex_check and re_search(where["regex"], value) is None:
+                return (False, f"value {value} doesn't match regex {where['regex']}")
         except RegexError:
-            self.__logger.warning(f"Invalid regex for {variable} : {where[real_var]['regex']}, ignoring regex check")
+            self.__logger.warning(f"Invalid regex for {variable} : {where['regex']}, ignoring regex check")
 
         return True, "ok"
 
-    def __find_var(self, variable: str) -> Tuple[Optional[Dict[str, str]], str]:
+    def __build_resolution_index(self):
+        """Index the settings and the server names once so that each variable is resolved with a few dict lookups."""
         targets = [
             self.get_settings(),
             self.get_plugins_settings("core"),
             self.get_plugins_settings("external"),
             self.get_plugins_settings("pro"),
         ]
-        for target in targets:
-            if variable in target:
-                return target, variable
-            for real_var, settings in target.items():
-                if "multiple" in settings and re_search(f"^{real_var}_[0-9]+$", variable):
-                    return target, real_var
+        # ? The first target defining a setting wins, like when looking for it in each target in order
+        self.__direct_settings: Dict[str, Tuple[int, Dict[str, str]]] = {}
+        self.__multiple_settings: Dict[str, Tuple[int, Dict[str, str]]] = {}
+        for position, target in enumerate(targets):
+            for setting, data in target.items():
+                self.__direct_settings.setdefault(setting, (position, data))
+                if "multiple" in data:
+                    self.__multiple_settings.setdefault(setting, (position, data))
+
+        self.__servers_order = {server: position for position, server in enumerate(self.__servers)}
+
+    def __find_var(self, variable: str) -> Tuple[Optional[Dict[str, str]], str]:
+        direct = self.__direct_settings.get(variable)
+        match = self.__multiple_suffix_rx.match(variable)
+        multiple = self.__multiple_settings.get(match.group(1)) if match else None
+
+        # ? A setting of an earlier target wins, a setting matching directly wins over a multiple one of the same target
+        if direct and (not multiple or direct[0] <= multiple[0]):
+            return direct[1], variable
+        elif multiple:
+            return multiple[1], match.group(1)
         return None, variable
 
     def __var_is_prefixed(self, variable: str) -> Tuple[bool, str]:
-        for server in self.__servers:
-            if variable.startswith(f"{server}_"):
-                return True, variable.replace(f"{server}_", "", 1)
-        return False, variable
+        # ? The candidate prefixes are the parts of the variable before each underscore, the first server in the list wins
+        server = None
+        position = len(self.__servers_order)
+        index = variable.find("_")
+        while index != -1:
+            candidate = self.__servers_order.get(variable[:index])
+            if candidate is not None and candidate < position:
+                server, position = variable[:index], candidate
+            index = variable.find("_", index + 1)
+
+        if server is None:
+            return False, variable
+        return True, variable[len(server) + 1 :]  # noqa: E203
 
     def __validate_plugin(self, plugin: dict) -> Tuple[bool, str]:
         if not all(key in plugin for key in self.__mandatory_plugin_keys):
@@ -84,6 +84,10 @@ if __name__ == "__main__":
 
             db = Database(LOGGER, sqlalchemy_string=dotenv_env.get("DATABASE_URI", getenv("DATABASE_URI", None)))
 
+            # ? Don't generate the configuration from a database which is being restored
+            if not db.wait_for_lock(timeout=30):
+                LOGGER.warning("Database is still locked after 30s, generating the configuration anyway ...")
+
         if args.variables:
             # Check existences and permissions
             LOGGER.info("Checking arguments ...")
@@ -28,6 +28,7 @@ LOGGER = getLogger("GENERATOR.SAVE_CONFIG")
 
 
 if __name__ == "__main__":
+    db_lock = None
     try:
         # Parse arguments
         parser = ArgumentParser(description="BunkerWeb config saver")
@@ -123,6 +124,11 @@ if __name__ == "__main__":
 
         db = Database(LOGGER, sqlalchemy_string=dotenv_env.get("DATABASE_URI", getenv("DATABASE_URI", None)))
 
+        # ? Don't write the configuration while a backup or a restore is in progress
+        db_lock = db.lock()
+        if not db_lock.acquire():
+            LOGGER.warning("Database is still locked, saving the config anyway ...")
+
         db_metadata = db.get_metadata()
         db_initialized = not isinstance(db_metadata, str) and db_metadata["is_initialized"]
 
@@ -251,6 +257,9 @@ if __name__ == "__main__":
     except:
         LOGGER.error(f"Exception while executing config saver : {format_exc()}")
         sys_exit(1)
+    finally:
+        if db_lock:
+            db_lock.release()
 
     # We're done
     LOGGER.info("Config saver successfully executed !")
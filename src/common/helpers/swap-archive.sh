@@ -0,0 +1,131 @@
+#!/bin/bash
+
+# Extract an archive sent to the API into a staging directory inside its destination then swap it in with rename(2) : files are replaced
+# atomically and directories are merged recursively, the destination is never seen empty or half extracted. The replaced and removed
+# entries are kept as the previous generation so that the last swap can be rolled back. Both generations are hidden directories of the
+# destination (the renames must not cross a volume boundary), the readers of the destinations skip them (e.g. the plugins loaders).
+#   swap-archive.sh <archive> <destination>
+#   swap-archive.sh --rollback <destination>
+
+STAGING_NAME=".bw-staging"
+PREVIOUS_NAME=".bw-previous"
+ADDED_NAME=".bw-added"
+
+function usage() {
+	echo "usage: $0 <archive> <destination> | --rollback <destination>" >&2
+	exit 1
+}
+
+function is_reserved() {
+	case "$1" in
+		"$STAGING_NAME" | "$PREVIOUS_NAME" | "$PREVIOUS_NAME.new" | "$ADDED_NAME") return 0 ;;
+	esac
+	return 1
+}
+
+# Move the entries of source into destination, what they replace goes to previous. With the replace mode, the entries of destination
+# which are not in source are moved to previous as well. The paths which didn't exist before are appended to the ADDED file.
+function swap_in() {
+	local source="$1" destination="$2" previous="$3" relative="$4" mode="$5" path name target
+	local -A new_entries=()
+
+	mkdir -p "$previous" || return 1
+	for path in "$source"/* "$source"/.[!.]* "$source"/..?*; do
+		[ -e "$path" ] || [ -L "$path" ] || continue
+		name="${path##*/}"
+		if [ -z "$relative" ] && is_reserved "$name" ; then
+			continue
+		fi
+		new_entries["$name"]=1
+		target="$destination/$name"
+
+		if [ -d "$path" ] && [ ! -L "$path" ] && [ -d "$target" ] && [ ! -L "$target" ] ; then
+			swap_in "$path" "$target" "$previous/$name" "$relative$name/" "$mode" || return 1
+			continue
+		fi
+
+		if [ ! -e "$target" ] && [ ! -L "$target" ] ; then
+			echo "$relative$name" >> "$ADDED"
+		elif [ -f "$target" ] && [ ! -L "$target" ] && { [ ! -d "$path" ] || [ -L "$path" ]; } ; then
+			# Keep the current file with a hard link, the rename below replaces it atomically
+			ln "$target" "$previous/$name" || return 1
+		else
+			# The type of the entry changed, it can't be replaced atomically
+			mv "$target" "$previous/$name" || return 1
+		fi
+		mv -f "$path" "$target" || return 1
+	done
+
+	if [ "$mode" = "replace" ] ; then
+		# Entries which are not part of the new generation are removed last
+		for path in "$destination"/* "$destination"/.[!.]* "$destination"/..?*; do
+			[ -e "$path" ] || [ -L "$path" ] || continue
+			name="${path##*/}"
+			if [ -n "${new_entries["$name"]}" ] || { [ -z "$relative" ] && is_reserved "$name"; } ; then
+				continue
+			fi
+			mv "$path" "$previous/$name" || return 1
+		done
+	fi
+}
+
+[ $# -eq 2 ] || usage
+if [ "$1" = "--rollback" ] ; then
+	archive=""
+else
+	archive="$1"
+fi
+destination="${2%/}"
+
+staging="$destination/$STAGING_NAME"
+previous="$destination/$PREVIOUS_NAME"
+
+mkdir -p "$destination" /var/tmp/bunkerweb || exit 1
+
+# Serialize the swaps of the same destination
+exec 9> "/var/tmp/bunkerweb/swap$(echo "$destination" | tr '/' '_').lock"
+flock 9 || exit 1
+
+rm -rf "$previous.new" && mkdir -p "$previous.new" || exit 1
+ADDED="$previous.new/$ADDED_NAME"
+: > "$ADDED"
+
+if [ -n "$archive" ] ; then
+	# The staging directory lives inside the destination so that the renames never cross filesystems (e.g. volumes)
+	rm -rf "$staging" && mkdir -p "$staging" || exit 1
+	if ! tar xzf "$archive" -C "$staging" ; then
+		rm -rf "$staging" "$previous.new"
+		exit 1
+	fi
+	if ! swap_in "$staging" "$destination" "$previous.new" "" "replace" ; then
+		echo "Failed to swap the content of $archive into $destination" >&2
+		exit 1
+	fi
+else
+	if [ ! -d "$previous" ] ; then
+		echo "No previous generation to roll back to in $destination" >&2
+		rm -rf "$previous.new"
+		exit 1
+	fi
+	if ! swap_in "$previous" "$destination" "$previous.new" "" "overlay" ; then
+		echo "Failed to roll back $destination" >&2
+		exit 1
+	fi
+	# Remove what the rolled back swap added
+	if [ -f "$previous/$ADDED_NAME" ] ; then
+		while IFS= read -r relative ; do
+			if [ -e "$destination/$relative" ] || [ -L "$destination/$relative" ] ; then
+				mkdir -p "$(dirname "$previous.new/$relative")" && mv "$destination/$relative" "$previous.new/$relative" || exit 1
+			fi
+		done < "$previous/$ADDED_NAME"
+	fi
+fi
+
+rm -rf "$previous" "$staging"
+mv "$previous.new" "$previous" || exit 1
+
+if [ -n "$archive" ] ; then
+	rm -f "$archive"
+fi
+
+exit 0
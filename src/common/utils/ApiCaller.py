@@ -24,6 +24,14 @@ class ApiCaller:
         self.apis = apis or []
         self.__logger = getLogger("API.CALLER")
 
+    @staticmethod
+    def __hostname(api: API) -> str:
+        # Extract hostname from endpoint (supports http and https)
+        try:
+            return urlsplit(api.endpoint).hostname or api.endpoint
+        except Exception:
+            return api.endpoint.replace("http://", "").replace("https://", "").split(":")[0]
+
     def send_to_apis(
         self,
         method: Union[Literal["POST"], Literal["GET"]],
@@ -60,14 +68,8 @@ class ApiCaller:
                         else:
                             self.__logger.info(f"Successfully sent API request to {api.endpoint}{url}")
 
-                        if resp and response:
-                            # Extract hostname from endpoint (supports http and https)
-                            try:
-                                host = urlsplit(api.endpoint).hostname or api.endpoint
-                            except Exception:
-                                host = api.endpoint.replace("http://", "").replace("https://", "").split(":")[0]
-                            if responses is not None:
-                                responses[host] = resp if isinstance(resp, dict) else resp.json()
+                        if resp and response and responses is not None:
+                            responses[self.__hostname(api)] = resp if isinstance(resp, dict) else resp.json()
                 except Exception as exc:
                     ret = False
                     self.__logger.error(f"API request generated an exception: {exc}")
@@ -84,3 +86,72 @@ class ApiCaller:
             if response:
                 return ret[0], ret[1]
             return ret[0]
+
+    def send_bans(
+        self, bans: Optional[List[Dict[str, Any]]] = None, unbans: Optional[List[Dict[str, Any]]] = None, timeout=(5, 60)
+    ) -> Tuple[bool, Dict[str, Dict[str, List[Dict[str, Any]]]]]:
+        """Apply bans and unbans on every instance with one POST /bans/bulk request per instance.
+
+        Returns whether every item succeeded on every instance and, by instance hostname, the {"status": ..., "msg": ...} result of each ban and
+        unban in the given order. Instances that don't have the bulk endpoint get the items one by one through /ban and /unban.
+        """
+        items = {"bans": bans or [], "unbans": unbans or []}
+
+        def failed(msg: str) -> Dict[str, List[Dict[str, Any]]]:
+            return {action: [{"status": "error", "msg": msg}] * len(action_items) for action, action_items in items.items()}
+
+        def one_by_one(api: API) -> Dict[str, List[Dict[str, Any]]]:
+            results = {}
+            for action, url in (("bans", "/ban"), ("unbans", "/unban")):
+                results[action] = []
+                for item in items[action]:
+                    sent, err, status, resp = api.request("POST", url, data=item, timeout=timeout)
+                    if not sent:
+                        results[action].append({"status": "error", "msg": err})
+                    else:
+                        results[action].append({"status": "success" if status == 200 else "error", "msg": (resp or {}).get("msg", "")})
+            return results
+
+        def send_request(api: API) -> Dict[str, List[Dict[str, Any]]]:
+            sent, err, status, resp = api.request("POST", "/bans/bulk", data=items, timeout=timeout)
+            if not sent:
+                return failed(err)
+            if status == 404:
+                self.__logger.warning(f"The instance {api.endpoint} doesn't support bulk bans, sending them one by one")
+                return one_by_one(api)
+            if not isinstance(resp, dict) or not isinstance(resp.get("msg"), dict):
+                return failed(f"status = {status}, msg = {resp.get('msg') if isinstance(resp, dict) else resp}")
+
+            results = {}
+            for action, action_items in items.items():
+                # ? An empty array is encoded as an empty object by the instances
+                action_results = resp["msg"].get(action)
+                action_results = action_results if isinstance(action_results, list) else []
+                action_results.extend([{"status": "error", "msg": "missing result"}] * (len(action_items) - len(action_results)))
+                results[action] = action_results[: len(action_items)]
+            return results
+
+        ret = True
+        responses = {}
+        if not items["bans"] and not items["unbans"]:
+            return ret, responses
+
+        with ThreadPoolExecutor() as executor:
+            future_to_api = {executor.submit(send_request, api): api for api in self.apis}
+            for future in as_completed(future_to_api):
+                api = future_to_api[future]
+                try:
+                    results = future.result()
+                except Exception as exc:
+                    self.__logger.error(f"API request generated an exception: {exc}")
+                    results = failed(str(exc))
+
+                errors = sum(result.get("status") != "success" for action_results in results.values() for result in action_results)
+                if errors:
+                    ret = False
+                    self.__logger.error(f"{errors} bans and unbans failed on {api.endpoint}")
+                else:
+                    self.__logger.info(f"Successfully sent {len(items['bans'])} bans and {len(items['unbans'])} unbans to {api.endpoint}")
+                responses[self.__hostname(api)] = results
+
+        return ret, responses
@@ -244,6 +244,53 @@ def add_dir_to_tar_safely(tar: Any, dir_path: Union[str, Path], arc_root: Option
             # unreadable files are ignored silently
 
 
+def plugin_manifest(dir_path: Union[str, Path], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the manifest of a plugin directory with the same exclusions as add_dir_to_tar_safely.
+
+    Files are mapped to [size, mtime_ns, sha256, mode] and directories to their mode, the hash of a file whose size and mtime
+    didn't change since the previous manifest is reused instead of reading the file again.
+
+    Args:
+        dir_path: root directory of the plugin
+        previous: files of a previous manifest of the same directory
+    """
+    d = Path(dir_path)
+    previous = previous or {}
+    files: Dict[str, Any] = {}
+    for p in d.rglob("*"):
+        if plugin_tar_exclude(p):
+            continue
+        relative = p.relative_to(d).as_posix()
+        with suppress(OSError):
+            stat = p.stat()
+            # ? The archives keep the permissions, a plugin update which only makes a job executable must be pushed as well
+            mode = stat.st_mode & 0o777
+            if p.is_dir():
+                files[relative] = mode
+            elif p.is_file() and access(p.as_posix(), R_OK):
+                cached = previous.get(relative)
+                if isinstance(cached, list) and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    files[relative] = [stat.st_size, stat.st_mtime_ns, cached[2], mode]
+                else:
+                    files[relative] = [stat.st_size, stat.st_mtime_ns, file_hash(p, algorithm="sha256"), mode]
+    return files
+
+
+def plugin_manifest_changed(files: Dict[str, Any], previous: Dict[str, Any]) -> bool:
+    """Return True if the content or the permissions of two plugin manifests differ, modification times are ignored."""
+    if files.keys() != previous.keys():
+        return True
+    for path, entry in files.items():
+        previous_entry = previous[path]
+        if isinstance(entry, list) and isinstance(previous_entry, list):
+            # ? Manifests saved before the modes were recorded have no mode, their files are considered as changed once
+            if entry[0] != previous_entry[0] or entry[2:] != previous_entry[2:]:
+                return True
+        elif entry != previous_entry:
+            return True
+    return False
+
+
 def get_redis_client(
     use_redis: bool = False,
     redis_host: Optional[str] = None,
@@ -1,18 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from inspect import currentframe, getframeinfo
 from io import BytesIO
 from logging import Logger
 from os import getenv, replace
-from os.path import sep
+from os.path import normpath, sep
 from pathlib import Path
 from shutil import rmtree
 from tarfile import TarFile, open as tar_open
 from threading import Lock
+from time import perf_counter, sleep
 from traceback import format_exc
-from typing import Any, Dict, Literal, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Union
 from tempfile import NamedTemporaryFile
 from stat import S_IMODE
 
@@ -25,6 +28,11 @@ EXPIRE_TIME = {
     "week": timedelta(weeks=1).total_seconds(),
     "month": timedelta(days=30).total_seconds(),
 }
+DOWNLOAD_MAX_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+URL_CACHE_HEADERS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+SHARED_LIST_PREFIX = "merged-"
+SHARED_LIST_REFERENCE = "# ref: "
 
 
 def _write_atomic(target: Path, data: bytes) -> None:
@@ -102,6 +110,10 @@ class Job:
 
             self.db = Database(logger, sqlalchemy_string=getenv("DATABASE_URI"))
         self.logger = logger or self.db.logger
+        # ? Files cached inside a batch_cache block, per job name, and the source files to delete once they are saved
+        self._cache_batch: Optional[Dict[str, List[Tuple[Optional[str], str, bytes, Optional[str]]]]] = None
+        self._cache_batch_files: Dict[str, List[Path]] = {}
+        self._cache_batch_errors: Dict[str, str] = {}
 
         if not deprecated:
             db_metadata = self.db.get_metadata()
@@ -253,6 +265,12 @@ class Job:
         if not checksum:
             checksum = bytes_hash(content)
 
+        if self._cache_batch is not None:
+            self._cache_batch.setdefault(job_name or self.job_name, []).append((service_id, name, content, checksum))
+            if isinstance(file_cache, Path) and delete_file and file_cache != cache_path:
+                self._cache_batch_files.setdefault(job_name or self.job_name, []).append(file_cache)
+            return ret, ""
+
         try:
             err = self.db.upsert_job_cache(service_id, name, content, job_name=job_name or self.job_name, checksum=checksum)  # type: ignore
             if err:
@@ -264,6 +282,36 @@ class Job:
             return False, f"exception :\n{format_exc()}"
         return ret, err
 
+    @contextmanager
+    def batch_cache(self) -> Iterator[Dict[str, str]]:
+        """Queue the files cached inside the block and save them in the database in a single transaction when leaving it.
+
+        The yielded dict is filled with the errors per job name when leaving the block, the job has to fail if it is not empty."""
+        if self._cache_batch is not None:
+            yield self._cache_batch_errors
+            return
+
+        self._cache_batch, self._cache_batch_files = {}, {}
+        errors = self._cache_batch_errors = {}
+        try:
+            yield errors
+        finally:
+            batch, batch_files = self._cache_batch, self._cache_batch_files
+            self._cache_batch, self._cache_batch_files, self._cache_batch_errors = None, {}, {}
+            for job_name, entries in batch.items():
+                try:
+                    err = self.db.bulk_upsert_job_cache(entries, job_name=job_name)  # type: ignore
+                except BaseException as e:
+                    err = str(e)
+
+                if err:
+                    self.logger.error(f"Error while saving {len(entries)} cache files of job {job_name} in database : {err}")
+                    errors[job_name] = err
+                    continue
+
+                for file in batch_files.get(job_name, []):
+                    file.unlink(missing_ok=True)
+
     def cache_dir(self, dir_path: Union[str, Path], *, job_name: str = "", service_id: str = "") -> Tuple[bool, str]:
         """Cache directory in database and in local cache file."""
         if isinstance(dir_path, str):
@@ -294,12 +342,182 @@ class Job:
         if job_path.is_dir() and not list(job_path.iterdir()):
             rmtree(job_path, ignore_errors=True)
 
+        if self._cache_batch is not None and job_name in self._cache_batch:
+            # ? Don't let the end of the batch write back a file deleted inside it
+            self._cache_batch[job_name] = [entry for entry in self._cache_batch[job_name] if (entry[0], entry[1]) != (service_id, name)]
+
         try:
             self.db.delete_job_cache(name, job_name=job_name, service_id=service_id)  # type: ignore
         except:
             return False, f"exception :\n{format_exc()}"
         return ret, err
 
+    @staticmethod
+    def url_cache_name(url: str) -> str:
+        """Get the name of the cache file holding the content downloaded from an URL."""
+        return f"{bytes_hash(url, algorithm='sha1')}.list"
+
+    def __download_url(self, url: str, *, expire: Literal["hour", "day", "week", "month"], timeout: int, retries: int) -> Dict[str, Any]:
+        result = {"url": url, "status": "failed", "path": None, "temporary": False, "data": None, "headers": {}, "elapsed": 0.0, "error": ""}
+        start = perf_counter()
+        try:
+            name = self.url_cache_name(url)
+            cached = self.get_cache(name, with_info=True, with_data=True)
+            cached_data = None
+            if isinstance(cached, dict) and cached.get("data") is not None:
+                cached_data = cached["data"]
+                last_update = cached.get("last_update")
+                if isinstance(last_update, float) and 0 <= datetime.now().astimezone().timestamp() - last_update < EXPIRE_TIME[expire]:
+                    self.logger.debug(f"URL {url} has already been downloaded less than 1 {expire} ago, skipping download...")
+                    result.update(status="cached", data=cached_data)
+                    return result
+
+            if url.startswith("file://"):
+                path = Path(normpath(url[7:]))
+                if not path.is_file():
+                    raise FileNotFoundError(f"No such file: {path}")
+                self.logger.info(f"Reading data from {path} ...")
+                result.update(status="downloaded", path=path)
+                return result
+
+            # ? Revalidate the stale cached content instead of downloading it again when the server supports it
+            cached_headers = {}
+            if cached_data:
+                for line in cached_data.split(b"\n", len(URL_CACHE_HEADERS) + 1)[1 : len(URL_CACHE_HEADERS) + 1]:  # noqa: E203
+                    for header in URL_CACHE_HEADERS:
+                        if line.startswith(f"# {header}: ".encode("utf-8")):
+                            cached_headers[header] = line.split(b": ", 1)[1].strip().decode("utf-8")
+
+            from requests import get  # type: ignore
+            from requests.exceptions import ConnectionError, Timeout  # type: ignore
+
+            self.logger.info(f"Downloading data from {url} ...")
+            retry_count = 0
+            while True:
+                try:
+                    resp = get(url, stream=True, timeout=timeout, headers={URL_CACHE_HEADERS[header]: value for header, value in cached_headers.items()})
+                    break
+                except (ConnectionError, Timeout) as e:
+                    retry_count += 1
+                    if retry_count >= retries:
+                        raise e
+                    self.logger.warning(f"Can't reach {url}, retrying in {2 ** (retry_count - 1)} second(s)... ({retry_count}/{retries})")
+                    sleep(2 ** (retry_count - 1))
+
+            with resp:
+                if resp.status_code == 304 and cached_data is not None:
+                    self.logger.debug(f"URL {url} has not been modified since the last download")
+                    # ? Rewrite the cache entry so that it is considered fresh again
+                    self.cache_file(name, cached_data)
+                    result.update(status="not_modified", data=cached_data, headers=cached_headers)
+                    return result
+                elif resp.status_code != 200:
+                    raise ValueError(f"Got status code {resp.status_code}")
+
+                with NamedTemporaryFile(prefix=f"{name}.", delete=False) as tmp:
+                    for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        tmp.write(chunk)
+                result.update(
+                    status="downloaded",
+                    path=Path(tmp.name),
+                    temporary=True,
+                    headers={header: resp.headers[header] for header in URL_CACHE_HEADERS if resp.headers.get(header)},
+                )
+        except BaseException as e:
+            self.logger.debug(format_exc())
+            self.logger.error(f"Error while downloading data from {url} : {e}")
+            result["error"] = str(e)
+        finally:
+            result["elapsed"] = perf_counter() - start
+        return result
+
+    def download_urls(
+        self,
+        urls: Iterable[str],
+        *,
+        expire: Literal["hour", "day", "week", "month"] = "hour",
+        max_workers: int = DOWNLOAD_MAX_WORKERS,
+        timeout: int = 10,
+        retries: int = 3,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Download URLs concurrently, reusing fresh cached content and revalidating stale one with ETag/Last-Modified.
+
+        Downloaded bodies are streamed to temporary files which can be read with read_download. Cached and not modified
+        URLs have their cached content in "data" and failed ones have their error in "error".
+        """
+        urls = sorted(set(urls))
+        if not urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+            results = executor.map(lambda url: self.__download_url(url, expire=expire, timeout=timeout, retries=retries), urls)
+            return {result["url"]: result for result in results}
+
+    def read_download(self, download: Dict[str, Any]) -> Iterator[bytes]:
+        """Iterate over the lines of a downloaded URL, the temporary file is removed afterwards."""
+        path = download.get("path")
+        if not path:
+            return
+        try:
+            with Path(path).open("rb") as f:
+                yield from f
+        finally:
+            if download.get("temporary"):
+                Path(path).unlink(missing_ok=True)
+                download["path"] = None
+
+    def cache_download(self, download: Dict[str, Any], content: bytes) -> Tuple[bool, str]:
+        """Cache the processed content of a downloaded URL alongside its ETag/Last-Modified headers."""
+        header = f"# Downloaded from {download['url']}\n"
+        for name, value in download.get("headers", {}).items():
+            if name in URL_CACHE_HEADERS:
+                header += f"# {name}: {value}\n"
+        return self.cache_file(self.url_cache_name(download["url"]), header.encode("utf-8") + content)
+
+    @staticmethod
+    def log_downloads_recap(logger: Logger, downloads: Dict[str, Dict[str, Any]]) -> None:
+        """Log the result and the time spent on each downloaded URL."""
+        for url, download in downloads.items():
+            logger.info(
+                f"URL {url}: {download['status'].replace('_', ' ')}"
+                + (f" ({download['error']})" if download["error"] else "")
+                + f" in {download['elapsed']:.2f}s"
+            )
+
+    @staticmethod
+    def shared_list_name(checksum: str) -> str:
+        """Get the name of the cache file holding a list shared between services."""
+        return f"{SHARED_LIST_PREFIX}{checksum}.list"
+
+    @staticmethod
+    def shared_list_reference(checksum: str) -> bytes:
+        """Get the content of a service list file referencing a shared list."""
+        return f"{SHARED_LIST_REFERENCE}{SHARED_LIST_PREFIX}{checksum}.list\n".encode("utf-8")
+
+    def shared_list_referenced(self, name: Union[str, Path], *, service_id: str = "") -> Optional[str]:
+        """Get the name of the shared list referenced by a cached service list, None if it holds its own entries or doesn't exist."""
+        try:
+            with self.job_path.joinpath(service_id, name).open("rb") as file:
+                first_line = file.readline().decode("utf-8", "replace").strip()
+        except OSError:
+            return None
+        if first_line.startswith(f"{SHARED_LIST_REFERENCE}{SHARED_LIST_PREFIX}"):
+            return first_line.removeprefix(SHARED_LIST_REFERENCE)
+        return None
+
+    def cache_shared_list(self, name: Union[str, Path], content: bytes, *, service_id: str, checksum: Optional[str] = None) -> Tuple[bool, str]:
+        """Cache a list once by content and only store a reference to it for the service."""
+        if not checksum:
+            checksum = bytes_hash(content)
+
+        shared_name = self.shared_list_name(checksum)
+        if self.cache_hash(shared_name) != checksum:
+            cached, err = self.cache_file(shared_name, content, checksum=checksum)
+            if not cached:
+                return cached, err
+
+        return self.cache_file(name, self.shared_list_reference(checksum), service_id=service_id)
+
     def cache_hash(self, name: Union[str, Path], *, job_name: str = "", service_id: str = "", plugin_id: str = "") -> Optional[str]:
         """Get cache file hash from database or from local cache file."""
         if isinstance(name, Path):
@@ -155,8 +155,8 @@ try:
             result = conn.execute(sa.text("SELECT version FROM bw_metadata WHERE id = 1"))
             print(next(result)[0])
         else:
-            # Table doesn't exist, use installed version
-            print("${installed_version}")
+            # Table doesn't exist, the scheduler creates the current schema
+            print("fresh")
 except BaseException as e:
     with open("/var/tmp/bunkerweb/database_error", "w") as file:
         file.write(format_exc())
@@ -193,37 +193,39 @@ EOL
     rm -f /var/tmp/bunkerweb/database_uri
 
     # Update configuration files
-    if [ "$current_version" != "$installed_version" ]; then
-        if [ "$current_version" != "dev" ] && [ "$current_version" != "testing" ]; then
-            if sed -i "s|^version_locations =.*$|version_locations = ${DATABASE}_versions|" alembic.ini; then
-                # Find the corresponding Alembic revision by scanning migration files
-                MIGRATION_DIR="/usr/share/bunkerweb/db/alembic/${DATABASE}_versions"
-                NORMALIZED_VERSION=$(echo "$current_version" | tr '.' '_' | tr '-' '_' | tr '~' '_')
-                REVISION=$(find "$MIGRATION_DIR" -maxdepth 1 -type f -name "*_upgrade_to_version_${NORMALIZED_VERSION}.py" -exec basename {} \; | awk -F_ '{print $1}')
-
-                if [ -z "$REVISION" ]; then
-                    log "SYSTEMCTL" "❌" "No migration file found for database version: $current_version"
-                    exit 1
-                fi
+    # ? The migration also runs when the versions match, to apply the revisions added after the release one (they check the schema before changing it)
+    if [ "$current_version" = "fresh" ]; then
+        log "SYSTEMCTL" "ℹ️" "The database is empty, the scheduler will create its tables, skipping the migration"
+    elif [ "$current_version" != "dev" ] && [ "$current_version" != "testing" ]; then
+        if sed -i "s|^version_locations =.*$|version_locations = ${DATABASE}_versions|" alembic.ini; then
+            # Find the corresponding Alembic revision by scanning migration files
+            MIGRATION_DIR="/usr/share/bunkerweb/db/alembic/${DATABASE}_versions"
+            NORMALIZED_VERSION=$(echo "$current_version" | tr '.' '_' | tr '-' '_' | tr '~' '_')
+            REVISION=$(find "$MIGRATION_DIR" -maxdepth 1 -type f -name "*_upgrade_to_version_${NORMALIZED_VERSION}.py" -exec basename {} \; | awk -F_ '{print $1}')
+
+            if [ -z "$REVISION" ]; then
+                log "SYSTEMCTL" "❌" "No migration file found for database version: $current_version"
+                exit 1
+            fi
 
-                # Stamp the database with the determined revision
-                if $PYTHON_BIN -m alembic stamp "$REVISION"; then
-                    # Run database migration
-                    log "SYSTEMCTL" "ℹ️" "Running database migration..."
-                    if ! $PYTHON_BIN -m alembic upgrade head; then
-                        log "SYSTEMCTL" "❌" "Database migration failed"
-                        exit 1
-                    fi
-                    log "SYSTEMCTL" "✅" "Database migration completed successfully"
-                else
-                    log "SYSTEMCTL" "❌" "Failed to stamp database with revision: $REVISION, migration aborted"
+            # Stamp the database with the determined revision
+            if $PYTHON_BIN -m alembic stamp "$REVISION"; then
+                # Run database migration
+                log "SYSTEMCTL" "ℹ️" "Running database migration..."
+                if ! $PYTHON_BIN -m alembic upgrade head; then
+                    log "SYSTEMCTL" "❌" "Database migration failed"
+                    exit 1
                 fi
+                log "SYSTEMCTL" "✅" "Database migration completed successfully"
             else
-                log "SYSTEMCTL" "❌" "Failed to update version locations in configuration, migration aborted"
+                log "SYSTEMCTL" "❌" "Failed to stamp database with revision: $REVISION, migration aborted"
             fi
         else
-            # Create temporary Python script to update version
-            cat > /tmp/version_update.py << EOL
+            log "SYSTEMCTL" "❌" "Failed to update version locations in configuration, migration aborted"
+        fi
+    elif [ "$current_version" != "$installed_version" ]; then
+        # Create temporary Python script to update version
+        cat > /tmp/version_update.py << EOL
 #!/usr/bin/env python3
 import sqlalchemy as sa
 from os import getenv
@@ -237,17 +239,16 @@ db = Database(LOGGER)
 with db.sql_engine.connect() as conn:
     conn.execute(sa.text("UPDATE bw_metadata SET version = '${installed_version}' WHERE id = 1"))
 EOL
-            # Ensure the temporary script is readable by nginx under UMask=027
-            chown root:nginx /tmp/version_update.py
-            chmod 640 /tmp/version_update.py
+        # Ensure the temporary script is readable by nginx under UMask=027
+        chown root:nginx /tmp/version_update.py
+        chmod 640 /tmp/version_update.py
 
-            if ! run_as_nginx env PYTHONPATH="$PYTHONPATH" "$PYTHON_BIN" /tmp/version_update.py; then
-                log "SYSTEMCTL" "❌" "Failed to update database version (nginx user execution error)"
-                rm -f /tmp/version_update.py
-                exit 1
-            fi
+        if ! run_as_nginx env PYTHONPATH="$PYTHONPATH" "$PYTHON_BIN" /tmp/version_update.py; then
+            log "SYSTEMCTL" "❌" "Failed to update database version (nginx user execution error)"
             rm -f /tmp/version_update.py
+            exit 1
         fi
+        rm -f /tmp/version_update.py
     fi
 
     cd - > /dev/null || exit 1
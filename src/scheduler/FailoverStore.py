@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+from contextlib import suppress
+from datetime import datetime
+from fcntl import ioctl
+from hashlib import sha256
+from json import dumps, loads
+from logging import Logger
+from os import link, replace, stat_result, symlink, walk
+from pathlib import Path
+from shutil import copyfile, rmtree
+from stat import S_IMODE
+from typing import Any, Dict, Optional, Tuple
+
+from Database import Database  # type: ignore
+from logger import getLogger  # type: ignore
+
+FICLONE = 0x40049409  # ? ioctl to reflink a file on filesystems supporting it (btrfs, xfs, ...)
+MANIFEST_NAME = ".manifest.json"
+LEGACY_FAILOVER_CACHE = "folder:/var/tmp/bunkerweb/failover.tgz"
+
+
+class FailoverStore:
+    """Failover snapshots of the last working configuration kept as generations of hard links to content-addressed objects.
+
+    Each file is stored once per content in the objects directory (reflinked when the filesystem allows it, copied otherwise) and every generation
+    is a tree of hard links to these objects. The failover path is a symlink to the current generation so that it is switched atomically, and only
+    the files the database doesn't have yet are saved in it along with the manifest of the generation.
+    """
+
+    def __init__(self, failover_path: Path, store_path: Path, db: Database, logger: Optional[Logger] = None, *, keep: int = 2):
+        self.failover_path = failover_path
+        self.store_path = store_path
+        self.objects_path = store_path.joinpath("objects")
+        self.generations_path = store_path.joinpath("generations")
+        self.db = db
+        self.logger = logger or getLogger("SCHEDULER.FAILOVER")
+        self.keep = max(keep, 1)
+        self._legacy_removed = False
+
+    # ------------------ Objects ------------------
+    def _object_path(self, checksum: str, mode: int) -> Path:
+        return self.objects_path.joinpath(checksum[:2], f"{checksum}-{mode:o}")
+
+    def _store_object(self, source: Path, checksum: str, mode: int) -> Path:
+        object_path = self._object_path(checksum, mode)
+        if object_path.is_file():
+            return object_path
+
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_name(f".{object_path.name}.tmp")
+        try:
+            with source.open("rb") as src, tmp_path.open("wb") as dst:
+                ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            copyfile(source, tmp_path)
+        tmp_path.chmod(mode)
+        replace(tmp_path, object_path)
+        return object_path
+
+    def _write_object(self, data: bytes, checksum: str, mode: int) -> Path:
+        object_path = self._object_path(checksum, mode)
+        if not object_path.is_file():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = object_path.with_name(f".{object_path.name}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.chmod(mode)
+            replace(tmp_path, object_path)
+        return object_path
+
+    @staticmethod
+    def _file_checksum(path: Path) -> str:
+        _hash = sha256()
+        with path.open("rb") as f:
+            while chunk := f.read(1024 * 1024):
+                _hash.update(chunk)
+        return _hash.hexdigest()
+
+    # ------------------ Generations ------------------
+    @staticmethod
+    def manifest_checksum(manifest: Dict[str, Any]) -> str:
+        """Checksum of the content of a manifest, the modification times of the files are ignored."""
+        content = {"dirs": sorted(manifest["dirs"]), "files": {path: entry[:2] for path, entry in sorted(manifest["files"].items())}}
+        return sha256(dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def current_generation(self) -> Optional[Path]:
+        if not self.failover_path.is_symlink():
+            return None
+        target = self.failover_path.resolve()
+        return target if target.is_dir() else None
+
+    def _read_manifest(self, generation: Optional[Path]) -> Optional[Dict[str, Any]]:
+        if not generation:
+            return None
+        with suppress(OSError, ValueError):
+            return loads(generation.joinpath(MANIFEST_NAME).read_text(encoding="utf-8"))
+        return None
+
+    def _build_generation(self, manifest: Dict[str, Any], objects: Dict[str, Path]) -> Path:
+        self.generations_path.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now().astimezone().strftime('%Y%m%d%H%M%S%f')}-{manifest['checksum'][:12]}"
+        tmp_generation = self.generations_path.joinpath(f".{name}.tmp")
+        rmtree(tmp_generation, ignore_errors=True)
+        tmp_generation.mkdir(parents=True)
+
+        for directory in sorted(manifest["dirs"]):
+            tmp_generation.joinpath(directory).mkdir(parents=True, exist_ok=True)
+        for path, (checksum, mode, *_) in manifest["files"].items():
+            target = tmp_generation.joinpath(path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            link(objects[f"{checksum}-{mode:o}"], target)
+        tmp_generation.joinpath(MANIFEST_NAME).write_text(dumps(manifest), encoding="utf-8")
+
+        generation = self.generations_path.joinpath(name)
+        replace(tmp_generation, generation)
+        return generation
+
+    def _switch_to(self, generation: Path):
+        """Point the failover path to the generation, the symlink is replaced atomically."""
+        if self.failover_path.is_dir() and not self.failover_path.is_symlink():
+            # ? The failover path was a plain directory before the snapshots
+            rmtree(self.failover_path, ignore_errors=True)
+        tmp_link = self.failover_path.with_name(f".{self.failover_path.name}.tmp")
+        tmp_link.unlink(missing_ok=True)
+        symlink(generation, tmp_link)
+        replace(tmp_link, self.failover_path)
+
+    def _prune(self, current: Path):
+        generations = sorted((path for path in self.generations_path.iterdir() if path.is_dir() and not path.name.startswith(".")), reverse=True)
+        for generation in [generation for generation in generations if generation != current][self.keep - 1 :]:  # noqa: E203
+            rmtree(generation, ignore_errors=True)
+
+        # Objects only linked from the objects directory are no longer used by any generation
+        for object_path in self.objects_path.glob("*/*"):
+            with suppress(OSError):
+                if object_path.stat().st_nlink == 1:
+                    object_path.unlink()
+
+    # ------------------ Snapshots ------------------
+    def _scan(self, sources: Dict[str, Path], previous: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Path]]:
+        """Build the manifest of the sources and store their files as objects, the checksum of an unchanged file (same size and mtime) is reused."""
+        previous_files = (previous or {}).get("files", {})
+        manifest: Dict[str, Any] = {"dirs": [], "files": {}}
+        objects: Dict[str, Path] = {}
+
+        for name, source in sources.items():
+            if not source.is_dir():
+                continue
+            manifest["dirs"].append(name)
+            for root, dirs, files in walk(source, followlinks=True):
+                root_path = Path(root)
+                relative_root = Path(name, root_path.relative_to(source))
+                for directory in dirs:
+                    manifest["dirs"].append(relative_root.joinpath(directory).as_posix())
+                for file in files:
+                    path = root_path.joinpath(file)
+                    relative = relative_root.joinpath(file).as_posix()
+                    try:
+                        file_stat: stat_result = path.stat()
+                    except OSError:
+                        continue
+
+                    mode = S_IMODE(file_stat.st_mode)
+                    entry = previous_files.get(relative)
+                    if entry and entry[2:] == [file_stat.st_size, file_stat.st_mtime_ns] and self._object_path(entry[0], mode).is_file():
+                        checksum = entry[0]
+                    else:
+                        try:
+                            checksum = self._file_checksum(path)
+                        except OSError:
+                            continue
+
+                    try:
+                        objects[f"{checksum}-{mode:o}"] = self._store_object(path, checksum, mode)
+                    except OSError as e:
+                        self.logger.warning(f"Couldn't add {path} to the failover snapshot: {e}")
+                        continue
+                    manifest["files"][relative] = [checksum, mode, file_stat.st_size, file_stat.st_mtime_ns]
+
+        manifest["checksum"] = self.manifest_checksum(manifest)
+        return manifest, objects
+
+    def snapshot(self, sources: Dict[str, Path]) -> bool:
+        """Take a snapshot of the sources (name -> directory) as the new failover generation and save its new files in the database."""
+        current = self.current_generation()
+        previous = self._read_manifest(current)
+        manifest, objects = self._scan(sources, previous)
+
+        if previous and previous.get("checksum") == manifest["checksum"] and current:
+            self.logger.debug("The failover snapshot didn't change, keeping the current generation")
+            generation = current
+        else:
+            generation = self._build_generation(manifest, objects)
+            self._switch_to(generation)
+        self._prune(generation)
+
+        stored = self.db.get_failover_checksums()
+        snapshot = self.db.get_failover_snapshot()
+        if snapshot and snapshot["checksum"] == manifest["checksum"] and all(entry[0] in stored for entry in manifest["files"].values()):
+            return True
+
+        new_objects = {}
+        for checksum, mode, *_ in manifest["files"].values():
+            if checksum not in stored and checksum not in new_objects:
+                new_objects[checksum] = objects[f"{checksum}-{mode:o}"].read_bytes()
+
+        err = self.db.save_failover_snapshot(manifest["checksum"], manifest, new_objects)
+        if err:
+            self.logger.error(f"Couldn't save the failover snapshot in the database: {err}")
+            return False
+        self.logger.debug(f"Saved the failover snapshot in the database with {len(new_objects)} new files out of {len(manifest['files'])}")
+
+        if not self._legacy_removed:
+            # ? Snapshots were stored as a single archive in the jobs cache before
+            self.db.delete_job_cache(LEGACY_FAILOVER_CACHE, job_name="failover-backup")
+            self._legacy_removed = True
+        return True
+
+    def restore(self) -> bool:
+        """Make the failover path point to the snapshot saved in the database, a local generation of the same snapshot is switched to without copying anything."""
+        snapshot = self.db.get_failover_snapshot()
+        if not snapshot:
+            return False
+
+        manifest = snapshot["manifest"]
+        current = self.current_generation()
+        if current and (self._read_manifest(current) or {}).get("checksum") == snapshot["checksum"]:
+            return True
+
+        if self.generations_path.is_dir():
+            for generation in sorted(self.generations_path.iterdir(), reverse=True):
+                if not generation.name.startswith(".") and (self._read_manifest(generation) or {}).get("checksum") == snapshot["checksum"]:
+                    self.logger.info(f"Switching the failover configuration back to the local generation {generation.name}")
+                    self._switch_to(generation)
+                    return True
+
+        objects = {}
+        missing = {}
+        for checksum, mode, *_ in manifest["files"].values():
+            object_path = self._object_path(checksum, mode)
+            if object_path.is_file():
+                objects[f"{checksum}-{mode:o}"] = object_path
+            else:
+                missing.setdefault(checksum, set()).add(mode)
+
+        if missing:
+            data = self.db.get_failover_objects(missing.keys())
+            for checksum, modes in missing.items():
+                if checksum not in data:
+                    self.logger.error(f"The failover snapshot file {checksum} is missing from the database, can't restore it")
+                    return False
+                for mode in modes:
+                    objects[f"{checksum}-{mode:o}"] = self._write_object(data[checksum], checksum, mode)
+
+        generation = self._build_generation(manifest, objects)
+        self._switch_to(generation)
+        self._prune(generation)
+        self.logger.info(f"Restored the failover configuration from the database ({len(missing)} files fetched)")
+        return True
@@ -74,8 +74,8 @@ try:
 			result = conn.execute(sa.text('SELECT version FROM bw_metadata WHERE id = 1'))
 			print(next(result)[0])
 		else:
-			# Table doesn't exist, use installed version
-			print('${installed_version}')
+			# Table doesn't exist, the scheduler creates the current schema
+			print('fresh')
 except BaseException as e:
 	with open('/var/tmp/bunkerweb/database_error', 'w') as file:
 		file.write(format_exc())
@@ -100,36 +100,38 @@ export DATABASE_URI
 rm -f /var/tmp/bunkerweb/database_uri
 
 # Update configuration files
-if [ "$current_version" != "$installed_version" ]; then
-	if [ "$current_version" != "dev" ] && [ "$current_version" != "testing" ]; then
-		if sed -i "s|^version_locations =.*$|version_locations = ${DATABASE}_versions|" alembic.ini; then
-			# Find the corresponding Alembic revision by scanning migration files
-			MIGRATION_DIR="/usr/share/bunkerweb/db/alembic/${DATABASE}_versions"
-			NORMALIZED_VERSION=$(echo "$current_version" | tr '.' '_' | tr '-' '_' | tr '~' '_')
-			REVISION=$(find "$MIGRATION_DIR" -maxdepth 1 -type f -name "*_upgrade_to_version_${NORMALIZED_VERSION}.py" -exec basename {} \; | awk -F_ '{print $1}')
-
-			if [ -z "$REVISION" ]; then
-				log "ENTRYPOINT" "❌" "No migration file found for database version: $current_version"
-				exit 1
-			fi
+# ? The migration also runs when the versions match, to apply the revisions added after the release one (they check the schema before changing it)
+if [ "$current_version" = "fresh" ]; then
+	log "ENTRYPOINT" "ℹ️" "The database is empty, the scheduler will create its tables, skipping the migration"
+elif [ "$current_version" != "dev" ] && [ "$current_version" != "testing" ]; then
+	if sed -i "s|^version_locations =.*$|version_locations = ${DATABASE}_versions|" alembic.ini; then
+		# Find the corresponding Alembic revision by scanning migration files
+		MIGRATION_DIR="/usr/share/bunkerweb/db/alembic/${DATABASE}_versions"
+		NORMALIZED_VERSION=$(echo "$current_version" | tr '.' '_' | tr '-' '_' | tr '~' '_')
+		REVISION=$(find "$MIGRATION_DIR" -maxdepth 1 -type f -name "*_upgrade_to_version_${NORMALIZED_VERSION}.py" -exec basename {} \; | awk -F_ '{print $1}')
+
+		if [ -z "$REVISION" ]; then
+			log "ENTRYPOINT" "❌" "No migration file found for database version: $current_version"
+			exit 1
+		fi
 
-			# Stamp the database with the determined revision
-			if python3 -m alembic stamp "$REVISION"; then
-				# Run database migration
-				log "ENTRYPOINT" "ℹ️" "Running database migration..."
-				if ! python3 -m alembic upgrade head; then
-					log "ENTRYPOINT" "❌" "Database migration failed"
-					exit 1
-				fi
-				log "ENTRYPOINT" "✅" "Database migration completed successfully"
-			else
-				log "ENTRYPOINT" "❌" "Failed to stamp database with revision: $REVISION, migration aborted"
+		# Stamp the database with the determined revision
+		if python3 -m alembic stamp "$REVISION"; then
+			# Run database migration
+			log "ENTRYPOINT" "ℹ️" "Running database migration..."
+			if ! python3 -m alembic upgrade head; then
+				log "ENTRYPOINT" "❌" "Database migration failed"
+				exit 1
 			fi
+			log "ENTRYPOINT" "✅" "Database migration completed successfully"
 		else
-			log "ENTRYPOINT" "❌" "Failed to update version locations in configuration, migration aborted"
+			log "ENTRYPOINT" "❌" "Failed to stamp database with revision: $REVISION, migration aborted"
 		fi
 	else
-		python3 -c "
+		log "ENTRYPOINT" "❌" "Failed to update version locations in configuration, migration aborted"
+	fi
+elif [ "$current_version" != "$installed_version" ]; then
+	python3 -c "
 import sqlalchemy as sa
 from os import getenv
 
@@ -140,9 +142,8 @@ LOGGER = getLogger('SCHEDULER')
 
 db = Database(LOGGER)
 with db.sql_engine.connect() as conn:
-		conn.execute(sa.text('UPDATE bw_metadata SET version = \"${installed_version}\" WHERE id = 1'))
+	conn.execute(sa.text('UPDATE bw_metadata SET version = \"${installed_version}\" WHERE id = 1'))
 "
-	fi
 fi
 
 cd - > /dev/null || exit 1
@@ -11,7 +11,7 @@ from logging import Logger
 from os import _exit, environ, getenv, getpid, sep, access, R_OK
 from os.path import join
 from pathlib import Path
-from shutil import copy, rmtree, copytree
+from shutil import copy, rmtree
 from signal import SIGINT, SIGTERM, signal, SIGHUP
 from stat import S_IRGRP, S_IRUSR, S_IWUSR, S_IXGRP, S_IXUSR
 from subprocess import run as subprocess_run, DEVNULL, STDOUT
@@ -20,7 +20,7 @@ from tarfile import TarFile, open as tar_open
 from threading import Event, Lock
 from time import sleep
 from traceback import format_exc
-from typing import Any, Dict, List, Literal, Optional, Union, cast
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union, cast
 
 BUNKERWEB_PATH = Path(sep, "usr", "share", "bunkerweb")
 
@@ -30,9 +30,19 @@ for deps_path in [BUNKERWEB_PATH.joinpath(*paths).as_posix() for paths in (("dep
 
 from schedule import every as schedule_every, run_pending
 
-from common_utils import bytes_hash, dict_to_frozenset, handle_docker_secrets, add_dir_to_tar_safely, plugin_tar_exclude, plugin_tar_filter  # type: ignore
+from common_utils import (  # type: ignore
+    bytes_hash,
+    dict_to_frozenset,
+    handle_docker_secrets,
+    add_dir_to_tar_safely,
+    plugin_manifest,
+    plugin_manifest_changed,
+    plugin_tar_exclude,
+    plugin_tar_filter,
+)
 from logger import getLogger  # type: ignore
 from Database import Database  # type: ignore
+from FailoverStore import FailoverStore
 from JobScheduler import JobScheduler
 from jobs import Job, _write_atomic  # type: ignore
 from API import API  # type: ignore
@@ -81,11 +91,13 @@ TMP_PATH.mkdir(parents=True, exist_ok=True)
 NGINX_TMP_VARIABLES_PATH = TMP_PATH.joinpath("variables.env")
 
 FAILOVER_PATH = TMP_PATH.joinpath("failover")
-FAILOVER_PATH.mkdir(parents=True, exist_ok=True)
+if not FAILOVER_PATH.is_symlink():
+    FAILOVER_PATH.mkdir(parents=True, exist_ok=True)
+FAILOVER_STORE_PATH = TMP_PATH.joinpath("failover-store")
+FAILOVER_STORE: Optional[FailoverStore] = None
 
 HEALTHY_PATH = TMP_PATH.joinpath("scheduler.healthy")
 
-DB_LOCK_FILE = Path(sep, "var", "lib", "bunkerweb", "db.lock")
 LOGGER = getLogger("SCHEDULER")
 
 HEALTHCHECK_INTERVAL = getenv("HEALTHCHECK_INTERVAL", "30")
@@ -97,6 +109,9 @@ if not HEALTHCHECK_INTERVAL.isdigit():
 HEALTHCHECK_INTERVAL = int(HEALTHCHECK_INTERVAL)
 HEALTHCHECK_EVENT = Event()
 HEALTHCHECK_LOGGER = getLogger("SCHEDULER.HEALTHCHECK")
+HEALTHCHECK_TIMEOUT = (3, 5)
+HEALTHCHECK_MAX_WORKERS = 16
+HEALTHCHECK_CONFIG_VERSION: Optional[int] = None
 
 # Shared executor to reuse worker threads across scheduler tasks
 SCHEDULER_TASKS_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bw-scheduler-tasks")
@@ -215,13 +230,11 @@ def send_file_to_bunkerweb(file_path: Path, endpoint: str, logger: Logger = LOGG
     fails = []
 
     if not IGNORE_FAIL_SENDING_CONFIG:
+        # ? Only the instances the files were sent to are updated
+        targets = {api.endpoint for api in api_caller.apis} if api_caller else None
         for db_instance in SCHEDULER.db.get_instances():
-            index = -1
-            with SCHEDULER_LOCK:
-                for i, api in enumerate(SCHEDULER.apis):
-                    if api.endpoint == f"{_instance_endpoint(db_instance)}/":
-                        index = i
-                        break
+            if targets is not None and f"{_instance_endpoint(db_instance)}/" not in targets:
+                continue
 
             status = responses.get(db_instance["hostname"], {"status": "down"}).get("status", "down")
 
@@ -230,6 +243,13 @@ def send_file_to_bunkerweb(file_path: Path, endpoint: str, logger: Logger = LOGG
                 logger.error(f"Couldn't update instance {db_instance['hostname']} status to down in the database: {ret}")
 
             with SCHEDULER_LOCK:
+                # ? The lookup is done under the same lock as the change so that concurrent sends don't add the same instance twice
+                index = -1
+                for i, api in enumerate(SCHEDULER.apis):
+                    if api.endpoint == f"{_instance_endpoint(db_instance)}/":
+                        index = i
+                        break
+
                 if status == "success":
                     success = True
                     if index == -1:
@@ -313,6 +333,10 @@ def generate_external_plugins(original_path: Union[Path, str] = EXTERNAL_PLUGINS
     plugins = SCHEDULER.db.get_plugins(_type="pro" if pro else "external", with_data=True)
     assert plugins is not None, "Couldn't get plugins from database"
 
+    # ? The manifests tell which plugins changed without having to archive them again
+    manifests = SCHEDULER.db.get_plugins_manifests(_type="pro" if pro else "external")
+    new_manifests = {}
+
     # Remove old external/pro plugins files
     LOGGER.info(f"Removing old/changed {'pro ' if pro else ''}external plugins files ...")
     ignored_plugins = set()
@@ -321,20 +345,32 @@ def generate_external_plugins(original_path: Union[Path, str] = EXTERNAL_PLUGINS
             with suppress(StopIteration, IndexError, FileNotFoundError):
                 index = next(i for i, plugin in enumerate(plugins) if plugin["id"] == file.name)
 
-                with BytesIO() as plugin_content:
-                    with tar_open(fileobj=plugin_content, mode="w:gz", compresslevel=9) as tar:
-                        if file.is_dir():
-                            add_dir_to_tar_safely(tar, file, arc_root=file.name)
-                        elif file.is_file():
-                            if not plugin_tar_exclude(file.as_posix()) and access(file.as_posix(), R_OK):
-                                tar.add(file.as_posix(), arcname=file.name, recursive=False, filter=plugin_tar_filter)
-                            else:
-                                LOGGER.debug(f"Excluding file from tar: {file}")
-                    plugin_content.seek(0, 0)
-                    if bytes_hash(plugin_content, algorithm="sha256") == plugins[index]["checksum"]:
+                manifest = manifests.get(file.name)
+                if manifest and file.is_dir():
+                    files = plugin_manifest(file, manifest["files"])
+                    if not plugin_manifest_changed(files, manifest["files"]):
                         ignored_plugins.add(file.name)
+                        if files != manifest["files"]:
+                            new_manifests[file.name] = manifest | {"files": files}
                         continue
-                    LOGGER.debug(f"Checksum of {file} has changed, removing it ...")
+                    LOGGER.debug(f"Manifest of {file} has changed, removing it ...")
+                else:
+                    with BytesIO() as plugin_content:
+                        with tar_open(fileobj=plugin_content, mode="w:gz", compresslevel=9) as tar:
+                            if file.is_dir():
+                                add_dir_to_tar_safely(tar, file, arc_root=file.name)
+                            elif file.is_file():
+                                if not plugin_tar_exclude(file.as_posix()) and access(file.as_posix(), R_OK):
+                                    tar.add(file.as_posix(), arcname=file.name, recursive=False, filter=plugin_tar_filter)
+                                else:
+                                    LOGGER.debug(f"Excluding file from tar: {file}")
+                        plugin_content.seek(0, 0)
+                        if bytes_hash(plugin_content, algorithm="sha256") == plugins[index]["checksum"]:
+                            ignored_plugins.add(file.name)
+                            if file.is_dir() and plugins[index]["checksum"]:
+                                new_manifests[file.name] = {"checksum": plugins[index]["checksum"], "files": plugin_manifest(file)}
+                            continue
+                        LOGGER.debug(f"Checksum of {file} has changed, removing it ...")
 
             if file.is_symlink() or file.is_file():
                 with suppress(OSError):
@@ -368,6 +404,9 @@ def generate_external_plugins(original_path: Union[Path, str] = EXTERNAL_PLUGINS
                         for executable_file in plugin_path.joinpath(subdir).rglob(pattern):
                             if executable_file.stat().st_mode & 0o777 != desired_perms:
                                 executable_file.chmod(desired_perms)
+
+                    if plugin["checksum"] and plugin_path.is_dir():
+                        new_manifests[plugin["id"]] = {"checksum": plugin["checksum"], "files": plugin_manifest(plugin_path)}
             except OSError as e:
                 LOGGER.debug(format_exc())
                 if plugin["method"] != "manual":
@@ -376,6 +415,10 @@ def generate_external_plugins(original_path: Union[Path, str] = EXTERNAL_PLUGINS
                 LOGGER.debug(format_exc())
                 LOGGER.error(f"Error while generating {'pro ' if pro else ''}external plugins \"{plugin['name']}\": {e}")
 
+    err = SCHEDULER.db.update_plugins_manifests(new_manifests)
+    if err:
+        LOGGER.warning(f"Couldn't save the manifests of the {'pro ' if pro else ''}external plugins to the database: {err}")
+
     if send and SCHEDULER and SCHEDULER.apis:
         LOGGER.info(f"Sending {'pro ' if pro else ''}external plugins to BunkerWeb")
         send_file_to_bunkerweb(original_path, "/pro_plugins" if original_path.as_posix().endswith("/pro/plugins") else "/plugins")
@@ -482,171 +525,159 @@ def generate_configs(logger: Logger = LOGGER) -> bool:
     return True
 
 
-def healthcheck_job():
-    if HEALTHCHECK_EVENT.is_set():
-        HEALTHCHECK_LOGGER.warning("Healthcheck job is already running, skipping execution ...")
-        return
-
+def probe_instance(db_instance: Dict[str, Any]) -> Tuple[API, bool, Optional[Dict[str, Any]]]:
+    """Send a health request to an instance and tell whether it answered successfully."""
+    bw_instance = API.from_instance(db_instance)
     try:
-        assert SCHEDULER is not None
-    except AssertionError:
-        return
+        sent, err, status, resp = bw_instance.request("GET", "health", timeout=HEALTHCHECK_TIMEOUT)
+    except BaseException as e:
+        err = str(e)
+        sent = False
+        status = 500
+        resp = {"status": "down", "msg": err}
 
-    HEALTHCHECK_EVENT.set()
+    HEALTHCHECK_LOGGER.debug(resp)
 
-    if APPLYING_CHANGES.is_set():
-        return
+    if not sent:
+        HEALTHCHECK_LOGGER.warning(
+            f"Can't send API request to {bw_instance.endpoint}health : {err}, healthcheck will be retried in {HEALTHCHECK_INTERVAL} seconds ..."
+        )
+        return bw_instance, False, resp
+    elif status != 200:
+        HEALTHCHECK_LOGGER.warning(
+            f"Error while sending API request to {bw_instance.endpoint}health : status = {resp['status']}, msg = {resp['msg']}, healthcheck will be retried in {HEALTHCHECK_INTERVAL} seconds ..."
+        )
+        return bw_instance, False, resp
+    return bw_instance, True, resp
 
-    env = None
 
-    for db_instance in SCHEDULER.db.get_instances():
-        bw_instance = API.from_instance(db_instance)
-        try:
-            try:
-                sent, err, status, resp = bw_instance.request("GET", "health")
-            except BaseException as e:
-                err = str(e)
-                sent = False
-                status = 500
-                resp = {"status": "down", "msg": err}
+def set_instance_reachable(db_instance: Dict[str, Any], bw_instance: API, reachable: bool):
+    ret = SCHEDULER.db.update_instance(db_instance["hostname"], "up" if reachable else "down")
+    if ret:
+        HEALTHCHECK_LOGGER.error(f"Couldn't update instance {bw_instance.endpoint} status to {'up' if reachable else 'down'} in the database: {ret}")
 
-            HEALTHCHECK_LOGGER.debug(resp)
+    with SCHEDULER_LOCK:
+        for i, api in enumerate(SCHEDULER.apis):
+            if api.endpoint == bw_instance.endpoint:
+                if not reachable:
+                    HEALTHCHECK_LOGGER.debug(f"Removing {bw_instance.endpoint} from the list of reachable instances")
+                    del SCHEDULER.apis[i]
+                break
+        else:
+            if reachable:
+                HEALTHCHECK_LOGGER.debug(f"Adding {bw_instance.endpoint} to the list of reachable instances")
+                SCHEDULER.apis.append(bw_instance)
 
-            success = True
-            if not sent:
-                HEALTHCHECK_LOGGER.warning(
-                    f"Can't send API request to {bw_instance.endpoint}health : {err}, healthcheck will be retried in {HEALTHCHECK_INTERVAL} seconds ..."
-                )
-                success = False
-            elif status != 200:
-                HEALTHCHECK_LOGGER.warning(
-                    f"Error while sending API request to {bw_instance.endpoint}health : status = {resp['status']}, msg = {resp['msg']}, healthcheck will be retried in {HEALTHCHECK_INTERVAL} seconds ..."
-                )
-                success = False
 
-            if not success:
-                ret = SCHEDULER.db.update_instance(db_instance["hostname"], "down")
-                if ret:
-                    HEALTHCHECK_LOGGER.error(f"Couldn't update instance {bw_instance.endpoint} status to down in the database: {ret}")
+def send_config_to_instances(loading_instances: List[Tuple[Dict[str, Any], API]]):
+    """Send the same generated configuration to all the instances found loading during a healthcheck round then reload them."""
+    global HEALTHCHECK_CONFIG_VERSION
+
+    env = SCHEDULER.db.get_config()
+
+    # ? The configuration is only generated again when changes were applied since it was last generated by the healthcheck
+    config_version = SCHEDULER.db.get_apply_status()["generation"]
+    if config_version != HEALTHCHECK_CONFIG_VERSION or not CONFIG_PATH.joinpath("nginx.conf").is_file():
+        if not generate_configs(HEALTHCHECK_LOGGER):
+            return
+        HEALTHCHECK_CONFIG_VERSION = config_version
+    else:
+        HEALTHCHECK_LOGGER.debug(f"Configuration of version {config_version} is already generated, reusing it ...")
+
+    api_caller = ApiCaller([bw_instance for _, bw_instance in loading_instances])
+    tmp_futures = [
+        SCHEDULER_TASKS_EXECUTOR.submit(send_file_to_bunkerweb, path, endpoint, HEALTHCHECK_LOGGER, api_caller=api_caller)
+        for path, endpoint in (
+            (CUSTOM_CONFIGS_PATH, "/custom_configs"),
+            (EXTERNAL_PLUGINS_PATH, "/plugins"),
+            (PRO_PLUGINS_PATH, "/pro_plugins"),
+            (CONFIG_PATH, "/confs"),
+            (CACHE_PATH, "/cache"),
+        )
+    ]
+    for future in tmp_futures:
+        future.result()
+
+    _, responses = api_caller.send_to_apis(
+        "POST",
+        f"/reload?test={'no' if DISABLE_CONFIGURATION_TESTING else 'yes'}",
+        timeout=max(RELOAD_MIN_TIMEOUT, 3 * len(env.get("SERVER_NAME", "www.example.com").split())),
+        response=True,
+    )
 
-                for i, api in enumerate(SCHEDULER.apis):
-                    if api.endpoint == bw_instance.endpoint:
-                        HEALTHCHECK_LOGGER.debug(f"Removing {bw_instance.endpoint} from the list of reachable instances")
-                        del SCHEDULER.apis[i]
-                        break
-                continue
+    for db_instance, bw_instance in loading_instances:
+        if (responses or {}).get(db_instance["hostname"], {}).get("status") != "success":
+            HEALTHCHECK_LOGGER.error(f"Error while reloading instance {bw_instance.endpoint}")
+            ret = SCHEDULER.db.update_instance(db_instance["hostname"], "loading")
+            if ret:
+                HEALTHCHECK_LOGGER.error(f"Couldn't update instance {bw_instance.endpoint} status to loading in the database: {ret}")
+            continue
+        HEALTHCHECK_LOGGER.info(f"Successfully reloaded instance {bw_instance.endpoint}")
+        set_instance_reachable(db_instance, bw_instance, True)
 
-            if resp["msg"] == "loading":
-                if db_instance["status"] == "failover":
-                    HEALTHCHECK_LOGGER.warning(f"Instance {db_instance['hostname']} is in failover mode, skipping sending config ...")
-                    continue
 
-                HEALTHCHECK_LOGGER.info(f"Instance {bw_instance.endpoint} is loading, sending config ...")
-                api_caller = ApiCaller([bw_instance])
+def healthcheck_job():
+    if HEALTHCHECK_EVENT.is_set():
+        HEALTHCHECK_LOGGER.warning("Healthcheck job is already running, skipping execution ...")
+        return
 
-                if env is None:
-                    env = SCHEDULER.db.get_config()
-                    env["DATABASE_URI"] = SCHEDULER.db.database_uri
-                    tz = getenv("TZ")
-                    if tz:
-                        env["TZ"] = tz
+    if SCHEDULER is None or APPLYING_CHANGES.is_set():
+        return
 
-                generate_configs(HEALTHCHECK_LOGGER)
-
-                tmp_futures = [
-                    SCHEDULER_TASKS_EXECUTOR.submit(
-                        send_file_to_bunkerweb,
-                        CUSTOM_CONFIGS_PATH,
-                        "/custom_configs",
-                        HEALTHCHECK_LOGGER,
-                        api_caller=api_caller,
-                    ),
-                    SCHEDULER_TASKS_EXECUTOR.submit(
-                        send_file_to_bunkerweb,
-                        EXTERNAL_PLUGINS_PATH,
-                        "/plugins",
-                        HEALTHCHECK_LOGGER,
-                        api_caller=api_caller,
-                    ),
-                    SCHEDULER_TASKS_EXECUTOR.submit(
-                        send_file_to_bunkerweb,
-                        PRO_PLUGINS_PATH,
-                        "/pro_plugins",
-                        HEALTHCHECK_LOGGER,
-                        api_caller=api_caller,
-                    ),
-                    SCHEDULER_TASKS_EXECUTOR.submit(
-                        send_file_to_bunkerweb,
-                        CONFIG_PATH,
-                        "/confs",
-                        HEALTHCHECK_LOGGER,
-                        api_caller=api_caller,
-                    ),
-                    SCHEDULER_TASKS_EXECUTOR.submit(
-                        send_file_to_bunkerweb,
-                        CACHE_PATH,
-                        "/cache",
-                        HEALTHCHECK_LOGGER,
-                        api_caller=api_caller,
-                    ),
-                ]
-                for future in tmp_futures:
-                    future.result()
-
-                if not api_caller.send_to_apis(
-                    "POST",
-                    f"/reload?test={'no' if DISABLE_CONFIGURATION_TESTING else 'yes'}",
-                    timeout=max(RELOAD_MIN_TIMEOUT, 3 * len(env.get("SERVER_NAME", "www.example.com").split())),
-                )[0]:
-                    HEALTHCHECK_LOGGER.error(f"Error while reloading instance {bw_instance.endpoint}")
-                    ret = SCHEDULER.db.update_instance(db_instance["hostname"], "loading")
-                    if ret:
-                        HEALTHCHECK_LOGGER.error(f"Couldn't update instance {bw_instance.endpoint} status to loading in the database: {ret}")
-                    continue
-                HEALTHCHECK_LOGGER.info(f"Successfully reloaded instance {bw_instance.endpoint}")
+    HEALTHCHECK_EVENT.set()
+    try:
+        db_instances = SCHEDULER.db.get_instances()
+        if not db_instances:
+            return
 
-            ret = SCHEDULER.db.update_instance(db_instance["hostname"], "up")
-            if ret:
-                HEALTHCHECK_LOGGER.error(f"Couldn't update instance {bw_instance.endpoint} status to down in the database: {ret}")
-
-            found = False
-            for api in SCHEDULER.apis:
-                if api.endpoint == bw_instance.endpoint:
-                    found = True
-                    break
-            if not found:
-                HEALTHCHECK_LOGGER.debug(f"Adding {bw_instance.endpoint} to the list of reachable instances")
-                SCHEDULER.apis.append(bw_instance)
-        except BaseException as e:
-            HEALTHCHECK_LOGGER.error(f"Exception while checking instance {bw_instance.endpoint}: {e}")
-            for i, api in enumerate(SCHEDULER.apis):
-                if api.endpoint == bw_instance.endpoint:
-                    HEALTHCHECK_LOGGER.debug(f"Removing {bw_instance.endpoint} from the list of reachable instances")
-                    del SCHEDULER.apis[i]
-                    break
+        # Probe all the instances at once, a slow or unreachable one only delays the round by the healthcheck timeout
+        with ThreadPoolExecutor(max_workers=min(len(db_instances), HEALTHCHECK_MAX_WORKERS), thread_name_prefix="bw-healthcheck") as executor:
+            results = list(executor.map(probe_instance, db_instances))
 
-    HEALTHCHECK_EVENT.clear()
+        loading_instances = []
+        for db_instance, (bw_instance, success, resp) in zip(db_instances, results):
+            try:
+                if not success:
+                    set_instance_reachable(db_instance, bw_instance, False)
+                elif resp["msg"] == "loading":
+                    if db_instance["status"] == "failover":
+                        HEALTHCHECK_LOGGER.warning(f"Instance {db_instance['hostname']} is in failover mode, skipping sending config ...")
+                        continue
+                    HEALTHCHECK_LOGGER.info(f"Instance {bw_instance.endpoint} is loading, sending config ...")
+                    loading_instances.append((db_instance, bw_instance))
+                else:
+                    set_instance_reachable(db_instance, bw_instance, True)
+            except BaseException as e:
+                HEALTHCHECK_LOGGER.error(f"Exception while checking instance {bw_instance.endpoint}: {e}")
+                with SCHEDULER_LOCK:
+                    for i, api in enumerate(SCHEDULER.apis):
+                        if api.endpoint == bw_instance.endpoint:
+                            HEALTHCHECK_LOGGER.debug(f"Removing {bw_instance.endpoint} from the list of reachable instances")
+                            del SCHEDULER.apis[i]
+                            break
+
+        if loading_instances:
+            # ? The instances which started loading during the same round share the same generated configuration and archives
+            try:
+                send_config_to_instances(loading_instances)
+            except BaseException as e:
+                HEALTHCHECK_LOGGER.error(f"Exception while sending the config to the loading instances: {e}")
+    finally:
+        HEALTHCHECK_EVENT.clear()
+
+
+def get_failover_store() -> FailoverStore:
+    global FAILOVER_STORE
+    if FAILOVER_STORE is None or FAILOVER_STORE.db is not SCHEDULER.db:
+        FAILOVER_STORE = FailoverStore(FAILOVER_PATH, FAILOVER_STORE_PATH, SCHEDULER.db, getLogger("SCHEDULER.FAILOVER"))
+    return FAILOVER_STORE
 
 
 def backup_failover():
     BACKING_UP_FAILOVER.set()
     try:
-        rmtree(FAILOVER_PATH, ignore_errors=True)
-        FAILOVER_PATH.mkdir(parents=True, exist_ok=True)
-
-        for src, dst_name in (
-            (CONFIG_PATH, "config"),
-            (CUSTOM_CONFIGS_PATH, "custom_configs"),
-            (CACHE_PATH, "cache"),
-        ):
-            try:
-                copytree(src, FAILOVER_PATH / dst_name, dirs_exist_ok=True)
-            except Exception as e:
-                LOGGER.error(f"Error copying {src} to failover path: {e}")
-
-        success, err = JOB.cache_dir(FAILOVER_PATH, job_name="failover-backup")
-        if not success:
-            LOGGER.error(f"Error while caching failover backup: {err}")
+        if not get_failover_store().snapshot({"config": CONFIG_PATH, "custom_configs": CUSTOM_CONFIGS_PATH, "cache": CACHE_PATH}):
+            LOGGER.error("Error while saving the failover backup")
     except Exception as e:
         LOGGER.error(f"Failed to initialize failover backup: {e}")
     finally:
@@ -813,22 +844,33 @@ if __name__ == "__main__":
             LOGGER.info(f"Checking if there are any changes in {_type} plugins ...")
             plugin_path = PRO_PLUGINS_PATH if _type == "pro" else EXTERNAL_PLUGINS_PATH
             db_plugins = SCHEDULER.db.get_plugins(_type=_type)
+            manifests = SCHEDULER.db.get_plugins_manifests(_type=_type)
+            new_manifests = {}
             external_plugins = []
             tmp_external_plugins = []
             for file in plugin_path.glob("*/plugin.json"):
+                with file.open("r", encoding="utf-8") as f:
+                    plugin_data = json_load(f)
+
+                if plugin_data["id"] == "letsencrypt_dns":
+                    continue
+
+                # The plugin is only archived again if its files changed since the manifest saved in the database
+                manifest = manifests.get(plugin_data["id"])
+                files = plugin_manifest(file.parent, manifest["files"] if manifest else None)
+                if manifest and not plugin_manifest_changed(files, manifest["files"]):
+                    if files != manifest["files"]:
+                        new_manifests[plugin_data["id"]] = manifest | {"files": files}
+                    continue
+
                 with BytesIO() as plugin_content:
                     with tar_open(fileobj=plugin_content, mode="w:gz", compresslevel=9) as tar:
                         # Safely pack the plugin directory while excluding caches/pyc and unreadable files
                         add_dir_to_tar_safely(tar, file.parent, arc_root=file.parent.name)
                     plugin_content.seek(0, 0)
 
-                    with file.open("r", encoding="utf-8") as f:
-                        plugin_data = json_load(f)
-
-                    if plugin_data["id"] == "letsencrypt_dns":
-                        continue
-
                     checksum = bytes_hash(plugin_content, algorithm="sha256")
+                    new_manifests[plugin_data["id"]] = {"checksum": checksum, "files": files}
                     common_data = plugin_data | {
                         "type": _type,
                         "page": file.parent.joinpath("ui").is_dir(),
@@ -864,8 +906,14 @@ if __name__ == "__main__":
                             LOGGER.error(f"Couldn't save some manually added {_type} plugins to database: {err}")
                     except BaseException as e:
                         LOGGER.error(f"Error while saving {_type} plugins to database: {e}")
-                else:
-                    return send_file_to_bunkerweb(plugin_path, "/pro_plugins" if _type == "pro" else "/plugins")
+
+            # ? Only the manifests matching the checksum of the plugins in the database are saved
+            err = SCHEDULER.db.update_plugins_manifests(new_manifests)
+            if err:
+                LOGGER.warning(f"Couldn't save the manifests of the {_type} plugins to the database: {err}")
+
+            if tmp_external_plugins and not changes:
+                return send_file_to_bunkerweb(plugin_path, "/pro_plugins" if _type == "pro" else "/plugins")
 
             generate_external_plugins(plugin_path)
 
@@ -951,7 +999,14 @@ if __name__ == "__main__":
                 env["TZ"] = tz
 
         LOGGER.info("Executing scheduler ...")
-        JOB.restore_cache(job_name="failover-backup", plugin_id="jobs")
+        try:
+            if not get_failover_store().restore():
+                # ? No snapshot saved yet, the failover backup may still be a cached archive
+                if FAILOVER_PATH.is_symlink():
+                    FAILOVER_PATH.unlink()
+                JOB.restore_cache(job_name="failover-backup", plugin_id="jobs")
+        except Exception as e:
+            LOGGER.error(f"Error while restoring the failover backup: {e}")
 
         del dotenv_env
 
@@ -1124,7 +1179,7 @@ if __name__ == "__main__":
                 LOGGER.error(f"Exception while executing failover logic : {e}")
 
             try:
-                ret = SCHEDULER.db.checked_changes(CHANGES, plugins_changes="all")
+                ret = SCHEDULER.db.checked_changes(CHANGES, plugins_changes="all", applied=True)
                 if ret:
                     LOGGER.error(f"An error occurred when setting the changes to checked in the database : {ret}")
             except BaseException as e:
@@ -1170,13 +1225,10 @@ if __name__ == "__main__":
                     sleep(3 if SCHEDULER.db.readonly else 1)
                     run_pending()
                     SCHEDULER.run_pending()
-                    current_time = datetime.now().astimezone()
-
-                    while DB_LOCK_FILE.is_file() and DB_LOCK_FILE.stat().st_ctime + 30 > current_time.timestamp():
-                        LOGGER.debug("Database is locked, waiting for it to be unlocked (timeout: 30s) ...")
-                        sleep(1)
 
-                    DB_LOCK_FILE.unlink(missing_ok=True)
+                    # ? Don't look for changes while a backup or a restore is in progress
+                    if not SCHEDULER.db.wait_for_lock(timeout=30):
+                        LOGGER.warning("Database is still locked after 30s, checking for changes anyway ...")
 
                     db_metadata = SCHEDULER.db.get_metadata()
 
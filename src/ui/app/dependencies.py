@@ -11,6 +11,7 @@ from traceback import format_exc
 
 from common_utils import bytes_hash  # type: ignore
 
+from app.models.ban_index import MemoryBanIndex
 from app.models.config import Config
 from app.models.instance import InstancesUtils
 from app.models.ui_data import UIData
@@ -21,6 +22,8 @@ DATA = UIData(Path(sep, "var", "tmp", "bunkerweb").joinpath("ui_data.json"))
 
 BW_CONFIG = Config(DB, data=DATA)
 BW_INSTANCES_UTILS = InstancesUtils(DB)
+# Bans of the instances listed by the bans page when redis is not used
+BANS_INDEX = MemoryBanIndex(BW_INSTANCES_UTILS.get_bans)
 
 CORE_PLUGINS_PATH = Path(sep, "usr", "share", "bunkerweb", "core")
 EXTERNAL_PLUGINS_PATH = Path(sep, "etc", "bunkerweb", "plugins")
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass, field, replace
+from json import loads
+from math import inf
+from re import compile as re_compile
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from app.models.exports import iter_sorted
+
+# Redis keys of the bans index, maintained by BunkerWeb (utils.add_ban and utils.remove_ban) for every ban key
+BANS_INDEX_DATE = "bans_index_date"  # ban key -> ban date
+BANS_INDEX_EXP = "bans_index_exp"  # ban key -> expiration date (+inf for permanent bans)
+BANS_INDEX_IP = "bans_index_ip"  # "<ip>|<ban key>" scored 0, the IPs are searched by prefix with lexicographical ranges
+BANS_INDEX_SERVICE = "bans_index_service_"  # one set per service ("_" for the global bans), ban key -> ban date
+BANS_INDEX_COUNTRY = "bans_index_country_"  # one set per country, ban key -> ban date
+BANS_INDEX_SETS = "bans_index_sets"  # names of the service and country sets
+BANS_INDEX_VERSION = "bans_index_version"  # present while the index is considered complete
+BANS_INDEX_REBUILD_INTERVAL = 3600
+BANS_INDEX_BATCH = 1000
+BANS_INDEX_TMP_TTL = 60
+# ? The searches and orders on columns which are not indexed only read the most recent bans matching the panes
+BANS_INDEX_SEARCH_LIMIT = 10_000
+
+DAY, WEEK, MONTH = 86400, 604800, 2592000
+DATE_PANE = ("last_24h", "last_7d", "last_30d", "older_30d")
+END_DATE_PANE = ("permanent", "next_24h", "next_7d", "next_30d", "future_30d")
+SEARCH_COLUMNS = ("date", "ip", "country", "reason", "scope", "service", "end_date", "time_left", "actions")
+INDEXED_ORDERS = ("date", "end_date", "time_left")
+IP_SEARCH = re_compile(r"^[0-9a-f:.]*[.:][0-9a-f:.]*$")
+
+
+@dataclass
+class BanQuery:
+    start: int = 0
+    length: int = 10
+    search: str = ""
+    order: str = "date"
+    direction: str = "desc"
+    panes: Dict[str, List[str]] = field(default_factory=dict)
+
+
+@dataclass
+class BanPage:
+    total: int
+    filtered: int
+    bans: List[Dict[str, Any]]
+    panes: Dict[str, Dict[str, Dict[str, int]]]
+
+
+def ban_key(ip: str, service: Optional[str], ban_scope: str) -> str:
+    if ban_scope == "service" and service and service != "_":
+        return f"bans_service_{service}_ip_{ip}"
+    return f"bans_ip_{ip}"
+
+
+def parse_ban_key(key: str) -> Optional[Tuple[str, str, str]]:
+    """Return the ip, scope and service ("_" for global bans) of a ban key."""
+    if key.startswith("bans_ip_"):
+        return key[8:], "global", "_"
+    elif key.startswith("bans_service_") and "_ip_" in key:
+        service, ip = key[13:].split("_ip_", 1)
+        return ip, "service", service
+    return None
+
+
+def ban_service(ban: Dict[str, Any]) -> str:
+    service = ban.get("service")
+    if ban.get("ban_scope") == "global" or service in (None, ""):
+        return "_"
+    return str(service)
+
+
+def load_ban(key: str, data: Optional[bytes], ttl: int) -> Optional[Dict[str, Any]]:
+    """Decode a ban stored in redis the same way for the index and the legacy listing."""
+    parsed = parse_ban_key(key)
+    if not parsed or not data:
+        return None
+    ip, ban_scope, service = parsed
+    ban_data = loads(data.decode("utf-8", "replace") if isinstance(data, bytes) else data)
+    ban_data["ban_scope"] = ban_scope
+    if ban_scope == "service":
+        ban_data["service"] = service
+    ban_data["permanent"] = ban_data.get("permanent", False) or ttl in (0, -1)
+    exp = 0 if ban_data["permanent"] else ttl
+    return {"ip": ip, "exp": exp, "permanent": ban_data["permanent"]} | ban_data
+
+
+# ? The elementary intervals of the date and end date panes, each pane value is a union of them
+def _date_intervals(now: float) -> List[Tuple[Any, Any]]:
+    return [(f"({now - DAY}", "+inf"), (f"({now - WEEK}", now - DAY), (f"({now - MONTH}", now - WEEK), ("-inf", now - MONTH)]
+
+
+def _end_date_intervals(now: float) -> List[Tuple[Any, Any]]:
+    return [("+inf", "+inf"), ("-inf", f"({now + DAY}"), (now + DAY, f"({now + WEEK}"), (now + WEEK, f"({now + MONTH}"), (now + MONTH, "(+inf")]
+
+
+DATE_PANE_INTERVALS = {"last_24h": (0,), "last_7d": (0, 1), "last_30d": (0, 1, 2), "older_30d": (3,)}
+# ? Filtering on future_30d keeps the permanent bans but they are not counted in it
+END_DATE_PANE_FILTER = {"permanent": (0,), "next_24h": (1,), "next_7d": (1, 2), "next_30d": (1, 2, 3), "future_30d": (4, 0)}
+END_DATE_PANE_COUNT = {"permanent": (0,), "next_24h": (1,), "next_7d": (1, 2), "next_30d": (1, 2, 3), "future_30d": (4,)}
+
+
+def date_pane_value(ban: Dict[str, Any], now: float) -> List[str]:
+    age = now - ban.get("date", 0)
+    return [value for value, limit in (("last_24h", DAY), ("last_7d", WEEK), ("last_30d", MONTH)) if age < limit] or ["older_30d"]
+
+
+def end_date_pane_value(ban: Dict[str, Any]) -> List[str]:
+    if ban.get("permanent", False):
+        return ["permanent"]
+    exp = ban.get("exp", 0)
+    return [value for value, limit in (("next_24h", DAY), ("next_7d", WEEK), ("next_30d", MONTH)) if exp < limit] or ["future_30d"]
+
+
+def matches_panes(ban: Dict[str, Any], panes: Dict[str, List[str]], now: float) -> bool:
+    for pane, selected in panes.items():
+        if not selected:
+            continue
+        if pane == "date":
+            values = date_pane_value(ban, now)
+        elif pane == "end_date":
+            values = end_date_pane_value(ban)
+            if ban.get("permanent", False) and "future_30d" in selected:
+                return True
+        elif pane == "scope":
+            values = [ban.get("ban_scope", "global")]
+        elif pane == "service":
+            values = [ban_service(ban)]
+        else:
+            values = [str(ban.get(pane, "N/A"))]
+        if not any(value in selected for value in values):
+            return False
+    return True
+
+
+def is_ip_search(search: str) -> bool:
+    """Whether the search looks like the start of an IP address (e.g. 10.1.2. or 2001:db8:), it is then matched against the IPs only."""
+    return bool(search) and IP_SEARCH.match(search) is not None
+
+
+def matches_search(ban: Dict[str, Any], search: str) -> bool:
+    if search == "permanent" and ban.get("permanent", False):
+        return True
+    elif is_ip_search(search):
+        return str(ban.get("ip", "")).startswith(search)
+    return any(search in str(ban.get(column, "")).lower() for column in SEARCH_COLUMNS)
+
+
+def ban_sort_key(order: str, direction: str) -> Tuple[Callable[[Dict[str, Any]], Any], bool]:
+    """Return the sort key and the reverse flag of an ordering."""
+    reverse = direction == "desc"
+    if order in ("end_date", "time_left"):
+        # ? Permanent bans are always listed last
+        return (lambda ban: (ban.get("permanent", False), -ban.get("exp", 0) if reverse else ban.get("exp", 0))), False
+    elif order == "date":
+        return (lambda ban: float(ban.get("date", 0) or 0)), reverse
+    return (lambda ban: str(ban.get(order, ""))), reverse
+
+
+def sort_bans(bans: List[Dict[str, Any]], order: str, direction: str):
+    key, reverse = ban_sort_key(order, direction)
+    bans.sort(key=key, reverse=reverse)
+
+
+def count_panes(bans: Iterable[Dict[str, Any]], now: float) -> Dict[str, Dict[str, int]]:
+    counts: Dict[str, Dict[str, int]] = {
+        "date": dict.fromkeys(DATE_PANE, 0),
+        "end_date": dict.fromkeys(END_DATE_PANE, 0),
+        "scope": dict.fromkeys(("global", "service"), 0),
+        "service": {},
+        "country": {},
+    }
+    for ban in bans:
+        for value in date_pane_value(ban, now):
+            counts["date"][value] = counts["date"].get(value, 0) + 1
+        for value in end_date_pane_value(ban):
+            counts["end_date"][value] = counts["end_date"].get(value, 0) + 1
+        for pane, value in (("scope", ban.get("ban_scope", "global")), ("service", ban_service(ban)), ("country", str(ban.get("country", "N/A")))):
+            counts[pane][value] = counts[pane].get(value, 0) + 1
+    return counts
+
+
+def merge_pane_counts(totals: Dict[str, Dict[str, int]], counts: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, Dict[str, int]]]:
+    panes = {}
+    for pane, values in totals.items():
+        panes[pane] = {value: {"total": total, "count": counts.get(pane, {}).get(value, 0)} for value, total in values.items()}
+    return panes
+
+
+def paginate(bans: List[Dict[str, Any]], start: int, length: int) -> List[Dict[str, Any]]:
+    return bans if length == -1 else bans[start : start + length]  # noqa: E203
+
+
+class RedisBanIndex:
+    """Bans listing answered with range queries on the sorted sets of the bans index."""
+
+    def __init__(self, redis_client, logger=None, *, search_limit: int = BANS_INDEX_SEARCH_LIMIT):
+        self.redis = redis_client
+        self.logger = logger
+        self.search_limit = search_limit
+        self.__tmp_keys: List[str] = []
+
+    # ------------------ Maintenance ------------------
+    def rebuild(self, now: Optional[float] = None) -> int:
+        """Index every ban key, the index is rebuilt when it doesn't exist yet and then every BANS_INDEX_REBUILD_INTERVAL seconds."""
+        started = now or time()
+        keys = [key.decode("utf-8", "replace") if isinstance(key, bytes) else key for key in self.redis.scan_iter("bans_ip_*", count=BANS_INDEX_BATCH)]
+        keys += [
+            key.decode("utf-8", "replace") if isinstance(key, bytes) else key for key in self.redis.scan_iter("bans_service_*_ip_*", count=BANS_INDEX_BATCH)
+        ]
+
+        indexed = set()
+        for offset in range(0, len(keys), BANS_INDEX_BATCH):
+            chunk = keys[offset : offset + BANS_INDEX_BATCH]  # noqa: E203
+            bans = self.__load(chunk, now=started)
+            pipeline = self.redis.pipeline(transaction=False)
+            for key, ban in bans.items():
+                indexed.add(key)
+                self.__add(pipeline, key, ban, started)
+            pipeline.execute()
+
+        # Bans removed by instances which don't maintain the index
+        stale = [
+            member
+            for member in (m.decode("utf-8", "replace") if isinstance(m, bytes) else m for m in self.redis.zrangebyscore(BANS_INDEX_DATE, "-inf", started))
+            if member not in indexed
+        ]
+        self.__remove(stale)
+        self.redis.set(BANS_INDEX_VERSION, "1", ex=BANS_INDEX_REBUILD_INTERVAL)
+        return len(indexed)
+
+    def ensure(self, now: Optional[float] = None):
+        if not self.redis.exists(BANS_INDEX_VERSION):
+            count = self.rebuild(now)
+            if self.logger:
+                self.logger.debug(f"Rebuilt the bans index with {count} bans")
+
+    def prune(self, now: Optional[float] = None):
+        """Remove the expired bans from the index."""
+        expired = self.__decode(self.redis.zrangebyscore(BANS_INDEX_EXP, "-inf", now or time()))
+        self.__remove(expired)
+
+    def __add(self, pipeline, key: str, ban: Dict[str, Any], now: float):
+        date = float(ban.get("date", 0) or 0)
+        expiry = "+inf" if ban["permanent"] else now + ban["exp"]
+        service_set = f"{BANS_INDEX_SERVICE}{ban_service(ban)}"
+        country_set = f"{BANS_INDEX_COUNTRY}{ban.get('country', 'N/A')}"
+        pipeline.zadd(BANS_INDEX_DATE, {key: date})
+        pipeline.zadd(BANS_INDEX_EXP, {key: expiry})
+        pipeline.zadd(BANS_INDEX_IP, {f"{ban['ip']}|{key}": 0})
+        pipeline.zadd(service_set, {key: date})
+        pipeline.zadd(country_set, {key: date})
+        pipeline.sadd(BANS_INDEX_SETS, service_set, country_set)
+
+    def __remove(self, keys: List[str]):
+        if not keys:
+            return
+        sets = self.__decode(self.redis.smembers(BANS_INDEX_SETS))
+        pipeline = self.redis.pipeline(transaction=False)
+        for offset in range(0, len(keys), BANS_INDEX_BATCH):
+            chunk = keys[offset : offset + BANS_INDEX_BATCH]  # noqa: E203
+            for name in [BANS_INDEX_DATE, BANS_INDEX_EXP] + [name for name in sets if name.startswith(BANS_INDEX_COUNTRY)]:
+                pipeline.zrem(name, *chunk)
+            for key in chunk:
+                parsed = parse_ban_key(key)
+                if parsed:
+                    pipeline.zrem(BANS_INDEX_IP, f"{parsed[0]}|{key}")
+                    pipeline.zrem(f"{BANS_INDEX_SERVICE}{parsed[2]}", key)
+        pipeline.execute()
+
+    def __load(self, keys: List[str], *, now: float) -> Dict[str, Dict[str, Any]]:
+        """Read the bans of the keys, the missing ones are removed from the index."""
+        bans = {}
+        missing = []
+        for offset in range(0, len(keys), BANS_INDEX_BATCH):
+            chunk = keys[offset : offset + BANS_INDEX_BATCH]  # noqa: E203
+            pipeline = self.redis.pipeline(transaction=False)
+            for key in chunk:
+                pipeline.get(key)
+                pipeline.ttl(key)
+            results = pipeline.execute()
+            for i, key in enumerate(chunk):
+                data, ttl = results[2 * i], results[2 * i + 1]
+                try:
+                    ban = load_ban(key, data, ttl)
+                except ValueError as e:
+                    if self.logger:
+                        self.logger.error(f"Failed to decode ban data for {key}: {e}")
+                    continue
+                if ban:
+                    bans[key] = ban
+                else:
+                    missing.append(key)
+        self.__remove(missing)
+        return bans
+
+    @staticmethod
+    def __decode(values) -> List[str]:
+        return [value.decode("utf-8", "replace") if isinstance(value, bytes) else value for value in values]
+
+    # ------------------ Queries ------------------
+    def __tmp(self) -> str:
+        key = f"bans_index_tmp_{uuid4().hex}"
+        self.__tmp_keys.append(key)
+        return key
+
+    def __expire_tmp(self):
+        """The temporary sets are deleted after each query, they expire in case the UI doesn't get the chance to."""
+        if self.__tmp_keys:
+            pipeline = self.redis.pipeline(transaction=False)
+            for key in self.__tmp_keys:
+                pipeline.expire(key, BANS_INDEX_TMP_TTL)
+            pipeline.execute()
+
+    def __cleanup_tmp(self):
+        if self.__tmp_keys:
+            self.redis.delete(*self.__tmp_keys)
+            self.__tmp_keys.clear()
+
+    def __restrict(self, key: str, intervals: List[Tuple[Any, Any]], kept: Iterable[int]) -> str:
+        """Keep only the members of the set scored in the kept intervals, the set is copied if it is one of the index sets."""
+        if not key.startswith("bans_index_tmp_"):
+            copy = self.__tmp()
+            self.redis.zunionstore(copy, [key])
+            key = copy
+        pipeline = self.redis.pipeline(transaction=False)
+        for i, (minimum, maximum) in enumerate(intervals):
+            if i not in kept:
+                pipeline.zremrangebyscore(key, minimum, maximum)
+        pipeline.execute()
+        return key
+
+    def __with_scores(self, key: str, scores: str) -> str:
+        """The members of the set scored with another index (e.g. the expiration dates)."""
+        if key == BANS_INDEX_DATE:
+            return scores
+        scored = self.__tmp()
+        self.redis.zinterstore(scored, {key: 0, scores: 1})
+        return scored
+
+    def __filter(self, panes: Dict[str, List[str]], sets: List[str], now: float, search: str = "") -> str:
+        """Return the name of the set (scored by ban date) of the bans matching the panes and the IP search."""
+        key = BANS_INDEX_DATE
+        services = [name[len(BANS_INDEX_SERVICE) :] for name in sets if name.startswith(BANS_INDEX_SERVICE)]  # noqa: E203
+
+        selected = None
+        if panes.get("scope"):
+            selected = {service for service in services if ("global" if service == "_" else "service") in panes["scope"]}
+        if panes.get("service"):
+            selected = (selected if selected is not None else set(services)) & set(panes["service"])
+        if selected is not None:
+            key = self.__tmp()
+            if selected:
+                self.redis.zunionstore(key, [f"{BANS_INDEX_SERVICE}{service}" for service in selected], aggregate="MAX")
+
+        if panes.get("country"):
+            countries = self.__tmp()
+            self.redis.zunionstore(countries, [f"{BANS_INDEX_COUNTRY}{country}" for country in panes["country"]], aggregate="MAX")
+            restricted = self.__tmp()
+            self.redis.zinterstore(restricted, {key: 1, countries: 0})
+            key = restricted
+
+        if is_ip_search(search):
+            # ? Only the bans of the matching IPs are transferred, not their data
+            members = self.__decode(self.redis.zrangebylex(BANS_INDEX_IP, f"[{search}", f"[{search}\xff"))
+            matching = self.__tmp()
+            pipeline = self.redis.pipeline(transaction=False)
+            for offset in range(0, len(members), BANS_INDEX_BATCH):
+                pipeline.zadd(matching, {member.split("|", 1)[1]: 0 for member in members[offset : offset + BANS_INDEX_BATCH]})  # noqa: E203
+            pipeline.execute()
+            restricted = self.__tmp()
+            self.redis.zinterstore(restricted, {key: 1, matching: 0})
+            key = restricted
+
+        if panes.get("date"):
+            key = self.__restrict(key, _date_intervals(now), {i for value in panes["date"] for i in DATE_PANE_INTERVALS.get(value, ())})
+
+        if panes.get("end_date"):
+            expirations = self.__restrict(
+                self.__with_scores(key, BANS_INDEX_EXP),
+                _end_date_intervals(now),
+                {i for value in panes["end_date"] for i in END_DATE_PANE_FILTER.get(value, ())},
+            )
+            restricted = self.__tmp()
+            self.redis.zinterstore(restricted, {key: 1, expirations: 0})
+            key = restricted
+        return key
+
+    def __count_panes(self, key: str, sets: List[str], now: float, total: int) -> Dict[str, Dict[str, Dict[str, int]]]:
+        filtered = key != BANS_INDEX_DATE
+        expirations = self.__with_scores(key, BANS_INDEX_EXP) if filtered else BANS_INDEX_EXP
+        pane_sets = [name for name in sets if name.startswith((BANS_INDEX_SERVICE, BANS_INDEX_COUNTRY))]
+
+        pipeline = self.redis.pipeline(transaction=False)
+        date_intervals, end_date_intervals = _date_intervals(now), _end_date_intervals(now)
+        for name in (BANS_INDEX_DATE, key):
+            for minimum, maximum in date_intervals:
+                pipeline.zcount(name, minimum, maximum)
+        for name in (BANS_INDEX_EXP, expirations):
+            for minimum, maximum in end_date_intervals:
+                pipeline.zcount(name, minimum, maximum)
+        for name in pane_sets:
+            pipeline.zcard(name)
+        scratch = self.__tmp()
+        if filtered:
+            pipeline.zcard(key)
+            for name in pane_sets:
+                pipeline.zinterstore(scratch, {key: 1, name: 0})
+        results = pipeline.execute()
+
+        date_counts = (results[0:4], results[4:8])
+        end_date_counts = (results[8:13], results[13:18])
+        set_totals = dict(zip(pane_sets, results[18 : 18 + len(pane_sets)]))  # noqa: E203
+        filtered_total = results[18 + len(pane_sets)] if filtered else total
+        set_counts = dict(zip(pane_sets, results[19 + len(pane_sets) :])) if filtered else set_totals  # noqa: E203
+
+        panes: Dict[str, Dict[str, Dict[str, int]]] = {"date": {}, "end_date": {}, "scope": {}, "service": {}, "country": {}}
+        for value in DATE_PANE:
+            panes["date"][value] = {
+                "total": sum(date_counts[0][i] for i in DATE_PANE_INTERVALS[value]),
+                "count": sum(date_counts[1][i] for i in DATE_PANE_INTERVALS[value]),
+            }
+        for value in END_DATE_PANE:
+            panes["end_date"][value] = {
+                "total": sum(end_date_counts[0][i] for i in END_DATE_PANE_COUNT[value]),
+                "count": sum(end_date_counts[1][i] for i in END_DATE_PANE_COUNT[value]),
+            }
+        for name in pane_sets:
+            pane, prefix = ("service", BANS_INDEX_SERVICE) if name.startswith(BANS_INDEX_SERVICE) else ("country", BANS_INDEX_COUNTRY)
+            if set_totals[name]:
+                panes[pane][name[len(prefix) :]] = {"total": set_totals[name], "count": set_counts[name]}  # noqa: E203
+
+        global_bans = panes["service"].get("_", {"total": 0, "count": 0})
+        panes["scope"] = {
+            "global": dict(global_bans),
+            "service": {"total": total - global_bans["total"], "count": filtered_total - global_bans["count"]},
+        }
+        return panes
+
+    def __page_keys(self, key: str, query: BanQuery, filtered: int) -> List[str]:
+        stop = -1 if query.length == -1 else query.start + query.length - 1
+        if query.order == "date":
+            return self.__decode(self.redis.zrange(key, query.start, stop, desc=query.direction == "desc"))
+
+        expirations = self.__with_scores(key, BANS_INDEX_EXP)
+        if query.direction != "desc":
+            return self.__decode(self.redis.zrange(expirations, query.start, stop))
+
+        # ? Permanent bans are listed last whatever the direction
+        limited = self.redis.zcount(expirations, "-inf", "(+inf")
+        count = filtered if query.length == -1 else query.length
+        keys = []
+        if query.start < limited:
+            keys = self.__decode(self.redis.zrevrangebyscore(expirations, "(+inf", "-inf", start=query.start, num=count))
+        if len(keys) < count:
+            keys += self.__decode(self.redis.zrangebyscore(expirations, "+inf", "+inf", start=max(0, query.start - limited), num=count - len(keys)))
+        return keys
+
+    def query(self, query: BanQuery, now: Optional[float] = None) -> BanPage:
+        now = now or time()
+        self.ensure(now)
+        self.prune(now)
+
+        try:
+            sets = self.__decode(self.redis.smembers(BANS_INDEX_SETS))
+            total = self.redis.zcard(BANS_INDEX_DATE)
+            key = self.__filter(query.panes, sets, now, query.search)
+            self.__expire_tmp()
+
+            if (query.search and not is_ip_search(query.search)) or query.order not in INDEXED_ORDERS:
+                # Columns which are not indexed are searched and sorted on the most recent bans matching the panes only
+                keys = self.__decode(self.redis.zrange(key, 0, self.search_limit - 1, desc=True))
+                if len(keys) == self.search_limit and self.logger:
+                    self.logger.debug(f"Only the {self.search_limit} most recent bans matching the search panes are searched and sorted")
+                bans = list(self.__load(keys, now=now).values())
+                if query.search:
+                    bans = [ban for ban in bans if matches_search(ban, query.search)]
+                sort_bans(bans, query.order, query.direction)
+                totals = self.__count_panes(BANS_INDEX_DATE, sets, now, total)
+                panes = merge_pane_counts(
+                    {pane: {value: counts["total"] for value, counts in values.items()} for pane, values in totals.items()}, count_panes(bans, now)
+                )
+                return BanPage(total, len(bans), paginate(bans, query.start, query.length), panes)
+
+            filtered = total if key == BANS_INDEX_DATE else self.redis.zcard(key)
+            keys = self.__page_keys(key, query, filtered)
+            loaded = self.__load(keys, now=now)
+            return BanPage(total, filtered, [loaded[key] for key in keys if key in loaded], self.__count_panes(key, sets, now, total))
+        finally:
+            self.__cleanup_tmp()
+
+    def iter_bans(self, query: BanQuery, now: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over all the bans matching the query page by page, used by the exports."""
+        now = now or time()
+        self.ensure(now)
+        self.prune(now)
+
+        try:
+            key = self.__filter(query.panes, self.__decode(self.redis.smembers(BANS_INDEX_SETS)), now, query.search)
+            self.__expire_tmp()
+            filtered = self.redis.zcard(key)
+
+            if (query.search and not is_ip_search(query.search)) or query.order not in INDEXED_ORDERS:
+                bans = (
+                    ban
+                    for start in range(0, filtered, BANS_INDEX_BATCH)
+                    for ban in self.__load(self.__decode(self.redis.zrange(key, start, start + BANS_INDEX_BATCH - 1, desc=True)), now=now).values()
+                    if not query.search or matches_search(ban, query.search)
+                )
+                sort_key, reverse = ban_sort_key(query.order, query.direction)
+                yield from iter_sorted(bans, sort_key, reverse=reverse)
+                return
+
+            for start in range(0, filtered, BANS_INDEX_BATCH):
+                keys = self.__page_keys(key, replace(query, start=start, length=BANS_INDEX_BATCH), filtered)
+                loaded = self.__load(keys, now=now)
+                yield from (loaded[member] for member in keys if member in loaded)
+        finally:
+            self.__cleanup_tmp()
+
+
+class MemoryBanIndex:
+    """Bans of the instances kept in memory when redis is not used, refreshed every ttl seconds and updated on ban and unban."""
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], *, ttl: float = 10.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.__lock = Lock()
+        self.__bans: Dict[str, Dict[str, Any]] = {}
+        self.__loaded_at = 0.0
+
+    def refresh(self, now: Optional[float] = None):
+        now = now or time()
+        bans = {}
+        for ban in self.loader():
+            ban = dict(ban)
+            if "ban_scope" not in ban:
+                ban["ban_scope"] = "global" if ban.get("service", "_") == "_" else "service"
+            exp = ban.pop("exp", 0)
+            ban["permanent"] = ban.get("permanent", False) or exp == 0
+            ban["expiry"] = inf if ban["permanent"] else now + exp
+            bans[ban_key(ban["ip"], ban.get("service"), ban["ban_scope"])] = ban
+        with self.__lock:
+            self.__bans = bans
+            self.__loaded_at = now
+
+    def add(self, ip: str, exp: float, reason: str, service: str, ban_scope: str = "global", *, now: Optional[float] = None):
+        now = now or time()
+        with self.__lock:
+            self.__bans[ban_key(ip, service, ban_scope)] = {
+                "ip": ip,
+                "reason": reason,
+                "service": service if ban_scope == "service" else "unknown",
+                "date": now,
+                "country": "local",
+                "ban_scope": ban_scope,
+                "permanent": not exp,
+                "expiry": inf if not exp else now + exp,
+            }
+
+    def remove(self, ip: str, service: Optional[str] = None, ban_scope: str = "global"):
+        with self.__lock:
+            if ban_scope == "service" and service:
+                self.__bans.pop(ban_key(ip, service, "service"), None)
+                return
+            # ? Like BunkerWeb, a global unban removes the service bans of the ip too
+            for key in [key for key, ban in self.__bans.items() if ban["ip"] == ip]:
+                del self.__bans[key]
+
+    def query(self, query: BanQuery, now: Optional[float] = None) -> BanPage:
+        now = now or time()
+        if now - self.__loaded_at >= self.ttl:
+            self.refresh(now)
+
+        with self.__lock:
+            bans = [ban | {"exp": 0 if ban["permanent"] else ban["expiry"] - now} for ban in self.__bans.values() if ban["expiry"] > now]
+
+        filtered = [ban for ban in bans if matches_panes(ban, query.panes, now) and (not query.search or matches_search(ban, query.search))]
+        sort_bans(filtered, query.order, query.direction)
+        panes = merge_pane_counts(count_panes(bans, now), count_panes(filtered, now))
+        return BanPage(len(bans), len(filtered), paginate(filtered, query.start, query.length), panes)
+
+    def iter_bans(self, query: BanQuery, now: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        yield from self.query(replace(query, start=0, length=-1), now).bans
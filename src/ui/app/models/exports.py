@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+from csv import writer as csv_writer
+from heapq import merge
+from io import StringIO
+from json import dumps, loads
+from os import unlink
+from tempfile import NamedTemporaryFile, TemporaryFile
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Excel sheets are limited to 1,048,576 rows, header included
+EXPORT_MAX_ROWS = 1_048_575
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_RUN_SIZE = 10_000
+
+
+def _spill(items: List[Dict[str, Any]], key: Callable, reverse: bool) -> IO[bytes]:
+    """Write a sorted run to a temporary file, one JSON document per line."""
+    run = TemporaryFile(prefix="bw-ui-export-")
+    items.sort(key=key, reverse=reverse)
+    run.writelines(dumps(item, separators=(",", ":")).encode() + b"\n" for item in items)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: IO[bytes]) -> Iterator[Dict[str, Any]]:
+    try:
+        for line in run:
+            yield loads(line)
+    finally:
+        run.close()
+
+
+def iter_sorted(items: Iterable[Dict[str, Any]], key: Callable, *, reverse: bool = False, run_size: int = EXPORT_RUN_SIZE) -> Iterator[Dict[str, Any]]:
+    """Sort the items with at most run_size of them in memory : the sorted runs are spilled to temporary files then merged lazily."""
+    runs = []
+    buffer = []
+    try:
+        for item in items:
+            buffer.append(item)
+            if len(buffer) >= run_size:
+                runs.append(_spill(buffer, key, reverse))
+                buffer = []
+
+        if not runs:
+            buffer.sort(key=key, reverse=reverse)
+            yield from buffer
+            return
+
+        if buffer:
+            runs.append(_spill(buffer, key, reverse))
+            buffer = []
+        yield from merge(*(_read_run(run) for run in runs), key=key, reverse=reverse)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def dedupe_sorted(items: Iterable[Dict[str, Any]], key: Callable, identity: Callable) -> Iterator[Dict[str, Any]]:
+    """Drop the duplicates of a sorted stream, duplicates having the same sort key only the identities of the current key are remembered."""
+    current_key = object()
+    seen = set()
+    for item in items:
+        item_key = key(item)
+        if item_key != current_key:
+            current_key = item_key
+            seen.clear()
+        item_id = identity(item)
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        yield item
+
+
+def iter_pages(fetch_page: Callable[[int, int], Sequence[Dict[str, Any]]], *, page_size: int = EXPORT_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Iterate the items of a paginated source, fetch_page(start, length) is called until a short page is returned."""
+    start = 0
+    while True:
+        page = fetch_page(start, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+def iter_csv(
+    headers: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    max_rows: int = EXPORT_MAX_ROWS,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+    on_truncate: Optional[Callable[[int], None]] = None,
+) -> Iterator[str]:
+    """Write the rows as CSV, yielding the output every chunk_rows rows so that the download progresses while the rows are produced."""
+    buffer = StringIO()
+    writer = csv_writer(buffer)
+    writer.writerow(headers)
+
+    count = 0
+    for row in rows:
+        if count >= max_rows:
+            if on_truncate:
+                on_truncate(max_rows)
+            break
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_excel(
+    headers: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    title: str,
+    widths: Optional[Sequence[int]] = None,
+    max_rows: int = EXPORT_MAX_ROWS,
+    on_truncate: Optional[Callable[[int], None]] = None,
+) -> str:
+    """Write the rows to a temporary xlsx file with the write-only mode of openpyxl (rows are not kept in memory), returns the path of the file."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # ? The columns width has to be set before writing the rows in write-only mode
+    for i, width in enumerate(widths or (), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    # Style for header
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    count = 0
+    for row in rows:
+        if count >= max_rows:
+            if on_truncate:
+                on_truncate(max_rows)
+            break
+        ws.append(row)
+        count += 1
+
+    with NamedTemporaryFile(prefix="bw-ui-export-", suffix=".xlsx", delete=False) as output:
+        path = output.name
+    try:
+        wb.save(path)
+    except BaseException:
+        unlink(path)
+        raise
+    return path
+
+
+def iter_file(path: str, *, chunk_size: int = EXPORT_CHUNK_SIZE, remove: bool = True) -> Iterator[bytes]:
+    """Stream a file by chunks, removing it once it has been sent."""
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+    finally:
+        if remove:
+            unlink(path)
@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 from datetime import datetime
+from heapq import merge
 from json import loads
 from operator import itemgetter
 from os import getenv
-from typing import Any, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Iterator, List, Literal, Optional, Tuple, Union
 
 from urllib.parse import quote
 
 from API import API  # type: ignore
 from ApiCaller import ApiCaller  # type: ignore
 
+from app.models.exports import EXPORT_CHUNK_ROWS, dedupe_sorted, iter_pages, iter_sorted
 from app.utils import LOGGER
 
 
@@ -313,35 +315,10 @@ class InstancesUtils:
 
         redis_client = get_redis_client()
 
-        def parse_search_panes(search_panes_value: str) -> dict[str, list[str]]:
-            pane_filters: dict[str, list[str]] = {}
-            if not search_panes_value:
-                return pane_filters
-            for field_filter in search_panes_value.split(";"):
-                if ":" in field_filter:
-                    field, values = field_filter.split(":", 1)
-                    pane_filters[field] = values.split(",")
-            return pane_filters
-
-        def matches_filters(report: dict[str, Any], search_value: str, pane_filters: dict[str, list[str]]) -> bool:
-            if search_value:
-                search_lower = search_value.lower()
-                if not any(
-                    search_lower in str(report.get(field, "")).lower()
-                    for field in ("ip", "country", "method", "url", "status", "user_agent", "reason", "server_name")
-                ):
-                    return False
-
-            for field, allowed_values in pane_filters.items():
-                if str(report.get(field, "N/A")) not in allowed_values:
-                    return False
-
-            return True
-
         # If Redis is available, use it for optimized queries
         if redis_client and not hostname:
             try:
-                pane_filters = parse_search_panes(search_panes)
+                pane_filters = self._parse_search_panes(search_panes)
                 pane_fields = ["ip", "country", "method", "url", "status", "reason", "server_name", "security_mode"]
                 pane_counts = {field: {} for field in pane_fields}
 
@@ -355,11 +332,11 @@ class InstancesUtils:
                         continue
                     seen_ids.add(report_id)
 
-                    if not (400 <= report.get("status", 0) < 500 or report.get("security_mode") == "detect"):
+                    if not self._is_report(report):
                         continue
 
                     valid_total += 1
-                    matches = matches_filters(report, search, pane_filters)
+                    matches = self._report_matches(report, search, pane_filters)
 
                     for field in pane_fields:
                         value = str(report.get(field, "N/A"))
@@ -466,11 +443,93 @@ class InstancesUtils:
 
     def _sort_reports(self, reports: List[dict], order_column: str, order_dir: str) -> List[dict]:
         """Sort reports by specified column and direction"""
-        reverse = order_dir == "desc"
+        return sorted(reports, key=self._report_sort_key(order_column), reverse=order_dir == "desc")
 
+    @staticmethod
+    def _report_sort_key(order_column: str) -> Callable[[dict], Any]:
         if order_column == "date":
-            return sorted(reports, key=lambda x: float(x.get("date", 0)), reverse=reverse)
-        return sorted(reports, key=lambda x: x.get(order_column, ""), reverse=reverse)
+            return lambda x: float(x.get("date", 0))
+        return lambda x: x.get(order_column, "")
+
+    @staticmethod
+    def _is_report(report: dict) -> bool:
+        return 400 <= report.get("status", 0) < 500 or report.get("security_mode") == "detect"
+
+    @staticmethod
+    def _parse_search_panes(search_panes_value: str) -> dict[str, list[str]]:
+        pane_filters: dict[str, list[str]] = {}
+        if not search_panes_value:
+            return pane_filters
+        for field_filter in search_panes_value.split(";"):
+            if ":" in field_filter:
+                field, values = field_filter.split(":", 1)
+                pane_filters[field] = values.split(",")
+        return pane_filters
+
+    @staticmethod
+    def _report_matches(report: dict[str, Any], search_value: str, pane_filters: dict[str, list[str]]) -> bool:
+        if search_value:
+            search_lower = search_value.lower()
+            if not any(
+                search_lower in str(report.get(field, "")).lower()
+                for field in ("ip", "country", "method", "url", "status", "user_agent", "reason", "server_name")
+            ):
+                return False
+
+        for field, allowed_values in pane_filters.items():
+            if str(report.get(field, "N/A")) not in allowed_values:
+                return False
+
+        return True
+
+    def iter_reports(
+        self,
+        search: str = "",
+        order_column: str = "date",
+        order_dir: str = "desc",
+        search_panes: str = "",
+        *,
+        page_size: int = EXPORT_CHUNK_ROWS,
+        instances: Optional[List[Instance]] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Iterate over all the filtered and sorted reports without loading them all in memory, used by the exports"""
+        from app.routes.utils import get_redis_client
+
+        key = self._report_sort_key(order_column)
+        reverse = order_dir == "desc"
+
+        redis_client = get_redis_client()
+        if redis_client:
+            try:
+                redis_client.llen("requests")
+            except Exception as e:
+                LOGGER.error(f"Error querying Redis for reports: {e}")
+                redis_client = None
+
+        if redis_client:
+            pane_filters = self._parse_search_panes(search_panes)
+            reports = (
+                report
+                for report in self._iter_redis_requests(redis_client, page_size)
+                if self._is_report(report) and self._report_matches(report, search, pane_filters)
+            )
+            yield from dedupe_sorted(iter_sorted(reports, key, reverse=reverse), key, lambda report: report.get("id"))
+            return
+
+        def instance_reports(instance: Instance) -> Iterator[dict[str, Any]]:
+            def fetch_page(start: int, length: int) -> List[dict[str, Any]]:
+                api_result = instance.reports_query(start, length, search, order_column, order_dir, search_panes, False)
+                if api_result[0] and isinstance(api_result[1], dict):
+                    instance_response = api_result[1].get(instance.hostname, {}).get("msg", {})
+                    if isinstance(instance_response, dict):
+                        return instance_response.get("data", [])
+                return []
+
+            return iter_pages(fetch_page, page_size=page_size)
+
+        # Each instance sorts its reports, their pages are merged
+        reports = merge(*(instance_reports(instance) for instance in instances or self.get_instances(status="up")), key=key, reverse=reverse)
+        yield from dedupe_sorted(reports, key, lambda report: report.get("id"))
 
     def _iter_redis_requests(self, redis_client, chunk_size: int = 1000):
         start = 0
@@ -5,24 +5,26 @@ from os.path import join
 from sys import path as sys_path
 from typing import Dict, List, Literal, Optional, Union
 
-
 for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("api",), ("db",))]:
     if deps_path not in sys_path:
         sys_path.append(deps_path)
 
 from bcrypt import gensalt, hashpw
+from sqlalchemy import update
 from sqlalchemy.orm import joinedload
 
 from Database import Database  # type: ignore
 from model import Permissions, Roles, RolesPermissions, RolesUsers, UserColumnsPreferences, UserRecoveryCodes, UserSessions  # type: ignore
 
 from app.models.models import UiUsers
+from app.models.user_cache import PrincipalCache
 from app.utils import COLUMNS_PREFERENCES_DEFAULTS
 
 
 class UIDatabase(Database):
     def __init__(self, logger: Logger, sqlalchemy_string: Optional[str] = None, *, pool: Optional[bool] = None, log: bool = True, **kwargs) -> None:
         super().__init__(logger, sqlalchemy_string, external=True, pool=pool, log=log, **kwargs)
+        self.principals = PrincipalCache()
 
     def get_ui_user(self, *, username: Optional[str] = None, as_dict: bool = False) -> Optional[Union[UiUsers, dict]]:
         """Get ui user. If username is None, return the first admin user."""
@@ -83,6 +85,20 @@ class UIDatabase(Database):
                 "recovery_codes": [rc.code for rc in ui_user.recovery_codes],
             }
 
+    def get_ui_principal(self, username: str) -> Optional[UiUsers]:
+        """Get the ui user of a session with its roles, permissions and recovery codes, from the principals cache when possible."""
+        return self.principals.get_or_load(username, self._load_ui_principal)
+
+    def _load_ui_principal(self, username: str) -> Optional[UiUsers]:
+        ui_user = self.get_ui_user(username=username)
+        if not ui_user:
+            return None
+
+        ui_user.list_roles = [role.role_name for role in ui_user.roles]
+        ui_user.list_permissions = set(self.get_ui_roles_permissions(ui_user.list_roles))
+        ui_user.list_recovery_codes = [recovery_code.code for recovery_code in ui_user.recovery_codes]
+        return ui_user
+
     def create_ui_user(
         self,
         username: str,
@@ -142,6 +158,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def update_ui_user(
@@ -194,6 +212,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         if totp_changed:
             if totp_recovery_codes:
                 self.refresh_ui_user_recovery_codes(username, totp_recovery_codes or [])
@@ -222,6 +242,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def mark_ui_user_login(self, username: str, date: datetime, ip: str, user_agent: str) -> Union[str, int]:
@@ -270,6 +292,28 @@ class UIDatabase(Database):
 
         return ""
 
+    def mark_ui_users_access(self, accesses: Dict[int, datetime]) -> str:
+        """Mark ui users access, the last activity of every session is updated in one batch."""
+        with self._db_session() as session:
+            if self.readonly:
+                return "The database is read-only, the changes will not be saved"
+
+            # ? Sessions deleted in the meantime are not an error, their rows are simply not updated
+            existing = {row.id for row in session.query(UserSessions).with_entities(UserSessions.id).filter(UserSessions.id.in_(list(accesses)))}
+            if not existing:
+                return ""
+
+            session.execute(
+                update(UserSessions), [{"id": session_id, "last_activity": date} for session_id, date in accesses.items() if session_id in existing]
+            )
+
+            try:
+                session.commit()
+            except BaseException as e:
+                return str(e)
+
+        return ""
+
     def create_ui_role(self, name: str, description: str, permissions: List[str]) -> str:
         """Create ui role."""
         with self._db_session() as session:
@@ -291,6 +335,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def get_ui_roles(self, *, as_dict: bool = False) -> Union[str, List[Union[Roles, dict]]]:
@@ -342,6 +388,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def delete_ui_user_recovery_codes(self, username: str) -> str:
@@ -357,6 +405,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def get_ui_user_roles(self, username: str) -> List[str]:
@@ -372,6 +422,20 @@ class UIDatabase(Database):
                 for permission in session.query(RolesPermissions).with_entities(RolesPermissions.permission_name).filter_by(role_name=role_name)
             ]
 
+    def get_ui_roles_permissions(self, role_names: List[str]) -> List[str]:
+        """Get the permissions of several ui roles at once."""
+        if not role_names:
+            return []
+
+        with self._db_session() as session:
+            return [
+                permission.permission_name
+                for permission in session.query(RolesPermissions)
+                .with_entities(RolesPermissions.permission_name)
+                .filter(RolesPermissions.role_name.in_(role_names))
+                .distinct()
+            ]
+
     def get_ui_user_recovery_codes(self, username: str) -> List[str]:
         """Get ui user recovery codes."""
         with self._db_session() as session:
@@ -405,6 +469,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def delete_ui_user_old_sessions(self, username: str) -> str:
@@ -449,6 +515,8 @@ class UIDatabase(Database):
             except BaseException as e:
                 return str(e)
 
+            self.principals.invalidate()
+
         return ""
 
     def get_ui_user_columns_preferences(self, username: str, table_name: str) -> Dict[str, bool]:
@@ -460,6 +528,7 @@ class UIDatabase(Database):
                 if not self.readonly and session.query(UiUsers).filter_by(username=username).first():
                     session.add(UserColumnsPreferences(user_name=username, table_name=table_name, columns=default_columns))
                     session.commit()
+                    self.principals.invalidate()
                 return default_columns
 
             return columns_preferences.columns
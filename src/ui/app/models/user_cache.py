@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# The principals are shared by the threads of a worker only, other workers see the changes once their entries expired
+PRINCIPAL_CACHE_TTL = 5.0
+PRINCIPAL_CACHE_MAX_SIZE = 1024
+# Sessions last activity is written to the database at most once every ACCESS_FLUSH_INTERVAL seconds
+ACCESS_FLUSH_INTERVAL = 30.0
+ACCESS_MAX_PENDING = 1000
+
+
+class PrincipalCache:
+    """Per-process cache of the loaded ui users (with their roles and permissions), keyed by username and stamped with the version of the users and roles.
+
+    The version is bumped every time the users or the roles are updated through the database, which invalidates every cached principal at once.
+    """
+
+    def __init__(self, *, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_MAX_SIZE, clock: Callable[[], float] = monotonic) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = Lock()
+        self._version = 0
+        self._entries: Dict[str, Tuple[int, float, Any]] = {}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, username: str) -> Optional[Any]:
+        entry = self._entries.get(username)
+        if not entry:
+            return None
+
+        version, expires, principal = entry
+        if version != self._version or expires <= self._clock():
+            with self._lock:
+                if self._entries.get(username) is entry:
+                    del self._entries[username]
+            return None
+        return principal
+
+    def set(self, username: str, principal: Any, version: int) -> None:
+        """Cache a principal, version being the one read before loading it so that a principal loaded during an update is never kept."""
+        with self._lock:
+            if version != self._version:
+                return
+
+            if username not in self._entries and len(self._entries) >= self.max_size:
+                # ? Drop the oldest entry, dicts keep the insertion order
+                del self._entries[next(iter(self._entries))]
+            self._entries[username] = (version, self._clock() + self.ttl, principal)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def get_or_load(self, username: str, loader: Callable[[str], Optional[Any]]) -> Optional[Any]:
+        principal = self.get(username)
+        if principal is not None:
+            return principal
+
+        version = self._version
+        principal = loader(username)
+        if principal is not None:
+            self.set(username, principal, version)
+        return principal
+
+
+class AccessBuffer:
+    """Write-behind buffer of the sessions last activity : the accesses are coalesced by session and written in one batch by flush()."""
+
+    def __init__(
+        self,
+        writer: Callable[[Dict[int, datetime]], str],
+        *,
+        interval: float = ACCESS_FLUSH_INTERVAL,
+        max_pending: int = ACCESS_MAX_PENDING,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        self.interval = interval
+        self.max_pending = max_pending
+        self._writer = writer
+        self._clock = clock
+        self._lock = Lock()
+        self._pending: Dict[int, datetime] = {}
+        self._last_flush = clock()
+        self._flushing = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def mark(self, session_id: int, date: datetime) -> bool:
+        """Record an access, returns True when the buffer is due to be flushed (and no flush is already running)."""
+        with self._lock:
+            current = self._pending.get(session_id)
+            if current is None or date > current:
+                self._pending[session_id] = date
+
+            if self._flushing or (len(self._pending) < self.max_pending and self._clock() - self._last_flush < self.interval):
+                return False
+            self._flushing = True
+            return True
+
+    def flush(self) -> str:
+        """Write the pending accesses, the ones that couldn't be written are kept for the next flush unless newer ones were recorded."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = self._clock()
+            self._flushing = True
+
+        try:
+            ret = self._writer(pending) if pending else ""
+        except BaseException as e:
+            ret = str(e)
+
+        with self._lock:
+            if ret:
+                for session_id, date in pending.items():
+                    self._pending.setdefault(session_id, date)
+            self._flushing = False
+        return ret
@@ -5,11 +5,14 @@ from math import floor
 from time import time
 from traceback import format_exc
 from html import escape
+from pathlib import Path
 
-from flask import Blueprint, jsonify, redirect, render_template, request, url_for
+from flask import Blueprint, Response, jsonify, redirect, render_template, request, stream_with_context, url_for
 from flask_login import login_required
 
-from app.dependencies import BW_CONFIG, BW_INSTANCES_UTILS, DB
+from app.dependencies import BANS_INDEX, BW_CONFIG, BW_INSTANCES_UTILS, DB
+from app.models.ban_index import BanQuery, RedisBanIndex
+from app.models.exports import iter_csv, iter_file, write_excel
 from app.utils import LOGGER, flash
 
 from app.routes.utils import cors_required, get_redis_client, get_remain, handle_error, verify_data_in_form
@@ -32,112 +35,8 @@ def bans_page():
 @login_required
 @cors_required
 def bans_fetch():
-    redis_client = get_redis_client()
-
-    bans = []
-    if redis_client:
-        try:
-            # Retrieve global bans from Redis (stored with prefix "bans_ip_")
-            for key in redis_client.scan_iter("bans_ip_*"):
-                key_str = key.decode("utf-8", "replace")
-                ip = key_str.replace("bans_ip_", "")
-                data = redis_client.get(key)
-                if not data:
-                    continue
-                exp = redis_client.ttl(key)
-                try:
-                    ban_data = loads(data.decode("utf-8", "replace"))
-                    # Ensure consistent scope for frontend display
-                    ban_data["ban_scope"] = "global"
-                    ban_data["permanent"] = ban_data.get("permanent", False) or exp == 0
-
-                    # Check if this is a permanent ban
-                    if ban_data.get("permanent", False):
-                        exp = 0  # Override TTL for permanent bans
-
-                    bans.append({"ip": ip, "exp": exp, "permanent": ban_data.get("permanent", False)} | ban_data)
-                except Exception as e:
-                    LOGGER.debug(format_exc())
-                    LOGGER.error(f"Failed to decode ban data for {ip}: {e}")
-
-            # Retrieve service-specific bans from Redis (stored with prefix "bans_service_*_ip_*")
-            for key in redis_client.scan_iter("bans_service_*_ip_*"):
-                key_str = key.decode("utf-8", "replace")
-                service, ip = key_str.replace("bans_service_", "").split("_ip_")
-                data = redis_client.get(key)
-                if not data:
-                    continue
-                exp = redis_client.ttl(key)
-                try:
-                    ban_data = loads(data.decode("utf-8", "replace"))
-                    # Ensure consistent scope for frontend display
-                    ban_data["ban_scope"] = "service"
-                    ban_data["service"] = service
-                    ban_data["permanent"] = ban_data.get("permanent", False) or exp == 0
-
-                    # Check if this is a permanent ban
-                    if ban_data.get("permanent", False):
-                        exp = 0  # Override TTL for permanent bans
-
-                    bans.append({"ip": ip, "exp": exp, "permanent": ban_data.get("permanent", False)} | ban_data)
-                except Exception as e:
-                    LOGGER.debug(format_exc())
-                    LOGGER.error(f"Failed to decode ban data for {ip} on service {service}: {e}")
-        except BaseException as e:
-            LOGGER.debug(format_exc())
-            LOGGER.error(f"Couldn't get bans from redis: {e}")
-            flash("Failed to fetch bans from Redis, see logs for more information.", "error")
-            bans = []
-
-    # Also fetch bans from all connected BunkerWeb instances
-    instance_bans = BW_INSTANCES_UTILS.get_bans()
-
-    # Current timestamp for calculating remaining times
-    timestamp_now = time()
-
-    # Process instance bans and avoid duplicates with Redis bans
-    for ban in instance_bans:
-        # Normalize ban scope to ensure consistent frontend display
-        if "ban_scope" not in ban:
-            if ban.get("service", "_") == "_":
-                ban["ban_scope"] = "global"
-            else:
-                ban["ban_scope"] = "service"
-
-        # Skip if this ban already exists in the list (checking IP, scope and service combination)
-        if not any(b["ip"] == ban["ip"] and b["ban_scope"] == ban["ban_scope"] and (b.get("service", "_") == ban.get("service", "_")) for b in bans):
-            bans.append(ban)
-
-    # Format ban times for display
-    for ban in bans:
-        exp = ban.pop("exp", 0)
-
-        # Handle permanent bans (exp = 0)
-        if exp == 0 or ban.get("permanent", False):
-            ban["remain"] = "permanent"
-            ban["permanent"] = True
-            ban["end_date"] = "permanent"
-        else:
-            # Calculate human-readable remaining time for non-permanent bans
-            remain = ("unknown", "unknown") if exp <= 0 else get_remain(exp)
-            ban["remain"] = remain[0]
-            # Format timestamps for start and end dates
-            ban["start_date"] = datetime.fromtimestamp(floor(ban["date"])).astimezone().isoformat()
-            ban["end_date"] = datetime.fromtimestamp(floor(timestamp_now + exp)).astimezone().isoformat()
-
     # DataTables parameters
     draw = int(request.form.get("draw", 1))
-    start = int(request.form.get("start", 0))
-    length = int(request.form.get("length", 10))
-    search_value = request.form.get("search[value]", "").lower()
-    # DataTables includes two leading non-data columns (details-control and select)
-    # Adjust incoming index to align with backend data columns
-    try:
-        order_column_index_dt = int(request.form.get("order[0][column]", 0))
-    except Exception:
-        order_column_index_dt = 0
-    order_column_index = max(order_column_index_dt - 2, 0)
-    order_direction = request.form.get("order[0][dir]", "desc")
     search_panes = defaultdict(list)
     for key, value in request.form.items():
         if key.startswith("searchPanes["):
@@ -157,8 +56,50 @@ def bans_fetch():
         "actions",  # 8
     ]
 
+    # DataTables includes two leading non-data columns (details-control and select)
+    # Adjust incoming index to align with backend data columns
+    try:
+        order_column_index_dt = int(request.form.get("order[0][column]", 0))
+    except Exception:
+        order_column_index_dt = 0
+    order_column_index = min(max(order_column_index_dt - 2, 0), len(columns) - 1)
+
+    query = BanQuery(
+        start=int(request.form.get("start", 0)),
+        length=int(request.form.get("length", 10)),
+        search=request.form.get("search[value]", "").lower(),
+        order=columns[order_column_index],
+        direction=request.form.get("order[0][dir]", "desc"),
+        panes=dict(search_panes),
+    )
+
+    # ? With redis, the bans are listed from its bans index which is maintained by BunkerWeb on each ban and unban
+    redis_client = get_redis_client()
+    page = None
+    if redis_client:
+        try:
+            page = RedisBanIndex(redis_client, LOGGER).query(query)
+        except BaseException as e:
+            LOGGER.debug(format_exc())
+            LOGGER.error(f"Couldn't get bans from redis: {e}")
+            flash("Failed to fetch bans from Redis, see logs for more information.", "error")
+
+    if page is None:
+        page = BANS_INDEX.query(query)
+
+    # Current timestamp for calculating remaining times
+    timestamp_now = time()
+
     # Helper: format a ban for DataTable row
     def format_ban(ban):
+        exp = ban.get("exp", 0)
+        if exp == 0 or ban.get("permanent", False):
+            permanent, remain, end_date = True, "permanent", "permanent"
+        else:
+            # Calculate human-readable remaining time for non-permanent bans
+            permanent, remain = False, ("unknown" if exp <= 0 else get_remain(exp)[0])
+            end_date = datetime.fromtimestamp(floor(timestamp_now + exp)).astimezone().isoformat()
+
         # Defensive: some bans may lack some fields
         return {
             "date": datetime.fromtimestamp(floor(ban.get("date", 0))).isoformat() if ban.get("date") else "N/A",
@@ -167,158 +108,15 @@ def bans_fetch():
             "reason": escape(str(ban.get("reason", "N/A"))),
             "scope": escape(str(ban.get("ban_scope", "global"))),
             "service": escape(str(ban.get("service") or "_")),
-            "end_date": "permanent" if ban.get("permanent", False) else escape(str(ban.get("end_date", "N/A"))),
-            "time_left": "permanent" if ban.get("permanent", False) else escape(str(ban.get("remain", "N/A"))),
-            "permanent": bool(ban.get("permanent", False)),
+            "end_date": "permanent" if permanent else escape(end_date),
+            "time_left": "permanent" if permanent else escape(str(remain)),
+            "permanent": permanent,
             "actions": "",  # Actions column for buttons
         }
 
-    # Apply searchPanes filters
-    def filter_by_search_panes(bans):
-        filtered = bans
-        for field, selected_values in search_panes.items():
-            if not selected_values:
-                continue
-            if field == "date":
-                # Special handling for date searchpane
-                now = time()
-
-                def date_filter(ban):
-                    ban_date = ban.get("date", 0)
-                    for val in selected_values:
-                        if val == "last_24h" and now - ban_date < 86400:
-                            return True
-                        if val == "last_7d" and now - ban_date < 604800:
-                            return True
-                        if val == "last_30d" and now - ban_date < 2592000:
-                            return True
-                        if val == "older_30d" and now - ban_date >= 2592000:
-                            return True
-                    return False
-
-                filtered = list(filter(date_filter, filtered))
-            elif field == "scope":
-                # Special handling for scope searchpane
-                def scope_filter(ban):
-                    for val in selected_values:
-                        if val == "global" == ban.get("ban_scope"):
-                            return True
-                        if val == "service" == ban.get("ban_scope"):
-                            return True
-                    return False
-
-                filtered = list(filter(scope_filter, filtered))
-            # Special handling for end_date searchpane
-            if field == "end_date":
-                # Special handling for end_date searchpane
-                now = time()
-
-                def end_date_filter(ban):
-                    # Always include permanent bans in the "future_30d" category
-                    if ban.get("permanent", False) and "future_30d" in selected_values:
-                        return True
-
-                    exp = ban.get("exp", 0)
-                    if ban.get("permanent", False):
-                        return "permanent" in selected_values
-
-                    for val in selected_values:
-                        if val == "permanent" and ban.get("permanent", False):
-                            return True
-                        if val == "next_24h" and exp < 86400:
-                            return True
-                        if val == "next_7d" and exp < 604800:
-                            return True
-                        if val == "next_30d" and exp < 2592000:
-                            return True
-                        if val == "future_30d" and exp >= 2592000:
-                            return True
-                    return False
-
-                filtered = list(filter(end_date_filter, filtered))
-            elif field == "service":
-                # Special handling for service searchpane
-                def service_filter(ban):
-                    ban_service = ban.get("service")
-                    # Normalize global bans to "_"
-                    if ban.get("ban_scope") == "global" or ban_service in (None, ""):
-                        ban_service = "_"
-                    return str(ban_service) in selected_values
-
-                filtered = list(filter(service_filter, filtered))
-            else:
-                filtered = [ban for ban in filtered if str(ban.get(field, "N/A")) in selected_values]
-        return filtered
-
-    # Global search filtering
-    def global_search_filter(ban):
-        # Special handling for permanent bans in search
-        if search_value == "permanent" and ban.get("permanent", False):
-            return True
-
-        return any(search_value in str(ban.get(col, "")).lower() for col in columns)
-
-    # Sort bans
-    def _to_float(value, default=0.0):
-        try:
-            if isinstance(value, (int, float)):
-                return float(value)
-            if value is None:
-                return float(default)
-            return float(str(value))
-        except Exception:
-            return float(default)
-
-    def sort_bans(bans):
-        if 0 <= order_column_index < len(columns):
-            sort_key = columns[order_column_index]
-            # Special handling for end_date and time_left sorting for permanent bans
-            if sort_key in ("end_date", "time_left"):
-                # For these columns, permanent bans should sort either at the top or bottom
-                # depending on sort order
-                bans.sort(
-                    key=lambda x: ("0" if order_direction == "desc" else "z") if x.get("permanent", False) else x.get(sort_key, ""),
-                    reverse=(order_direction == "desc"),
-                )
-            elif sort_key == "date":
-                bans.sort(key=lambda x: _to_float(x.get("date", 0.0), 0.0), reverse=(order_direction == "desc"))
-            else:
-                bans.sort(key=lambda x: x.get(sort_key, ""), reverse=(order_direction == "desc"))
-
-    # Apply filters and sort
-    filtered_bans = filter(global_search_filter, bans) if search_value else bans
-    filtered_bans = list(filter_by_search_panes(filtered_bans))
-    sort_bans(filtered_bans)
-
-    paginated_bans = filtered_bans if length == -1 else filtered_bans[start : start + length]  # noqa: E203
-
-    # Format for DataTable
-    formatted_bans = [format_ban(ban) for ban in paginated_bans]
-
-    # Calculate pane counts (for SearchPanes)
-    pane_counts = defaultdict(lambda: defaultdict(lambda: {"total": 0, "count": 0}))
-
-    # Use IP+scope+service as unique ID for bans
-    def ban_id(ban):
-        service = ban.get("service")
-        # Normalize service to "_" for global bans or when service is None
-        if ban.get("ban_scope") == "global" or service is None:
-            service = "_"
-        return f"{ban.get('ip','')}|{ban.get('ban_scope','')}|{service}"
-
-    filtered_ids = {ban_id(ban) for ban in filtered_bans}
-    for ban in bans:
-        for field in columns[1:]:  # skip date
-            value = ban.get(field, "N/A")
-            # Special handling for service field to normalize global bans
-            if field == "service":
-                if ban.get("ban_scope") == "global" or value in (None, ""):
-                    value = "_"
-            if isinstance(value, (dict, list)):
-                value = str(value)
-            pane_counts[field][value]["total"] += 1
-            if ban_id(ban) in filtered_ids:
-                pane_counts[field][value]["count"] += 1
+    def pane_option(label, field, value):
+        counts = page.panes.get(field, {}).get(value, {"total": 0, "count": 0})
+        return {"label": label, "value": value, "total": counts["total"], "count": counts["count"]}
 
     # Prepare SearchPanes options (special formatting for date, country, scope, service, and end_date)
     base_flags_url = url_for("static", filename="img/flags")
@@ -326,35 +124,15 @@ def bans_fetch():
 
     # Special handling for date searchpane options
     search_panes_options["date"] = [
-        {
-            "label": '<span data-i18n="searchpane.last_24h">Last 24 hours</span>',
-            "value": "last_24h",
-            "total": sum(1 for ban in bans if time() - ban.get("date", 0) < 86400),
-            "count": sum(1 for ban in filtered_bans if time() - ban.get("date", 0) < 86400),
-        },
-        {
-            "label": '<span data-i18n="searchpane.last_7d">Last 7 days</span>',
-            "value": "last_7d",
-            "total": sum(1 for ban in bans if time() - ban.get("date", 0) < 604800),
-            "count": sum(1 for ban in filtered_bans if time() - ban.get("date", 0) < 604800),
-        },
-        {
-            "label": '<span data-i18n="searchpane.last_30d">Last 30 days</span>',
-            "value": "last_30d",
-            "total": sum(1 for ban in bans if time() - ban.get("date", 0) < 2592000),
-            "count": sum(1 for ban in filtered_bans if time() - ban.get("date", 0) < 2592000),
-        },
-        {
-            "label": '<span data-i18n="searchpane.older_30d">More than 30 days</span>',
-            "value": "older_30d",
-            "total": sum(1 for ban in bans if time() - ban.get("date", 0) >= 2592000),
-            "count": sum(1 for ban in filtered_bans if time() - ban.get("date", 0) >= 2592000),
-        },
+        pane_option('<span data-i18n="searchpane.last_24h">Last 24 hours</span>', "date", "last_24h"),
+        pane_option('<span data-i18n="searchpane.last_7d">Last 7 days</span>', "date", "last_7d"),
+        pane_option('<span data-i18n="searchpane.last_30d">Last 30 days</span>', "date", "last_30d"),
+        pane_option('<span data-i18n="searchpane.older_30d">More than 30 days</span>', "date", "older_30d"),
     ]
 
     # Special handling for country searchpane options
     search_panes_options["country"] = []
-    for code, counts in pane_counts["country"].items():
+    for code in page.panes.get("country", {}):
         str_code = str(code)
         country_code = str_code.lower()
         is_unknown = str_code in ("unknown", "local", "n/a")
@@ -364,102 +142,124 @@ def bans_fetch():
         i18n_key = "not_applicable" if str_code in ("unknown", "local") else str_code.upper()
         fallback_name = "N/A" if is_unknown else str_code
         search_panes_options["country"].append(
-            {
-                "label": f'<img src="{base_flags_url}/{flag_code}.svg" class="border border-1 p-0 me-1" height="17" />&nbsp;－&nbsp;<span class="me-1"><code>{code_text}</code></span><span data-i18n="country.{i18n_key}">{fallback_name}</span>',
-                "value": str_code,
-                "total": counts["total"],
-                "count": counts["count"],
-            }
+            pane_option(
+                f'<img src="{base_flags_url}/{flag_code}.svg" class="border border-1 p-0 me-1" height="17" />&nbsp;－&nbsp;<span class="me-1"><code>{code_text}</code></span><span data-i18n="country.{i18n_key}">{fallback_name}</span>',
+                "country",
+                str_code,
+            )
         )
 
     # Special handling for scope searchpane options
     search_panes_options["scope"] = [
-        {
-            "label": '<i class="bx bx-xs bx-globe"></i> <span data-i18n="scope.global">Global</span>',
-            "value": "global",
-            "total": sum(1 for ban in bans if ban.get("ban_scope") == "global"),
-            "count": sum(1 for ban in filtered_bans if ban.get("ban_scope") == "global"),
-        },
-        {
-            "label": '<i class="bx bx-xs bx-server"></i> <span data-i18n="scope.service_specific">Service</span>',
-            "value": "service",
-            "total": sum(1 for ban in bans if ban.get("ban_scope") == "service"),
-            "count": sum(1 for ban in filtered_bans if ban.get("ban_scope") == "service"),
-        },
+        pane_option('<i class="bx bx-xs bx-globe"></i> <span data-i18n="scope.global">Global</span>', "scope", "global"),
+        pane_option('<i class="bx bx-xs bx-server"></i> <span data-i18n="scope.service_specific">Service</span>', "scope", "service"),
     ]
 
     # Special handling for service searchpane options
     search_panes_options["service"] = []
-    for name, counts in pane_counts["service"].items():
+    for name in page.panes.get("service", {}):
         display_name = "default server" if (not name or name == "_") else escape(str(name))
-        search_panes_options["service"].append(
-            {
-                "label": display_name,
-                "value": escape(str(name)),
-                "total": counts["total"],
-                "count": counts["count"],
-            }
-        )
+        search_panes_options["service"].append(pane_option(display_name, "service", name) | {"value": escape(str(name))})
 
     # Special handling for end_date searchpane options
     search_panes_options["end_date"] = [
-        {
-            "label": '<span data-i18n="searchpane.permanent">Permanent</span>',
-            "value": "permanent",
-            "total": sum(1 for ban in bans if ban.get("permanent", False) or ban.get("exp", 0) == 0),
-            "count": sum(1 for ban in filtered_bans if ban.get("permanent", False) or ban.get("exp", 0) == 0),
-        },
-        {
-            "label": '<span data-i18n="searchpane.next_24h">Next 24 hours</span>',
-            "value": "next_24h",
-            "total": sum(1 for ban in bans if not ban.get("permanent", False) and ban.get("exp", 0) < 86400),
-            "count": sum(1 for ban in filtered_bans if not ban.get("permanent", False) and ban.get("exp", 0) < 86400),
-        },
-        {
-            "label": '<span data-i18n="searchpane.next_7d">Next 7 days</span>',
-            "value": "next_7d",
-            "total": sum(1 for ban in bans if not ban.get("permanent", False) and ban.get("exp", 0) < 604800),
-            "count": sum(1 for ban in filtered_bans if not ban.get("permanent", False) and ban.get("exp", 0) < 604800),
-        },
-        {
-            "label": '<span data-i18n="searchpane.next_30d">Next 30 days</span>',
-            "value": "next_30d",
-            "total": sum(1 for ban in bans if not ban.get("permanent", False) and ban.get("exp", 0) < 2592000),
-            "count": sum(1 for ban in filtered_bans if not ban.get("permanent", False) and ban.get("exp", 0) < 2592000),
-        },
-        {
-            "label": '<span data-i18n="searchpane.future_30d">More than 30 days</span>',
-            "value": "future_30d",
-            "total": sum(1 for ban in bans if not ban.get("permanent", False) and ban.get("exp", 0) >= 2592000),
-            "count": sum(1 for ban in filtered_bans if not ban.get("permanent", False) and ban.get("exp", 0) >= 2592000),
-        },
+        pane_option('<span data-i18n="searchpane.permanent">Permanent</span>', "end_date", "permanent"),
+        pane_option('<span data-i18n="searchpane.next_24h">Next 24 hours</span>', "end_date", "next_24h"),
+        pane_option('<span data-i18n="searchpane.next_7d">Next 7 days</span>', "end_date", "next_7d"),
+        pane_option('<span data-i18n="searchpane.next_30d">Next 30 days</span>', "end_date", "next_30d"),
+        pane_option('<span data-i18n="searchpane.future_30d">More than 30 days</span>', "end_date", "future_30d"),
     ]
 
-    # Add any remaining fields from pane_counts
-    for field, values in pane_counts.items():
-        if field not in search_panes_options:
-            search_panes_options[field] = [
-                {
-                    "label": escape(str(value)),
-                    "value": escape(str(value)),
-                    "total": counts["total"],
-                    "count": counts["count"],
-                }
-                for value, counts in values.items()
-            ]
-
     # Response
     return jsonify(
         {
             "draw": draw,
-            "recordsTotal": len(bans),
-            "recordsFiltered": len(filtered_bans),
-            "data": formatted_bans,
+            "recordsTotal": page.total,
+            "recordsFiltered": page.filtered,
+            "data": [format_ban(ban) for ban in page.bans],
             "searchPanes": {"options": search_panes_options},
         }
     )
 
 
+BANS_EXPORT_HEADERS = ["Date", "IP Address", "Country", "Reason", "Scope", "Service", "End date", "Time left"]
+BANS_EXPORT_WIDTHS = [21, 17, 9, 30, 9, 30, 27, 20]
+
+
+def iter_export_rows():
+    """Rows of all the bans matching the search and order parameters, produced lazily"""
+    order = request.args.get("order_column", "date")
+    query = BanQuery(
+        search=request.args.get("search", "").lower(),
+        order=order if order in ("date", "ip", "country", "reason", "scope", "service", "end_date", "time_left") else "date",
+        direction=request.args.get("order_dir", "desc") or "desc",
+    )
+
+    redis_client = get_redis_client()
+    bans = RedisBanIndex(redis_client, LOGGER).iter_bans(query) if redis_client else BANS_INDEX.iter_bans(query)
+    timestamp_now = time()
+    for ban in bans:
+        exp = ban.get("exp", 0)
+        permanent = exp == 0 or ban.get("permanent", False)
+        yield [
+            datetime.fromtimestamp(floor(ban.get("date", 0))).isoformat() if ban.get("date") else "N/A",
+            str(ban.get("ip", "N/A")),
+            str(ban.get("country", "N/A")),
+            str(ban.get("reason", "N/A")),
+            str(ban.get("ban_scope", "global")),
+            str(ban.get("service") or "_"),
+            "permanent" if permanent else datetime.fromtimestamp(floor(timestamp_now + exp)).astimezone().isoformat(),
+            "permanent" if permanent else ("unknown" if exp <= 0 else get_remain(exp)[0]),
+        ]
+
+
+def log_truncated_export(max_rows: int):
+    LOGGER.warning(f"Bans export truncated to {max_rows} rows")
+
+
+@bans.route("/bans/export/csv", methods=["GET"])
+@login_required
+def bans_export_csv():
+    """Export all bans as CSV"""
+
+    def generate():
+        try:
+            yield from iter_csv(BANS_EXPORT_HEADERS, iter_export_rows(), on_truncate=log_truncated_export)
+        except BaseException as e:
+            # ? The response has already started, the error can only be logged
+            LOGGER.error(f"Error exporting bans to CSV: {e}")
+            LOGGER.debug(format_exc())
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=bunkerweb_bans_{timestamp}.csv", "X-Accel-Buffering": "no"},
+    )
+
+
+@bans.route("/bans/export/excel", methods=["GET"])
+@login_required
+def bans_export_excel():
+    """Export all bans as Excel"""
+    try:
+        path = write_excel(BANS_EXPORT_HEADERS, iter_export_rows(), title="Bans", widths=BANS_EXPORT_WIDTHS, on_truncate=log_truncated_export)
+    except BaseException as e:
+        LOGGER.error(f"Error exporting bans to Excel: {e}")
+        LOGGER.debug(format_exc())
+        return jsonify({"error": "Failed to export bans"}), 500
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        iter_file(path),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f"attachment; filename=bunkerweb_bans_{timestamp}.xlsx",
+            "Content-Length": str(Path(path).stat().st_size),
+        },
+    )
+
+
 @bans.route("/bans/ban", methods=["POST"])
 @login_required
 def bans_ban():
@@ -513,6 +313,7 @@ def bans_ban():
         else:
             LOGGER.info(f"Banned {ip} on all instances")
             flash(f"Banned {ip} successfully.", "success")
+            BANS_INDEX.add(ip, ban_end, reason, service, ban_scope)
 
     return redirect(url_for("loading", next=url_for("bans.bans_page"), message=f"Banning {len(bans)} IP{'s' if len(bans) > 1 else ''}"))
 
@@ -562,6 +363,7 @@ def bans_unban():
         else:
             LOGGER.info(f"Unbanned {ip} on all instances")
             flash(f"Unbanned {ip} successfully.", "success")
+            BANS_INDEX.remove(ip, service, ban_scope)
 
     return redirect(url_for("loading", next=url_for("bans.bans_page"), message=f"Unbanning {len(unbans)} IP{'s' if len(unbans) > 1 else ''}"))
 
@@ -663,5 +465,6 @@ def bans_update_duration():
         else:
             LOGGER.info(f"Updated ban duration for {ip} on all instances")
             flash(f"Updated ban duration for {ip} successfully.", "success")
+            BANS_INDEX.add(ip, new_exp, original_reason, service, ban_scope)
 
     return redirect(url_for("loading", next=url_for("bans.bans_page"), message=f"Updating duration for {len(updates)} ban{'s' if len(updates) > 1 else ''}"))
@@ -1,19 +1,15 @@
 from collections import defaultdict
-from contextlib import suppress
 from datetime import datetime
 from json import dumps, loads
 from traceback import format_exc
 from html import escape
-from io import StringIO, BytesIO
-import csv
+from pathlib import Path
 
-
-from flask import Blueprint, jsonify, render_template, request, url_for, Response, send_file
+from flask import Blueprint, jsonify, render_template, request, url_for, Response, stream_with_context
 from flask_login import login_required
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
 
 from app.dependencies import BW_CONFIG, BW_INSTANCES_UTILS
+from app.models.exports import iter_csv, iter_file, write_excel
 from app.utils import LOGGER
 
 from app.routes.utils import cors_required
@@ -244,95 +240,86 @@ def reports_fetch():
     )
 
 
+REPORTS_EXPORT_HEADERS = [
+    "Date",
+    "Request ID",
+    "IP Address",
+    "Country",
+    "Method",
+    "URL",
+    "Status Code",
+    "User-Agent",
+    "Reason",
+    "Server Name",
+    "Data",
+    "Security Mode",
+]
+REPORTS_EXPORT_WIDTHS = [21, 34, 17, 9, 9, 50, 13, 50, 20, 30, 50, 15]
+
+
+def report_export_row(report: dict) -> list:
+    # Format data field
+    data_field = report.get("data", {})
+    if isinstance(data_field, str):
+        try:
+            data_output = dumps(loads(data_field))
+        except (ValueError, TypeError):
+            data_output = data_field
+    else:
+        data_output = dumps(data_field)
+
+    return [
+        datetime.fromtimestamp(report.get("date", 0)).isoformat() if report.get("date") else "N/A",
+        str(report.get("id", "N/A")),
+        str(report.get("ip", "N/A")),
+        str(report.get("country", "N/A")),
+        str(report.get("method", "N/A")),
+        str(report.get("url", "N/A")),
+        str(report.get("status", "N/A")),
+        str(report.get("user_agent", "N/A")),
+        str(report.get("reason", "N/A")),
+        str(report.get("server_name", "N/A")),
+        data_output,
+        str(report.get("security_mode", "N/A")),
+    ]
+
+
+def iter_export_rows():
+    """Rows of all the reports matching the search and order parameters, produced lazily"""
+    if not BW_INSTANCES_UTILS:
+        return iter(())
+
+    reports = BW_INSTANCES_UTILS.iter_reports(
+        search=request.args.get("search", "").lower(),
+        order_column=request.args.get("order_column", "date") or "date",
+        order_dir=request.args.get("order_dir", "desc") or "desc",
+    )
+    return (report_export_row(report) for report in reports)
+
+
+def log_truncated_export(max_rows: int):
+    LOGGER.warning(f"Reports export truncated to {max_rows} rows")
+
+
 @reports.route("/reports/export/csv", methods=["GET"])
 @login_required
 def reports_export_csv():
     """Export all reports as CSV"""
-    try:
-        # Get search and order parameters
-        search_value = request.args.get("search", "").lower()
-        order_column = request.args.get("order_column", "date")
-        order_dir = request.args.get("order_dir", "desc")
-
-        # Get all reports (no pagination)
-        if BW_INSTANCES_UTILS:
-            result = BW_INSTANCES_UTILS.get_reports_query(
-                start=0,
-                length=-1,  # Get all records
-                search=search_value,
-                order_column=order_column,
-                order_dir=order_dir,
-                search_panes="",
-                count_only=False,
-            )
-            all_reports = result.get("data", [])
-        else:
-            all_reports = []
-
-        # Create CSV in memory
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow(
-            [
-                "Date",
-                "Request ID",
-                "IP Address",
-                "Country",
-                "Method",
-                "URL",
-                "Status Code",
-                "User-Agent",
-                "Reason",
-                "Server Name",
-                "Data",
-                "Security Mode",
-            ]
-        )
-
-        # Write data rows
-        for report in all_reports:
-            # Format data field
-            data_field = report.get("data", {})
-            if isinstance(data_field, str):
-                try:
-                    data_output = dumps(loads(data_field))
-                except (ValueError, TypeError):
-                    data_output = data_field
-            else:
-                data_output = dumps(data_field)
 
-            writer.writerow(
-                [
-                    datetime.fromtimestamp(report.get("date", 0)).isoformat() if report.get("date") else "N/A",
-                    str(report.get("id", "N/A")),
-                    str(report.get("ip", "N/A")),
-                    str(report.get("country", "N/A")),
-                    str(report.get("method", "N/A")),
-                    str(report.get("url", "N/A")),
-                    str(report.get("status", "N/A")),
-                    str(report.get("user_agent", "N/A")),
-                    str(report.get("reason", "N/A")),
-                    str(report.get("server_name", "N/A")),
-                    data_output,
-                    str(report.get("security_mode", "N/A")),
-                ]
-            )
-
-        # Prepare response
-        output.seek(0)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=bunkerweb_reports_{timestamp}.csv"},
-        )
+    def generate():
+        try:
+            yield from iter_csv(REPORTS_EXPORT_HEADERS, iter_export_rows(), on_truncate=log_truncated_export)
+        except Exception as e:
+            # ? The response has already started, the error can only be logged
+            LOGGER.error(f"Error exporting reports to CSV: {e}")
+            LOGGER.debug(format_exc())
 
-    except Exception as e:
-        LOGGER.error(f"Error exporting reports to CSV: {e}")
-        LOGGER.debug(format_exc())
-        return jsonify({"error": "Failed to export reports"}), 500
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=bunkerweb_reports_{timestamp}.csv", "X-Accel-Buffering": "no"},
+    )
 
 
 @reports.route("/reports/export/excel", methods=["GET"])
@@ -340,111 +327,18 @@ def reports_export_csv():
 def reports_export_excel():
     """Export all reports as Excel"""
     try:
-        # Get search and order parameters
-        search_value = request.args.get("search", "").lower()
-        order_column = request.args.get("order_column", "date")
-        order_dir = request.args.get("order_dir", "desc")
-
-        # Get all reports (no pagination)
-        if BW_INSTANCES_UTILS:
-            result = BW_INSTANCES_UTILS.get_reports_query(
-                start=0,
-                length=-1,  # Get all records
-                search=search_value,
-                order_column=order_column,
-                order_dir=order_dir,
-                search_panes="",
-                count_only=False,
-            )
-            all_reports = result.get("data", [])
-        else:
-            all_reports = []
-
-        # Create workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reports"
-
-        # Style for header
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-
-        # Write header
-        headers = [
-            "Date",
-            "Request ID",
-            "IP Address",
-            "Country",
-            "Method",
-            "URL",
-            "Status Code",
-            "User-Agent",
-            "Reason",
-            "Server Name",
-            "Data",
-            "Security Mode",
-        ]
-        ws.append(headers)
-
-        # Apply header styling
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-
-        # Write data rows
-        for report in all_reports:
-            # Format data field
-            data_field = report.get("data", {})
-            if isinstance(data_field, str):
-                try:
-                    data_output = dumps(loads(data_field))
-                except (ValueError, TypeError):
-                    data_output = data_field
-            else:
-                data_output = dumps(data_field)
-
-            ws.append(
-                [
-                    datetime.fromtimestamp(report.get("date", 0)).isoformat() if report.get("date") else "N/A",
-                    str(report.get("id", "N/A")),
-                    str(report.get("ip", "N/A")),
-                    str(report.get("country", "N/A")),
-                    str(report.get("method", "N/A")),
-                    str(report.get("url", "N/A")),
-                    str(report.get("status", "N/A")),
-                    str(report.get("user_agent", "N/A")),
-                    str(report.get("reason", "N/A")),
-                    str(report.get("server_name", "N/A")),
-                    data_output,
-                    str(report.get("security_mode", "N/A")),
-                ]
-            )
-
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                with suppress(Exception):
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return send_file(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=f"bunkerweb_reports_{timestamp}.xlsx",
-        )
-
+        path = write_excel(REPORTS_EXPORT_HEADERS, iter_export_rows(), title="Reports", widths=REPORTS_EXPORT_WIDTHS, on_truncate=log_truncated_export)
     except Exception as e:
         LOGGER.error(f"Error exporting reports to Excel: {e}")
         LOGGER.debug(format_exc())
         return jsonify({"error": "Failed to export reports"}), 500
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        iter_file(path),
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f"attachment; filename=bunkerweb_reports_{timestamp}.xlsx",
+            "Content-Length": str(Path(path).stat().st_size),
+        },
+    )
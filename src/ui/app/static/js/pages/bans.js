@@ -498,21 +498,69 @@ $(document).ready(function () {
         },
         {
           extend: "csv",
-          text: `<span class="tf-icons bx bx-table bx-18px me-2"></span>CSV`,
+          text: '<span class="tf-icons bx bx-table bx-18px me-2"></span><span data-i18n="button.export_csv_visible">CSV (Visible)</span>',
           bom: true,
-          filename: "bw_bans",
+          filename: "bw_bans_visible",
           exportOptions: {
-            modifier: { search: "none" },
-            columns: ":not(:nth-child(-n+2)):not(:last-child)",
+            columns: ":visible:not(:nth-child(-n+2)):not(:last-child)",
+          },
+        },
+        {
+          text: '<span class="tf-icons bx bx-download bx-18px me-2"></span><span data-i18n="button.export_csv_all">CSV (All)</span>',
+          className: "buttons-csv",
+          action: function (e, dt, button, config) {
+            // Get current table state for filters
+            const params = dt.ajax.params();
+            // Build URL with parameters for server-side export
+            const exportUrl = `${window.location.pathname}/export/csv?${$.param(
+              {
+                csrf_token: $("#csrf_token").val(),
+                search: params.search ? params.search.value : "",
+                order_column:
+                  params.order && params.order.length > 0
+                    ? params.columns[params.order[0].column].data
+                    : "",
+                order_dir:
+                  params.order && params.order.length > 0
+                    ? params.order[0].dir
+                    : "",
+              },
+            )}`;
+            // Trigger download
+            window.location.href = exportUrl;
           },
         },
         {
           extend: "excel",
-          text: `<span class="tf-icons bx bx-table bx-18px me-2"></span>Excel`,
-          filename: "bw_bans",
+          text: '<span class="tf-icons bx bx-table bx-18px me-2"></span><span data-i18n="button.export_excel_visible">Excel (Visible)</span>',
+          filename: "bw_bans_visible",
           exportOptions: {
-            modifier: { search: "none" },
-            columns: ":not(:nth-child(-n+2)):not(:last-child)",
+            columns: ":visible:not(:nth-child(-n+2)):not(:last-child)",
+          },
+        },
+        {
+          text: '<span class="tf-icons bx bx-download bx-18px me-2"></span><span data-i18n="button.export_excel_all">Excel (All)</span>',
+          className: "buttons-excel",
+          action: function (e, dt, button, config) {
+            // Get current table state for filters
+            const params = dt.ajax.params();
+            // Build URL with parameters for server-side export
+            const exportUrl = `${window.location.pathname}/export/excel?${$.param(
+              {
+                csrf_token: $("#csrf_token").val(),
+                search: params.search ? params.search.value : "",
+                order_column:
+                  params.order && params.order.length > 0
+                    ? params.columns[params.order[0].column].data
+                    : "",
+                order_dir:
+                  params.order && params.order.length > 0
+                    ? params.order[0].dir
+                    : "",
+              },
+            )}`;
+            // Trigger download
+            window.location.href = exportUrl;
           },
         },
       ],
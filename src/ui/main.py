@@ -41,6 +41,7 @@ from app.models.reverse_proxied import ReverseProxied
 
 from app.dependencies import BW_CONFIG, DATA, DB, CORE_PLUGINS_PATH, EXTERNAL_PLUGINS_PATH, PRO_PLUGINS_PATH, safe_reload_plugins
 from app.models.models import AnonymousUser
+from app.models.user_cache import AccessBuffer
 from app.utils import (
     BISCUIT_PUBLIC_KEY_FILE,
     COLUMNS_PREFERENCES_DEFAULTS,
@@ -153,6 +154,9 @@ _periodic_tasks_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=
 _user_access_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bw-ui-access")
 _config_tasks_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bw-ui-config")
 
+# Sessions last activity, written to the database in batches by the access executor
+_user_access_buffer = AccessBuffer(DB.mark_ui_users_access)
+
 _db_check_lock = Lock()
 _db_check_future = None
 _db_check_next_allowed = 0.0
@@ -160,6 +164,7 @@ _db_check_next_allowed = 0.0
 
 def _shutdown_executors():
     """Shutdown all thread pool executors on application exit."""
+    flush_user_accesses()
     _db_check_executor.shutdown(wait=False)
     _periodic_tasks_executor.shutdown(wait=False)
     _user_access_executor.shutdown(wait=False)
@@ -737,20 +742,13 @@ def inject_variables():
 
 @login_manager.user_loader
 def load_user(username):
-    ui_user = DB.get_ui_user(username=username)
+    # ? The user is shared with the other requests of the worker until it expires or the users / roles are updated, it must not be modified
+    ui_user = DB.get_ui_principal(username)
     if not ui_user:
         LOGGER.warning(f"Couldn't get the user {username} from the database.")
         return None
 
-    ui_user.list_roles = [role.role_name for role in ui_user.roles]
-    ui_user.list_permissions = []
-    for role in ui_user.list_roles:
-        ui_user.list_permissions.extend(DB.get_ui_role_permissions(role))
-    ui_user.list_permissions = set(ui_user.list_permissions)
-
     if ui_user.totp_secret:
-        ui_user.list_recovery_codes = [recovery_code.code for recovery_code in ui_user.recovery_codes]
-
         if (
             "totp-disable" not in request.path
             and "totp-refresh" not in request.path
@@ -1080,10 +1078,17 @@ def mark_user_access(user, session_id):
     if user and "write" not in user.list_permissions or DB.readonly:
         return
 
-    ret = DB.mark_ui_user_access(session_id, datetime.now().astimezone())
+    if _user_access_buffer.mark(session_id, datetime.now().astimezone()):
+        _user_access_executor.submit(flush_user_accesses)
+
+
+def flush_user_accesses():
+    count = len(_user_access_buffer)
+    ret = _user_access_buffer.flush()
     if ret:
-        LOGGER.error(f"Couldn't mark the user access: {ret}")
-    LOGGER.debug(f"Marked the user access for session {session_id}")
+        LOGGER.error(f"Couldn't mark the users access: {ret}")
+    elif count:
+        LOGGER.debug(f"Marked the users access for {count} session(s)")
 
 
 @app.after_request
@@ -1146,7 +1151,7 @@ def teardown_request(teardown):
         and current_user.is_authenticated
         and "session_id" in session
     ):
-        _user_access_executor.submit(mark_user_access, current_user, session["session_id"])
+        mark_user_access(current_user, session["session_id"])
 
     for hook in app.config["TEARDOWN_REQUEST_HOOKS"]:
         try:
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+# Measure the HTTP requests and the time needed to ban 10,000 IP addresses on 4 stub instances (local HTTP servers answering like the instances
+# API with 2 ms of latency per request), with the former fan-out (one /ban request per IP and per instance, sent by IP) and with the bulk
+# endpoint (one /bans/bulk request per instance). The former fan-out is timed on a sample of the IPs and extrapolated to all of them.
+# It also checks the per-item results and the fallback to /ban and /unban for instances that don't have the bulk endpoint.
+# The test needs requests. Run it from the repository or where BunkerWeb is installed : python3 test_bulk_bans.py (or with pytest)
+
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from os import sep
+from os.path import join
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from threading import Lock, Thread
+from time import perf_counter, sleep
+
+for common_path in (Path(__file__).parents[2].joinpath("src", "common"), Path("/usr/share/bunkerweb")):
+    if common_path.joinpath("utils", "ApiCaller.py").is_file():
+        for deps_path in (common_path.joinpath("utils"), common_path.joinpath("api")):
+            if deps_path.as_posix() not in sys_path:
+                sys_path.append(deps_path.as_posix())
+        break
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("api",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+BANS = 10000
+LEGACY_SAMPLE = 250
+INSTANCES = 4
+LATENCY = 0.002
+
+
+class StubInstance(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bulk: bool = True):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.bulk = bulk
+        self.lock = Lock()
+        self.requests = Counter()
+        self.bans = {}
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def ban(self, item: dict) -> dict:
+        if not item.get("ip"):
+            return {"status": "error", "msg": "missing ip"}
+        with self.lock:
+            self.bans[(item["ip"], item.get("service") if item.get("ban_scope") == "service" else None)] = item
+        return {"status": "success", "msg": f"ip {item['ip']} banned"}
+
+    def unban(self, item: dict) -> dict:
+        with self.lock:
+            for key in [key for key in self.bans if key[0] == item["ip"] and (item.get("ban_scope") != "service" or key[1] == item.get("service"))]:
+                del self.bans[key]
+        return {"status": "success", "msg": f"ip {item['ip']} unbanned"}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubInstance
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        data = loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+        sleep(LATENCY)
+
+        if self.path == "/ban":
+            result = self.server.ban(data)
+            status, body = (200 if result["status"] == "success" else 500), result
+        elif self.path == "/unban":
+            status, body = 200, self.server.unban(data)
+        elif self.path == "/bans/bulk" and self.server.bulk:
+            results = {"bans": [self.server.ban(item) for item in data.get("bans", [])], "unbans": [self.server.unban(item) for item in data.get("unbans", [])]}
+            all_ok = all(result["status"] == "success" for action_results in results.values() for result in action_results)
+            # ? Like cjson, empty arrays are sent as empty objects
+            status, body = 200, {"status": "success" if all_ok else "error", "msg": {key: value or {} for key, value in results.items()}}
+        else:
+            status, body = 404, {"status": "error", "msg": "not found"}
+
+        payload = dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@contextmanager
+def stub_instances(count: int, bulk: bool = True):
+    servers = [StubInstance(bulk) for _ in range(count)]
+    threads = [Thread(target=server.serve_forever, daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def make_caller(servers):
+    from API import API  # type: ignore
+    from ApiCaller import ApiCaller  # type: ignore
+
+    return ApiCaller([API(server.endpoint, token="") for server in servers])
+
+
+def make_bans(count: int):
+    return [{"ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "exp": 3600, "reason": "test", "ban_scope": "global"} for i in range(count)]
+
+
+def check_dependencies() -> bool:
+    try:
+        import requests  # noqa: F401
+    except ImportError as e:
+        print(f"requests isn't installed ({e}), skipping the test")
+        return False
+    return True
+
+
+def test_per_item_results():
+    if not check_dependencies():
+        return
+
+    with stub_instances(2) as servers:
+        caller = make_caller(servers)
+        ok, responses = caller.send_bans(bans=[{"ip": "1.2.3.4", "ban_scope": "global"}, {"ip": "", "ban_scope": "global"}])
+        assert not ok and len(responses) == 1 and "127.0.0.1" in responses, "The results are keyed by the hostname of the instances"
+        assert [result["status"] for result in responses["127.0.0.1"]["bans"]] == ["success", "error"]
+        assert responses["127.0.0.1"]["unbans"] == []
+
+        ok, responses = caller.send_bans(unbans=[{"ip": "1.2.3.4", "ban_scope": "global"}])
+        assert ok and responses["127.0.0.1"]["unbans"][0]["status"] == "success" and responses["127.0.0.1"]["bans"] == []
+        assert all(not server.bans for server in servers) and all(server.requests["/bans/bulk"] == 2 for server in servers)
+
+    # Instances without the bulk endpoint get the items one by one
+    with stub_instances(1, bulk=False) as servers:
+        caller = make_caller(servers)
+        ok, responses = caller.send_bans(bans=make_bans(3), unbans=[{"ip": "10.0.0.1"}])
+        assert ok and [result["status"] for result in responses["127.0.0.1"]["bans"]] == ["success"] * 3
+        assert servers[0].requests == Counter({"/bans/bulk": 1, "/ban": 3, "/unban": 1}) and len(servers[0].bans) == 2
+
+    # Unreachable instances fail every item
+    with stub_instances(1) as servers:
+        caller = make_caller(servers)
+    ok, responses = caller.send_bans(bans=make_bans(2))
+    assert not ok and all(result["status"] == "error" for result in responses["127.0.0.1"]["bans"])
+
+
+def test_bulk_fan_out(verbose: bool = False):
+    if not check_dependencies():
+        return
+
+    bans = make_bans(BANS)
+    with stub_instances(INSTANCES) as servers:
+        caller = make_caller(servers)
+
+        start = perf_counter()
+        for ban in bans[:LEGACY_SAMPLE]:
+            ok, _ = caller.send_to_apis("POST", "/ban", data=ban)
+            assert ok
+        legacy_time = (perf_counter() - start) * BANS / LEGACY_SAMPLE
+        legacy_requests = sum(server.requests["/ban"] for server in servers) * BANS // LEGACY_SAMPLE
+
+        start = perf_counter()
+        ok, responses = caller.send_bans(bans=bans)
+        bulk_time = perf_counter() - start
+        bulk_requests = sum(server.requests["/bans/bulk"] for server in servers)
+
+        assert ok and all(len(server.bans) == BANS for server in servers)
+        assert all(result["status"] == "success" for result in responses["127.0.0.1"]["bans"]) and len(responses["127.0.0.1"]["bans"]) == BANS
+
+    if verbose:
+        print(f"one request per ban  : {legacy_requests:6d} requests, {legacy_time:7.2f}s (extrapolated from {LEGACY_SAMPLE} bans)")
+        print(f"one bulk per instance: {bulk_requests:6d} requests, {bulk_time:7.2f}s")
+
+    assert bulk_requests == INSTANCES
+    assert bulk_time * 5 < legacy_time, f"{bulk_time:.2f}s instead of {legacy_time:.2f}s"
+
+
+if __name__ == "__main__":
+    test_per_item_results()
+    test_bulk_fan_out(verbose=True)
+    sys_exit(0)
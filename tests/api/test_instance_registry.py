@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+# Count the database statements issued to build the API clients of the instances during 1,000 requests spread over 10 seconds, with the former
+# dependency (every instance loaded from the database by every request) and with the instance registry of the workers, which must also see
+# the instances added, updated or deleted. Then fan out requests to two local stub instances, one answering and one that never answers : the
+# connections to the first one must be reused and the second one must be skipped right away once known to be down, except for the pings.
+# The test needs the dependencies of the database (sqlalchemy, pymysql, ...) and requests.
+# Run it from the repository or where BunkerWeb is installed : python3 test_instance_registry.py (or with pytest)
+
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from logging import getLogger
+from os import sep
+from os.path import join
+from pathlib import Path
+from socket import create_server
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter
+
+for api_path in (Path(__file__).parents[2].joinpath("src", "api"), Path("/usr/share/bunkerweb/api")):
+    if api_path.joinpath("app", "instance_registry.py").is_file():
+        sys_path.insert(0, api_path.as_posix())
+        break
+
+for common_path in (Path(__file__).parents[2].joinpath("src", "common"), Path("/usr/share/bunkerweb")):
+    if common_path.joinpath("db", "Database.py").is_file():
+        for deps_path in (common_path.joinpath("db"), common_path.joinpath("utils"), common_path.joinpath("api")):
+            if deps_path.as_posix() not in sys_path:
+                sys_path.append(deps_path.as_posix())
+        break
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("api",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+REQUESTS = 1000
+REQUEST_INTERVAL = 0.01
+INSTANCES = 20
+TIMEOUT = (0.3, 0.3)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def answer(self):
+        self.server.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = dumps({"status": "success", "msg": "pong" if self.path == "/ping" else "ok"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = answer
+    do_POST = answer
+
+
+class Blackhole:
+    """Accepts the connections and never answers, like an instance that hangs."""
+
+    def __init__(self, host: str):
+        self.socket = create_server((host, 0))
+        self.port = self.socket.getsockname()[1]
+        self.accepted = []
+        Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                self.accepted.append(self.socket.accept()[0])
+            except OSError:
+                return
+
+    def close(self):
+        self.socket.close()
+        for connection in self.accepted:
+            connection.close()
+
+
+@contextmanager
+def stub_instances():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    Thread(target=server.serve_forever, daemon=True).start()
+    blackhole = Blackhole("127.0.0.2")
+    try:
+        yield server, blackhole
+    finally:
+        server.shutdown()
+        server.server_close()
+        blackhole.close()
+
+
+def setup_database(tmp_dir: str, instances):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import Session
+    from Database import Database  # type: ignore
+    from model import Base, Instances, Metadata  # type: ignore
+
+    uri = f"sqlite:///{tmp_dir}/db.sqlite3"
+    engine = create_engine(uri)
+    Base.metadata.create_all(engine)
+    now = datetime.now().astimezone()
+    with Session(engine) as session:
+        session.add(Metadata(id=1, is_initialized=True, first_config_saved=True))
+        for hostname, port in instances:
+            session.add(Instances(hostname=hostname, name=hostname, port=port, server_name="bwapi", method="api", creation_date=now, last_seen=now))
+        session.commit()
+    engine.dispose()
+
+    db = Database(getLogger("API"), uri, log=False)
+    statements = []
+    event.listen(db.sql_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return db, statements
+
+
+def legacy_apis(db):
+    """The former get_instances_api_caller : every instance is loaded from the database by every request."""
+    from API import API  # type: ignore
+
+    return [API.from_instance(instance) for instance in db.get_instances()]
+
+
+def check_dependencies() -> bool:
+    try:
+        import requests  # noqa: F401
+        import sqlalchemy  # noqa: F401
+    except ImportError as e:
+        print(f"The dependencies of the API aren't installed ({e}), skipping the test")
+        return False
+    return True
+
+
+def test_registry_queries(verbose: bool = False):
+    if not check_dependencies():
+        return
+
+    from app.instance_registry import InstanceRegistry  # type: ignore
+
+    with TemporaryDirectory(prefix="bw-api-test-") as tmp_dir:
+        db, statements = setup_database(tmp_dir, [(f"10.0.0.{i}", 5000) for i in range(INSTANCES)])
+        clock = Clock()
+        registry = InstanceRegistry(lambda: db, clock=clock)
+
+        statements.clear()
+        for _ in range(REQUESTS):
+            assert len(legacy_apis(db)) == INSTANCES
+        legacy = len(statements)
+
+        statements.clear()
+        for i in range(REQUESTS):
+            clock.now = i * REQUEST_INTERVAL
+            assert len(registry.get_apis()) == INSTANCES
+        cached = len(statements)
+        assert registry.get_apis()[0] is registry.get_apis()[0], "The API clients must be reused"
+
+        # Changes made by another worker are seen once the version is checked again
+        first = registry.get_api("10.0.0.1")
+        assert not db.add_instance("10.0.1.1", 5000, "bwapi", "api")
+        assert len(registry.get_apis()) == INSTANCES
+        clock.now += 1
+        assert len(registry.get_apis()) == INSTANCES + 1
+
+        # Changes made by the worker itself are seen right away once it invalidated the registry, unknown instances are looked up again
+        assert not db.update_instance_fields("10.0.1.1", port=6000)
+        registry.invalidate()
+        assert registry.get_api("10.0.1.1").endpoint == "http://10.0.1.1:6000/"
+        assert registry.get_api("10.0.0.1") is first, "The clients of the unchanged instances must be kept"
+        assert not db.add_instance("10.0.1.2", 5000, "bwapi", "api")
+        assert registry.get_api("10.0.1.2") is not None and registry.get_api("10.0.2.1") is None
+        assert not db.delete_instances(["10.0.1.1", "10.0.1.2"])
+        registry.invalidate()
+        assert registry.get_api("10.0.1.1") is None and len(registry.get_apis()) == INSTANCES
+        db.sql_engine.dispose()
+
+    if verbose:
+        print(f"former dependency : {legacy:5d} statements for {REQUESTS} requests")
+        print(f"instance registry : {cached:5d} statements for {REQUESTS} requests")
+
+    assert cached * 50 < legacy, f"{cached} statements instead of {legacy}"
+
+
+def test_registry_health(verbose: bool = False):
+    if not check_dependencies():
+        return
+
+    from ApiCaller import ApiCaller  # type: ignore
+    from app.instance_registry import HEALTH_MAX_FAILURES, HEALTH_RETRY_INTERVAL, InstanceRegistry  # type: ignore
+
+    with TemporaryDirectory(prefix="bw-api-test-") as tmp_dir, stub_instances() as (server, blackhole):
+        db, _ = setup_database(tmp_dir, [("127.0.0.1", server.server_address[1]), ("127.0.0.2", blackhole.port)])
+        clock = Clock()
+        registry = InstanceRegistry(lambda: db, clock=clock)
+        up, down = registry.get_api("127.0.0.1"), registry.get_api("127.0.0.2")
+
+        timings = []
+        for _ in range(HEALTH_MAX_FAILURES + 2):
+            start = perf_counter()
+            ok, responses = ApiCaller(registry.get_apis()).send_to_apis("POST", "/reload", timeout=TIMEOUT, response=True)
+            timings.append(perf_counter() - start)
+            assert not ok and responses["127.0.0.1"]["msg"] == "ok"
+
+        assert down.health.is_down() and not up.health.is_down() and up.health.latency is not None
+        assert len(blackhole.accepted) == HEALTH_MAX_FAILURES, "A known down instance must not be contacted"
+        assert min(timings[:HEALTH_MAX_FAILURES]) >= TIMEOUT[1] and max(timings[HEALTH_MAX_FAILURES:]) < TIMEOUT[1] / 2
+        assert len(server.connections) == 1, "The connections to the instances must be reused"
+
+        # Pings always go through, and the instance is tried again after the retry interval
+        ApiCaller(registry.get_apis()).send_to_apis("GET", "/ping", timeout=TIMEOUT)
+        assert len(blackhole.accepted) == HEALTH_MAX_FAILURES + 1 and up.health.last_ping is not None
+        clock.now += HEALTH_RETRY_INTERVAL
+        ApiCaller(registry.get_apis()).send_to_apis("POST", "/reload", timeout=TIMEOUT)
+        assert len(blackhole.accepted) == HEALTH_MAX_FAILURES + 2
+        db.sql_engine.dispose()
+
+    if verbose:
+        print(f"fan-out with a hanging instance : {' / '.join(f'{timing:.3f}s' for timing in timings)}")
+
+
+if __name__ == "__main__":
+    test_registry_queries(verbose=True)
+    test_registry_health(verbose=True)
+    sys_exit(0)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+# Count the statements run by the lookups the API routers use to validate their inputs, on a SQLite database with 1,000 services, 2,000 custom
+# configs (16 KiB each) and 100 instances : checking a service, the methods of the custom configs to delete and the methods of the instances to
+# delete must each be a single statement that never reads the custom configs data, where the former paths materialized the whole configuration.
+# The deletion of API-managed custom configs must only remove the selected ones, the configs managed by another method are reported as skipped and the
+# missing ones are ignored.
+# The test needs the dependencies of the database (sqlalchemy, pymysql, ...).
+# Run it from the repository or where BunkerWeb is installed : python3 test_lookups.py (or with pytest)
+
+from datetime import datetime
+from json import loads
+from logging import getLogger
+from os import sep
+from os.path import join
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for db_path in (Path(__file__).parents[2].joinpath("src", "common"), Path("/usr/share/bunkerweb")):
+    if db_path.joinpath("db", "Database.py").is_file():
+        for deps_path in (db_path.joinpath("db"), db_path.joinpath("utils")):
+            if deps_path.as_posix() not in sys_path:
+                sys_path.append(deps_path.as_posix())
+        break
+
+for api_path in (Path(__file__).parents[2].joinpath("src", "api"), Path("/usr/share/bunkerweb/api")):
+    if api_path.joinpath("app", "routers", "configs.py").is_file():
+        sys_path.insert(0, api_path.as_posix())
+        break
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+SERVICES = 1000
+INSTANCES = 100
+CONFIG_SIZE = 16 * 1024
+
+
+def setup_database(tmp_dir: str):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import Session
+    from Database import Database  # type: ignore
+    from model import Base, Custom_configs, Instances, Metadata, Services  # type: ignore
+
+    uri = f"sqlite:///{tmp_dir}/db.sqlite3"
+    engine = create_engine(uri)
+    Base.metadata.create_all(engine)
+    now = datetime.now().astimezone()
+    with Session(engine) as session:
+        session.add(Metadata(id=1, is_initialized=True, first_config_saved=True))
+        for i in range(SERVICES):
+            service_id = f"app{i}.example.com"
+            session.add(Services(id=service_id, method="api" if i % 2 else "ui", is_draft=i % 10 == 0, creation_date=now, last_update=now))
+            for j, method in enumerate(("api", "ui")):
+                session.add(
+                    Custom_configs(
+                        service_id=service_id,
+                        type="server_http",
+                        name=f"snippet_{j}",
+                        data=b"#" * CONFIG_SIZE,
+                        checksum=f"{i}-{j}",
+                        method=method,
+                        is_draft=i % 3 == 0,
+                    )
+                )
+        for i in range(INSTANCES):
+            session.add(
+                Instances(
+                    hostname=f"bw-{i}", name=f"bw-{i}", port=5000, server_name=f"bw-{i}", method="api" if i % 2 else "manual", creation_date=now, last_seen=now
+                )
+            )
+        session.commit()
+    engine.dispose()
+
+    db = Database(getLogger("API"), uri, log=False)
+    statements = []
+    event.listen(db.sql_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return db, statements
+
+
+def count(statements: list, callback) -> tuple:
+    statements.clear()
+    result = callback()
+    return result, list(statements)
+
+
+def test_lookups(verbose: bool = False):
+    try:
+        import pymysql  # noqa: F401
+        import sqlalchemy  # noqa: F401
+    except ImportError as e:
+        print(f"The dependencies of the database aren't installed ({e}), skipping the test")
+        return
+
+    with TemporaryDirectory(prefix="bw-api-test-") as tmp_dir:
+        db, statements = setup_database(tmp_dir)
+
+        exists, executed = count(statements, lambda: db.service_exists("app999.example.com"))
+        assert exists and len(executed) == 1, executed
+        assert not db.service_exists("unknown.example.com") and db.service_exists("app0.example.com")
+        assert not db.service_exists("app0.example.com", with_drafts=False)
+        _, legacy_service = count(statements, lambda: db.get_config(global_only=True, methods=False, with_drafts=True))
+
+        keys = [(f"app{i}.example.com", "server-http", f"snippet_{i % 2}") for i in range(0, 200, 7)] + [(None, "http", "missing")]
+        methods, executed = count(statements, lambda: db.get_custom_configs_methods(keys))
+        assert len(executed) == 1 and "data" not in executed[0].split("FROM")[0], executed
+        assert len(methods) == len(keys) - 1 and all(method == ("api" if key[2] == "snippet_0" else "ui") for key, method in methods.items())
+        _, legacy_configs = count(statements, lambda: db.get_custom_configs(with_drafts=True, with_data=True))
+
+        instances, executed = count(statements, lambda: db.get_instances_methods(["bw-1", "bw-2", "bw-1000"]))
+        assert instances == {"bw-1": "api", "bw-2": "manual"} and len(executed) == 1
+
+        # Delete some API-managed configs, the others keep their data and draft state
+        removed = [[service_id, config_type, name] for (service_id, config_type, name), method in methods.items() if method == "api"]
+        assert not db.save_custom_configs_changes([], removed, "api")
+        remaining = db.get_custom_configs(with_drafts=True, with_data=False)
+        assert len(remaining) == 2 * SERVICES - len(removed)
+        assert sum(config["is_draft"] for config in remaining) == sum(2 for i in range(SERVICES) if i % 3 == 0) - sum(
+            1 for service_id, _, _ in removed if int(service_id[3:].split(".")[0]) % 3 == 0
+        )
+        db.sql_engine.dispose()
+
+    if verbose:
+        print(f"service check        : 1 statement (former path : {len(legacy_service)} statements over the whole configuration)")
+        print(f"custom configs check : 1 statement (former path : {len(legacy_configs)} statements reading {2 * SERVICES * CONFIG_SIZE // 1024} KiB of data)")
+
+
+def test_delete_configs():
+    try:
+        from app.routers import configs  # type: ignore
+        from app.schemas import ConfigKey, ConfigsDeleteRequest  # type: ignore
+    except (ImportError, RuntimeError, FileNotFoundError) as e:
+        print(f"The configs router can't be loaded ({e}), skipping the test")
+        return
+
+    with TemporaryDirectory(prefix="bw-api-test-") as tmp_dir:
+        db, _ = setup_database(tmp_dir)
+        get_db = configs.get_db
+        configs.get_db = lambda: db
+        try:
+            response = configs.delete_configs(
+                ConfigsDeleteRequest(
+                    configs=[
+                        ConfigKey(service="app1.example.com", type="server-http", name="snippet_0"),
+                        ConfigKey(service="app1.example.com", type="server-http", name="snippet_1"),
+                        ConfigKey(service="app1.example.com", type="server-http", name="missing"),
+                        ConfigKey(service="global", type="http", name="missing"),
+                    ]
+                )
+            )
+            assert response.status_code == 200, response.body
+            # Only the UI-managed config is reported, the missing ones are ignored like before
+            assert loads(response.body) == {"status": "success", "skipped": ["app1.example.com/server_http/snippet_1"]}, response.body
+            methods = db.get_custom_configs_methods([("app1.example.com", "server_http", "snippet_0"), ("app1.example.com", "server_http", "snippet_1")])
+            assert methods == {("app1.example.com", "server_http", "snippet_1"): "ui"}, methods
+
+            response = configs.delete_configs(ConfigsDeleteRequest(configs=[ConfigKey(service="global", type="http", name="missing")]))
+            assert response.status_code == 200 and loads(response.body) == {"status": "success"}, response.body
+        finally:
+            configs.get_db = get_db
+            db.sql_engine.dispose()
+
+
+if __name__ == "__main__":
+    test_lookups(verbose=True)
+    test_delete_configs()
+    sys_exit(0)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# Page through 10,000 synthetic custom configs with the pagination layer of the API routers (opaque cursors, field selection and conditional
+# requests) : every config must be returned once and in order, the listing must only be computed once while the configs don't change, and a
+# request with a matching If-None-Match must get a 304 without the listing being computed, until the change timestamps move.
+# The test needs fastapi (and httpx for its test client).
+# Run it from the repository or where BunkerWeb is installed : python3 test_pagination.py (or with pytest)
+
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from typing import Annotated, Optional
+
+for api_path in (Path(__file__).parents[2].joinpath("src", "api"), Path("/usr/share/bunkerweb/api")):
+    if api_path.joinpath("app", "pagination.py").is_file():
+        sys_path.insert(0, api_path.as_posix())
+        break
+
+CONFIGS = 10_000
+PAGE_SIZE = 500
+TYPES = ("http", "server-http", "modsec", "modsec-crs")
+
+
+class FakeDatabase:
+    """The configs and the change timestamp of the metadata, counting the listings that were computed."""
+
+    def __init__(self, count: int):
+        self.configs = [
+            {
+                "service_id": None if i % 10 == 0 else f"app{i % 97}.example.com",
+                "type": TYPES[i % len(TYPES)],
+                "name": f"config_{i:05d}",
+                "data": b"# " + b"x" * 64,
+            }
+            for i in range(count)
+        ]
+        self.last_change = "2025-01-01T00:00:00+00:00"
+        self.listings = 0
+
+    def get_collection_version(self, collection: str) -> str:
+        return self.last_change
+
+    def get_custom_configs(self, *, with_data: bool = False):
+        self.listings += 1
+        return [{k: v for k, v in config.items() if with_data or k != "data"} for config in self.configs]
+
+
+def create_client(db: FakeDatabase):
+    from fastapi import FastAPI, Query, Request
+    from fastapi.testclient import TestClient
+
+    from app.pagination import PAGE_MAX_LIMIT, clear_collections, list_response  # type: ignore
+
+    clear_collections()
+    app = FastAPI()
+
+    # ? Same layout as list_configs in the configs router
+    @app.get("/configs")
+    def list_configs(
+        request: Request,
+        with_data: bool = False,
+        limit: Annotated[Optional[int], Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+    ):
+        def build():
+            out = []
+            for it in db.get_custom_configs(with_data=with_data):
+                data = {k: v for k, v in it.items() if k != "data"}
+                if with_data:
+                    data["data"] = it["data"].decode("utf-8")
+                data["service"] = data.pop("service_id", None) or "global"
+                out.append(data)
+            return out
+
+        return list_response(
+            request,
+            "configs",
+            version=db.get_collection_version("custom_configs"),
+            params=(with_data,),
+            build=build,
+            key=lambda config: (config["service"], config["type"], config["name"]),
+            render=lambda configs: {"status": "success", "configs": configs},
+            cursor=cursor,
+            limit=limit,
+            fields=fields,
+        )
+
+    return TestClient(app)
+
+
+def fetch_all(client, **params) -> tuple:
+    configs, pages, cursor = [], 0, None
+    while True:
+        response = client.get("/configs", params={"limit": PAGE_SIZE, **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages += 1
+        content = response.json()
+        configs.extend(content["configs"])
+        cursor = content["next_cursor"]
+        if not cursor:
+            return configs, pages
+
+
+def test_cursor_pagination():
+    try:
+        import fastapi  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError as e:
+        print(f"fastapi isn't installed ({e}), skipping the test")
+        return
+
+    db = FakeDatabase(CONFIGS)
+    client = create_client(db)
+
+    configs, pages = fetch_all(client, fields="service,type,name")
+    keys = [(config["service"], config["type"], config["name"]) for config in configs]
+    assert len(configs) == CONFIGS and len(set(keys)) == CONFIGS, f"{len(configs)} configs returned ({len(set(keys))} distinct)"
+    assert keys == sorted(keys), "The configs are not sorted"
+    assert pages == CONFIGS // PAGE_SIZE
+    assert set(configs[0]) == {"service", "type", "name"}, "Only the selected fields must be returned"
+    assert db.listings == 1, f"The configs were listed {db.listings} times for {pages} pages"
+
+    # The full listing is still returned without limit
+    response = client.get("/configs")
+    assert len(response.json()["configs"]) == CONFIGS and "next_cursor" not in response.json() and db.listings == 1
+
+    # Pages go on from the last key, even when configs are added before the cursor in the meantime
+    first = client.get("/configs", params={"limit": 10}).json()
+    db.configs.insert(0, {"service_id": None, "type": "http", "name": "aaa", "data": b""})
+    db.last_change = "2025-01-01T00:00:01+00:00"
+    second = client.get("/configs", params={"limit": 10, "cursor": first["next_cursor"]}).json()
+    assert second["configs"][0]["name"] not in {config["name"] for config in first["configs"]} | {"aaa"}
+
+    response = client.get("/configs", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    # Crafted cursors whose key can't be compared with the sort keys of the configs are rejected as well
+    from app.pagination import encode_cursor  # type: ignore
+
+    for key in ([1], ["global"], ["global", "http", "config_00001", "extra"], ["global", "http", None], [["global"], "http", "config_00001"]):
+        response = client.get("/configs", params={"limit": 10, "cursor": encode_cursor("configs", key)})
+        assert response.status_code == 400, f"{key}: {response.status_code} {response.text}"
+
+
+def test_conditional_requests():
+    try:
+        import fastapi  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError as e:
+        print(f"fastapi isn't installed ({e}), skipping the test")
+        return
+
+    db = FakeDatabase(CONFIGS)
+    client = create_client(db)
+
+    response = client.get("/configs", params={"with_data": True})
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and etag and db.listings == 1
+
+    for _ in range(100):
+        response = client.get("/configs", params={"with_data": True}, headers={"If-None-Match": etag})
+        assert response.status_code == 304 and not response.content and response.headers["ETag"] == etag
+    assert db.listings == 1, "A 304 must not compute the configs"
+
+    # Another representation has another ETag
+    response = client.get("/configs", params={"limit": 100}, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+    # Once the configs changed, the former ETag doesn't match anymore
+    db.configs.pop()
+    db.last_change = "2025-01-02T00:00:00+00:00"
+    response = client.get("/configs", params={"with_data": True}, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag and len(response.json()["configs"]) == CONFIGS - 1
+
+
+if __name__ == "__main__":
+    test_cursor_pagination()
+    test_conditional_requests()
+    sys_exit(0)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# Match 20,000 requests against 200 rate limit rules (exact paths, wildcards and regexes, some with capture groups or inline flags) with the
+# former linear scan of the rules and with the compiled matcher : both must return the same rule for every request and the per-request overhead
+# of the matcher is measured. Then check the hybrid limiter : local token buckets on a fake clock, and two worker processes sharing a counter
+# storage that both try 1,000 requests per second against a 50 per second limit for 2 seconds, the requests they accept together must stay
+# close to what a single bucket would accept.
+# The test needs regex. Run it from the repository or where BunkerWeb is installed : python3 test_rate_limit.py (or with pytest)
+
+from multiprocessing import get_context
+from pathlib import Path
+from random import Random
+from sys import exit as sys_exit, path as sys_path
+from time import perf_counter, sleep, time
+
+for api_path in (Path(__file__).parents[2].joinpath("src", "api"), Path("/usr/share/bunkerweb/api")):
+    if api_path.joinpath("app", "rate_limit_engine.py").is_file():
+        sys_path.insert(0, api_path.as_posix())
+        break
+
+RULES = 200
+REQUESTS = 20000
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+RESOURCES = ("instances", "services", "configs", "plugins", "cache", "bans", "jobs", "global_config", "users", "roles")
+ROOT_PATH = "/api"
+
+LIMIT = (50, 1)
+WORKER_DURATION = 2.0
+WORKER_INTERVAL = 0.001
+
+
+class Rule:
+    """The methods and pattern of a rule, compiled like the rules of the API (exact paths, * wildcards and re: prefixed regexes)."""
+
+    __slots__ = ("methods", "pattern", "index")
+
+    def __init__(self, methods, path: str, index: int):
+        from regex import compile as regex_compile, escape
+
+        self.methods = set(methods)
+        if path.startswith("re:"):
+            self.pattern = regex_compile(path[3:])
+        elif "*" in path:
+            self.pattern = regex_compile("^" + escape(path).replace("\\*", ".*") + "$")
+        else:
+            self.pattern = regex_compile("^" + escape(path) + "$")
+        self.index = index
+
+
+def make_rules(count: int):
+    rng = Random(42)
+    rules = []
+    for i in range(count):
+        resource = f"{RESOURCES[i % len(RESOURCES)]}{i // len(RESOURCES)}"
+        methods = set(rng.sample(METHODS, rng.randint(0, 2)))
+        kind = i % 10
+        if kind < 4:
+            path = f"/{resource}"
+        elif kind < 7:
+            path = f"/{resource}/*"
+        elif kind == 7:
+            path = f"/{resource}/*/items*"
+        elif kind == 8:
+            path = f"re:^/{resource}/(\\d+)$" if i % 20 == 8 else f"re:^/{resource}/[a-z]+/[0-9]+$"
+        else:
+            path = f"re:(?i)^/{resource.upper()}/export$" if i % 20 == 9 else f"re:/(?:{resource}|any{i})/stats"
+        rules.append(Rule(methods, path, i))
+    rules.append(Rule({"*"}, "/*", count))
+    return rules
+
+
+def make_requests(count: int):
+    rng = Random(7)
+    requests = []
+    for _ in range(count):
+        resource = f"{rng.choice(RESOURCES)}{rng.randint(0, RULES // len(RESOURCES) + 2)}"
+        path = rng.choice((f"/{resource}", f"/{resource}/{rng.randint(0, 99)}", f"/{resource}/abc/12", f"/{resource}/x/items/1", f"/{resource}/stats"))
+        if rng.random() < 0.1:
+            path = f"/{resource.upper()}/export"
+        requests.append((rng.choice(METHODS), ROOT_PATH + path if rng.random() < 0.5 else path))
+    return requests
+
+
+def path_variants(path: str):
+    return [path, path[len(ROOT_PATH) :]] if path.startswith(ROOT_PATH + "/") else [path]  # noqa: E203
+
+
+def legacy_match(rules, method: str, path: str):
+    """The former _match_rule : every rule is tested in order on every path variant."""
+    paths = path_variants(path)
+    for rule in rules:
+        if rule.methods and method not in rule.methods and "*" not in rule.methods:
+            continue
+        for p in paths:
+            if rule.pattern.match(p):
+                return rule
+    return None
+
+
+def check_dependencies() -> bool:
+    try:
+        import regex  # noqa: F401
+    except ImportError as e:
+        print(f"regex isn't installed ({e}), skipping the test")
+        return False
+    return True
+
+
+def test_matcher(verbose: bool = False):
+    if not check_dependencies():
+        return
+
+    from app.rate_limit_engine import RuleMatcher  # type: ignore
+
+    rules = make_rules(RULES)
+    requests = make_requests(REQUESTS)
+    matcher = RuleMatcher(rules)
+
+    expected = [legacy_match(rules, method, path) for method, path in requests]
+    assert [matcher.match(method, path_variants(path)) for method, path in requests] == expected
+    assert len({rule.index for rule in expected if rule}) > RULES // 2, "The requests must exercise most of the rules"
+
+    # Only the first matching rule counts, even when a later one is more specific
+    first = Rule(set(), "/services/*", 0)
+    assert RuleMatcher([first, Rule(set(), "/services/app", 1)]).match("GET", ["/services/app"]) is first
+    assert RuleMatcher([Rule({"POST"}, "/auth", 0)]).match("GET", ["/auth"]) is None
+
+    start = perf_counter()
+    for method, path in requests:
+        legacy_match(rules, method, path)
+    legacy_time = (perf_counter() - start) / REQUESTS
+
+    start = perf_counter()
+    for method, path in requests:
+        matcher.match(method, path_variants(path))
+    compiled_time = (perf_counter() - start) / REQUESTS
+
+    if verbose:
+        print(f"linear scan of {RULES} rules : {legacy_time * 1e6:7.2f} µs per request")
+        print(f"compiled matcher           : {compiled_time * 1e6:7.2f} µs per request")
+
+    assert compiled_time * 3 < legacy_time, f"{compiled_time * 1e6:.2f} µs instead of {legacy_time * 1e6:.2f} µs per request"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.counters = {}
+        self.calls = 0
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        self.calls += 1
+        self.counters[key] = self.counters.get(key, 0) + amount
+        return self.counters[key]
+
+
+class SharedStorage:
+    """Counters shared by processes, like the Redis storage of the workers."""
+
+    def __init__(self, manager):
+        self.counters = manager.dict()
+        self.lock = manager.Lock()
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        with self.lock:
+            value = self.counters.get(key, 0) + amount
+            self.counters[key] = value
+        return value
+
+
+def test_hybrid_buckets():
+    if not check_dependencies():
+        return
+
+    from app.rate_limit_engine import HybridLimiter  # type: ignore
+
+    clock = Clock()
+    storage = MemoryStorage()
+    limiter = HybridLimiter(storage, sync_interval=1, clock=clock)
+
+    # A full burst is accepted with a few reconciliations only, then the bucket refills at 10 tokens per second
+    assert all(limiter.hit(100, 10, "a")[0] for _ in range(100))
+    assert storage.calls < 10 and sum(storage.counters.values()) == 100 - 1
+    allowed, retry_after = limiter.hit(100, 10, "a")
+    assert not allowed and 0 < retry_after <= 0.1
+    clock.now += 0.5
+    assert sum(limiter.hit(100, 10, "a")[0] for _ in range(10)) == 5
+    assert limiter.hit(100, 10, "b")[0], "Each key has its own bucket"
+
+    # The hits accepted by another worker are taken from the tokens
+    other = HybridLimiter(storage, sync_interval=1, clock=clock)
+    clock.now += 10
+    assert sum(other.hit(10, 60, "c")[0] for _ in range(20)) == 10
+    clock.now += 1
+    assert not other.hit(10, 60, "c")[0]
+    assert sum(limiter.hit(10, 60, "c")[0] for _ in range(20)) == 0
+
+    # Without the storage, the limits are enforced locally
+    class BrokenStorage:
+        def incr(self, *args, **kwargs):
+            raise ConnectionError("storage unavailable")
+
+    local = HybridLimiter(BrokenStorage(), clock=clock)
+    assert sum(local.hit(10, 60, "d")[0] for _ in range(20)) == 10
+
+    bounded = HybridLimiter(storage, max_buckets=2, clock=clock)
+    for key in ("e", "f", "g"):
+        bounded.hit(10, 60, key)
+    assert len(bounded) == 2
+
+
+def run_worker(storage, start: float, results):
+    from app.rate_limit_engine import HybridLimiter  # type: ignore
+
+    limiter = HybridLimiter(storage, sync_interval=0.05)
+    while time() < start:
+        sleep(0.001)
+    accepted = 0
+    while time() < start + WORKER_DURATION:
+        accepted += limiter.hit(*LIMIT, "client")[0]
+        sleep(WORKER_INTERVAL)
+    results.put(accepted)
+
+
+def test_hybrid_workers(verbose: bool = False):
+    if not check_dependencies():
+        return
+
+    context = get_context("fork")
+    with context.Manager() as manager:
+        storage = SharedStorage(manager)
+        results = context.Queue()
+        start = time() + 0.5
+        workers = [context.Process(target=run_worker, args=(storage, start, results)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        accepted = [results.get(timeout=30) for _ in workers]
+        for worker in workers:
+            worker.join()
+
+    # A single bucket accepts its burst then refills at its rate
+    expected = LIMIT[0] + LIMIT[0] / LIMIT[1] * WORKER_DURATION
+    if verbose:
+        print(f"two workers accepted {sum(accepted)} requests ({' + '.join(map(str, accepted))}), a single bucket would accept {expected:.0f}")
+
+    assert all(accepted), "Both workers must get their share of the limit"
+    assert expected * 0.9 <= sum(accepted) <= expected * 1.15, f"{sum(accepted)} requests accepted instead of {expected:.0f}"
+
+
+if __name__ == "__main__":
+    test_matcher(verbose=True)
+    test_hybrid_buckets()
+    test_hybrid_workers(verbose=True)
+    sys_exit(0)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Hammer a destination directory with "reloads" (full reads of the tree, like nginx -t does with its includes) while archives are uploaded
+# and swapped in by the swap-archive.sh helper of the API, then check that no reload ever saw a missing file. The same load is run against
+# the former rm -rf + tar xzf extraction to show what the harness catches. The rollback of the last swap is checked as well.
+# Run it from the repository or where BunkerWeb is installed : python3 test_swap_archive.py (or with pytest)
+
+from io import BytesIO
+from os import walk
+from pathlib import Path
+from shutil import copyfile
+from subprocess import run
+from sys import exit as sys_exit
+from tarfile import TarInfo, open as tar_open
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+
+SWAP_ARCHIVE = next(
+    (
+        path
+        for path in (Path(__file__).parents[2].joinpath("src", "common", "helpers", "swap-archive.sh"), Path("/usr/share/bunkerweb/helpers/swap-archive.sh"))
+        if path.is_file()
+    ),
+    None,
+)
+
+GENERATIONS = 30
+FILES = [
+    "nginx.conf",
+    "variables.env",
+    "http-server-blocks.conf",
+    "www.example.com/server-http/modsecurity.conf",
+    "www.example.com/server-http/reverse-proxy.conf",
+    "app.example.com/server-http/reverse-proxy.conf",
+] + [f"default-server-http/block-{i}.conf" for i in range(50)]
+
+
+def build_archive(path: Path, generation: int, extra: str = ""):
+    with tar_open(path, "w:gz") as tar:
+        for name in FILES + ([extra] if extra else []):
+            data = f"# generation {generation}\n".encode() * 64
+            info = TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+
+
+def missing_files(destination: Path) -> list:
+    """Read the whole tree like a reload would and return the expected files it couldn't find."""
+    seen = set()
+    for root, dirs, files in walk(destination):
+        dirs[:] = [directory for directory in dirs if not directory.startswith(".bw-")]
+        for file in files:
+            path = Path(root, file)
+            try:
+                path.read_bytes()
+            except FileNotFoundError:
+                continue
+            seen.add(path.relative_to(destination).as_posix())
+    return [file for file in FILES if file not in seen]
+
+
+def swap_archive(archive: Path, destination: Path):
+    assert run(["bash", SWAP_ARCHIVE.as_posix(), archive.as_posix(), destination.as_posix()], check=False).returncode == 0
+
+
+def legacy_extract(archive: Path, destination: Path):
+    assert run(f"rm -rf {destination}/* && tar xzf {archive} -C {destination} && rm -f {archive}", shell=True, check=False).returncode == 0
+
+
+def hammer(extract, tmp_dir: Path, name: str) -> tuple:
+    destination = tmp_dir.joinpath(name)
+    destination.mkdir()
+    archives = []
+    for generation in range(GENERATIONS):
+        archive = tmp_dir.joinpath(f"{name}-{generation}.tar.gz")
+        build_archive(archive, generation)
+        archives.append(archive)
+    extract(copy_archive(archives[0]), destination)
+
+    stop = Event()
+    reloads, partial = [0], [0]
+
+    def reload_loop():
+        while not stop.is_set():
+            reloads[0] += 1
+            if missing_files(destination):
+                partial[0] += 1
+
+    reader = Thread(target=reload_loop)
+    reader.start()
+    try:
+        for archive in archives[1:]:
+            extract(copy_archive(archive), destination)
+    finally:
+        stop.set()
+        reader.join()
+    return reloads[0], partial[0]
+
+
+def copy_archive(archive: Path) -> Path:
+    # ? Both extraction methods delete the archive once extracted
+    upload = archive.with_suffix(".upload")
+    copyfile(archive, upload)
+    return upload
+
+
+def test_swap_never_exposes_partial_directory():
+    assert SWAP_ARCHIVE, "swap-archive.sh not found"
+    with TemporaryDirectory(prefix="bw-swap-archive-") as tmp_dir:
+        reloads, partial = hammer(swap_archive, Path(tmp_dir), "staged")
+        legacy_reloads, legacy_partial = hammer(legacy_extract, Path(tmp_dir), "legacy")
+        print(f"staged swap     : {reloads:6d} reloads, {partial:6d} saw a partial directory")
+        print(f"rm -rf + tar xzf: {legacy_reloads:6d} reloads, {legacy_partial:6d} saw a partial directory")
+        assert reloads and not partial
+
+
+def test_swap_rollback():
+    assert SWAP_ARCHIVE, "swap-archive.sh not found"
+    with TemporaryDirectory(prefix="bw-swap-archive-") as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        destination = tmp_path.joinpath("destination")
+        first, second = tmp_path.joinpath("first.tar.gz"), tmp_path.joinpath("second.tar.gz")
+        build_archive(first, 1, extra="removed.conf")
+        build_archive(second, 2, extra="www.example.com/server-http/added.conf")
+
+        swap_archive(first, destination)
+        swap_archive(second, destination)
+        assert not first.exists() and not second.exists()
+        assert destination.joinpath("nginx.conf").read_text().startswith("# generation 2")
+        assert destination.joinpath("www.example.com", "server-http", "added.conf").is_file()
+        assert not destination.joinpath("removed.conf").exists()
+        assert not destination.joinpath(".bw-staging").exists()
+
+        assert run(["bash", SWAP_ARCHIVE.as_posix(), "--rollback", destination.as_posix()], check=False).returncode == 0
+        assert destination.joinpath("nginx.conf").read_text().startswith("# generation 1")
+        assert destination.joinpath("removed.conf").is_file()
+        assert not destination.joinpath("www.example.com", "server-http", "added.conf").exists()
+        assert not missing_files(destination)
+
+
+if __name__ == "__main__":
+    test_swap_never_exposes_partial_directory()
+    test_swap_rollback()
+    print("Archives are swapped atomically")
+    sys_exit(0)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Measure the wall time and the peak RSS of the backup plugin when backing up and restoring a synthetic SQLite database.
+# Run it where the backup plugin is installed (e.g. in the scheduler container) : python3 benchmark.py --size 512
+
+from argparse import ArgumentParser
+from datetime import datetime
+from os import urandom, wait4
+from os.path import join, sep
+from pathlib import Path
+from subprocess import Popen
+from sys import executable, exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+deps_path = join(sep, "usr", "share", "bunkerweb", "core", "backup")
+if deps_path not in sys_path:
+    sys_path.append(deps_path)
+
+BLOB_SIZE = 1024 * 1024
+
+
+def populate(db_path: Path, size: int):
+    """Create the BunkerWeb tables and fill the jobs cache with incompressible blobs until the database reaches the given size in MiB."""
+    from sqlalchemy import create_engine, insert
+
+    from model import Base, Jobs, Jobs_cache, Metadata, Plugins  # type: ignore
+
+    engine = create_engine(f"sqlite:///{db_path.as_posix()}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Metadata).values(id=1, is_initialized=True, first_config_saved=True))
+        conn.execute(insert(Plugins).values(id="benchmark", name="Benchmark", description="Benchmark", version="0.1", stream="no"))
+        conn.execute(insert(Jobs).values(name="benchmark", plugin_id="benchmark", file_name="benchmark.py", every="day", reload=False))
+        for i in range(size):
+            conn.execute(insert(Jobs_cache).values(job_name="benchmark", file_name=f"blob-{i}.bin", data=urandom(BLOB_SIZE), checksum=str(i)))
+    engine.dispose()
+
+
+def run(action: str, db_path: Path, backup_dir: Path):
+    from backup import LOGGER, backup_database, restore_database  # type: ignore
+    from Database import Database  # type: ignore
+
+    db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{db_path.as_posix()}")
+    if action == "backup":
+        backup_database(datetime.now().astimezone(), db, backup_dir)
+    else:
+        restore_database(sorted(backup_dir.glob("backup-*.zip"))[-1], db)
+
+
+def measure(action: str, db_path: Path, backup_dir: Path) -> bool:
+    start = perf_counter()
+    proc = Popen([executable, __file__, "--run", action, "--database", db_path.as_posix(), "--directory", backup_dir.as_posix()])
+    _, wait_status, rusage = wait4(proc.pid, 0)
+    elapsed = perf_counter() - start
+    # ? ru_maxrss is in KiB on Linux
+    print(f"{action:<8} wall time: {elapsed:8.2f}s  peak RSS: {rusage.ru_maxrss / 1024:8.1f} MiB  exit status: {wait_status >> 8}")
+    return wait_status == 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the backup plugin on a synthetic SQLite database")
+    parser.add_argument("--size", type=int, default=512, help="size of the synthetic database in MiB (default: 512)")
+    parser.add_argument("--run", choices=("backup", "restore"), help="internal: run a single action")
+    parser.add_argument("--database", type=Path, help="internal: database path")
+    parser.add_argument("--directory", type=Path, help="internal: backup directory")
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.database, args.directory)
+        sys_exit(0)
+
+    with TemporaryDirectory(prefix="bw-backup-benchmark-") as tmp_dir:
+        db_path = Path(tmp_dir, "db.sqlite3")
+        backup_dir = Path(tmp_dir, "backups")
+        backup_dir.mkdir()
+
+        print(f"Creating a {args.size} MiB SQLite database in {db_path} ...")
+        populate(db_path, args.size)
+        print(f"Database size: {db_path.stat().st_size / 1024 / 1024:.1f} MiB")
+
+        ok = measure("backup", db_path, backup_dir) and measure("restore", db_path, backup_dir)
+        for backup_file in backup_dir.glob("backup-*.zip"):
+            print(f"Backup size: {backup_file.stat().st_size / 1024 / 1024:.1f} MiB ({backup_file.name})")
+
+    sys_exit(0 if ok else 1)
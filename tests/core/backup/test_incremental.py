@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# Restore a chain of incremental backups into a fresh SQLite database and compare it row by row with the source database.
+# Run it where the backup plugin is installed (e.g. in the scheduler container) : python3 test_incremental.py (or with pytest)
+
+from datetime import datetime, timedelta
+from os import urandom
+from os.path import join, sep
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+deps_path = join(sep, "usr", "share", "bunkerweb", "core", "backup")
+if deps_path not in sys_path:
+    sys_path.append(deps_path)
+
+from sqlalchemy import delete, insert, select, update  # noqa: E402
+
+import backup  # type: ignore # noqa: E402
+from backup import LOGGER, backup_database_incremental, get_backup_manifest, restore_database  # type: ignore # noqa: E402
+from Database import Database  # type: ignore # noqa: E402
+from model import Base, Custom_configs, Jobs, Jobs_cache, Jobs_runs, Jobs_runs_daily, Metadata, Plugins, Services  # type: ignore # noqa: E402
+
+CHANGE_DATES_COLUMNS = ("last_custom_configs_change", "last_external_plugins_change", "last_pro_plugins_change", "last_instances_change", "last_config_change")
+
+
+def compare_databases(source: Database, target: Database) -> list:
+    """Return the names of the tables whose rows differ between the two databases, ignoring the change dates set by a restore."""
+    differences = []
+    with source.sql_engine.connect() as source_conn, target.sql_engine.connect() as target_conn:
+        for table in Base.metadata.sorted_tables:
+            columns = [column for column in table.columns if column.name not in CHANGE_DATES_COLUMNS]
+            query = select(*columns).order_by(*table.primary_key.columns)
+            if source_conn.execute(query).all() != target_conn.execute(query).all():
+                differences.append(table.name)
+    return differences
+
+
+def test_incremental_chain_restore():
+    with TemporaryDirectory(prefix="bw-backup-incremental-") as tmp_dir:
+        backup_dir = Path(tmp_dir, "backups")
+        backup_dir.mkdir()
+        source = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'source.sqlite3').as_posix()}")
+        Base.metadata.create_all(source.sql_engine)
+        current_time = datetime.now().astimezone()
+
+        with source.sql_engine.begin() as conn:
+            conn.execute(insert(Metadata).values(id=1, is_initialized=True, first_config_saved=True))
+            conn.execute(insert(Plugins).values(id="test", name="Test", description="Test", version="0.1", stream="no"))
+            conn.execute(insert(Jobs).values(name="test-job", plugin_id="test", file_name="test.py", every="day", reload=False))
+            conn.execute(insert(Services).values(id="www.example.com", method="ui", creation_date=current_time, last_update=current_time))
+            for i in range(20):
+                conn.execute(insert(Jobs_cache).values(job_name="test-job", service_id="www.example.com", file_name=f"file-{i}", data=urandom(1024)))
+
+        _, backup_file = backup_database_incremental(current_time, source, backup_dir, full_interval=4)
+        assert get_backup_manifest(backup_file)["type"] == "full"
+
+        # Only the jobs runs and their daily summaries (which have a date column) change
+        with source.sql_engine.begin() as conn:
+            for i in range(10):
+                conn.execute(insert(Jobs_runs).values(job_name="test-job", success=True, start_date=current_time, end_date=current_time))
+            conn.execute(
+                insert(Jobs_runs_daily).values(
+                    job_name="test-job", day=current_time.date() - timedelta(days=1), runs=3, failures=1, total_duration=1.5, durations_histogram='{"80":3}'
+                )
+            )
+
+        _, backup_file = backup_database_incremental(current_time + timedelta(seconds=1), source, backup_dir, full_interval=4)
+        manifest = get_backup_manifest(backup_file)
+        assert manifest["type"] == "incremental" and set(manifest["changed"]) == {"bw_jobs_runs", "bw_jobs_runs_daily"}, manifest
+
+        # Rows are updated, deleted and added in a table other tables depend on and in one of its children
+        with source.sql_engine.begin() as conn:
+            conn.execute(update(Jobs_cache).where(Jobs_cache.file_name == "file-1").values(data=urandom(2048)))
+            conn.execute(delete(Jobs_cache).where(Jobs_cache.file_name.in_(("file-2", "file-3"))))
+            conn.execute(insert(Services).values(id="app.example.com", method="api", creation_date=current_time, last_update=current_time))
+            conn.execute(insert(Jobs_cache).values(job_name="test-job", service_id="app.example.com", file_name="file-new", data=urandom(512)))
+            conn.execute(delete(Jobs_runs).where(Jobs_runs.id <= 5))
+
+        _, backup_file = backup_database_incremental(current_time + timedelta(seconds=2), source, backup_dir, full_interval=4)
+        manifest = get_backup_manifest(backup_file)
+        assert manifest["type"] == "incremental" and set(manifest["changed"]) == {"bw_services", "bw_jobs_cache", "bw_jobs_runs"}, manifest
+
+        target = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'target.sqlite3').as_posix()}")
+        restore_database(backup_file, target)
+
+        # ? A restore flags everything as changed so that the configuration is regenerated, do the same on the source
+        assert not source.checked_changes(plugins_changes="all", value=True)
+
+        differences = compare_databases(source, target)
+        assert not differences, f"Tables differ after restoring the chain: {differences}"
+
+        # The chain is full, the next backup is a full one again
+        _, backup_file = backup_database_incremental(current_time + timedelta(seconds=3), source, backup_dir, full_interval=3)
+        assert get_backup_manifest(backup_file)["type"] == "full"
+
+
+def test_write_during_full_backup():
+    with TemporaryDirectory(prefix="bw-backup-incremental-") as tmp_dir:
+        backup_dir = Path(tmp_dir, "backups")
+        backup_dir.mkdir()
+        source = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'source.sqlite3').as_posix()}")
+        Base.metadata.create_all(source.sql_engine)
+        current_time = datetime.now().astimezone()
+
+        with source.sql_engine.begin() as conn:
+            conn.execute(insert(Metadata).values(id=1, is_initialized=True, first_config_saved=True))
+            conn.execute(insert(Plugins).values(id="test", name="Test", description="Test", version="0.1", stream="no"))
+            conn.execute(insert(Jobs).values(name="test-job", plugin_id="test", file_name="test.py", every="day", reload=False))
+
+        # A job run is committed right after the database was dumped by the full backup
+        copy_sqlite_database = backup.copy_sqlite_database
+
+        def copy_then_write(source_path: Path, target_path: Path):
+            copy_sqlite_database(source_path, target_path)
+            with source.sql_engine.begin() as conn:
+                conn.execute(insert(Jobs_runs).values(job_name="test-job", success=True, start_date=current_time, end_date=current_time))
+
+        backup.copy_sqlite_database = copy_then_write
+        try:
+            _, backup_file = backup_database_incremental(current_time, source, backup_dir, full_interval=4)
+        finally:
+            backup.copy_sqlite_database = copy_sqlite_database
+        assert get_backup_manifest(backup_file)["type"] == "full"
+
+        # The table may be saved again but never missed
+        _, backup_file = backup_database_incremental(current_time + timedelta(seconds=1), source, backup_dir, full_interval=4)
+        manifest = get_backup_manifest(backup_file)
+        assert manifest["type"] == "incremental" and "bw_jobs_runs" in manifest["changed"], manifest
+
+        target = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'target.sqlite3').as_posix()}")
+        restore_database(backup_file, target)
+        assert not source.checked_changes(plugins_changes="all", value=True)
+
+        differences = compare_databases(source, target)
+        assert not differences, f"Tables differ after restoring the chain: {differences}"
+
+
+def test_unchanged_tables_not_read():
+    with TemporaryDirectory(prefix="bw-backup-incremental-") as tmp_dir:
+        backup_dir = Path(tmp_dir, "backups")
+        backup_dir.mkdir()
+        source = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'source.sqlite3').as_posix()}")
+        Base.metadata.create_all(source.sql_engine)
+        current_time = datetime.now().astimezone()
+
+        with source.sql_engine.begin() as conn:
+            conn.execute(insert(Metadata).values(id=1, is_initialized=True, first_config_saved=True, last_custom_configs_change=current_time))
+            conn.execute(insert(Plugins).values(id="test", name="Test", description="Test", version="0.1", stream="no"))
+            conn.execute(insert(Jobs).values(name="test-job", plugin_id="test", file_name="test.py", every="day", reload=False))
+            conn.execute(insert(Custom_configs).values(type="http", name="test", data=b"# test", checksum="test", method="ui"))
+            for i in range(20):
+                conn.execute(insert(Jobs_cache).values(job_name="test-job", file_name=f"file-{i}", data=urandom(1024), last_update=current_time))
+
+        # Record the tables read to compute the checksums or to save their rows
+        read_tables = []
+        iter_table_rows = backup.iter_table_rows
+
+        def recording_iter_table_rows(conn, table):
+            read_tables.append(table.name)
+            return iter_table_rows(conn, table)
+
+        backup.iter_table_rows = recording_iter_table_rows
+        try:
+            backup_database_incremental(current_time, source, backup_dir, full_interval=3)
+            assert {"bw_jobs_cache", "bw_custom_configs"} <= set(read_tables)
+
+            # The jobs cache and the custom configs didn't change, they are not read again
+            read_tables.clear()
+            with source.sql_engine.begin() as conn:
+                conn.execute(insert(Jobs_runs).values(job_name="test-job", success=True, start_date=current_time, end_date=current_time))
+            _, backup_file = backup_database_incremental(current_time + timedelta(seconds=1), source, backup_dir, full_interval=3)
+            assert get_backup_manifest(backup_file)["changed"] == ["bw_jobs_runs"]
+            assert "bw_jobs_cache" not in read_tables and "bw_custom_configs" not in read_tables, read_tables
+
+            # Once they change, they are read and saved
+            read_tables.clear()
+            with source.sql_engine.begin() as conn:
+                conn.execute(
+                    update(Jobs_cache).where(Jobs_cache.file_name == "file-1").values(data=urandom(512), last_update=current_time + timedelta(seconds=2))
+                )
+                conn.execute(update(Custom_configs).values(data=b"# changed"))
+                conn.execute(update(Metadata).values(last_custom_configs_change=current_time + timedelta(seconds=2)))
+            _, backup_file = backup_database_incremental(current_time + timedelta(seconds=2), source, backup_dir, full_interval=3)
+            assert set(get_backup_manifest(backup_file)["changed"]) == {"bw_jobs_cache", "bw_custom_configs", "bw_metadata"}
+
+            # The full backup doesn't read the unchanged tables before dumping the database either
+            read_tables.clear()
+            _, backup_file = backup_database_incremental(current_time + timedelta(seconds=3), source, backup_dir, full_interval=3)
+            assert get_backup_manifest(backup_file)["type"] == "full"
+            assert "bw_jobs_cache" not in read_tables and "bw_custom_configs" not in read_tables, read_tables
+        finally:
+            backup.iter_table_rows = iter_table_rows
+
+        target = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'target.sqlite3').as_posix()}")
+        restore_database(backup_file, target)
+        assert not source.checked_changes(plugins_changes="all", value=True)
+        differences = compare_databases(source, target)
+        assert not differences, f"Tables differ after restoring the full backup: {differences}"
+
+
+if __name__ == "__main__":
+    test_incremental_chain_restore()
+    test_write_during_full_backup()
+    test_unchanged_tables_not_read()
+    LOGGER.info("Incremental backups chain restored successfully")
+    sys_exit(0)
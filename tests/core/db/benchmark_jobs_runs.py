@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# Compare the former and the batched cleanup of the excess jobs runs on a SQLite database filled with synthetic runs. A writer process keeps
+# adding runs like the scheduler does during the cleanup, its worst insert latency is the time the cleanup held the database write lock.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 benchmark_jobs_runs.py --runs 1000000 --keep 10000
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from os.path import join, sep
+from pathlib import Path
+from random import random
+from shutil import copyfile
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import create_engine, func, insert, text  # noqa: E402
+
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Jobs, Jobs_runs, Jobs_runs_daily, Plugins  # type: ignore # noqa: E402
+
+LOGGER = getLogger("BENCHMARK-JOBS-RUNS")
+
+JOBS = 40
+INSERT_BATCH = 50000
+
+
+def populate(db_path: Path, runs: int):
+    engine = create_engine(f"sqlite:///{db_path.as_posix()}")
+    Base.metadata.create_all(engine)
+    start = datetime.now().astimezone() - timedelta(minutes=runs // JOBS)
+    with engine.begin() as conn:
+        conn.execute(insert(Plugins).values(id="benchmark", name="Benchmark", description="Benchmark", version="0.1", stream="no"))
+        conn.execute(insert(Jobs), [{"name": f"job-{i}", "plugin_id": "benchmark", "file_name": "job.py", "every": "minute"} for i in range(JOBS)])
+        for offset in range(0, runs, INSERT_BATCH):
+            rows = []
+            for i in range(offset, min(offset + INSERT_BATCH, runs)):
+                end_date = start + timedelta(minutes=i // JOBS)
+                rows.append(
+                    {"job_name": f"job-{i % JOBS}", "success": random() > 0.05, "start_date": end_date - timedelta(seconds=random() * 5), "end_date": end_date}
+                )
+            conn.execute(insert(Jobs_runs), rows)
+    engine.dispose()
+
+
+def legacy_cleanup(database_uri: str, max_runs: int) -> int:
+    """The cleanup as it was : count the whole table then delete the excess in a single transaction."""
+    engine = create_engine(database_uri, connect_args={"timeout": 600})
+    with engine.begin() as conn:
+        rows_count = conn.execute(text("SELECT count(*) FROM bw_jobs_runs")).scalar()
+        if rows_count <= max_runs:
+            return 0
+        ids = [row.id for row in conn.execute(text("SELECT id FROM bw_jobs_runs ORDER BY end_date ASC LIMIT :limit"), {"limit": rows_count - max_runs})]
+        removed = 0
+        for offset in range(0, len(ids), 30000):
+            # ? SQLite limits the number of bound parameters, the former code relied on a single IN clause
+            chunk = ids[offset : offset + 30000]  # noqa: E203
+            removed += conn.execute(Jobs_runs.__table__.delete().where(Jobs_runs.id.in_(chunk))).rowcount
+    engine.dispose()
+    return removed
+
+
+def writer(database_uri: str, stop, latencies):
+    """Add a run every 10ms like a busy scheduler and record how long each insert waited."""
+    engine = create_engine(database_uri, connect_args={"timeout": 600})
+    worst = 0.0
+    while not stop.is_set():
+        start = perf_counter()
+        with engine.begin() as conn:
+            now = datetime.now().astimezone()
+            conn.execute(insert(Jobs_runs).values(job_name="job-0", success=True, start_date=now, end_date=now))
+        worst = max(worst, perf_counter() - start)
+        sleep(0.01)
+    latencies.put(worst)
+    engine.dispose()
+
+
+def measure(name: str, database_uri: str, cleanup) -> None:
+    ctx = get_context("spawn")
+    stop, latencies = ctx.Event(), ctx.Queue()
+    process = ctx.Process(target=writer, args=(database_uri, stop, latencies))
+    process.start()
+    sleep(1)
+
+    start = perf_counter()
+    result = cleanup()
+    elapsed = perf_counter() - start
+
+    sleep(0.5)
+    stop.set()
+    worst = latencies.get()
+    process.join()
+    print(f"{name:<8} cleanup: {elapsed:8.2f}s  worst concurrent insert wait: {worst * 1000:9.1f} ms  ({result})")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the cleanup of the excess jobs runs on a synthetic SQLite database")
+    parser.add_argument("--runs", type=int, default=1_000_000, help="number of synthetic jobs runs (default: 1000000)")
+    parser.add_argument("--keep", type=int, default=10000, help="number of jobs runs to keep, like DATABASE_MAX_JOBS_RUNS (default: 10000)")
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="bw-jobs-runs-benchmark-") as tmp_dir:
+        db_path = Path(tmp_dir, "batched.sqlite3")
+        legacy_path = Path(tmp_dir, "legacy.sqlite3")
+        purge_path = Path(tmp_dir, "purge.sqlite3")
+
+        print(f"Creating a SQLite database with {args.runs} jobs runs ...")
+        populate(db_path, args.runs)
+        copyfile(db_path, legacy_path)
+        copyfile(db_path, purge_path)
+
+        # The former schema had no index on the jobs runs
+        legacy_engine = create_engine(f"sqlite:///{legacy_path.as_posix()}")
+        with legacy_engine.begin() as conn:
+            for index in Jobs_runs.__table__.indexes:
+                conn.execute(text(f"DROP INDEX {index.name}"))
+        legacy_engine.dispose()
+
+        measure("legacy", f"sqlite:///{legacy_path.as_posix()}", lambda: f"removed {legacy_cleanup(f'sqlite:///{legacy_path.as_posix()}', args.keep)}")
+
+        # ? The batches alone, the summaries read every removed run back into Python which is most of the batched cleanup time
+        purge_db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{purge_path.as_posix()}", log=False)
+        measure("purge", purge_db.database_uri, lambda: purge_db.cleanup_jobs_runs_excess(args.keep))
+
+        db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{db_path.as_posix()}", log=False)
+        measure("batched", db.database_uri, lambda: db.cleanup_jobs_runs_excess(args.keep, summarize=True))
+
+        with db.sql_engine.connect() as conn:
+            summaries = conn.execute(text("SELECT count(*), sum(runs) FROM bw_jobs_runs_daily")).first()
+            remaining = conn.execute(text("SELECT count(*) FROM bw_jobs_runs")).scalar()
+            failures = conn.execute(func.sum(Jobs_runs_daily.failures).select()).scalar()
+        print(f"Kept {remaining} runs, {summaries[1]} runs summarized in {summaries[0]} daily summaries ({failures} failures)")
+
+    sys_exit(0)
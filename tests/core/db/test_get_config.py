@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Count the queries issued by Database.get_config and Database.get_custom_configs on a multisite deployment with 200 services spread over 20 templates, the count must not
+# grow with the number of services, templates or suffixed settings.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_get_config.py (or with pytest)
+
+from datetime import datetime
+from os.path import join, sep
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Global_values, Plugins, Services, Services_settings, Settings, Template_custom_configs, Template_settings, Templates  # type: ignore # noqa: E402
+
+LOGGER = getLogger("TEST-GET-CONFIG")
+
+SERVICES = 200
+TEMPLATES = 20
+SUFFIXES = 3
+MAX_QUERIES = 10
+
+
+def populate(db: Database, services: int):
+    current_time = datetime.now().astimezone()
+    setting = {"plugin_id": "test", "help": "Test", "regex": "^.*$", "type": "text", "multiple": None}
+    with db.sql_engine.begin() as conn:
+        conn.execute(insert(Plugins).values(id="test", name="Test", description="Test", version="0.1", stream="no"))
+        conn.execute(
+            insert(Settings),
+            [
+                setting | {"id": "SERVER_NAME", "name": "Server name", "context": "multisite", "default": "www.example.com", "order": 0},
+                setting | {"id": "MULTISITE", "name": "Multisite", "context": "global", "default": "no", "order": 1},
+                setting | {"id": "USE_TEMPLATE", "name": "Use template", "context": "multisite", "default": "", "order": 2},
+                setting | {"id": "PROXY_HOST", "name": "Proxy host", "context": "multisite", "default": "", "multiple": "proxy", "order": 3},
+                setting | {"id": "PROXY_URL", "name": "Proxy URL", "context": "multisite", "default": "/", "multiple": "proxy", "order": 4},
+            ],
+        )
+        conn.execute(insert(Global_values).values(setting_id="MULTISITE", value="yes", method="scheduler"))
+
+        conn.execute(
+            insert(Templates),
+            [{"id": f"template-{i}", "name": f"Template {i}", "creation_date": current_time, "last_update": current_time} for i in range(TEMPLATES)],
+        )
+        conn.execute(
+            insert(Template_settings),
+            [
+                {
+                    "template_id": f"template-{i}",
+                    "setting_id": "PROXY_URL",
+                    "step_id": 1,
+                    "default": f"/template-{i}/{suffix}",
+                    "suffix": suffix,
+                    "order": suffix,
+                }
+                for i in range(TEMPLATES)
+                for suffix in range(1, SUFFIXES + 1)
+            ],
+        )
+        conn.execute(
+            insert(Template_custom_configs),
+            [
+                {
+                    "template_id": f"template-{i}",
+                    "step_id": 1,
+                    "type": "server_http",
+                    "name": f"config-{j}",
+                    "data": f"# template {i} config {j}".encode(),
+                    "checksum": f"{i}-{j}",
+                    "order": j,
+                }
+                for i in range(TEMPLATES)
+                for j in range(SUFFIXES)
+            ],
+        )
+
+        conn.execute(
+            insert(Services),
+            [{"id": f"app-{i}.example.com", "method": "scheduler", "creation_date": current_time, "last_update": current_time} for i in range(services)],
+        )
+        conn.execute(
+            insert(Services_settings),
+            [
+                {"service_id": f"app-{i}.example.com", "setting_id": "USE_TEMPLATE", "value": f"template-{i % TEMPLATES}", "suffix": 0, "method": "scheduler"}
+                for i in range(services)
+            ]
+            + [
+                {
+                    "service_id": f"app-{i}.example.com",
+                    "setting_id": "PROXY_HOST",
+                    "value": f"http://backend-{i}-{suffix}",
+                    "suffix": suffix,
+                    "method": "scheduler",
+                }
+                for i in range(services)
+                for suffix in range(1, SUFFIXES + 1)
+            ],
+        )
+
+
+def count_queries(tmp_dir: str, services: int) -> tuple:
+    db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, f'db-{services}.sqlite3').as_posix()}", log=False)
+    Base.metadata.create_all(db.sql_engine)
+    populate(db, services)
+
+    statements = []
+    event.listen(db.sql_engine, "before_cursor_execute", lambda _conn, _cursor, statement, *_: statements.append(statement))
+    config = db.get_config()
+    config_queries = len(statements)
+
+    # The suffixed settings missing from the services are resolved from the template of each service
+    for i in (0, services - 1):
+        for suffix in range(1, SUFFIXES + 1):
+            assert config[f"app-{i}.example.com_PROXY_HOST_{suffix}"] == f"http://backend-{i}-{suffix}"
+            assert config[f"app-{i}.example.com_PROXY_URL_{suffix}"] == f"/template-{i % TEMPLATES}/{suffix}"
+
+    statements.clear()
+    custom_configs = db.get_custom_configs(as_dict=True)
+    custom_configs_queries = len(statements)
+
+    assert len(custom_configs) == services * SUFFIXES
+    for i in (0, services - 1):
+        custom_config = custom_configs[f"app-{i}.example.com_server-http_config-1"]
+        assert custom_config["template"] == f"template-{i % TEMPLATES}" and custom_config["data"] == f"# template {i % TEMPLATES} config 1".encode()
+
+    return config_queries, custom_configs_queries
+
+
+def test_templates_query_count():
+    with TemporaryDirectory(prefix="bw-get-config-") as tmp_dir:
+        small = count_queries(tmp_dir, TEMPLATES)
+        large = count_queries(tmp_dir, SERVICES)
+        for name, small_count, large_count in zip(("get_config", "get_custom_configs"), small, large):
+            print(f"{name} queries: {small_count} with {TEMPLATES} services, {large_count} with {SERVICES} services")
+            assert large_count == small_count, f"{name} issued {large_count} queries with {SERVICES} services against {small_count} with {TEMPLATES}"
+            assert large_count <= MAX_QUERIES, f"{name} issued {large_count} queries"
+
+
+if __name__ == "__main__":
+    test_templates_query_count()
+    LOGGER.info("Templates are resolved with a constant number of queries")
+    sys_exit(0)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# Cache 1000 files for as many services with one Database.upsert_job_cache call per file then with a single Database.bulk_upsert_job_cache call and compare
+# the number of transactions and the time spent, caching the same files again must not rewrite any of them. The Job.batch_cache context manager is checked as well.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_job_cache.py (or with pytest)
+
+from datetime import datetime
+from os.path import join, sep
+from pathlib import Path
+from shutil import rmtree
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+from common_utils import bytes_hash  # type: ignore # noqa: E402
+from Database import Database  # type: ignore # noqa: E402
+from jobs import Job  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Jobs, Jobs_cache, Plugins, Services  # type: ignore # noqa: E402
+
+LOGGER = getLogger("TEST-JOB-CACHE")
+
+FILES = 1000
+PLUGIN_ID = "test-job-cache"
+JOB_NAME = "test-job-cache"
+
+
+def create_database(tmp_dir: str, name: str) -> Database:
+    db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, f'{name}.sqlite3').as_posix()}", log=False)
+    Base.metadata.create_all(db.sql_engine)
+    current_time = datetime.now().astimezone()
+    with db.sql_engine.begin() as conn:
+        conn.execute(insert(Plugins).values(id=PLUGIN_ID, name="Test", description="Test", version="0.1", stream="no"))
+        conn.execute(insert(Jobs).values(name=JOB_NAME, plugin_id=PLUGIN_ID, file_name=f"{JOB_NAME}.py", every="day"))
+        conn.execute(
+            insert(Services),
+            [{"id": f"app-{i}.example.com", "method": "scheduler", "creation_date": current_time, "last_update": current_time} for i in range(FILES)],
+        )
+    return db
+
+
+def build_entries(generation: int) -> list:
+    entries = []
+    for i in range(FILES):
+        data = f"# generation {generation}\n192.168.{i // 256}.{i % 256}\n".encode()
+        entries.append((f"app-{i}.example.com", "IP.list", data, bytes_hash(data)))
+    return entries
+
+
+def count_transactions(db: Database, callback) -> tuple:
+    commits = [0]
+    listener = lambda _conn: commits.__setitem__(0, commits[0] + 1)  # noqa: E731
+    event.listen(db.sql_engine, "commit", listener)
+    try:
+        start = perf_counter()
+        callback()
+        elapsed = perf_counter() - start
+    finally:
+        event.remove(db.sql_engine, "commit", listener)
+    return commits[0], elapsed
+
+
+def cached_files(db: Database) -> dict:
+    with db.sql_engine.connect() as conn:
+        return {
+            (row.service_id, row.file_name): (row.data, row.checksum, row.last_update)
+            for row in conn.execute(select(Jobs_cache.service_id, Jobs_cache.file_name, Jobs_cache.data, Jobs_cache.checksum, Jobs_cache.last_update))
+        }
+
+
+def test_bulk_upsert_job_cache():
+    with TemporaryDirectory(prefix="bw-job-cache-") as tmp_dir:
+        single_db, bulk_db = create_database(tmp_dir, "single"), create_database(tmp_dir, "bulk")
+        entries = build_entries(1)
+
+        def upsert_each():
+            for service_id, file_name, data, checksum in entries:
+                assert not single_db.upsert_job_cache(service_id, file_name, data, job_name=JOB_NAME, checksum=checksum)
+
+        single_transactions, single_time = count_transactions(single_db, upsert_each)
+        bulk_transactions, bulk_time = count_transactions(bulk_db, lambda: bulk_db.bulk_upsert_job_cache(entries, job_name=JOB_NAME))
+        print(f"upsert_job_cache per file: {single_transactions:5d} transactions in {single_time:6.2f}s")
+        print(f"bulk_upsert_job_cache    : {bulk_transactions:5d} transactions in {bulk_time:6.2f}s")
+
+        assert bulk_transactions == 1 and single_transactions >= FILES
+        assert bulk_time < single_time
+        single_files, bulk_files = cached_files(single_db), cached_files(bulk_db)
+        assert len(bulk_files) == FILES
+        assert {key: value[:2] for key, value in single_files.items()} == {key: value[:2] for key, value in bulk_files.items()}
+
+        # Unchanged files are not written again but stay fresh, changed ones are updated in place
+        assert not bulk_db.bulk_upsert_job_cache(entries, job_name=JOB_NAME)
+        refreshed = cached_files(bulk_db)
+        assert {key: value[:2] for key, value in refreshed.items()} == {key: value[:2] for key, value in bulk_files.items()}
+        assert all(refreshed[key][2] > bulk_files[key][2] for key in bulk_files), "The last update of the unchanged files must be refreshed"
+        bulk_files = refreshed
+        changed = build_entries(2)[: FILES // 2] + entries[FILES // 2 :]  # noqa: E203
+        assert not bulk_db.bulk_upsert_job_cache(changed, job_name=JOB_NAME)
+        files = cached_files(bulk_db)
+        assert len(files) == FILES
+        for service_id, file_name, data, checksum in changed:
+            assert files[(service_id, file_name)][:2] == (data, checksum)
+        assert files[("app-0.example.com", "IP.list")][2] != bulk_files[("app-0.example.com", "IP.list")][2]
+        assert files[(f"app-{FILES - 1}.example.com", "IP.list")][2] > bulk_files[(f"app-{FILES - 1}.example.com", "IP.list")][2]
+
+
+def test_job_batch_cache():
+    with TemporaryDirectory(prefix="bw-job-cache-") as tmp_dir:
+        db = create_database(tmp_dir, "job")
+        job = Job(LOGGER, Path(tmp_dir, PLUGIN_ID, "jobs", f"{JOB_NAME}.py"), db, deprecated=True)
+
+        def cache_each():
+            for service_id, _, data, _ in build_entries(1):
+                assert job.cache_file("IP.list", data, service_id=service_id) == (True, "")
+
+        def cache_batch():
+            with job.batch_cache() as errors:
+                for service_id, _, data, _ in build_entries(2):
+                    assert job.cache_file("IP.list", data, service_id=service_id) == (True, "")
+                job.del_cache("IP.list", service_id="app-0.example.com")
+            assert not errors, errors
+
+        try:
+            transactions, _ = count_transactions(db, cache_each)
+            assert transactions == FILES
+
+            transactions, _ = count_transactions(db, cache_batch)
+            files = cached_files(db)
+            # One transaction for the deletion and one for the whole batch
+            assert transactions == 2
+            assert len(files) == FILES - 1 and ("app-0.example.com", "IP.list") not in files
+            assert files[("app-1.example.com", "IP.list")][0].startswith(b"# generation 2")
+            assert job.job_path.joinpath("app-1.example.com", "IP.list").read_bytes().startswith(b"# generation 2")
+
+            # The errors of the batch are given back to the job so that it can fail
+            db.bulk_upsert_job_cache = lambda entries, *, job_name: "database is locked"
+            with job.batch_cache() as errors:
+                assert job.cache_file("IP.list", b"# generation 3\n", service_id="app-1.example.com") == (True, "")
+            assert errors == {JOB_NAME: "database is locked"}
+            assert cached_files(db)[("app-1.example.com", "IP.list")][0].startswith(b"# generation 2")
+        finally:
+            rmtree(job.job_path, ignore_errors=True)
+
+
+def test_shared_list_referenced():
+    with TemporaryDirectory(prefix="bw-job-cache-") as tmp_dir:
+        db = create_database(tmp_dir, "shared")
+        job = Job(LOGGER, Path(tmp_dir, PLUGIN_ID, "jobs", f"{JOB_NAME}.py"), db, deprecated=True)
+        content = b"192.168.0.1\n"
+
+        try:
+            assert job.cache_shared_list("IP.list", content, service_id="app-0.example.com") == (True, "")
+            # The services lists reference the shared one, which must be kept as long as they do
+            assert job.shared_list_referenced("IP.list", service_id="app-0.example.com") == job.shared_list_name(bytes_hash(content))
+            assert job.cache_file("IP.list", content, service_id="app-1.example.com") == (True, "")
+            assert job.shared_list_referenced("IP.list", service_id="app-1.example.com") is None
+            assert job.shared_list_referenced("IP.list", service_id="app-2.example.com") is None
+        finally:
+            rmtree(job.job_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_bulk_upsert_job_cache()
+    test_job_batch_cache()
+    test_shared_list_referenced()
+    LOGGER.info("Job cache files are saved in a single transaction")
+    sys_exit(0)
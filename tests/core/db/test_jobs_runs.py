@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# Clean up the excess jobs runs of a SQLite database in several small batches and over several cleanups, check that the right runs are kept and that the
+# daily summaries are the same as when every run is summarized at once (the durations histograms add up instead of averaging percentiles).
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_jobs_runs.py (or with pytest)
+
+from datetime import datetime, timedelta
+from math import ceil
+from os.path import join, sep
+from pathlib import Path
+from random import Random
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Jobs, Jobs_runs, Jobs_runs_daily, Plugins  # type: ignore # noqa: E402
+
+LOGGER = getLogger("TEST-JOBS-RUNS")
+
+JOBS = 3
+RUNS = 3000
+
+
+def create_database(tmp_dir: str, name: str) -> Database:
+    db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, f'{name}.sqlite3').as_posix()}", log=False)
+    Base.metadata.create_all(db.sql_engine)
+
+    rng = Random(42)
+    start = datetime.now().astimezone().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=3)
+    with db.sql_engine.begin() as conn:
+        conn.execute(insert(Plugins).values(id="test", name="Test", description="Test", version="0.1", stream="no"))
+        conn.execute(insert(Jobs), [{"name": f"job-{i}", "plugin_id": "test", "file_name": "job.py", "every": "minute"} for i in range(JOBS)])
+        rows = []
+        for i in range(RUNS):
+            # ? Several runs share the same end date so that the batches have to break ties on the id
+            end_date = start + timedelta(minutes=i // 2)
+            rows.append(
+                {
+                    "job_name": f"job-{i % JOBS}",
+                    "success": rng.random() > 0.1,
+                    "start_date": end_date - timedelta(seconds=rng.lognormvariate(0, 1.5)),
+                    "end_date": end_date,
+                }
+            )
+        conn.execute(insert(Jobs_runs), rows)
+    return db
+
+
+def get_summaries(db: Database) -> dict:
+    with db.sql_engine.connect() as conn:
+        return {
+            (row.job_name, row.day): (row.runs, row.failures, round(row.total_duration, 6), row.p50_duration, row.p95_duration, row.max_duration)
+            for row in conn.execute(select(Jobs_runs_daily))
+        }
+
+
+def test_cleanup_summaries():
+    with TemporaryDirectory(prefix="bw-jobs-runs-") as tmp_dir:
+        once = create_database(tmp_dir, "once")
+        assert once.cleanup_jobs_runs_excess(100, summarize=True) == f"Removed {RUNS - 100} excess jobs runs"
+
+        several = create_database(tmp_dir, "several")
+        for max_runs in (2000, 1000, 100):
+            assert several.cleanup_jobs_runs_excess(max_runs, batch_size=97, summarize=True).startswith("Removed")
+
+        with once.sql_engine.connect() as conn:
+            kept_once = conn.execute(select(Jobs_runs.id).order_by(Jobs_runs.id)).scalars().all()
+        with several.sql_engine.connect() as conn:
+            kept_several = conn.execute(select(Jobs_runs.id).order_by(Jobs_runs.id)).scalars().all()
+            summarized = conn.execute(select(func.sum(Jobs_runs_daily.runs))).scalar()
+
+        # The most recent runs are kept
+        assert kept_once == kept_several == list(range(RUNS - 99, RUNS + 1)), kept_several
+        assert summarized == RUNS - 100
+
+        summaries_once, summaries_several = get_summaries(once), get_summaries(several)
+        assert summaries_once == summaries_several, f"The summaries depend on the cleanups: {summaries_once} != {summaries_several}"
+
+        # The percentiles are the upper bound of their histogram bucket, within about 9% of the exact value
+        exact = create_database(tmp_dir, "exact")
+        with exact.sql_engine.connect() as conn:
+            durations = {}
+            for row in conn.execute(select(Jobs_runs.job_name, Jobs_runs.start_date, Jobs_runs.end_date).where(Jobs_runs.id <= RUNS - 100)):
+                durations.setdefault((row.job_name, row.end_date.date()), []).append((row.end_date - row.start_date).total_seconds())
+
+        assert durations.keys() == summaries_several.keys()
+        for key, values in durations.items():
+            values.sort()
+            runs, _, _, p50, p95, max_duration = summaries_several[key]
+            assert runs == len(values) and abs(max_duration - values[-1]) < 1e-6, f"{key}: {runs} runs up to {max_duration}s"
+            for percent, percentile in ((50, p50), (95, p95)):
+                value = values[max(1, ceil(percent / 100 * runs)) - 1]
+                assert value - 1e-6 <= percentile <= value * 2 ** (1 / 8) + 1e-6, f"{key} p{percent}: {percentile} is too far from {value}"
+
+
+if __name__ == "__main__":
+    test_cleanup_summaries()
+    LOGGER.info("Jobs runs cleaned up and summarized successfully")
+    sys_exit(0)
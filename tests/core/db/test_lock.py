@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Make several processes contend for the database lock on a SQLite database, check that they never overlap and compare the time needed
+# to hand the lock over with the db.lock file polling it replaces.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_lock.py (or with pytest)
+
+from json import dumps, loads
+from multiprocessing import get_context
+from os import getpid
+from os.path import join, sep
+from pathlib import Path
+from statistics import mean, median
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import sleep, time
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base  # type: ignore # noqa: E402
+
+LOGGER = getLogger("TEST-LOCK")
+
+WORKERS = 4
+ITERATIONS = 3
+HOLD_TIME = 0.05
+
+
+def file_lock_worker(lock_file: str, events_file: str):
+    """The db.lock file polling the backup plugin and the scheduler used to rely on."""
+    lock_path = Path(lock_file)
+    for _ in range(ITERATIONS):
+        while lock_path.is_file() and lock_path.stat().st_ctime + 30 > time():
+            sleep(1)
+        lock_path.touch()
+        acquired = time()
+        sleep(HOLD_TIME)
+        released = time()
+        lock_path.unlink(missing_ok=True)
+        with open(events_file, "a") as f:
+            f.write(dumps({"pid": getpid(), "acquired": acquired, "released": released}) + "\n")
+
+
+def database_lock_worker(database_uri: str, events_file: str):
+    db = Database(LOGGER, sqlalchemy_string=database_uri, log=False)
+    for _ in range(ITERATIONS):
+        with db.lock(timeout=30) as lock:
+            assert lock.acquired
+            acquired = time()
+            sleep(HOLD_TIME)
+            released = time()
+        with open(events_file, "a") as f:
+            f.write(dumps({"pid": getpid(), "acquired": acquired, "released": released}) + "\n")
+
+
+def run_workers(target, *args) -> list:
+    events_file = Path(args[-1])
+    ctx = get_context("spawn")
+    processes = [ctx.Process(target=target, args=args) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0, f"{target.__name__} exited with {process.exitcode}"
+    return sorted((loads(line) for line in events_file.read_text().splitlines()), key=lambda event: event["acquired"])
+
+
+def count_overlaps(events: list) -> int:
+    return sum(1 for previous, event in zip(events, events[1:]) if event["acquired"] < previous["released"])
+
+
+def handover_latencies(events: list) -> list:
+    """Time between a release and the acquisition by another waiting process, in milliseconds."""
+    return [max(event["acquired"] - previous["released"], 0) * 1000 for previous, event in zip(events, events[1:]) if event["pid"] != previous["pid"]]
+
+
+def test_database_lock_contention():
+    with TemporaryDirectory(prefix="bw-db-lock-") as tmp_dir:
+        database_uri = f"sqlite:///{Path(tmp_dir, 'db.sqlite3').as_posix()}"
+        db = Database(LOGGER, sqlalchemy_string=database_uri)
+        Base.metadata.create_all(db.sql_engine)
+
+        events = run_workers(database_lock_worker, database_uri, Path(tmp_dir, "database.jsonl").as_posix())
+        assert len(events) == WORKERS * ITERATIONS
+        assert not count_overlaps(events), "Two processes held the database lock at the same time"
+        assert not db.is_locked(), "The database lock was not released"
+        database_latencies = handover_latencies(events)
+
+        file_events = run_workers(file_lock_worker, Path(tmp_dir, "db.lock").as_posix(), Path(tmp_dir, "file.jsonl").as_posix())
+        file_latencies = handover_latencies(file_events)
+
+        for name, latencies, overlaps in (
+            ("database lock", database_latencies, 0),
+            ("db.lock polling", file_latencies, count_overlaps(file_events)),
+        ):
+            print(
+                f"{name:<16} handover latency (ms): mean {mean(latencies):8.1f}  median {median(latencies):8.1f}  max {max(latencies):8.1f}  overlaps: {overlaps}"
+            )
+
+        assert median(database_latencies) < median(file_latencies)
+
+
+if __name__ == "__main__":
+    test_database_lock_contention()
+    LOGGER.info("Database lock contention test passed")
+    sys_exit(0)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Generate then check 500 self-signed certificates with openssl called once per certificate like the self-signed job did, then with the in-process
+# generation pool, with and without a shared key, and compare the wall time and the number of processes spawned.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 benchmark_certificates.py
+
+from argparse import ArgumentParser
+from os import getenv, register_at_fork, sep
+from os.path import join
+from pathlib import Path
+from subprocess import DEVNULL, run
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("core", "selfsigned", "jobs"))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from common_utils import effective_cpu_count  # type: ignore # noqa: E402
+from selfsigned_certificates import CertificateRequest, check_certificate, generate_certificates  # type: ignore # noqa: E402
+
+FORKS = [0]
+register_at_fork(before=lambda: FORKS.__setitem__(0, FORKS[0] + 1))
+
+
+def openssl(*args: str) -> int:
+    return run(["openssl", *args], stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, check=False, env={"PATH": getenv("PATH", "")}).returncode
+
+
+def legacy(requests: list, path: Path) -> int:
+    """Check then generate each certificate with openssl like the former job, returns the number of openssl processes."""
+    processes = 0
+    for request in requests:
+        server_path = path.joinpath(request.server)
+        cert_path, key_path = server_path.joinpath("cert.pem"), server_path.joinpath("key.pem")
+        if cert_path.is_file() and key_path.is_file():
+            processes += 1
+            if openssl("x509", "-checkend", "86400", "-noout", "-in", cert_path.as_posix()) == 0:
+                continue
+        server_path.mkdir(parents=True, exist_ok=True)
+        curve_or_bits = request.algorithm.split("-")[1]
+        key_options = (
+            ["ec", "-pkeyopt", f"ec_paramgen_curve:{curve_or_bits}"]
+            if request.algorithm.startswith("ec-")
+            else ["rsa", "-pkeyopt", f"rsa_keygen_bits:{curve_or_bits}"]
+        )
+        processes += 1
+        assert (
+            openssl(
+                "req",
+                "-nodes",
+                "-x509",
+                "-newkey",
+                *key_options,
+                "-keyout",
+                key_path.as_posix(),
+                "-out",
+                cert_path.as_posix(),
+                "-days",
+                str(request.days),
+                "-subj",
+                request.subject,
+            )
+            == 0
+        )
+    return processes
+
+
+def pooled(requests: list, path: Path, workers: int, reuse_keys: bool) -> int:
+    """Check each certificate in-process then generate the missing ones in the pool, returns the number of forked processes."""
+    FORKS[0] = 0
+    missing = []
+    for request in requests:
+        server_path = path.joinpath(request.server)
+        if check_certificate(server_path.joinpath("cert.pem"), server_path.joinpath("key.pem"), request):
+            missing.append(request)
+    for server, result in generate_certificates(missing, max_workers=workers, reuse_keys=reuse_keys).items():
+        assert isinstance(result, tuple), result
+        path.joinpath(server).mkdir(parents=True, exist_ok=True)
+        path.joinpath(server, "cert.pem").write_bytes(result[0])
+        path.joinpath(server, "key.pem").write_bytes(result[1])
+    return FORKS[0]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the generation of the self-signed certificates")
+    parser.add_argument("--certificates", type=int, default=500, help="number of certificates (default: 500)")
+    parser.add_argument("--algorithm", default="ec-prime256v1", help="algorithm of the certificates (default: ec-prime256v1)")
+    parser.add_argument("--workers", type=int, default=effective_cpu_count(), help="size of the generation pool (default: number of CPUs)")
+    args = parser.parse_args()
+
+    requests = [CertificateRequest(f"www-{i}.example.com", args.algorithm, "/CN=www.example.com/", 365) for i in range(args.certificates)]
+    print(f"{args.certificates} {args.algorithm} certificates, {args.workers} worker(s)")
+
+    with TemporaryDirectory(prefix="bw-selfsigned-benchmark-") as tmp_dir:
+        for name, run_once in (
+            ("openssl per certificate", lambda path: legacy(requests, path)),
+            ("in-process pool", lambda path: pooled(requests, path, args.workers, False)),
+            ("in-process pool, reused key", lambda path: pooled(requests, path, args.workers, True)),
+        ):
+            path = Path(tmp_dir, name.replace(" ", "-").replace(",", ""))
+            for phase in ("generate", "check"):
+                start = perf_counter()
+                processes = run_once(path)
+                print(f"{name:<28} {phase:<8}: {perf_counter() - start:7.2f}s, {processes:4d} processes spawned")
+
+            # The certificates generated by openssl and by the pool are both accepted by the in-process check
+            assert all(not check_certificate(path.joinpath(r.server, "cert.pem"), path.joinpath(r.server, "key.pem"), r) for r in requests)
+
+    sys_exit(0)
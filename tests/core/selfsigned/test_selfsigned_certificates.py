@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Generate self-signed certificates with the in-process generation pool and check why the self-signed job would generate them again : missing,
+# expiring, different algorithm, subject or expiry. The subjects with an attribute openssl -subj accepts but the generation doesn't support are
+# rejected, and with a shared key the requests with the same algorithm and subject get the same key.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_selfsigned_certificates.py (or with pytest)
+
+from datetime import datetime, timedelta, timezone
+from os.path import join, sep
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("core", "selfsigned", "jobs"))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from selfsigned_certificates import CertificateRequest, build_certificate, check_certificate, generate_certificates, parse_subject  # type: ignore # noqa: E402
+
+REQUEST = CertificateRequest("www.example.com", "ec-prime256v1", "/CN=www.example.com/O=BunkerWeb/", 365)
+
+
+def write_certificate(path: Path, request: CertificateRequest) -> tuple:
+    cert, key = build_certificate(request)
+    cert_path, key_path = path.joinpath("cert.pem"), path.joinpath("key.pem")
+    cert_path.write_bytes(cert)
+    key_path.write_bytes(key)
+    return cert_path, key_path
+
+
+def test_check_certificate():
+    with TemporaryDirectory(prefix="bw-selfsigned-") as tmp_dir:
+        assert check_certificate(Path(tmp_dir, "cert.pem"), Path(tmp_dir, "key.pem"), REQUEST) == "missing"
+
+        cert_path, key_path = write_certificate(Path(tmp_dir), REQUEST)
+        assert check_certificate(cert_path, key_path, REQUEST) is None
+        # Equivalent curve names and the order of the subject attributes don't matter
+        assert check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, "ec-secp256r1", "/O=BunkerWeb/CN=www.example.com", 365)) is None
+
+        # Like openssl x509 -checkend 86400 : the certificate is regenerated the day before it expires
+        now = datetime.now(timezone.utc)
+        assert check_certificate(cert_path, key_path, REQUEST, now=now + timedelta(days=363)) is None
+        assert check_certificate(cert_path, key_path, REQUEST, now=now + timedelta(days=364, hours=12)) == "expiring"
+
+        reason = check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, "rsa-2048", REQUEST.subject, 365))
+        assert reason == "algorithm (ec-secp256r1) is different from the one in the configuration (rsa-2048)", reason
+        reason = check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, "ec-secp384r1", REQUEST.subject, 365))
+        assert reason and reason.startswith("algorithm (ec-secp256r1)"), reason
+
+        reason = check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, REQUEST.algorithm, "/CN=app.example.com/O=BunkerWeb/", 365))
+        assert reason == "subject is different from the one in the configuration", reason
+        reason = check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, REQUEST.algorithm, "/CN=www.example.com/", 365))
+        assert reason == "subject is different from the one in the configuration", reason
+
+        reason = check_certificate(cert_path, key_path, CertificateRequest(REQUEST.server, REQUEST.algorithm, REQUEST.subject, 30))
+        assert reason == "expiration date is different from the one in the configuration", reason
+
+        cert_path.write_text("not a certificate")
+        assert check_certificate(cert_path, key_path, REQUEST) == "invalid"
+
+
+def test_parse_subject():
+    name = parse_subject("/C=FR/ST=Ile-de-France/CN=www.example.com/emailAddress=contact@example.com/")
+    assert name.rfc4514_string() == "1.2.840.113549.1.9.1=contact@example.com,CN=www.example.com,ST=Ile-de-France,C=FR", name.rfc4514_string()
+
+    for subject in ("/CN=www.example.com/FOO=bar/", "/CN/", "/", ""):
+        try:
+            parse_subject(subject)
+        except ValueError:
+            continue
+        raise AssertionError(f"The subject {subject!r} should have been rejected")
+
+    # The generation of an unsupported subject fails on its own
+    results = generate_certificates([REQUEST, CertificateRequest("app.example.com", REQUEST.algorithm, "/CN=app.example.com/FOO=bar/", 365)], max_workers=2)
+    assert isinstance(results["www.example.com"], tuple)
+    assert isinstance(results["app.example.com"], ValueError) and "FOO=bar" in str(results["app.example.com"]), results["app.example.com"]
+
+
+def test_reuse_keys():
+    requests = [
+        CertificateRequest("app1.example.com", "ec-prime256v1", "/CN=www.example.com/", 365),
+        CertificateRequest("app2.example.com", "ec-prime256v1", "/CN=www.example.com/", 365),
+        CertificateRequest("app3.example.com", "ec-prime256v1", "/CN=app3.example.com/", 365),
+        CertificateRequest("app4.example.com", "ec-secp384r1", "/CN=www.example.com/", 365),
+        CertificateRequest("app5.example.com", "ec-unknown", "/CN=www.example.com/", 365),
+    ]
+
+    for max_workers in (1, 4):
+        results = generate_certificates(requests, max_workers=max_workers, reuse_keys=True)
+        assert set(results) == {request.server for request in requests}
+        # The shared key of an unsupported algorithm can't be generated, the other groups aren't affected
+        assert isinstance(results.pop("app5.example.com"), ValueError)
+        assert all(isinstance(result, tuple) for result in results.values()), results
+
+        keys = {server: key for server, (_, key) in results.items()}
+        assert keys["app1.example.com"] == keys["app2.example.com"]
+        assert len({keys["app1.example.com"], keys["app3.example.com"], keys["app4.example.com"]}) == 3
+        # The certificates sharing a key are still distinct (serial numbers)
+        assert results["app1.example.com"][0] != results["app2.example.com"][0]
+
+    results = generate_certificates(requests[:2], max_workers=2)
+    assert results["app1.example.com"][1] != results["app2.example.com"][1], "Each certificate gets its own key without reuse_keys"
+
+    with TemporaryDirectory(prefix="bw-selfsigned-") as tmp_dir:
+        for server, (cert, key) in results.items():
+            server_path = Path(tmp_dir, server)
+            server_path.mkdir()
+            server_path.joinpath("cert.pem").write_bytes(cert)
+            server_path.joinpath("key.pem").write_bytes(key)
+            assert check_certificate(server_path.joinpath("cert.pem"), server_path.joinpath("key.pem"), requests[0]) is None
+
+
+if __name__ == "__main__":
+    test_check_certificate()
+    test_parse_subject()
+    test_reuse_keys()
+    print("Self-signed certificates generated and checked successfully")
+    sys_exit(0)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Validate the variables of a synthetic multisite environment of 2000 services with the former resolution of the Configurator (loop over the servers and
+# over every setting with a regex per multiple setting) and with the resolution index, and check that both accept and reject exactly the same variables.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 benchmark_configurator.py
+
+from argparse import ArgumentParser
+from os.path import join, sep
+from re import error as RegexError, search as re_search
+from sys import exit as sys_exit, path as sys_path
+from time import perf_counter
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("gen",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from Configurator import Configurator  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+
+LOGGER = getLogger("BENCHMARK-CONFIGURATOR")
+
+
+def build_variables(services: int) -> dict:
+    # ? "app_b" is listed before "app" so that the first matching server wins for the variables prefixed by both
+    server_names = ["app_b", "app"] + [f"www-{i}.example.com" for i in range(services - 2)]
+    variables = {"MULTISITE": "yes", "SERVER_NAME": " ".join(server_names), "USE_REVERSE_PROXY": "no", "HTTP_PORT": "8080", "NOT_A_SETTING": "yes"}
+    for i, server_name in enumerate(server_names):
+        variables[f"{server_name}_USE_REVERSE_PROXY"] = "yes" if i % 3 else "maybe"
+        variables[f"{server_name}_REVERSE_PROXY_HOST"] = f"http://backend-{i}:8080"
+        variables[f"{server_name}_REVERSE_PROXY_URL"] = "/"
+        variables[f"{server_name}_REVERSE_PROXY_URL_{i % 5}"] = f"/api-{i}"
+        variables[f"{server_name}_REVERSE_PROXY_URL_X"] = "/invalid"
+        variables[f"{server_name}_HTTP_PORT"] = "8080"
+        variables[f"{server_name}_UNKNOWN_SETTING_{i}"] = "yes"
+    variables["app_b_SERVER_NAME"] = "app_b"
+    variables["unknown.example.com_USE_REVERSE_PROXY"] = "yes"
+    return variables
+
+
+def legacy_find_var(configurator: Configurator, variable: str):
+    targets = [
+        configurator.get_settings(),
+        configurator.get_plugins_settings("core"),
+        configurator.get_plugins_settings("external"),
+        configurator.get_plugins_settings("pro"),
+    ]
+    for target in targets:
+        if variable in target:
+            return target, variable
+        for real_var, settings in target.items():
+            if "multiple" in settings and re_search(f"^{real_var}_[0-9]+$", variable):
+                return target, real_var
+    return None, variable
+
+
+def legacy_check_var(configurator: Configurator, servers: dict, variables: dict, variable: str) -> tuple:
+    """The former Configurator.__check_var with MULTISITE=yes."""
+    value = variables[variable]
+    prefixed, real_var = False, variable
+    for server in servers:
+        if variable.startswith(f"{server}_"):
+            prefixed, real_var = True, variable.replace(f"{server}_", "", 1)
+            break
+    where, real_var = legacy_find_var(configurator, real_var)
+    if not where:
+        return False, f"variable name {variable} doesn't exist"
+    elif prefixed and where[real_var]["context"] != "multisite":
+        return False, f"context of {variable} isn't multisite"
+
+    try:
+        if re_search(where[real_var]["regex"], value) is None:
+            return (False, f"value {value} doesn't match regex {where[real_var]['regex']}")
+    except RegexError:
+        pass
+    return True, "ok"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the validation of the variables by the Configurator")
+    parser.add_argument("--services", type=int, default=2000, help="number of synthetic services (default: 2000)")
+    parser.add_argument("--settings", default=join(sep, "usr", "share", "bunkerweb", "settings.json"), help="file containing the main settings")
+    parser.add_argument("--core", default=join(sep, "usr", "share", "bunkerweb", "core"), help="directory containing the core plugins")
+    args = parser.parse_args()
+
+    variables = build_variables(args.services)
+    configurator = Configurator(args.settings, args.core, [], [], variables, LOGGER)
+    servers = configurator._Configurator__servers
+    check_var = configurator._Configurator__check_var
+
+    start = perf_counter()
+    legacy = {variable: legacy_check_var(configurator, servers, variables, variable) for variable in variables}
+    legacy_time = perf_counter() - start
+
+    start = perf_counter()
+    indexed = {variable: check_var(variable) for variable in variables}
+    indexed_time = perf_counter() - start
+
+    accepted = sum(ret for ret, _ in indexed.values())
+    print(f"{len(variables)} variables for {len(servers)} services, {accepted} accepted and {len(variables) - accepted} rejected")
+    print(f"legacy resolution : {legacy_time * 1000:9.1f} ms")
+    print(f"resolution index  : {indexed_time * 1000:9.1f} ms")
+
+    differences = [variable for variable in variables if legacy[variable] != indexed[variable]]
+    assert not differences, f"{len(differences)} variables are validated differently, e.g. {differences[:5]}"
+    assert indexed["app_b_SERVER_NAME"][0] and indexed["app_USE_REVERSE_PROXY"][0] and not indexed["NOT_A_SETTING"][0]
+
+    start = perf_counter()
+    config = configurator.get_config()
+    print(f"get_config        : {(perf_counter() - start) * 1000:9.1f} ms ({len(config)} settings)")
+
+    sys_exit(0)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# Measure the CPU time spent by one generate_external_plugins cycle of the scheduler on 50 synthetic external plugins, when the plugins are compared by
+# archiving them again (no manifest in the database, like before) and when they are compared with their manifest, with and without a changed plugin.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 benchmark_external_plugins.py
+
+from argparse import ArgumentParser
+from io import BytesIO
+from json import dumps
+from os.path import join, sep
+from pathlib import Path
+from random import randbytes
+from sys import exit as sys_exit, path as sys_path
+from tarfile import open as tar_open
+from tempfile import TemporaryDirectory
+from time import process_time
+from types import SimpleNamespace
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",), ("api",), ("scheduler",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import insert, update  # noqa: E402
+
+import main as scheduler  # type: ignore # noqa: E402
+from common_utils import add_dir_to_tar_safely, bytes_hash  # type: ignore # noqa: E402
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Plugins  # type: ignore # noqa: E402
+
+LOGGER = getLogger("BENCHMARK-EXTERNAL-PLUGINS")
+
+
+def build_plugin(path: Path, plugin_id: str, files: int, file_size: int):
+    path.joinpath("jobs").mkdir(parents=True)
+    path.joinpath("ui", "templates").mkdir(parents=True)
+    path.joinpath("plugin.json").write_text(
+        dumps({"id": plugin_id, "name": plugin_id, "description": "Benchmark", "version": "1.0", "stream": "no", "settings": {}})
+    )
+    path.joinpath(f"{plugin_id}.lua").write_bytes(b"-- " + randbytes(file_size).hex().encode())
+    path.joinpath("jobs", f"{plugin_id}-job.py").write_text("#!/usr/bin/env python3\n")
+    for i in range(files):
+        path.joinpath("ui", "templates", f"page-{i}.html").write_bytes(randbytes(file_size // 2).hex().encode())
+
+
+def store_plugins(db: Database, plugins_path: Path):
+    """Save the plugins in the database the way check_plugin_changes does, without any manifest."""
+    rows = []
+    for plugin_path in sorted(plugins_path.iterdir()):
+        with BytesIO() as plugin_content:
+            with tar_open(fileobj=plugin_content, mode="w:gz", compresslevel=9) as tar:
+                add_dir_to_tar_safely(tar, plugin_path, arc_root=plugin_path.name)
+            data = plugin_content.getvalue()
+        rows.append(
+            {
+                "id": plugin_path.name,
+                "name": plugin_path.name,
+                "description": "Benchmark",
+                "version": "1.0",
+                "stream": "no",
+                "type": "external",
+                "method": "manual",
+                "data": data,
+                "checksum": bytes_hash(data, algorithm="sha256"),
+            }
+        )
+    with db.sql_engine.begin() as conn:
+        conn.execute(insert(Plugins), rows)
+
+
+def cycle(db: Database, plugins_path: Path, *, manifests: bool) -> float:
+    if not manifests:
+        with db.sql_engine.begin() as conn:
+            conn.execute(update(Plugins).values(manifest=None))
+    start = process_time()
+    scheduler.generate_external_plugins(plugins_path, send=False)
+    return process_time() - start
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the detection of the external plugins changes of the scheduler")
+    parser.add_argument("--plugins", type=int, default=50, help="number of synthetic plugins (default: 50)")
+    parser.add_argument("--files", type=int, default=20, help="number of UI templates per plugin (default: 20)")
+    parser.add_argument("--file-size", type=int, default=16384, help="size in bytes of the random content of each file (default: 16384)")
+    parser.add_argument("--cycles", type=int, default=5, help="number of measured cycles (default: 5)")
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="bw-external-plugins-benchmark-") as tmp_dir:
+        plugins_path = Path(tmp_dir, "plugins")
+        for i in range(args.plugins):
+            build_plugin(plugins_path.joinpath(f"plugin-{i}"), f"plugin-{i}", args.files, args.file_size)
+
+        db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{Path(tmp_dir, 'db.sqlite3').as_posix()}", log=False)
+        Base.metadata.create_all(db.sql_engine)
+        store_plugins(db, plugins_path)
+        scheduler.SCHEDULER = SimpleNamespace(db=db, apis=[])
+
+        # The first cycle extracts the plugins from the database and saves their manifests
+        cycle(db, plugins_path, manifests=True)
+        changed_file = plugins_path.joinpath("plugin-0", "plugin-0.lua")
+
+        results = {}
+        for name, manifests, change in (
+            ("archives, no change", False, False),
+            ("manifests, no change", True, False),
+            ("archives, 1 changed", False, True),
+            ("manifests, 1 changed", True, True),
+        ):
+            times = []
+            for _ in range(args.cycles):
+                if change:
+                    # ? The changed plugin is restored from the database by the cycle
+                    changed_file.write_bytes(b"-- changed\n")
+                times.append(cycle(db, plugins_path, manifests=manifests))
+            results[name] = sum(times) / len(times)
+            print(f"{name:<22}: {results[name] * 1000:8.1f} ms of CPU per cycle")
+
+        assert changed_file.read_bytes() != b"-- changed\n", "The changed plugin was not restored from the database"
+
+    sys_exit(0)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# Compare the former failover backup of the scheduler (copy of the configuration then a gzipped archive saved in the jobs cache) with the failover snapshot
+# store on a synthetic tree of 5000 files : snapshot time, disk usage, bytes written to the database and restore latency.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 benchmark_failover.py
+
+from argparse import ArgumentParser
+from io import BytesIO
+from os import walk
+from os.path import join, sep
+from pathlib import Path
+from random import randbytes
+from shutil import copytree, rmtree
+from sys import exit as sys_exit, path as sys_path
+from tarfile import open as tar_open
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",), ("scheduler",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import func, select  # noqa: E402
+
+from Database import Database  # type: ignore # noqa: E402
+from FailoverStore import FailoverStore  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Failover_objects  # type: ignore # noqa: E402
+
+LOGGER = getLogger("BENCHMARK-FAILOVER")
+
+SOURCES = ("config", "custom_configs", "cache")
+
+
+def build_tree(path: Path, files: int, file_size: int) -> dict:
+    sources = {name: path.joinpath(name) for name in SOURCES}
+    for i in range(files):
+        directory = sources[SOURCES[i % len(SOURCES)]].joinpath(f"service-{i % 100}")
+        directory.mkdir(parents=True, exist_ok=True)
+        directory.joinpath(f"file-{i}.conf").write_bytes(randbytes(file_size // 2).hex().encode())
+    return sources
+
+
+def change_files(sources: dict, changes: int, generation: int):
+    changed = 0
+    for root, _, files in walk(sources["config"]):
+        for file in files:
+            if changed == changes:
+                return
+            Path(root, file).write_bytes(f"# generation {generation}\n".encode() + randbytes(64).hex().encode())
+            changed += 1
+
+
+def disk_usage(*paths: Path) -> int:
+    """Size on disk of the files under the paths, hard links are only counted once."""
+    seen, total = set(), 0
+    for path in paths:
+        for root, _, files in walk(path):
+            for file in files:
+                file_stat = Path(root, file).stat()
+                if (file_stat.st_dev, file_stat.st_ino) not in seen:
+                    seen.add((file_stat.st_dev, file_stat.st_ino))
+                    total += file_stat.st_blocks * 512
+    return total
+
+
+def legacy_backup(sources: dict, failover_path: Path) -> bytes:
+    """The former backup_failover : copy everything then archive the copy for the jobs cache."""
+    rmtree(failover_path, ignore_errors=True)
+    failover_path.mkdir(parents=True)
+    for name, source in sources.items():
+        copytree(source, failover_path.joinpath(name), dirs_exist_ok=True)
+    content = BytesIO()
+    with tar_open(mode="w:gz", fileobj=content, compresslevel=9) as tgz:
+        tgz.add(failover_path, arcname=".")
+    return content.getvalue()
+
+
+def legacy_restore(data: bytes, failover_path: Path):
+    rmtree(failover_path, ignore_errors=True)
+    failover_path.mkdir(parents=True)
+    with tar_open(fileobj=BytesIO(data), mode="r:gz") as tar:
+        tar.extractall(failover_path)
+
+
+def timed(callback) -> tuple:
+    start = perf_counter()
+    result = callback()
+    return perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the failover backups of the scheduler")
+    parser.add_argument("--files", type=int, default=5000, help="number of files in the configuration tree (default: 5000)")
+    parser.add_argument("--file-size", type=int, default=4096, help="size in bytes of each file (default: 4096)")
+    parser.add_argument("--changes", type=int, default=50, help="number of files changed between two snapshots (default: 50)")
+    args = parser.parse_args()
+
+    with TemporaryDirectory(prefix="bw-failover-benchmark-") as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        sources = build_tree(tmp_path.joinpath("sources"), args.files, args.file_size)
+
+        legacy_path = tmp_path.joinpath("legacy", "failover")
+        legacy_time, legacy_data = timed(lambda: legacy_backup(sources, legacy_path))
+        print(
+            f"{'legacy backup':<28}: {legacy_time * 1000:8.1f} ms, {disk_usage(legacy_path) / 1024:9.0f} KiB on disk, "
+            f"{len(legacy_data) / 1024:9.0f} KiB written to the database"
+        )
+
+        db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{tmp_path.joinpath('db.sqlite3').as_posix()}", log=False)
+        Base.metadata.create_all(db.sql_engine)
+        failover_path = tmp_path.joinpath("store", "failover")
+        store = FailoverStore(failover_path, tmp_path.joinpath("store", "failover-store"), db, LOGGER)
+
+        def stored_sizes() -> dict:
+            """Compressed size of each file stored in the database."""
+            with db.sql_engine.connect() as conn:
+                return dict(conn.execute(select(Failover_objects.checksum, func.length(Failover_objects.data))).all())
+
+        for name, change in (("snapshot, first", False), ("snapshot, unchanged", False), (f"snapshot, {args.changes} changed", True)):
+            if change:
+                change_files(sources, args.changes, 2)
+            stored = stored_sizes()
+            elapsed, success = timed(lambda: store.snapshot(sources))
+            assert success, "The snapshot couldn't be saved"
+            print(
+                f"{name:<28}: {elapsed * 1000:8.1f} ms, {disk_usage(store.store_path) / 1024:9.0f} KiB on disk, "
+                f"{sum(size for checksum, size in stored_sizes().items() if checksum not in stored) / 1024:9.0f} KiB written to the database"
+            )
+
+        current = store.current_generation()
+        assert current and sorted(path.name for path in failover_path.iterdir() if not path.name.startswith(".")) == sorted(SOURCES)
+        changed_file = next(failover_path.joinpath("config").rglob("*.conf"))
+        assert changed_file.read_bytes() == sources["config"].joinpath(changed_file.relative_to(failover_path.joinpath("config"))).read_bytes()
+
+        elapsed, _ = timed(lambda: legacy_restore(legacy_data, legacy_path))
+        print(f"{'legacy restore (extract)':<28}: {elapsed * 1000:8.1f} ms")
+
+        # The failover path points to an older generation, restoring switches it back to the last one
+        previous = sorted(path for path in store.generations_path.iterdir() if path != current)[-1]
+        store._switch_to(previous)
+        elapsed, success = timed(store.restore)
+        assert success and store.current_generation() == current
+        print(f"{'restore, local generation':<28}: {elapsed * 1000:8.1f} ms")
+
+        # Nothing left locally, like a new scheduler container : the files are fetched from the database
+        failover_path.unlink()
+        rmtree(store.store_path)
+        elapsed, success = timed(store.restore)
+        assert success and changed_file.read_bytes() == sources["config"].joinpath(changed_file.relative_to(failover_path.joinpath("config"))).read_bytes()
+        print(f"{'restore, from the database':<28}: {elapsed * 1000:8.1f} ms")
+
+    sys_exit(0)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# Emulate ten BunkerWeb instances with local HTTP servers answering slowly to the health requests, all of them restarting at once (loading), then run the
+# healthcheck job of the scheduler and check that the round takes about as long as the slowest instance, that the configuration is only generated once
+# for the ten of them and that each archive is built once and sent to every instance.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_healthcheck.py (or with pytest)
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from os.path import join, sep
+from pathlib import Path
+from socket import socket
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",), ("api",), ("scheduler",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from sqlalchemy import insert  # noqa: E402
+
+import main as scheduler  # type: ignore # noqa: E402
+from ApiCaller import ApiCaller  # type: ignore # noqa: E402
+from Database import Database  # type: ignore # noqa: E402
+from logger import getLogger  # type: ignore # noqa: E402
+from model import Base, Instances, Metadata, Plugins, Settings  # type: ignore # noqa: E402
+
+LOGGER = getLogger("TEST-HEALTHCHECK")
+
+INSTANCES = 10
+HEALTH_DELAY = 0.3
+ARCHIVES = ("/custom_configs", "/plugins", "/pro_plugins", "/confs", "/cache")
+
+
+class StubInstance(ThreadingHTTPServer):
+    """A BunkerWeb API answering "loading" to the health requests until it is reloaded."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple):
+        super().__init__(address, StubHandler)
+        self.loading = True
+        self.uploads = []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, data: dict):
+        body = dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        sleep(HEALTH_DELAY)
+        self.reply({"status": "success", "msg": "loading" if self.server.loading else "ok"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?", 1)[0]
+        if path == "/reload":
+            self.server.loading = False
+        else:
+            self.server.uploads.append(path)
+        self.reply({"status": "success", "msg": "ok"})
+
+
+def free_port() -> int:
+    with socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_healthcheck_round():
+    with TemporaryDirectory(prefix="bw-healthcheck-") as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        db = Database(LOGGER, sqlalchemy_string=f"sqlite:///{tmp_path.joinpath('db.sqlite3').as_posix()}", log=False)
+        Base.metadata.create_all(db.sql_engine)
+
+        # ? Each instance listens on its own loopback address so that the responses are told apart by hostname like in a real deployment
+        port = free_port()
+        hosts = [f"127.0.0.{i + 2}" for i in range(INSTANCES)]
+        stubs = [StubInstance((host, port)) for host in hosts]
+        threads = [Thread(target=stub.serve_forever, daemon=True) for stub in stubs]
+        for thread in threads:
+            thread.start()
+
+        current_time = datetime.now().astimezone()
+        with db.sql_engine.begin() as conn:
+            conn.execute(insert(Metadata).values(id=1, is_initialized=True, first_config_saved=True, apply_generation=3))
+            conn.execute(insert(Plugins).values(id="general", name="General", description="General", version="0.1", stream="no"))
+            setting = {"plugin_id": "general", "help": "Test", "regex": "^.*$", "type": "text", "multiple": None}
+            conn.execute(
+                insert(Settings),
+                [
+                    setting | {"id": "SERVER_NAME", "name": "Server name", "context": "multisite", "default": "www.example.com", "order": 0},
+                    setting | {"id": "MULTISITE", "name": "Multisite", "context": "global", "default": "no", "order": 1},
+                ],
+            )
+            conn.execute(
+                insert(Instances),
+                [
+                    {"hostname": host, "port": port, "server_name": "bwapi", "status": "up", "creation_date": current_time, "last_seen": current_time}
+                    for host in hosts
+                ],
+            )
+
+        for name in ("CONFIG_PATH", "CUSTOM_CONFIGS_PATH", "EXTERNAL_PLUGINS_PATH", "PRO_PLUGINS_PATH", "CACHE_PATH"):
+            path = tmp_path.joinpath(name.lower())
+            path.mkdir()
+            path.joinpath("file.conf").write_text(f"# {name}\n")
+            setattr(scheduler, name, path)
+
+        generations = []
+        lock = Lock()
+        archives = []
+        original_send_files = ApiCaller.send_files
+
+        def generate_configs(logger=None):
+            generations.append(perf_counter())
+            scheduler.CONFIG_PATH.joinpath("nginx.conf").write_text("# generated\n")
+            return True
+
+        def send_files(self, path, url, *args, **kwargs):
+            with lock:
+                archives.append(url)
+            return original_send_files(self, path, url, *args, **kwargs)
+
+        original_generate_configs = scheduler.generate_configs
+        scheduler.generate_configs = generate_configs
+        ApiCaller.send_files = send_files
+        scheduler.SCHEDULER = SimpleNamespace(db=db, apis=[])
+        try:
+            start = perf_counter()
+            scheduler.healthcheck_job()
+            elapsed = perf_counter() - start
+
+            print(f"healthcheck round with {INSTANCES} loading instances: {elapsed:.2f}s, {len(generations)} generator run, {len(archives)} archives built")
+            assert len(generations) == 1, f"The configuration was generated {len(generations)} times"
+            assert sorted(archives) == sorted(ARCHIVES), f"The archives were built {len(archives)} times"
+            # ? Sequential health requests alone would take INSTANCES * HEALTH_DELAY
+            assert elapsed < INSTANCES * HEALTH_DELAY / 2, f"The healthcheck round took {elapsed:.2f}s"
+            for stub in stubs:
+                assert not stub.loading and sorted(stub.uploads) == sorted(ARCHIVES)
+            assert {instance["hostname"] for instance in db.get_instances() if instance["status"] == "up"} == set(hosts)
+            assert len(scheduler.SCHEDULER.apis) == INSTANCES
+
+            # A second round with the same configuration version doesn't generate it again when an instance restarts
+            stubs[0].loading = True
+            scheduler.healthcheck_job()
+            assert len(generations) == 1 and not stubs[0].loading
+            assert len(stubs[0].uploads) == 2 * len(ARCHIVES) and len(stubs[1].uploads) == len(ARCHIVES)
+        finally:
+            scheduler.generate_configs = original_generate_configs
+            ApiCaller.send_files = original_send_files
+            for stub in stubs:
+                stub.shutdown()
+                stub.server_close()
+
+
+if __name__ == "__main__":
+    test_healthcheck_round()
+    LOGGER.info("Healthcheck rounds probe the instances concurrently and share the generated configuration")
+    sys_exit(0)
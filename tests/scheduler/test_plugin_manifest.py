@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Build the manifest of a synthetic external plugin and check which changes make the scheduler push it again : the content and the permissions of its
+# files count, their modification times don't, and the manifests saved before the permissions were recorded are considered as changed once.
+# Run it where BunkerWeb is installed (e.g. in the scheduler container) : python3 test_plugin_manifest.py (or with pytest)
+
+from os import utime
+from os.path import join, sep
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from common_utils import plugin_manifest, plugin_manifest_changed  # type: ignore # noqa: E402
+
+
+def build_plugin(path: Path) -> Path:
+    path.joinpath("jobs").mkdir(parents=True)
+    path.joinpath("plugin.json").write_text('{"id": "test", "name": "Test", "version": "1.0"}')
+    job = path.joinpath("jobs", "test-job.py")
+    job.write_text("#!/usr/bin/env python3\n")
+    job.chmod(0o644)
+    return job
+
+
+def test_plugin_manifest_changes():
+    with TemporaryDirectory(prefix="bw-plugin-manifest-") as tmp_dir:
+        plugin_path = Path(tmp_dir, "test")
+        job = build_plugin(plugin_path)
+        manifest = plugin_manifest(plugin_path)
+        assert set(manifest) == {"jobs", "jobs/test-job.py", "plugin.json"}, manifest
+
+        # Touching a file doesn't change the plugin
+        utime(job, ns=(0, 1_000_000_000))
+        files = plugin_manifest(plugin_path, manifest)
+        assert files != manifest and not plugin_manifest_changed(files, manifest)
+
+        # Making the job executable does
+        job.chmod(0o755)
+        files = plugin_manifest(plugin_path, manifest)
+        assert files["jobs/test-job.py"][3] == 0o755 and plugin_manifest_changed(files, manifest)
+        manifest = files
+
+        # So does a new content of the same size
+        job.write_text("#!/usr/bin/env python3\n".upper())
+        assert plugin_manifest_changed(plugin_manifest(plugin_path, manifest), manifest)
+
+        # Manifests without the permissions are considered as changed
+        legacy = {path: entry[:3] if isinstance(entry, list) else None for path, entry in manifest.items()}
+        assert plugin_manifest_changed(manifest, legacy)
+
+
+if __name__ == "__main__":
+    test_plugin_manifest_changes()
+    print("Plugin manifests changes detected successfully")
+    sys_exit(0)
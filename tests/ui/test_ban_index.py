@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+
+# Fill a local fake redis with bans and list them like the bans page does : first with the former listing (scan of every ban key then a get and a ttl for
+# each of them, filtered and sorted in Python), then with the bans index (range queries on its sorted sets), and compare the per-page latency.
+# The pages and the search panes counts of the index are checked against the same bans listed by the in-memory fallback of the UI, the IP searches use
+# the IP index and the other searches only read the most recent bans. The suite lists 10,000 bans, set BENCHMARK=yes to list 100,000 of them.
+# Run it from the repository or where BunkerWeb is installed : python3 test_ban_index.py (or with pytest)
+
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
+from functools import wraps
+from json import dumps
+from math import ceil, isnan
+from os import getenv
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from time import perf_counter
+
+for ui_path in (Path(__file__).parents[2].joinpath("src", "ui"), Path("/usr/share/bunkerweb/ui")):
+    if ui_path.joinpath("app", "models", "ban_index.py").is_file():
+        sys_path.insert(0, ui_path.as_posix())
+        break
+
+from app.models.ban_index import (  # type: ignore # noqa: E402
+    BANS_INDEX_VERSION,
+    BanQuery,
+    MemoryBanIndex,
+    RedisBanIndex,
+    is_ip_search,
+    load_ban,
+    matches_panes,
+    matches_search,
+    paginate,
+    sort_bans,
+)
+
+BENCHMARK = getenv("BENCHMARK", "no") == "yes"
+BANS = 100_000 if BENCHMARK else 10_000
+NOW = 1_750_000_000
+SERVICES = [f"app{i}.example.com" for i in range(20)]
+COUNTRIES = ["FR", "US", "DE", "CN", "BR", "local"]
+
+
+def parse_score(value) -> float:
+    return float(value.decode() if isinstance(value, bytes) else value)
+
+
+def parse_bound(value, minimum: bool):
+    value = str(value)
+    exclusive = value.startswith("(")
+    return parse_score(value[1:] if exclusive else value), exclusive
+
+
+class FakeZSet:
+    def __init__(self):
+        self.scores = {}
+        self.__sorted = None
+
+    def items(self) -> list:
+        if self.__sorted is None:
+            self.__sorted = sorted((score, member) for member, score in self.scores.items())
+            self.__keys = [score for score, _ in self.__sorted]
+        return self.__sorted
+
+    def invalidate(self):
+        self.__sorted = None
+
+    def range_by_score(self, minimum, maximum) -> list:
+        items = self.items()
+        low, low_exclusive = parse_bound(minimum, True)
+        high, high_exclusive = parse_bound(maximum, False)
+        start = bisect_right(self.__keys, low) if low_exclusive else bisect_left(self.__keys, low)
+        stop = bisect_left(self.__keys, high) if high_exclusive else bisect_right(self.__keys, high)
+        return items[start:stop]
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self) -> list:
+        """The queued commands are sent in a single round trip."""
+        calls, self.calls = self.calls, []
+        round_trips = self.redis.calls
+        results = [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in calls]
+        self.redis.calls = round_trips + 1
+        return results
+
+
+def count_round_trips(cls):
+    """Each command of the fake client counts as a round trip."""
+
+    def counted(method):
+        @wraps(method)
+        def command(self, *args, **kwargs):
+            self.calls += 1
+            return method(self, *args, **kwargs)
+
+        return command
+
+    for name, method in list(vars(cls).items()):
+        if callable(method) and not name.startswith("_") and name not in ("pipeline", "zset"):
+            setattr(cls, name, counted(method))
+    return cls
+
+
+@count_round_trips
+class FakeRedis:
+    """The subset of the redis-py client used by the bans listing, with a manual clock for the expirations and a count of the round trips."""
+
+    def __init__(self, clock: float):
+        self.clock = clock
+        self.data = {}
+        self.expires = {}
+        self.calls = 0
+
+    def __alive(self, name: str) -> bool:
+        if name in self.expires and self.expires[name] <= self.clock:
+            self.data.pop(name, None)
+            del self.expires[name]
+        return name in self.data
+
+    def zset(self, name: str, create: bool = False):
+        if not self.__alive(name):
+            if not create:
+                return None
+            self.data[name] = FakeZSet()
+        return self.data[name]
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+    # Strings and keys
+    def set(self, name, value, ex=None):
+        self.data[name] = value.encode() if isinstance(value, str) else value
+        self.expires.pop(name, None)
+        if ex:
+            self.expires[name] = self.clock + ex
+        return True
+
+    def get(self, name):
+        return self.data[name] if self.__alive(name) else None
+
+    def ttl(self, name) -> int:
+        if not self.__alive(name):
+            return -2
+        return ceil(self.expires[name] - self.clock) if name in self.expires else -1
+
+    def expire(self, name, seconds) -> bool:
+        if not self.__alive(name):
+            return False
+        self.expires[name] = self.clock + seconds
+        return True
+
+    def exists(self, *names) -> int:
+        return sum(self.__alive(name) for name in names)
+
+    def delete(self, *names) -> int:
+        deleted = 0
+        for name in names:
+            deleted += self.__alive(name)
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return deleted
+
+    def scan_iter(self, match="*", count=None):
+        for name in list(self.data):
+            if fnmatchcase(name, match) and self.__alive(name):
+                yield name.encode()
+
+    # Sets
+    def sadd(self, name, *values) -> int:
+        members = self.data.setdefault(name, set())
+        added = len(set(values) - members)
+        members.update(values)
+        return added
+
+    def smembers(self, name) -> set:
+        return {member.encode() for member in self.data.get(name, set())}
+
+    # Sorted sets
+    def zadd(self, name, mapping) -> int:
+        zset = self.zset(name, True)
+        added = sum(member not in zset.scores for member in mapping)
+        zset.scores.update({member: parse_score(score) for member, score in mapping.items()})
+        zset.invalidate()
+        return added
+
+    def zrem(self, name, *members) -> int:
+        zset = self.zset(name)
+        if not zset:
+            return 0
+        removed = sum(zset.scores.pop(member, None) is not None for member in members)
+        zset.invalidate()
+        return removed
+
+    def zcard(self, name) -> int:
+        zset = self.zset(name)
+        return len(zset.scores) if zset else 0
+
+    def zcount(self, name, minimum, maximum) -> int:
+        zset = self.zset(name)
+        return len(zset.range_by_score(minimum, maximum)) if zset else 0
+
+    def zrange(self, name, start, end, desc=False) -> list:
+        zset = self.zset(name)
+        if not zset:
+            return []
+        items = zset.items()[::-1] if desc else zset.items()
+        end = len(items) + end if end < 0 else end
+        return [member.encode() for _, member in items[start : end + 1]]  # noqa: E203
+
+    def zrangebylex(self, name, minimum, maximum) -> list:
+        zset = self.zset(name)
+        if not zset:
+            return []
+        members = [member for _, member in zset.items()]
+        start = bisect_left(members, minimum[1:]) if minimum.startswith("[") else bisect_right(members, minimum[1:])
+        stop = bisect_right(members, maximum[1:]) if maximum.startswith("[") else bisect_left(members, maximum[1:])
+        return [member.encode() for member in members[start:stop]]
+
+    def zrangebyscore(self, name, minimum, maximum, start=None, num=None) -> list:
+        zset = self.zset(name)
+        items = zset.range_by_score(minimum, maximum) if zset else []
+        if start is not None:
+            items = items[start : start + num]  # noqa: E203
+        return [member.encode() for _, member in items]
+
+    def zrevrangebyscore(self, name, maximum, minimum, start=None, num=None) -> list:
+        zset = self.zset(name)
+        items = zset.range_by_score(minimum, maximum)[::-1] if zset else []
+        if start is not None:
+            items = items[start : start + num]  # noqa: E203
+        return [member.encode() for _, member in items]
+
+    def zremrangebyscore(self, name, minimum, maximum) -> int:
+        zset = self.zset(name)
+        if not zset:
+            return 0
+        items = zset.range_by_score(minimum, maximum)
+        for _, member in items:
+            del zset.scores[member]
+        zset.invalidate()
+        return len(items)
+
+    def __store(self, dest, keys, aggregate, intersect: bool) -> int:
+        weights = keys if isinstance(keys, dict) else {key: 1 for key in keys}
+        sources = [(zset.scores if zset else {}, weight) for zset, weight in ((self.zset(key), weight) for key, weight in weights.items())]
+        if intersect:
+            # ? Like redis, the smallest set is iterated and its members are looked up in the other ones
+            smallest = min((scores for scores, _ in sources), key=len)
+            members = [member for member in smallest if all(member in scores for scores, _ in sources)]
+        else:
+            members = {member for scores, _ in sources for member in scores}
+
+        result = {}
+        for member in members:
+            values = [0.0 if isnan(scores[member] * weight) else scores[member] * weight for scores, weight in sources if member in scores]
+            result[member] = max(values) if aggregate == "MAX" else sum(values)
+        self.delete(dest)
+        if result:
+            self.zset(dest, True).scores.update(result)
+        return len(result)
+
+    def zunionstore(self, dest, keys, aggregate=None) -> int:
+        return self.__store(dest, keys, aggregate, False)
+
+    def zinterstore(self, dest, keys, aggregate=None) -> int:
+        return self.__store(dest, keys, aggregate, True)
+
+
+def build_bans(count: int) -> list:
+    """Unique dates and expirations so that every ordering is deterministic, permanent bans apart."""
+    bans = []
+    for i in range(count):
+        scope = "service" if i % 3 else "global"
+        bans.append(
+            {
+                "ip": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                "date": NOW - 1 - i * 53,
+                "exp": 0 if i % 10 == 0 else 100 + i * 31,
+                "reason": ("bad behavior", "antibot", "ui", "dnsbl")[i % 4],
+                "service": SERVICES[i % len(SERVICES)] if scope == "service" else "unknown",
+                "country": COUNTRIES[i % len(COUNTRIES)],
+                "ban_scope": scope,
+            }
+        )
+    return bans
+
+
+def fill_redis(redis: FakeRedis, bans: list):
+    for ban in bans:
+        key = f"bans_service_{ban['service']}_ip_{ban['ip']}" if ban["ban_scope"] == "service" else f"bans_ip_{ban['ip']}"
+        data = {k: ban[k] for k in ("reason", "service", "date", "country", "ban_scope")} | {"reason_data": {}, "permanent": ban["exp"] == 0}
+        redis.set(key, dumps(data), ex=ban["exp"] or None)
+
+
+def legacy_query(redis: FakeRedis, query: BanQuery) -> list:
+    """The former listing : every ban key is scanned and read before filtering, sorting and paginating."""
+    bans = []
+    for pattern in ("bans_ip_*", "bans_service_*_ip_*"):
+        for key in redis.scan_iter(pattern):
+            key = key.decode()
+            data = redis.get(key)
+            if data:
+                bans.append(load_ban(key, data, redis.ttl(key)))
+    bans = [ban for ban in bans if matches_panes(ban, query.panes, redis.clock) and (not query.search or matches_search(ban, query.search))]
+    sort_bans(bans, query.order, query.direction)
+    return paginate(bans, query.start, query.length)
+
+
+def page_ids(bans) -> list:
+    # ? Permanent bans share the same expiration, their relative order isn't significant when sorting on it
+    return [("permanent" if ban["permanent"] else ban["ip"], ban["ban_scope"], ban.get("service")) for ban in bans]
+
+
+def export_ids(bans) -> tuple:
+    """The ordered bans with the permanent ones apart, as a set, like page_ids."""
+    bans = list(bans)
+    permanent = {(ban["ip"], ban["ban_scope"], ban.get("service")) for ban in bans if ban["permanent"]}
+    return page_ids(ban for ban in bans if not ban["permanent"]), permanent, len(bans)
+
+
+QUERIES = {
+    "first page, newest first": BanQuery(),
+    "page 500, oldest first": BanQuery(start=5000, order="date", direction="asc"),
+    "last page, expiring last": BanQuery(start=BANS - 10, order="end_date", direction="desc"),
+    "page 100, expiring first": BanQuery(start=1000, order="time_left", direction="asc"),
+    "service and country panes": BanQuery(panes={"service": SERVICES[:3], "country": ["FR"]}),
+    "scope and date panes": BanQuery(start=20, panes={"scope": ["global"], "date": ["last_7d", "older_30d"]}),
+    "end date pane": BanQuery(order="end_date", direction="desc", panes={"end_date": ["next_7d", "future_30d"]}),
+    "search on the ip": BanQuery(search="10.0.2."),
+    "search on the reason": BanQuery(search="antibot", panes={"country": ["FR"]}),
+    "sorted on the reason": BanQuery(order="reason", direction="asc", panes={"country": ["US"]}),
+}
+
+
+def test_ban_index(bans_count: int = BANS, verbose: bool = False):
+    bans = build_bans(bans_count)
+    redis = FakeRedis(NOW - 1000)
+    fill_redis(redis, bans)
+    redis.clock = NOW  # The bans expiring within 1000 seconds are gone but they are still in the index once built
+
+    index = RedisBanIndex(redis)
+    start = perf_counter()
+    index.ensure(NOW)
+    rebuild_time = perf_counter() - start
+    assert redis.exists(BANS_INDEX_VERSION)
+
+    alive = [ban for ban in bans if ban["exp"] == 0 or ban["exp"] > 1000]
+    memory = MemoryBanIndex(lambda: [ban | {"exp": ban["exp"] - 1000 if ban["exp"] else 0} for ban in alive])
+    if verbose:
+        print(f"{bans_count} bans ({len(alive)} still active), bans index built in {rebuild_time * 1000:.0f} ms")
+        print(f"{'query':<28} {'legacy':>10} {'index':>10} {'round trips':>12}")
+
+    for i, (name, query) in enumerate(QUERIES.items()):
+        # ? The former listing reads every ban on each query, it is only compared on the first one unless benchmarking
+        start = perf_counter()
+        legacy = legacy_query(redis, query) if BENCHMARK or not i else None
+        legacy_time = perf_counter() - start
+
+        redis.calls = 0
+        start = perf_counter()
+        page = index.query(query, now=NOW)
+        index_time = perf_counter() - start
+
+        expected = memory.query(query, now=NOW)
+        assert page.total == expected.total == len(alive), name
+        assert page.filtered == expected.filtered, name
+        assert page_ids(page.bans) == page_ids(expected.bans), name
+        assert legacy is None or page_ids(page.bans) == page_ids(legacy), name
+        assert page.panes == expected.panes, name
+        if verbose:
+            legacy_column = f"{legacy_time * 1000:8.1f}ms" if legacy is not None else f"{'-':>10}"
+            print(f"{name:<28} {legacy_column} {index_time * 1000:8.1f}ms {redis.calls:12d}")
+
+    # The exports iterate over all the bans matching the query, page by page
+    for name in ("last page, expiring last", "end date pane", "search on the ip", "sorted on the reason"):
+        query = QUERIES[name]
+        assert export_ids(index.iter_bans(query, now=NOW)) == export_ids(memory.iter_bans(query, now=NOW)), name
+
+    # The pages which don't need a free-text search are answered with range queries only, without reading every ban
+    redis.calls = 0
+    start = perf_counter()
+    index.query(BanQuery(start=BANS // 2, length=10), now=NOW)
+    assert perf_counter() - start < 0.1 and redis.calls < 30
+
+    # So are the searches on the start of an IP
+    assert is_ip_search("10.0.2.") and is_ip_search("2001:db8:") and not is_ip_search("antibot") and not is_ip_search("2025")
+    loaded = []
+    load = RedisBanIndex._RedisBanIndex__load
+    RedisBanIndex._RedisBanIndex__load = lambda self, keys, *, now: loaded.extend(keys) or load(self, keys, now=now)
+    try:
+        page = index.query(BanQuery(search="10.0.2.", order="end_date"), now=NOW)
+        assert page.filtered == len([ban for ban in alive if ban["ip"].startswith("10.0.2.")]) and len(loaded) == 10, (page.filtered, len(loaded))
+
+        # The other searches only read the most recent bans matching the panes
+        loaded.clear()
+        page = RedisBanIndex(redis, search_limit=1000).query(BanQuery(search="antibot"), now=NOW)
+        recent = sorted(alive, key=lambda ban: ban["date"], reverse=True)[:1000]
+        assert page.filtered == len([ban for ban in recent if ban["reason"] == "antibot"]) and len(loaded) == 1000, (page.filtered, len(loaded))
+    finally:
+        RedisBanIndex._RedisBanIndex__load = load
+
+    # Bans deleted by instances which don't maintain the index are dropped when it is rebuilt
+    redis.delete(*[f"bans_ip_{ban['ip']}" for ban in alive[:30] if ban["ban_scope"] == "global"])
+    redis.delete(BANS_INDEX_VERSION)
+    assert index.query(BanQuery(), now=NOW).total == len(alive) - len([ban for ban in alive[:30] if ban["ban_scope"] == "global"])
+
+
+def test_memory_ban_index_updates():
+    memory = MemoryBanIndex(lambda: [], ttl=3600)
+    memory.refresh(NOW)
+    memory.add("1.2.3.4", 3600, "ui", "www.example.com", "service", now=NOW)
+    memory.add("1.2.3.4", 0, "ui", "unknown", "global", now=NOW)
+    memory.add("5.6.7.8", 60, "ui", "unknown", "global", now=NOW)
+    page = memory.query(BanQuery(order="end_date", direction="asc"), now=NOW)
+    assert [(ban["ip"], ban["ban_scope"]) for ban in page.bans] == [("5.6.7.8", "global"), ("1.2.3.4", "service"), ("1.2.3.4", "global")]
+
+    memory.remove("1.2.3.4", "www.example.com", "service")
+    assert memory.query(BanQuery(), now=NOW).total == 2
+    memory.remove("1.2.3.4")
+    assert memory.query(BanQuery(), now=NOW + 120).total == 0
+
+
+if __name__ == "__main__":
+    test_ban_index(verbose=True)
+    test_memory_ban_index_updates()
+    sys_exit(0)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Export synthetic reports (in random date order, with duplicates like the ones found when several instances share their reports) through the
+# streaming export : reports sorted by date with spilled runs, deduplicated, then written as CSV chunks. The peak memory is measured with tracemalloc and
+# compared with the former export which loaded every report then wrote the whole CSV in memory, it must not grow with the number of reports.
+# The suite exports 10,000 reports sorted by runs of 250. Set BENCHMARK=yes to export 500,000 reports with the default runs (a few minutes), the former
+# export is then measured on a tenth of them.
+# The Excel export is checked as well when openpyxl is installed.
+# Run it from the repository or where BunkerWeb is installed : python3 test_reports_export.py (or with pytest)
+
+from csv import reader as csv_reader, writer as csv_writer
+from io import StringIO
+from json import dumps
+from os import getenv, unlink
+from pathlib import Path
+from random import Random
+from sys import exit as sys_exit, path as sys_path
+from time import perf_counter
+from tracemalloc import get_traced_memory, start as tracemalloc_start, stop as tracemalloc_stop
+
+for ui_path in (Path(__file__).parents[2].joinpath("src", "ui"), Path("/usr/share/bunkerweb/ui")):
+    if ui_path.joinpath("app", "models", "exports.py").is_file():
+        sys_path.insert(0, ui_path.as_posix())
+        break
+
+from app.models.exports import EXPORT_RUN_SIZE, dedupe_sorted, iter_csv, iter_sorted  # type: ignore # noqa: E402
+
+BENCHMARK = getenv("BENCHMARK", "no") == "yes"
+REPORTS = 500_000 if BENCHMARK else 10_000
+RUN_SIZE = EXPORT_RUN_SIZE if BENCHMARK else 250
+DUPLICATE_EVERY = 100
+MAX_PEAK_MEMORY = 64 * 1024 * 1024
+HEADERS = ["Date", "Request ID", "IP Address", "Country", "Method", "URL", "Status Code", "User-Agent", "Reason", "Server Name", "Data", "Security Mode"]
+
+
+def iter_reports(count: int):
+    """Reports like the ones stored in the redis requests list, generated lazily, every DUPLICATE_EVERY report is sent twice."""
+    rng = Random(42)
+    for i in range(count):
+        report = {
+            "id": f"{i:032x}",
+            "date": 1_750_000_000 + rng.random() * 2_592_000,
+            "ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "country": rng.choice(("FR", "US", "DE", "CN", "local")),
+            "method": rng.choice(("GET", "POST")),
+            "url": f"/wp-admin/{i}/setup-config.php?step={i % 7}",
+            "status": rng.choice((400, 403, 404, 429, 444)),
+            "user_agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+            "reason": rng.choice(("modsecurity", "antibot", "badbehavior", "limit")),
+            "server_name": f"app{i % 20}.example.com",
+            "data": {"ids": ["942100", "949110"], "msgs": ["SQL Injection Attack Detected via libinjection"]},
+            "security_mode": "block",
+        }
+        yield report
+        if i % DUPLICATE_EVERY == 0:
+            yield dict(report)
+
+
+def export_row(report: dict) -> list:
+    return [
+        str(report["date"]),
+        report["id"],
+        report["ip"],
+        report["country"],
+        report["method"],
+        report["url"],
+        str(report["status"]),
+        report["user_agent"],
+        report["reason"],
+        report["server_name"],
+        dumps(report["data"]),
+        report["security_mode"],
+    ]
+
+
+def legacy_export(count: int) -> str:
+    """The former export : every report is loaded and sorted, then the whole CSV is built in memory."""
+    reports, seen = [], set()
+    for report in iter_reports(count):
+        if report["id"] not in seen:
+            seen.add(report["id"])
+            reports.append(report)
+    reports.sort(key=lambda report: report["date"], reverse=True)
+    output = StringIO()
+    writer = csv_writer(output)
+    writer.writerow(HEADERS)
+    for report in reports:
+        writer.writerow(export_row(report))
+    return output.getvalue()
+
+
+def streaming_rows(count: int, run_size: int = EXPORT_RUN_SIZE):
+    key = lambda report: float(report["date"])  # noqa: E731
+    reports = dedupe_sorted(iter_sorted(iter_reports(count), key, reverse=True, run_size=run_size), key, lambda report: report["id"])
+    return (export_row(report) for report in reports)
+
+
+def measure(callback, *, trace: bool = True) -> tuple:
+    """Run the callback, returns its result, the elapsed time and the peak memory (None when it isn't traced, tracemalloc slows the export down)."""
+    if trace:
+        tracemalloc_start()
+    start = perf_counter()
+    try:
+        result = callback()
+        return result, perf_counter() - start, get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc_stop()
+
+
+def consume_csv(chunks) -> tuple:
+    """Check the streamed CSV like a client would, without keeping it : rows count, chunks count and order of the dates."""
+    rows, chunk_count, previous = -1, 0, float("inf")
+    pending = ""
+    for chunk in chunks:
+        chunk_count += 1
+        lines = (pending + chunk).split("\r\n")
+        pending = lines.pop()
+        for row in csv_reader(lines):
+            rows += 1
+            if rows:
+                assert float(row[0]) <= previous, "The reports are not sorted by date"
+                previous = float(row[0])
+    assert not pending
+    return rows, chunk_count
+
+
+def test_streaming_export_memory(reports: int = REPORTS, run_size: int = RUN_SIZE, verbose: bool = False):
+    sample = reports // 10 if BENCHMARK else reports
+    legacy_csv, legacy_time, legacy_peak = measure(lambda: legacy_export(sample))
+    legacy_rows = legacy_csv.count("\r\n") - 1
+    del legacy_csv
+
+    (rows, chunks), streaming_time, streaming_peak = measure(lambda: consume_csv(iter_csv(HEADERS, streaming_rows(reports, run_size))))
+    expected_rows = reports
+    # ? Only the merge of the runs depends on the number of reports, exporting a quarter of them must already reach about the same peak
+    _, _, quarter_peak = measure(lambda: consume_csv(iter_csv(HEADERS, streaming_rows(reports // 4, run_size))))
+
+    if verbose:
+        print(f"legacy export    : {sample:7d} rows in {legacy_time:6.1f}s, peak memory {legacy_peak / 1024 / 1024:7.1f} MiB")
+        print(f"streaming export : {rows:7d} rows in {streaming_time:6.1f}s, peak memory {streaming_peak / 1024 / 1024:7.1f} MiB, {chunks} chunks")
+        print(f"streaming export : {reports // 4:7d} rows, peak memory {quarter_peak / 1024 / 1024:7.1f} MiB")
+
+    assert legacy_rows == sample
+    assert rows == expected_rows, f"{rows} rows exported instead of {expected_rows}"
+    assert chunks > rows // 2000, "The CSV isn't streamed by chunks"
+    assert streaming_peak < MAX_PEAK_MEMORY, f"Peak memory of {streaming_peak / 1024 / 1024:.1f} MiB"
+    assert streaming_peak < 1.5 * quarter_peak, f"The peak memory grows with the reports ({quarter_peak / 1024 / 1024:.1f} MiB for a quarter of them)"
+    # The former export already uses more memory for a tenth of the reports in the benchmark
+    assert streaming_peak < legacy_peak
+
+
+def test_export_row_cap():
+    truncated = []
+    output = "".join(iter_csv(HEADERS, streaming_rows(5000), max_rows=1234, chunk_rows=100, on_truncate=truncated.append))
+    assert output.count("\r\n") == 1235 and truncated == [1234]
+
+
+def test_excel_export(reports: int = 20_000 if BENCHMARK else 5000):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        print("openpyxl isn't installed, skipping the Excel export")
+        return
+
+    from app.models.exports import write_excel  # type: ignore
+
+    path, elapsed, peak = measure(lambda: write_excel(HEADERS, streaming_rows(reports), title="Reports", widths=[20] * len(HEADERS)), trace=BENCHMARK)
+    try:
+        workbook = load_workbook(path, read_only=True)
+        # ? A write-only workbook has no dimension tag, the read-only max_row is None so the rows are counted instead
+        sheet_rows = workbook["Reports"].iter_rows(values_only=True)
+        assert next(sheet_rows)[0] == "Date"
+        assert sum(1 for _ in sheet_rows) == reports
+        workbook.close()
+    finally:
+        unlink(path)
+    print(f"excel export     : {reports:7d} rows in {elapsed:6.1f}s" + (f", peak memory {peak / 1024 / 1024:7.1f} MiB" if peak is not None else ""))
+
+
+if __name__ == "__main__":
+    test_streaming_export_memory(verbose=True)
+    test_export_row_cap()
+    test_excel_export()
+    sys_exit(0)
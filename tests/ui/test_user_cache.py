@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+# Count the database statements issued to load the logged in user and to mark the sessions access during 1,000 page requests, with the former
+# behaviour (the user, its roles and its recovery codes loaded by every request, the permissions fetched role by role, then one UPDATE per request)
+# and with the principals cache and the write-behind buffer of the sessions accesses. The requests are spread over 100 seconds (fake clock).
+# The benchmark needs the dependencies of the web UI (sqlalchemy, bcrypt, flask-login, ...) and uses a temporary SQLite database.
+# Run it from the repository or where BunkerWeb is installed : python3 test_user_cache.py (or with pytest)
+
+from datetime import datetime, timedelta
+from logging import getLogger
+from os import sep
+from os.path import join
+from pathlib import Path
+from sys import exit as sys_exit, path as sys_path
+from tempfile import TemporaryDirectory
+
+for ui_path in (Path(__file__).parents[2].joinpath("src", "ui"), Path("/usr/share/bunkerweb/ui")):
+    if ui_path.joinpath("app", "models", "user_cache.py").is_file():
+        sys_path.insert(0, ui_path.as_posix())
+        for deps_path in (ui_path.parent.joinpath("common", "db"), ui_path.parent.joinpath("common", "utils")):
+            if deps_path.is_dir():
+                sys_path.append(deps_path.as_posix())
+        break
+
+for deps_path in [join(sep, "usr", "share", "bunkerweb", *paths) for paths in (("deps", "python"), ("utils",), ("db",))]:
+    if deps_path not in sys_path:
+        sys_path.append(deps_path)
+
+from app.models.user_cache import AccessBuffer, PrincipalCache  # type: ignore # noqa: E402
+
+REQUESTS = 1000
+REQUEST_INTERVAL = 0.1
+USERS = {"admin": ["admin"], "writer": ["writer"], "reader": ["reader"], "both": ["writer", "reader"]}
+ROLES = {"admin": ["manage", "write", "read"], "writer": ["write", "read"], "reader": ["read"]}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_principal_cache():
+    clock = Clock()
+    cache = PrincipalCache(ttl=5, max_size=2, clock=clock)
+    loads = []
+
+    def loader(username):
+        loads.append(username)
+        return {"username": username}
+
+    assert cache.get_or_load("a", loader) is cache.get_or_load("a", loader) and loads == ["a"]
+    clock.now = 5
+    cache.get_or_load("a", loader)
+    assert loads == ["a", "a"], "Expired principals must be reloaded"
+
+    cache.invalidate()
+    cache.get_or_load("a", loader)
+    assert loads == ["a", "a", "a"], "Principals must be reloaded after an update of the users or the roles"
+
+    # A principal loaded while the users were updated is not kept
+    version = cache.version
+    cache.invalidate()
+    cache.set("b", {"username": "b"}, version)
+    assert cache.get("b") is None
+
+    cache.get_or_load("b", loader)
+    cache.get_or_load("c", loader)
+    assert cache.get("a") is None and cache.get("c"), "The oldest principal must be dropped when the cache is full"
+
+
+def test_access_buffer():
+    clock = Clock()
+    batches = []
+    failing = []
+
+    def writer(accesses):
+        if failing:
+            return "database is locked"
+        batches.append(dict(accesses))
+        return ""
+
+    buffer = AccessBuffer(writer, interval=30, max_pending=3, clock=clock)
+    start = datetime(2025, 1, 1).astimezone()
+    assert not buffer.mark(1, start) and not buffer.mark(1, start + timedelta(seconds=1)) and not buffer.mark(1, start)
+    assert len(buffer) == 1
+
+    clock.now = 30
+    assert buffer.mark(2, start)
+    assert not buffer.mark(3, start), "Only one flush can be requested at a time"
+    assert buffer.flush() == "" and batches == [{1: start + timedelta(seconds=1), 2: start, 3: start}]
+
+    # The accesses that couldn't be written are kept for the next flush
+    failing.append(True)
+    buffer.mark(1, start + timedelta(seconds=2))
+    assert buffer.flush() and len(buffer) == 1
+    failing.clear()
+    assert not buffer.mark(4, start)
+    assert buffer.mark(5, start), "A full buffer must be flushed"
+    buffer.flush()
+    assert batches[-1] == {1: start + timedelta(seconds=2), 4: start, 5: start}
+
+
+def setup_database(tmp_dir: str):
+    from sqlalchemy import create_engine, event
+    from model import Base  # type: ignore
+    from app.models.ui_database import UIDatabase  # type: ignore
+
+    uri = f"sqlite:///{tmp_dir}/db.sqlite3"
+    engine = create_engine(uri)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    db = UIDatabase(getLogger("UI"), uri, log=False)
+    for role, permissions in ROLES.items():
+        assert not db.create_ui_role(role, role, permissions)
+    sessions = {}
+    for username, roles in USERS.items():
+        # ? Any hash does the job, the password isn't checked here
+        assert not db.create_ui_user(username, b"$2b$10$" + b"." * 53, roles, admin=username == "admin")
+        sessions[username] = db.mark_ui_user_login(username, datetime.now().astimezone(), "127.0.0.1", "benchmark")
+
+    statements = []
+    event.listen(db.sql_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return db, sessions, statements
+
+
+def legacy_request(db, username: str, session_id: int):
+    """What every page request did : load_user then mark_user_access."""
+    ui_user = db.get_ui_user(username=username)
+    ui_user.list_roles = [role.role_name for role in ui_user.roles]
+    ui_user.list_permissions = []
+    for role in ui_user.list_roles:
+        ui_user.list_permissions.extend(db.get_ui_role_permissions(role))
+    ui_user.list_permissions = set(ui_user.list_permissions)
+    if "write" in ui_user.list_permissions:
+        assert not db.mark_ui_user_access(session_id, datetime.now().astimezone())
+    return ui_user
+
+
+def cached_request(db, buffer: AccessBuffer, username: str, session_id: int):
+    ui_user = db.get_ui_principal(username)
+    if "write" in ui_user.list_permissions and buffer.mark(session_id, datetime.now().astimezone()):
+        assert not buffer.flush()
+    return ui_user
+
+
+def run_requests(callback, clock: Clock, statements: list) -> int:
+    usernames = list(USERS)
+    statements.clear()
+    for i in range(REQUESTS):
+        clock.now = i * REQUEST_INTERVAL
+        ui_user = callback(usernames[i % len(usernames)])
+        assert ui_user.list_permissions == set().union(*(ROLES[role] for role in USERS[ui_user.username]))
+    return len(statements)
+
+
+def test_statements_per_requests(verbose: bool = False):
+    try:
+        import bcrypt  # noqa: F401
+        import flask_login  # noqa: F401
+        import sqlalchemy  # noqa: F401
+    except ImportError as e:
+        print(f"The dependencies of the web UI aren't installed ({e}), skipping the benchmark")
+        return
+
+    with TemporaryDirectory(prefix="bw-ui-test-") as tmp_dir:
+        db, sessions, statements = setup_database(tmp_dir)
+        clock = Clock()
+        db.principals = PrincipalCache(clock=clock)
+        buffer = AccessBuffer(db.mark_ui_users_access, clock=clock)
+
+        legacy = run_requests(lambda username: legacy_request(db, username, sessions[username]), clock, statements)
+        cached = run_requests(lambda username: cached_request(db, buffer, username, sessions[username]), clock, statements)
+        buffer.flush()
+        cached_with_exit = len(statements)
+
+        # An update of the roles invalidates the cached principals
+        db.get_ui_principal("reader")
+        assert not db.create_ui_role("auditor", "auditor", ["read"])
+        statements.clear()
+        db.get_ui_principal("reader")
+        assert statements, "The principal must be reloaded after an update of the roles"
+
+        # The last activity of the sessions has been written
+        from model import UserSessions  # type: ignore
+
+        with db._db_session() as session:
+            user_session = session.query(UserSessions).filter_by(id=sessions["writer"]).first()
+            assert user_session.last_activity > user_session.creation_date
+        db.sql_engine.dispose()
+
+    if verbose:
+        print(f"former behaviour        : {legacy:5d} statements for {REQUESTS} requests")
+        print(f"cache and write-behind  : {cached:5d} statements for {REQUESTS} requests ({cached_with_exit} with the final flush)")
+
+    assert cached_with_exit * 10 < legacy, f"{cached_with_exit} statements instead of {legacy}"
+
+
+if __name__ == "__main__":
+    test_principal_cache()
+    test_access_buffer()
+    test_statements_per_requests(verbose=True)
+    sys_exit(0)